@@ -37,6 +37,13 @@ ROOT_HELPER_OPTS = [
     # rootwrap daemon command, which may be necessary for Xen?
     cfg.StrOpt('root_helper_daemon',
                help=_('Root helper daemon application to use when possible.')),
+    cfg.IntOpt('root_helper_daemon_pool_size', default=1,
+               help=_('Number of root helper daemons commands are run by '
+                      'concurrently, when root_helper_daemon is set.')),
+    cfg.IntOpt('command_latency_report_interval', default=300,
+               help=_('Seconds between logging the latency histograms of '
+                      'the commands executed by the agent. 0 disables '
+                      'them.')),
 ]
 
 AGENT_STATE_OPTS = [
@@ -61,6 +68,17 @@ USE_NAMESPACES_OPTS = [
 IPTABLES_OPTS = [
     cfg.BoolOpt('comment_iptables_rules', default=True,
                 help=_("Add comments to iptables rules.")),
+    cfg.BoolOpt('iptables_incremental_apply', default=False,
+                help=_("Only send the wrapped chains which changed since "
+                       "the last apply to iptables-restore --noflush, "
+                       "instead of rewriting the whole iptables-save dump. "
+                       "A full save/restore is still done when unwrapped "
+                       "chains change or when an incremental update "
+                       "fails.")),
+    cfg.IntOpt('iptables_apply_report_interval', default=300,
+               help=_("Seconds between logging the number of iptables "
+                      "applies done by the agent in each mode. 0 disables "
+                      "it.")),
 ]
 
 PROCESS_MONITOR_OPTS = [
@@ -294,6 +294,16 @@ class OVSBridge(BaseOVS):
     def get_port_name_list(self):
         return self.ovsdb.list_ports(self.br_name).execute(check_error=True)
 
+    def get_port_records(self, table, columns):
+        """Return the Port or Interface records of the ports of the bridge.
+
+        With the native OVSDB interface they are read from the local replica
+        of the database in a single call, instead of listing the ports and
+        then their records with two ovs-vsctl runs.
+        """
+        return self.ovsdb.list_port_records(
+            self.br_name, table, columns=columns).execute(check_error=True)
+
     def get_port_stats(self, port_name):
         return self.db_get_val("Interface", port_name, "statistics")
 
@@ -311,12 +321,11 @@ class OVSBridge(BaseOVS):
     # returns a VIF object for each VIF port
     def get_vif_ports(self):
         edge_ports = []
-        port_names = self.get_port_name_list()
-        for name in port_names:
-            external_ids = self.db_get_val("Interface", name, "external_ids",
-                                           check_error=True)
-            ofport = self.db_get_val("Interface", name, "ofport",
-                                     check_error=True)
+        for r in self.get_port_records(
+                'Interface', ['name', 'external_ids', 'ofport']):
+            name = r['name']
+            external_ids = r['external_ids']
+            ofport = r['ofport']
             if "iface-id" in external_ids and "attached-mac" in external_ids:
                 p = VifPort(name, ofport, external_ids["iface-id"],
                             external_ids["attached-mac"], self)
@@ -333,11 +342,8 @@ class OVSBridge(BaseOVS):
         return edge_ports
 
     def get_vif_port_to_ofport_map(self):
-        port_names = self.get_port_name_list()
-        cmd = self.ovsdb.db_list(
-            'Interface', port_names,
-            columns=['name', 'external_ids', 'ofport'], if_exists=True)
-        results = cmd.execute(check_error=True)
+        results = self.get_port_records(
+            'Interface', ['name', 'external_ids', 'ofport'])
         port_map = {}
         for r in results:
             # fall back to basic interface name
@@ -351,11 +357,8 @@ class OVSBridge(BaseOVS):
 
     def get_vif_port_set(self):
         edge_ports = set()
-        port_names = self.get_port_name_list()
-        cmd = self.ovsdb.db_list(
-            'Interface', port_names,
-            columns=['name', 'external_ids', 'ofport'], if_exists=True)
-        results = cmd.execute(check_error=True)
+        results = self.get_port_records(
+            'Interface', ['name', 'external_ids', 'ofport'])
         for result in results:
             if result['ofport'] == UNASSIGNED_OFPORT:
                 LOG.warn(_LW("Found not yet ready openvswitch port: %s"),
@@ -392,10 +395,7 @@ class OVSBridge(BaseOVS):
         in the "Interface" table queried by the get_vif_port_set() method.
 
         """
-        port_names = self.get_port_name_list()
-        cmd = self.ovsdb.db_list('Port', port_names, columns=['name', 'tag'],
-                                 if_exists=True)
-        results = cmd.execute(check_error=True)
+        results = self.get_port_records('Port', ['name', 'tag'])
         return {p['name']: p['tag'] for p in results}
 
     def get_vif_port_by_id(self, port_id):
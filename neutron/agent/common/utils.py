@@ -22,3 +22,4 @@ else:
     from neutron.agent.linux import utils
 
 execute = utils.execute
+execute_reusing_client = utils.execute_reusing_client
@@ -15,14 +15,17 @@
 
 import collections
 import os
+import time
 
 import eventlet
 
+from oslo_concurrency import lockutils
 from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging
 from oslo_utils import importutils
 
+from neutron.agent.dhcp import network_processing_queue as queue
 from neutron.agent.linux import dhcp
 from neutron.agent.linux import external_process
 from neutron.agent.linux import utils as linux_utils
@@ -57,6 +60,7 @@ class DhcpAgent(manager.Manager):
         self.needs_resync_reasons = collections.defaultdict(list)
         self.conf = cfg.CONF
         self.cache = NetworkCache()
+        self._queue = queue.NetworkProcessingQueue()
         self.dhcp_driver_cls = importutils.import_class(self.conf.dhcp_driver)
         ctx = context.get_admin_context_without_session()
         self.plugin_rpc = DhcpPluginApi(topics.PLUGIN,
@@ -96,11 +100,18 @@ class DhcpAgent(manager.Manager):
         """Activate the DHCP agent."""
         self.sync_state()
         self.periodic_resync()
+        eventlet.spawn_n(self._process_network_events_loop)
 
     def call_driver(self, action, network, **action_kwargs):
         """Invoke an action on a DHCP driver instance."""
         LOG.debug('Calling driver for network: %(net)s action: %(action)s',
                   {'net': network.id, 'action': action})
+        # Actions on different networks may run concurrently
+        with lockutils.lock('dhcp-agent-network-%s' % network.id,
+                            utils.SYNCHRONIZED_PREFIX):
+            return self._call_driver(action, network, **action_kwargs)
+
+    def _call_driver(self, action, network, **action_kwargs):
         try:
             # the Driver expects something that is duck typed similar to
             # the base models.
@@ -315,22 +326,21 @@ class DhcpAgent(manager.Manager):
         if network:
             self.refresh_dhcp_helper(network.id)
 
-    @utils.synchronized('dhcp-agent')
     def port_update_end(self, context, payload):
         """Handle the port.update.end notification event."""
-        updated_port = dhcp.DictModel(payload['port'])
+        updated_port = dhcp.PortModel(payload['port'])
         network = self.cache.get_network_by_id(updated_port.network_id)
         if network:
-            driver_action = 'reload_allocations'
+            driver_action = queue.RELOAD_ALLOCATIONS
             if self._is_port_on_this_agent(updated_port):
                 orig = self.cache.get_port_by_id(updated_port['id'])
                 # assume IP change if not in cache
                 old_ips = {i['ip_address'] for i in orig['fixed_ips'] or []}
                 new_ips = {i['ip_address'] for i in updated_port['fixed_ips']}
                 if old_ips != new_ips:
-                    driver_action = 'restart'
+                    driver_action = queue.RESTART
             self.cache.put_port(updated_port)
-            self.call_driver(driver_action, network)
+            self._queue.add(network.id, driver_action)
 
     def _is_port_on_this_agent(self, port):
         thishost = utils.get_dhcp_agent_device_id(
@@ -340,14 +350,30 @@ class DhcpAgent(manager.Manager):
     # Use the update handler for the port create event.
     port_create_end = port_update_end
 
-    @utils.synchronized('dhcp-agent')
     def port_delete_end(self, context, payload):
         """Handle the port.delete.end notification event."""
         port = self.cache.get_port_by_id(payload['port_id'])
         if port:
             network = self.cache.get_network_by_id(port.network_id)
             self.cache.remove_port(port)
-            self.call_driver('reload_allocations', network)
+            self._queue.add(network.id, queue.RELOAD_ALLOCATIONS)
+
+    def _process_network_event(self):
+        network_id, action = self._queue.get()
+        try:
+            # The cache is updated when the events are received, perform
+            # the action with the network as it is now
+            network = self.cache.get_network_by_id(network_id)
+            if network:
+                self.call_driver(action, network)
+        finally:
+            self._queue.done(network_id)
+
+    def _process_network_events_loop(self):
+        LOG.debug("Starting _process_network_events_loop")
+        pool = eventlet.GreenPool(size=self.conf.network_event_workers)
+        while True:
+            pool.spawn_n(self._process_network_event)
 
     def enable_isolated_metadata_proxy(self, network):
 
@@ -429,7 +455,7 @@ class DhcpPluginApi(object):
                           network_id=network_id, device_id=device_id,
                           host=self.host)
         if port:
-            return dhcp.DictModel(port)
+            return dhcp.PortModel(port)
 
     def create_dhcp_port(self, port):
         """Make a remote process call to create the dhcp port."""
@@ -437,7 +463,7 @@ class DhcpPluginApi(object):
         port = cctxt.call(self.context, 'create_dhcp_port',
                           port=port, host=self.host)
         if port:
-            return dhcp.DictModel(port)
+            return dhcp.PortModel(port)
 
     def update_dhcp_port(self, port_id, port):
         """Make a remote process call to update the dhcp port."""
@@ -445,7 +471,7 @@ class DhcpPluginApi(object):
         port = cctxt.call(self.context, 'update_dhcp_port',
                           port_id=port_id, port=port, host=self.host)
         if port:
-            return dhcp.DictModel(port)
+            return dhcp.PortModel(port)
 
     def release_dhcp_port(self, network_id, device_id):
         """Make a remote process call to release the dhcp port."""
@@ -463,11 +489,19 @@ class DhcpPluginApi(object):
 
 
 class NetworkCache(object):
-    """Agent cache of the current network state."""
+    """Agent cache of the current network state.
+
+    Besides the networks, the cache indexes their subnets and ports by ID and
+    their ports by MAC address, so that the port events do not have to scan
+    the ports of the network.
+    """
     def __init__(self):
         self.cache = {}
         self.subnet_lookup = {}
         self.port_lookup = {}
+        self.subnets = {}
+        self.ports = {}
+        self.mac_lookup = {}
 
     def get_network_ids(self):
         return self.cache.keys()
@@ -489,45 +523,68 @@ class NetworkCache(object):
 
         for subnet in network.subnets:
             self.subnet_lookup[subnet.id] = network.id
+            self.subnets[subnet.id] = subnet
 
         for port in network.ports:
-            self.port_lookup[port.id] = network.id
+            self._index_port(network.id, port)
 
     def remove(self, network):
         del self.cache[network.id]
 
         for subnet in network.subnets:
             del self.subnet_lookup[subnet.id]
+            self.subnets.pop(subnet.id, None)
 
         for port in network.ports:
-            del self.port_lookup[port.id]
+            self._unindex_port(port)
+
+    def _index_port(self, network_id, port):
+        self.port_lookup[port.id] = network_id
+        self.ports[port.id] = port
+        mac_address = getattr(port, 'mac_address', None)
+        if mac_address:
+            self.mac_lookup[mac_address] = port.id
+
+    def _unindex_port(self, port):
+        del self.port_lookup[port.id]
+        self.ports.pop(port.id, None)
+        mac_address = getattr(port, 'mac_address', None)
+        if self.mac_lookup.get(mac_address) == port.id:
+            del self.mac_lookup[mac_address]
 
     def put_port(self, port):
         network = self.get_network_by_id(port.network_id)
-        for index in range(len(network.ports)):
-            if network.ports[index].id == port.id:
-                network.ports[index] = port
-                break
-        else:
+        old_port = self.ports.get(port.id)
+        if old_port is None:
             network.ports.append(port)
+        else:
+            for index in range(len(network.ports)):
+                if network.ports[index].id == port.id:
+                    network.ports[index] = port
+                    break
+            else:
+                network.ports.append(port)
+            self._unindex_port(old_port)
 
-        self.port_lookup[port.id] = network.id
+        self._index_port(network.id, port)
 
     def remove_port(self, port):
         network = self.get_network_by_port_id(port.id)
 
         for index in range(len(network.ports)):
-            if network.ports[index] == port:
+            if network.ports[index].id == port.id:
+                self._unindex_port(network.ports[index])
                 del network.ports[index]
-                del self.port_lookup[port.id]
                 break
 
     def get_port_by_id(self, port_id):
-        network = self.get_network_by_port_id(port_id)
-        if network:
-            for port in network.ports:
-                if port.id == port_id:
-                    return port
+        return self.ports.get(port_id)
+
+    def get_port_by_mac(self, mac_address):
+        return self.ports.get(self.mac_lookup.get(mac_address))
+
+    def get_subnet_by_id(self, subnet_id):
+        return self.subnets.get(subnet_id)
 
     def get_state(self):
         net_ids = self.get_network_ids()
@@ -557,6 +614,7 @@ class DhcpAgentWithStateReport(DhcpAgent):
                 'dhcp_lease_duration': cfg.CONF.dhcp_lease_duration},
             'start_flag': True,
             'agent_type': constants.AGENT_TYPE_DHCP}
+        self._network_event_stats_time = None
         report_interval = cfg.CONF.AGENT.report_interval
         self.use_call = True
         if report_interval:
@@ -568,6 +626,7 @@ class DhcpAgentWithStateReport(DhcpAgent):
         try:
             self.agent_state.get('configurations').update(
                 self.cache.get_state())
+            self._update_network_event_stats()
             ctx = context.get_admin_context_without_session()
             self.state_rpc.report_state(ctx, self.agent_state, self.use_call)
             self.use_call = False
@@ -584,6 +643,22 @@ class DhcpAgentWithStateReport(DhcpAgent):
         if self.agent_state.pop('start_flag', None):
             self.run()
 
+    def _update_network_event_stats(self):
+        # The queue counters change on every event: they are only refreshed
+        # every network_event_stats_interval, so that configurations stay
+        # unchanged between most heartbeats.
+        interval = cfg.CONF.network_event_stats_interval
+        now = time.time()
+        if not interval or (self._network_event_stats_time is not None and
+                            now - self._network_event_stats_time < interval):
+            return
+        self._network_event_stats_time = now
+        stats = self._queue.get_state()
+        self.agent_state['configurations']['network_events'] = stats
+        LOG.info(_LI("Network event queue: %(event_queue_depth)d networks "
+                     "queued, %(events_processed)d events processed, "
+                     "%(events_merged)d events merged"), stats)
+
     def agent_updated(self, context, payload):
         """Handle the agent_updated notification event."""
         self.schedule_resync(_("Agent updated: %(payload)s") %
@@ -29,7 +29,14 @@ DHCP_AGENT_OPTS = [
                        "dedicated network. Requires "
                        "enable_isolated_metadata = True")),
     cfg.IntOpt('num_sync_threads', default=4,
-               help=_('Number of threads to use during sync process.'))
+               help=_('Number of threads to use during sync process.')),
+    cfg.IntOpt('network_event_workers', default=8,
+               help=_('Number of networks whose events are processed '
+                      'concurrently.')),
+    cfg.IntOpt('network_event_stats_interval', default=300,
+               help=_('Seconds between refreshing the network event queue '
+                      'statistics sent in the state reports of the agent, '
+                      'which are also logged. 0 disables them.')),
 ]
 
 DHCP_OPTS = [
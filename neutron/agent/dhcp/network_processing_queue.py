@@ -0,0 +1,77 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from six.moves import queue as Queue
+
+RELOAD_ALLOCATIONS = 'reload_allocations'
+RESTART = 'restart'
+
+# Driver actions in increasing order of precedence: a restart also reloads
+# the allocations.
+ACTIONS = (RELOAD_ALLOCATIONS, RESTART)
+
+
+class NetworkProcessingQueue(object):
+    """Manager of the queue of driver actions to perform on networks.
+
+    Events received for a network add the driver action they require to the
+    queue. Until a worker picks the network up, the actions added for it are
+    merged into the one with the highest precedence, so that a burst of
+    events leads to a single driver call.
+
+    A network is processed by one worker at a time. Actions added while it is
+    being processed are queued again when the worker calls done(), so that
+    they are performed with the state cached after the events.
+    """
+    def __init__(self):
+        self._pending = {}
+        self._in_progress = set()
+        self._ready = Queue.Queue()
+        self.merged = 0
+        self.processed = 0
+
+    def add(self, network_id, action):
+        pending = self._pending.get(network_id)
+        if pending is not None:
+            self.merged += 1
+            self._pending[network_id] = max(pending, action,
+                                            key=ACTIONS.index)
+            return
+        self._pending[network_id] = action
+        if network_id not in self._in_progress:
+            self._ready.put(network_id)
+
+    def get(self):
+        """Wait for a network to process
+
+        :returns: (network_id, action) tuple. done() must be called with the
+        network_id once the action has been performed.
+        """
+        network_id = self._ready.get()
+        self._in_progress.add(network_id)
+        return network_id, self._pending.pop(network_id)
+
+    def done(self, network_id):
+        self._in_progress.discard(network_id)
+        self.processed += 1
+        if network_id in self._pending:
+            self._ready.put(network_id)
+
+    @property
+    def depth(self):
+        """Number of networks with an action waiting to be performed"""
+        return len(self._pending)
+
+    def get_state(self):
+        return {'event_queue_depth': self.depth,
+                'events_merged': self.merged,
+                'events_processed': self.processed}
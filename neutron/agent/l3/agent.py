@@ -13,6 +13,8 @@
 #    under the License.
 #
 
+import time
+
 import eventlet
 import netaddr
 from oslo_config import cfg
@@ -76,6 +78,7 @@ class L3PluginApi(object):
         1.4 - Added L3 HA update_router_state. This method was reworked in
               to update_ha_routers_states
         1.5 - Added update_ha_routers_states
+        1.6 - Added sync_routers_delta
 
     """
 
@@ -90,6 +93,27 @@ class L3PluginApi(object):
         return cctxt.call(context, 'sync_routers', host=self.host,
                           router_ids=router_ids)
 
+    def get_routers_delta(self, context, revisions):
+        """Retrieve the routers which changed since the given revisions.
+
+        :param revisions: the revision of each router known by the agent
+        :returns: a dict with routers, the routers with a revision different
+                  from the agent's, and deleted, the IDs of the routers of
+                  the revisions which are not hosted by the agent anymore
+        """
+        try:
+            cctxt = self.client.prepare(version='1.6')
+            return cctxt.call(context, 'sync_routers_delta', host=self.host,
+                              revisions=revisions)
+        except oslo_messaging.UnsupportedVersion:
+            # If the server has not been upgraded yet, fall back to
+            # retrieving all the routers.
+            routers = self.get_routers(context)
+            router_ids = set(r['id'] for r in routers)
+            return {'routers': routers,
+                    'deleted': [router_id for router_id in revisions
+                                if router_id not in router_ids]}
+
     def get_external_network_id(self, context):
         """Make a remote process call to retrieve the external network id.
 
@@ -214,6 +238,12 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
             self.conf.use_namespaces)
 
         self._queue = queue.RouterProcessingQueue()
+        # router_id -> (fetch timestamp, router or None), for the routers
+        # fetched along with the router of another update
+        self._prefetched_routers = {}
+        # router_id -> revision of the data the router was last successfully
+        # processed with, sent on full syncs to only get changed routers
+        self._router_revisions = {}
         super(L3NATAgent, self).__init__(conf=self.conf)
 
         self.target_ex_net_id = None
@@ -426,29 +456,55 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
     def _process_updated_router(self, router):
         ri = self.router_info[router['id']]
         ri.router = router
+        ri.timings.clear()
         registry.notify(resources.ROUTER, events.BEFORE_UPDATE,
                         self, router=ri)
         ri.process(self)
         registry.notify(resources.ROUTER, events.AFTER_UPDATE, self, router=ri)
 
+    def _fetch_router(self, update):
+        """Return the data of the router to update, None if it is gone
+
+        The routers of the next updates waiting in the queue are fetched in
+        the same call, and kept for the processing of these updates.
+        """
+        prefetched = self._prefetched_routers.pop(update.id, None)
+        if prefetched and prefetched[0] >= update.timestamp:
+            update.timestamp = prefetched[0]
+            return prefetched[1]
+
+        router_ids = [update.id]
+        for router_id in self._queue.get_router_ids_to_fetch(
+                self.conf.router_fetch_batch_size - 1):
+            if router_id not in router_ids:
+                router_ids.append(router_id)
+        update.timestamp = timeutils.utcnow()
+        routers = dict((r['id'], r) for r in
+                       self.plugin_rpc.get_routers(self.context, router_ids))
+        for router_id in router_ids[1:]:
+            self._prefetched_routers[router_id] = (update.timestamp,
+                                                   routers.get(router_id))
+        return routers.get(update.id)
+
     def _process_router_update(self):
         for rp, update in self._queue.each_update_to_next_router():
             LOG.debug("Starting router update for %s", update.id)
+            # Until the update is successfully processed, the router is
+            # known with no revision, so that a full sync returns it
+            self._router_revisions.pop(update.id, None)
             router = update.router
+            fetch_time = 0.0
             if update.action != queue.DELETE_ROUTER and not router:
                 try:
-                    update.timestamp = timeutils.utcnow()
-                    routers = self.plugin_rpc.get_routers(self.context,
-                                                          [update.id])
+                    start = time.time()
+                    router = self._fetch_router(update)
+                    fetch_time = time.time() - start
                 except Exception:
                     msg = _LE("Failed to fetch router information for '%s'")
                     LOG.exception(msg, update.id)
                     self.fullsync = True
                     continue
 
-                if routers:
-                    router = routers[0]
-
             if not router:
                 removed = self._safe_router_removed(update.id)
                 if not removed:
@@ -473,12 +529,23 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
                 self.fullsync = True
                 continue
 
-            LOG.debug("Finished a router update for %s", update.id)
+            timings = {}
+            ri = self.router_info.get(router['id'])
+            if ri:
+                timings = ri.timings
+                timings['fetch'] = fetch_time
+            LOG.debug("Finished a router update for %(router_id)s, "
+                      "timings: %(timings)s",
+                      {'router_id': update.id,
+                       'timings': ', '.join('%s %.3fs' % timing for timing
+                                            in sorted(timings.items()))})
+            if ri and router.get('revision'):
+                self._router_revisions[router['id']] = router['revision']
             rp.fetched_and_processed(update.timestamp)
 
     def _process_routers_loop(self):
         LOG.debug("Starting _process_routers_loop")
-        pool = eventlet.GreenPool(size=8)
+        pool = eventlet.GreenPool(size=self.conf.router_processing_workers)
         while True:
             pool.spawn_n(self._process_router_update)
 
@@ -511,10 +578,18 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
     def fetch_and_sync_all_routers(self, context, ns_manager):
         prev_router_ids = set(self.router_info)
         timestamp = timeutils.utcnow()
+        # Routers with a known revision are only returned if they changed
+        revisions = dict((router_id, revision) for router_id, revision
+                         in self._router_revisions.items()
+                         if router_id in self.router_info)
+        unchanged_router_ids = set()
 
         try:
             if self.conf.use_namespaces:
-                routers = self.plugin_rpc.get_routers(context)
+                delta = self.plugin_rpc.get_routers_delta(context, revisions)
+                routers = delta['routers']
+                unchanged_router_ids = (set(revisions) - set(delta['deleted'])
+                                        - set(r['id'] for r in routers))
             else:
                 routers = self.plugin_rpc.get_routers(context,
                                                       [self.conf.router_id])
@@ -534,7 +609,10 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
             self.fullsync = False
             LOG.debug("periodic_sync_routers_task successfully completed")
 
-            curr_router_ids = set([r['id'] for r in routers])
+            for router_id in unchanged_router_ids:
+                ns_manager.keep_router(router_id)
+            curr_router_ids = (set([r['id'] for r in routers]) |
+                               unchanged_router_ids)
 
             # Delete routers that have disappeared since the last sync
             for router_id in prev_router_ids - curr_router_ids:
@@ -599,6 +677,12 @@ class L3NATAgentWithStateReport(L3NATAgent):
         configurations['ex_gw_ports'] = num_ex_gw_ports
         configurations['interfaces'] = num_interfaces
         configurations['floating_ips'] = num_floating_ips
+        # The HA state change counters change with every transition: only
+        # those of the last batch reported to the server are sent, so that
+        # configurations stay unchanged between failovers.
+        if self.reported_ha_state_change_stats is not None:
+            configurations['ha_state_changes'] = (
+                self.reported_ha_state_change_stats)
         try:
             self.state_rpc.report_state(self.context, self.agent_state,
                                         self.use_call)
@@ -86,4 +86,13 @@ OPTS = [
                default='0x2',
                help=_('Iptables mangle mark used to mark ingress from '
                       'external network')),
+    cfg.IntOpt('router_processing_workers',
+               default=8,
+               help=_('Number of routers processed concurrently. Routers '
+                      'are processed in greenthreads, which overlap the '
+                      'waits for the commands they run.')),
+    cfg.IntOpt('router_fetch_batch_size',
+               default=32,
+               help=_('Maximum number of routers waiting to be processed '
+                      'fetched from the server in a single call.')),
 ]
@@ -170,7 +170,8 @@ class DvrRouter(router.RouterInfo):
                                                         self.agent_conf,
                                                         self.driver,
                                                         self.use_ipv6)
-        self.snat_namespace.create()
+        with self.timed('namespace'):
+            self.snat_namespace.create()
         return self.snat_namespace
 
     def _get_internal_port(self, subnet_id):
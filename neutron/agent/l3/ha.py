@@ -14,15 +14,17 @@
 #    under the License.
 
 import os
+import time
 
 import eventlet
 from oslo_config import cfg
 from oslo_log import log as logging
+from six.moves import queue as Queue
 import webob
 
 from neutron.agent.linux import keepalived
 from neutron.agent.linux import utils as agent_utils
-from neutron.i18n import _LI
+from neutron.i18n import _LE, _LI
 from neutron.notifiers import batch_notifier
 
 LOG = logging.getLogger(__name__)
@@ -44,9 +46,66 @@ OPTS = [
     cfg.IntOpt('ha_vrrp_advert_int',
                default=2,
                help=_('The advertisement interval in seconds')),
+    cfg.IntOpt('ha_state_change_workers',
+               default=8,
+               help=_('Number of HA routers whose state change is processed '
+                      'concurrently, spawning or stopping their metadata '
+                      'proxy and radvd.')),
+    cfg.IntOpt('ha_state_report_batch_size',
+               default=64,
+               help=_('Number of HA router state changes after which they '
+                      'are reported to the server without waiting for the '
+                      'end of the batch interval. 0 disables it.')),
 ]
 
 
+class StateChangeQueue(object):
+    """Queue of the HA routers which changed state.
+
+    Only the last state of a router is kept until a worker picks it up, so
+    that a router flapping during a failover is processed once. A router is
+    processed by one worker at a time: a state received while it is being
+    processed is queued again when the worker calls done().
+    """
+    def __init__(self):
+        # router_id -> (state, time of the first unprocessed notification)
+        self._pending = {}
+        self._in_progress = set()
+        self._ready = Queue.Queue()
+        self.merged = 0
+
+    def add(self, router_id, state):
+        pending = self._pending.get(router_id)
+        if pending is not None:
+            self.merged += 1
+            self._pending[router_id] = (state, pending[1])
+            return
+        self._pending[router_id] = (state, time.time())
+        if router_id not in self._in_progress:
+            self._ready.put(router_id)
+
+    def get(self):
+        """Wait for a router to process
+
+        :returns: (router_id, state, received_at) tuple. done() must be
+        called with the router_id once the state change is processed.
+        """
+        router_id = self._ready.get()
+        self._in_progress.add(router_id)
+        state, received_at = self._pending.pop(router_id)
+        return router_id, state, received_at
+
+    def done(self, router_id):
+        self._in_progress.discard(router_id)
+        if router_id in self._pending:
+            self._ready.put(router_id)
+
+    @property
+    def depth(self):
+        """Number of routers with a state change waiting to be processed"""
+        return len(self._pending)
+
+
 class KeepalivedStateChangeHandler(object):
     def __init__(self, agent):
         self.agent = agent
@@ -91,8 +150,17 @@ class AgentMixin(object):
         self._init_ha_conf_path()
         super(AgentMixin, self).__init__(host)
         self.state_change_notifier = batch_notifier.BatchNotifier(
-            self._calculate_batch_duration(), self.notify_server)
+            self._calculate_batch_duration(), self.notify_server,
+            max_batch_size=self.conf.ha_state_report_batch_size)
+        self._state_change_queue = StateChangeQueue()
+        # Seconds between the notification of a state change and its report
+        # to the server, for the last batch reported
+        self.ha_state_report_latency = None
+        # HA state change statistics when the last batch was reported, sent
+        # in the agent state so that it only changes after a failover
+        self.reported_ha_state_change_stats = None
         eventlet.spawn(self._start_keepalived_notifications_server)
+        eventlet.spawn(self._process_state_changes_loop)
 
     def _start_keepalived_notifications_server(self):
         state_change_server = (
@@ -113,17 +181,37 @@ class AgentMixin(object):
         LOG.info(_LI('Router %(router_id)s transitioned to %(state)s'),
                  {'router_id': router_id,
                   'state': state})
+        self._state_change_queue.add(router_id, state)
 
+    def _process_state_change(self):
+        router_id, state, received_at = self._state_change_queue.get()
         try:
-            ri = self.router_info[router_id]
-        except AttributeError:
-            LOG.info(_LI('Router %s is not managed by this agent. It was '
-                         'possibly deleted concurrently.'), router_id)
-            return
+            ri = self.router_info.get(router_id)
+            if ri is None:
+                LOG.info(_LI('Router %s is not managed by this agent. It was '
+                             'possibly deleted concurrently.'), router_id)
+                return
+
+            self._update_metadata_proxy(ri, router_id, state)
+            self._update_radvd_daemon(ri, state)
+            self.state_change_notifier.queue_event(
+                (router_id, state, received_at))
+        except Exception:
+            LOG.exception(_LE('Failed to process the transition of router '
+                              '%(router_id)s to %(state)s'),
+                          {'router_id': router_id, 'state': state})
+        finally:
+            self._state_change_queue.done(router_id)
 
-        self._update_metadata_proxy(ri, router_id, state)
-        self._update_radvd_daemon(ri, state)
-        self.state_change_notifier.queue_event((router_id, state))
+    def _process_state_changes_loop(self):
+        pool = eventlet.GreenPool(size=self.conf.ha_state_change_workers)
+        while True:
+            pool.spawn_n(self._process_state_change)
+
+    def get_ha_state_change_stats(self):
+        return {'ha_state_changes_pending': self._state_change_queue.depth,
+                'ha_state_changes_merged': self._state_change_queue.merged,
+                'ha_state_report_latency': self.ha_state_report_latency}
 
     def _update_metadata_proxy(self, ri, router_id, state):
         if state == 'master':
@@ -149,11 +237,30 @@ class AgentMixin(object):
                            'backup': 'standby',
                            'fault': 'standby'}
         translated_states = dict((router_id, translation_map[state]) for
-                                 router_id, state in batched_events)
+                                 router_id, state, received_at
+                                 in batched_events)
         LOG.debug('Updating server with HA routers states %s',
                   translated_states)
-        self.plugin_rpc.update_ha_routers_states(
-            self.context, translated_states)
+        try:
+            self.plugin_rpc.update_ha_routers_states(
+                self.context, translated_states)
+        except Exception:
+            LOG.exception(_LE('Failed to update the server with the states '
+                              'of HA routers %s'), translated_states.keys())
+            return
+        self.ha_state_report_latency = round(
+            time.time() - min(received_at for router_id, state, received_at
+                              in batched_events), 3)
+        self.reported_ha_state_change_stats = (
+            self.get_ha_state_change_stats())
+        LOG.info(_LI('Reported the states of %(count)d HA routers to the '
+                     'server, %(latency).3f seconds after the first '
+                     'transition, %(pending)d state changes pending, '
+                     '%(merged)d merged since the agent started'),
+                 {'count': len(translated_states),
+                  'latency': self.ha_state_report_latency,
+                  'pending': self._state_change_queue.depth,
+                  'merged': self._state_change_queue.merged})
 
     def _init_ha_conf_path(self):
         ha_full_path = os.path.dirname("/%s/" % self.conf.ha_confs_path)
@@ -354,7 +354,8 @@ class HaRouter(router.RouterInfo):
         super(HaRouter, self).process(agent)
 
         if self.ha_port:
-            self.enable_keepalived()
+            with self.timed('keepalived'):
+                self.enable_keepalived()
 
     def enable_radvd(self, internal_ports=None):
         if (self.keepalived_manager.get_process().active and
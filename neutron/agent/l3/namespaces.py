@@ -69,11 +69,10 @@ class Namespace(object):
 
     def create(self):
         ip_wrapper = self.ip_wrapper_root.ensure_namespace(self.name)
-        cmd = ['sysctl', '-w', 'net.ipv4.ip_forward=1']
-        ip_wrapper.netns.execute(cmd)
+        cmds = [['sysctl', '-w', 'net.ipv4.ip_forward=1']]
         if self.use_ipv6:
-            cmd = ['sysctl', '-w', 'net.ipv6.conf.all.forwarding=1']
-            ip_wrapper.netns.execute(cmd)
+            cmds.append(['sysctl', '-w', 'net.ipv6.conf.all.forwarding=1'])
+        ip_wrapper.netns.execute_reusing_client(cmds)
 
     def delete(self):
         if self.agent_conf.router_delete_namespaces:
@@ -12,6 +12,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+import time
+
 import netaddr
 
 from oslo_log import log as logging
@@ -64,6 +67,8 @@ class RouterInfo(object):
         self.driver = interface_driver
         # radvd is a neutron.agent.linux.ra.DaemonMonitor
         self.radvd = None
+        # Seconds spent in each phase of the last processing of the router
+        self.timings = {}
 
     def initialize(self, process_monitor):
         """Initialize the router on the system.
@@ -82,7 +87,8 @@ class RouterInfo(object):
                                       self.get_internal_device_name)
 
         if self.router_namespace:
-            self.router_namespace.create()
+            with self.timed('namespace'):
+                self.router_namespace.create()
 
     @property
     def router(self):
@@ -103,6 +109,16 @@ class RouterInfo(object):
             # Gateway port was removed, remove rules
             self._snat_action = 'remove_rules'
 
+    @contextlib.contextmanager
+    def timed(self, phase):
+        """Add the time spent in the block to the timing of the phase."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.timings[phase] = (self.timings.get(phase, 0.0) +
+                                   time.time() - start)
+
     @property
     def is_ha(self):
         # TODO(Carl) Refactoring should render this obsolete.  Remove it.
@@ -621,10 +637,14 @@ class RouterInfo(object):
 
         :param agent: Passes the agent in order to send RPC messages.
         """
+        apply_time = self.iptables_manager.apply_time
         self._process_internal_ports()
         self.process_external(agent)
         # Process static routes for router
         self.routes_updated()
+        self.timings['iptables'] = (self.timings.get('iptables', 0.0) +
+                                    self.iptables_manager.apply_time -
+                                    apply_time)
 
         # Update ex_gw_port and enable_snat on the router info cache
         self.ex_gw_port = self.get_ex_gw_port()
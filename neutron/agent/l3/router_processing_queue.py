@@ -14,6 +14,8 @@
 #
 
 import datetime
+import heapq
+
 from six.moves import queue as Queue
 
 from oslo_utils import timeutils
@@ -143,6 +145,17 @@ class RouterProcessingQueue(object):
     def add(self, update):
         self._queue.put(update)
 
+    def get_router_ids_to_fetch(self, limit):
+        """Return the IDs of the next routers whose data must be fetched
+
+        These are the routers of the queued updates without router data,
+        other than deletions, in processing order.
+        """
+        updates = heapq.nsmallest(limit, (
+            update for update in self._queue.queue
+            if not update.router and update.action != DELETE_ROUTER))
+        return [update.id for update in updates]
+
     def each_update_to_next_router(self):
         """Grabs the next router from the queue and processes
 
@@ -95,13 +95,143 @@ class DictModel(dict):
         del self[name]
 
 
-class NetModel(DictModel):
+class Record(object):
+    """Read-only record giving attribute and item access to dict values.
+
+    Unlike DictModel, records only keep the keys listed in their __slots__,
+    which saves the memory of a dict per port, fixed IP and subnet cached by
+    the DHCP agent. Values of the keys listed in _nested are converted to
+    the given record class, item by item for lists. Accessing a key which
+    was not in the dict raises AttributeError (or KeyError), so that
+    getattr() with a default keeps working for optional keys.
+    """
+
+    __slots__ = ()
+    _nested = {}
+
+    def __init__(self, d=(), **kwargs):
+        if isinstance(d, Record):
+            d = d.to_dict()
+        values = dict(d, **kwargs)
+        for name in self._fields:
+            if name in values:
+                object.__setattr__(self, name,
+                                   self._convert(name, values[name]))
+
+    @classmethod
+    def _convert(cls, name, value):
+        record_cls = cls._nested.get(name)
+        if record_cls is None:
+            return value
+        if isinstance(value, (list, tuple)):
+            return [record_cls(item) if isinstance(item, dict) else item
+                    for item in value]
+        if isinstance(value, dict):
+            return record_cls(value)
+        return value
+
+    def __setattr__(self, name, value):
+        raise AttributeError(_("%s is read-only") % type(self).__name__)
+
+    def __delattr__(self, name):
+        raise AttributeError(_("%s is read-only") % type(self).__name__)
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except AttributeError as e:
+            raise KeyError(e)
+
+    def __contains__(self, name):
+        return name in self._fields and hasattr(self, name)
+
+    def get(self, name, default=None):
+        if name in self._fields:
+            return getattr(self, name, default)
+        return default
+
+    def to_dict(self):
+        return dict((name, getattr(self, name)) for name in self._fields
+                    if hasattr(self, name))
+
+    copy = to_dict
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            other = other.to_dict()
+        elif not isinstance(other, dict):
+            return NotImplemented
+        return self.to_dict() == other
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return type(self), (self.to_dict(),)
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, self.to_dict())
+
+
+class HostRouteModel(Record):
+    _fields = ('destination', 'nexthop')
+    __slots__ = _fields
+
+
+class AllocationPoolModel(Record):
+    _fields = ('start', 'end')
+    __slots__ = _fields
+
+
+class DhcpOptModel(Record):
+    _fields = ('opt_name', 'opt_value', 'ip_version')
+    __slots__ = _fields
+
+
+class SubnetModel(Record):
+    _fields = ('id', 'name', 'network_id', 'tenant_id', 'ip_version', 'cidr',
+               'gateway_ip', 'enable_dhcp', 'dns_nameservers', 'host_routes',
+               'allocation_pools', 'ipv6_ra_mode', 'ipv6_address_mode',
+               'subnetpool_id')
+    __slots__ = _fields
+    _nested = {'host_routes': HostRouteModel,
+               'allocation_pools': AllocationPoolModel}
+
+
+class FixedIpModel(Record):
+    _fields = ('subnet_id', 'ip_address', 'subnet')
+    __slots__ = _fields
+    _nested = {'subnet': SubnetModel}
+
+
+class PortModel(Record):
+    _fields = ('id', 'name', 'network_id', 'tenant_id', 'admin_state_up',
+               'status', 'mac_address', 'device_id', 'device_owner',
+               'fixed_ips', 'extra_dhcp_opts')
+    __slots__ = _fields
+    _nested = {'fixed_ips': FixedIpModel,
+               'extra_dhcp_opts': DhcpOptModel}
+
+
+class NetModel(Record):
+    _fields = ('id', 'name', 'tenant_id', 'admin_state_up', 'status',
+               'shared', 'mtu', 'subnets', 'ports')
+    __slots__ = _fields + ('_ns_name',)
+    _nested = {'subnets': SubnetModel,
+               'ports': PortModel}
 
     def __init__(self, use_namespaces, d):
         super(NetModel, self).__init__(d)
 
-        self._ns_name = (use_namespaces and
-                         "%s%s" % (NS_PREFIX, self.id) or None)
+        object.__setattr__(self, '_ns_name',
+                           use_namespaces and
+                           "%s%s" % (NS_PREFIX, self.id) or None)
+
+    def __reduce__(self):
+        return NetModel, (self._ns_name is not None, self.to_dict())
 
     @property
     def namespace(self):
@@ -281,6 +411,12 @@ class Dnsmasq(DhcpLocalProcess):
 
     _TAG_PREFIX = 'tag%d'
 
+    # Contents of the config files last written for each network, and the
+    # leases listed in its hosts file. They avoid rewriting unchanged files
+    # and reading the hosts file back to find the leases to release.
+    _written_files = {}
+    _written_leases = {}
+
     @classmethod
     def check_version(cls):
         pass
@@ -388,12 +524,13 @@ class Dnsmasq(DhcpLocalProcess):
         or it's reloaded if the process is not running.
         """
 
-        self._output_config_files()
+        changed = self._output_config_files()
 
         pm = self._get_process_manager(
             cmd_callback=self._build_cmdline_callback)
 
-        pm.enable(reload_cfg=reload_with_HUP)
+        # There is no need to signal dnsmasq if its files did not change
+        pm.enable(reload_cfg=reload_with_HUP and changed)
 
         self.process_monitor.register(uuid=self.network.id,
                                       service_name=DNSMASQ_SERVICE_NAME,
@@ -406,9 +543,29 @@ class Dnsmasq(DhcpLocalProcess):
         ip_wrapper.netns.execute(cmd, run_as_root=True)
 
     def _output_config_files(self):
-        self._output_hosts_file()
-        self._output_addn_hosts_file()
-        self._output_opts_file()
+        """Write the config files, returning whether any of them changed."""
+        changed = [self._output_hosts_file(),
+                   self._output_addn_hosts_file(),
+                   self._output_opts_file()]
+        return any(changed)
+
+    def _replace_config_file(self, kind, contents):
+        """Write a config file unless it already has the given contents.
+
+        Returns whether the file was written.
+        """
+        filename = self.get_conf_file_name(kind)
+        written = self._written_files.setdefault(self.network.id, {})
+        if written.get(kind) == contents and os.path.exists(filename):
+            return False
+        utils.replace_file(filename, contents)
+        written[kind] = contents
+        return True
+
+    def _remove_config_files(self):
+        self._written_files.pop(self.network.id, None)
+        self._written_leases.pop(self.network.id, None)
+        super(Dnsmasq, self)._remove_config_files()
 
     def reload_allocations(self):
         """Rebuild the dnsmasq config and signal the dnsmasq to reload."""
@@ -476,8 +633,11 @@ class Dnsmasq(DhcpLocalProcess):
         multiple network nodes). This file is only defining hosts which
         should receive a dhcp lease, the hosts resolution in itself is
         defined by the `_output_addn_hosts_file` method.
+
+        Returns whether the file changed.
         """
         buf = six.StringIO()
+        leases = set()
         filename = self.get_conf_file_name('host')
 
         LOG.debug('Building host file: %s', filename)
@@ -496,6 +656,7 @@ class Dnsmasq(DhcpLocalProcess):
             if alloc.subnet_id not in dhcp_enabled_subnet_ids:
                 continue
 
+            leases.add((alloc.ip_address, port.mac_address))
             # (dzyu) Check if it is legal ipv6 address, if so, need wrap
             # it with '[]' to let dnsmasq to distinguish MAC address from
             # IPv6 address.
@@ -511,10 +672,12 @@ class Dnsmasq(DhcpLocalProcess):
                 buf.write('%s,%s,%s\n' %
                           (port.mac_address, name, ip_address))
 
-        utils.replace_file(filename, buf.getvalue())
-        LOG.debug('Done building host file %s with contents:\n%s', filename,
-                  buf.getvalue())
-        return filename
+        changed = self._replace_config_file('host', buf.getvalue())
+        self._written_leases[self.network.id] = leases
+        if changed:
+            LOG.debug('Done building host file %s with contents:\n%s',
+                      filename, buf.getvalue())
+        return changed
 
     def _read_hosts_file_leases(self, filename):
         leases = set()
@@ -526,8 +689,11 @@ class Dnsmasq(DhcpLocalProcess):
         return leases
 
     def _release_unused_leases(self):
-        filename = self.get_conf_file_name('host')
-        old_leases = self._read_hosts_file_leases(filename)
+        old_leases = self._written_leases.get(self.network.id)
+        if old_leases is None:
+            # The hosts file was written before the agent started
+            filename = self.get_conf_file_name('host')
+            old_leases = self._read_hosts_file_leases(filename)
 
         new_leases = set()
         for port in self.network.ports:
@@ -546,6 +712,8 @@ class Dnsmasq(DhcpLocalProcess):
         `_output_hosts_file` method).
         Each line in this file is in the same form as a standard /etc/hosts
         file.
+
+        Returns whether the file changed.
         """
         buf = six.StringIO()
         for (port, alloc, hostname, fqdn) in self._iter_hosts():
@@ -553,18 +721,17 @@ class Dnsmasq(DhcpLocalProcess):
             # order to obtain it in PTR responses.
             if alloc:
                 buf.write('%s\t%s %s\n' % (alloc.ip_address, fqdn, hostname))
-        addn_hosts = self.get_conf_file_name('addn_hosts')
-        utils.replace_file(addn_hosts, buf.getvalue())
-        return addn_hosts
+        return self._replace_config_file('addn_hosts', buf.getvalue())
 
     def _output_opts_file(self):
-        """Write a dnsmasq compatible options file."""
+        """Write a dnsmasq compatible options file.
+
+        Returns whether the file changed.
+        """
         options, subnet_index_map = self._generate_opts_per_subnet()
         options += self._generate_opts_per_port(subnet_index_map)
 
-        name = self.get_conf_file_name('opts')
-        utils.replace_file(name, '\n'.join(options))
-        return name
+        return self._replace_config_file('opts', '\n'.join(options))
 
     def _generate_opts_per_subnet(self):
         options = []
@@ -919,11 +1086,7 @@ class DeviceManager(object):
                           subnet=subnets[fixed_ip.subnet_id])
                      for fixed_ip in dhcp_port.fixed_ips]
 
-        ips = [DictModel(item) if isinstance(item, dict) else item
-               for item in fixed_ips]
-        dhcp_port.fixed_ips = ips
-
-        return dhcp_port
+        return PortModel(dhcp_port, fixed_ips=fixed_ips)
 
     def setup(self, network):
         """Create and initialize a device for network's DHCP on this host."""
@@ -160,6 +160,10 @@ class ProcessMonitor(object):
         if self._config.AGENT.check_child_processes_interval:
             self._spawn_checking_thread()
 
+    @property
+    def resource_type(self):
+        return self._resource_type
+
     def register(self, uuid, service_name, monitored_process):
         """Start monitoring a process.
 
@@ -573,13 +573,15 @@ class IpNetnsCommand(IpCommandBase):
     def delete(self, name):
         self._as_root([], ('delete', name), use_root_namespace=True)
 
+    def _get_ns_params(self):
+        if self._parent.namespace:
+            return ['ip', 'netns', 'exec', self._parent.namespace]
+        return []
+
     def execute(self, cmds, addl_env=None, check_exit_code=True,
                 extra_ok_codes=None, run_as_root=False):
-        ns_params = []
-        kwargs = {'run_as_root': run_as_root}
-        if self._parent.namespace:
-            kwargs['run_as_root'] = True
-            ns_params = ['ip', 'netns', 'exec', self._parent.namespace]
+        ns_params = self._get_ns_params()
+        kwargs = {'run_as_root': run_as_root or bool(ns_params)}
 
         env_params = []
         if addl_env:
@@ -589,6 +591,17 @@ class IpNetnsCommand(IpCommandBase):
         return utils.execute(cmd, check_exit_code=check_exit_code,
                              extra_ok_codes=extra_ok_codes, **kwargs)
 
+    def execute_reusing_client(self, cmds_list, check_exit_code=True,
+                               run_as_root=False):
+        """Execute several commands in the namespace, see
+        utils.execute_reusing_client.
+        """
+        ns_params = self._get_ns_params()
+        return utils.execute_reusing_client(
+            [ns_params + list(cmds) for cmds in cmds_list],
+            check_exit_code=check_exit_code,
+            run_as_root=run_as_root or bool(ns_params))
+
     def exists(self, name):
         output = self._parent._execute(
             ['o'], 'netns', ['list'],
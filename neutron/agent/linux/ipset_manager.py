@@ -13,12 +13,20 @@
 
 import copy
 
+import netaddr
+from oslo_log import log as logging
+from oslo_utils import excutils
+
 from neutron.agent.linux import utils as linux_utils
 from neutron.common import utils
+from neutron.i18n import _LW
+
+LOG = logging.getLogger(__name__)
 
 IPSET_ADD_BULK_THRESHOLD = 5
 SWAP_SUFFIX = '-new'
 IPSET_NAME_MAX_LENGTH = 31 - len(SWAP_SUFFIX)
+IPSET_NAME_PREFIX = 'NET'
 
 
 class IpsetManager(object):
@@ -26,19 +34,29 @@ class IpsetManager(object):
 
        Keeps track of ip addresses per set, using bulk
        or single ip add/remove for smaller changes.
+
+       While in deferred mode (see defer_apply_on/defer_apply_off),
+       all set changes are collected and applied with a single
+       ipset restore call.
     """
 
     def __init__(self, execute=None, namespace=None):
         self.execute = execute or linux_utils.execute
         self.namespace = namespace
         self.ipset_sets = {}
+        # True once ipset_sets reflects the sets present on the system, in
+        # which case new sets can be created with a plain restore.
+        self.sets_loaded = False
+        self._defer_apply = False
+        self._pending_input = []
+        self._pending_sets = set()
 
     @staticmethod
     def get_name(id, ethertype):
         """Returns the given ipset name for an id+ethertype pair.
         This reference can be used from iptables.
         """
-        name = 'NET' + ethertype + id
+        name = IPSET_NAME_PREFIX + ethertype + id
         return name[:IPSET_NAME_MAX_LENGTH]
 
     def set_exists(self, id, ethertype):
@@ -46,6 +64,65 @@ class IpsetManager(object):
         set_name = self.get_name(id, ethertype)
         return set_name in self.ipset_sets
 
+    @staticmethod
+    def _normalize_member(member):
+        """Return a member the way ipset save prints it.
+
+        Host addresses are printed without prefix length, networks by their
+        CIDR, and IPv6 addresses compressed, so the members listed by
+        ipset and the ones given by the agent compare equal.
+        """
+        try:
+            net = netaddr.IPNetwork(member)
+        except (netaddr.AddrFormatError, ValueError):
+            return member
+        if net.size == 1:
+            return str(net.ip)
+        return str(net.cidr)
+
+    @utils.synchronized('ipset', external=True)
+    def load_sets(self):
+        """Seed the known sets and their members from the system.
+
+        Only sets managed by this class are taken into account, leftover
+        temporary swap sets are ignored.
+        """
+        try:
+            output = self._apply(['ipset', 'list', '-output', 'save'])
+        except RuntimeError:
+            LOG.warning(_LW("Unable to list the existing ipsets, they will "
+                            "be recreated on demand."))
+            return
+        self.ipset_sets = self._parse_saved_sets(output)
+        self.sets_loaded = True
+
+    @staticmethod
+    def _parse_saved_sets(output):
+        sets = {}
+        for line in (output or '').splitlines():
+            fields = line.split()
+            if len(fields) < 2:
+                continue
+            action, set_name = fields[0], fields[1]
+            if (not set_name.startswith(IPSET_NAME_PREFIX) or
+                    set_name.endswith(SWAP_SUFFIX)):
+                continue
+            if action == 'create':
+                sets.setdefault(set_name, [])
+            elif action == 'add' and len(fields) > 2:
+                sets.setdefault(set_name, []).append(
+                    IpsetManager._normalize_member(fields[2]))
+        return sets
+
+    def defer_apply_on(self):
+        self._defer_apply = True
+
+    @utils.synchronized('ipset', external=True)
+    def defer_apply_off(self):
+        if self._defer_apply:
+            self._defer_apply = False
+            self._flush_pending()
+
     @utils.synchronized('ipset', external=True)
     def set_members(self, id, ethertype, member_ips):
         """Create or update a specific set by name and ethertype.
@@ -54,17 +131,23 @@ class IpsetManager(object):
         that's faster.
         """
         set_name = self.get_name(id, ethertype)
-        if not self.set_exists(id, ethertype):
-            # The initial creation is handled with create/refresh to
-            # avoid any downtime for existing sets (i.e. avoiding
-            # a flush/restore), as the restore operation of ipset is
-            # additive to the existing set.
-            self._create_set(set_name, ethertype)
-            self._refresh_set(set_name, member_ips, ethertype)
-            # TODO(majopela,shihanzhang,haleyb): Optimize this by
-            # gathering the system ipsets at start. So we can determine
-            # if a normal restore is enough for initial creation.
-            # That should speed up agent boot up time.
+        member_ips = [self._normalize_member(ip) for ip in member_ips]
+        if self._defer_apply:
+            self._queue_set_members(set_name, ethertype, member_ips)
+        elif not self.set_exists(id, ethertype):
+            if self.sets_loaded:
+                # The set is known not to exist on the system, so a
+                # single restore call is enough to create and fill it.
+                self._restore_sets(
+                    self._get_create_input(set_name, member_ips, ethertype))
+                self.ipset_sets[set_name] = copy.copy(member_ips)
+            else:
+                # The initial creation is handled with create/refresh to
+                # avoid any downtime for existing sets (i.e. avoiding
+                # a flush/restore), as the restore operation of ipset is
+                # additive to the existing set.
+                self._create_set(set_name, ethertype)
+                self._refresh_set(set_name, member_ips, ethertype)
         else:
             add_ips = self._get_new_set_ips(set_name, member_ips)
             del_ips = self._get_deleted_set_ips(set_name, member_ips)
@@ -77,8 +160,67 @@ class IpsetManager(object):
     @utils.synchronized('ipset', external=True)
     def destroy(self, id, ethertype, forced=False):
         set_name = self.get_name(id, ethertype)
+        # Pending changes could still refer to the set being destroyed.
+        self._flush_pending()
         self._destroy(set_name, forced)
 
+    def _queue_set_members(self, set_name, ethertype, member_ips):
+        if set_name not in self.ipset_sets:
+            if self.sets_loaded:
+                process_input = self._get_create_input(set_name, member_ips,
+                                                       ethertype)
+            else:
+                process_input = (
+                    self._get_create_input(set_name, [], ethertype) +
+                    self._get_swap_input(set_name, member_ips, ethertype))
+        else:
+            add_ips = self._get_new_set_ips(set_name, member_ips)
+            del_ips = self._get_deleted_set_ips(set_name, member_ips)
+            if (len(add_ips) + len(del_ips) < IPSET_ADD_BULK_THRESHOLD):
+                process_input = ["add %s %s" % (set_name, ip)
+                                 for ip in add_ips]
+                process_input.extend("del %s %s" % (set_name, ip)
+                                     for ip in del_ips)
+            else:
+                process_input = self._get_swap_input(set_name, member_ips,
+                                                     ethertype)
+        self._pending_input.extend(process_input)
+        self._pending_sets.add(set_name)
+        self.ipset_sets[set_name] = copy.copy(member_ips)
+
+    def _flush_pending(self):
+        if not self._pending_input:
+            return
+        process_input = self._pending_input
+        pending_sets = self._pending_sets
+        self._pending_input = []
+        self._pending_sets = set()
+        try:
+            self._restore_sets(process_input)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                # The in-memory state of the batched sets can't be trusted
+                # anymore, forget about them so they are rebuilt safely.
+                for set_name in pending_sets:
+                    self.ipset_sets.pop(set_name, None)
+                self.sets_loaded = False
+
+    def _get_create_input(self, set_name, member_ips, ethertype):
+        set_type = self._get_ipset_set_type(ethertype)
+        process_input = ["create %s hash:net family %s" % (set_name,
+                                                          set_type)]
+        for ip in member_ips:
+            process_input.append("add %s %s" % (set_name, ip))
+        return process_input
+
+    def _get_swap_input(self, set_name, member_ips, ethertype):
+        new_set_name = set_name + SWAP_SUFFIX
+        process_input = self._get_create_input(new_set_name, member_ips,
+                                               ethertype)
+        process_input.append("swap %s %s" % (new_set_name, set_name))
+        process_input.append("destroy %s" % new_set_name)
+        return process_input
+
     def _add_member_to_set(self, set_name, member_ip):
         cmd = ['ipset', 'add', '-exist', set_name, member_ip]
         self._apply(cmd)
@@ -86,11 +228,8 @@ class IpsetManager(object):
 
     def _refresh_set(self, set_name, member_ips, ethertype):
         new_set_name = set_name + SWAP_SUFFIX
-        set_type = self._get_ipset_set_type(ethertype)
-        process_input = ["create %s hash:net family %s" % (new_set_name,
-                                                          set_type)]
-        for ip in member_ips:
-            process_input.append("add %s %s" % (new_set_name, ip))
+        process_input = self._get_create_input(new_set_name, member_ips,
+                                               ethertype)
 
         self._restore_sets(process_input)
         self._swap_sets(new_set_name, set_name)
@@ -114,7 +253,7 @@ class IpsetManager(object):
         if self.namespace:
             cmd_ns.extend(['ip', 'netns', 'exec', self.namespace])
         cmd_ns.extend(cmd)
-        self.execute(cmd_ns, run_as_root=True, process_input=input)
+        return self.execute(cmd_ns, run_as_root=True, process_input=input)
 
     def _get_new_set_ips(self, set_name, expected_ips):
         new_member_ips = (set(expected_ips) -
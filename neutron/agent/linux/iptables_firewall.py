@@ -70,7 +70,22 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self.sg_members = collections.defaultdict(
             lambda: collections.defaultdict(list))
         self.pre_sg_members = None
+        # Reverse indexes of the filtered ports: security group id -> devices
+        # and, per ip version, remote security group id -> devices
+        self.sg_port_index = collections.defaultdict(set)
+        self.remote_sg_port_index = {
+            constants.IPv4: collections.defaultdict(set),
+            constants.IPv6: collections.defaultdict(set)}
+        self._port_index_refs = {}
+        # Devices whose chains have to be regenerated in place and remote
+        # security groups whose ipset members have to be refreshed
+        self._dirty_ports = set()
+        self._dirty_ipset_sgs = collections.defaultdict(set)
         self.enable_ipset = cfg.CONF.SECURITYGROUP.enable_ipset
+        if self.enable_ipset:
+            # Knowing the existing sets avoids recreating all of them
+            # when the agent is restarted.
+            self.ipset.load_sets()
 
     @property
     def ports(self):
@@ -78,11 +93,29 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
 
     def update_security_group_rules(self, sg_id, sg_rules):
         LOG.debug("Update rules of security group (%s)", sg_id)
+        if self.sg_rules.get(sg_id) != sg_rules:
+            self._dirty_ports.update(self.sg_port_index.get(sg_id, ()))
         self.sg_rules[sg_id] = sg_rules
+        # the remote groups referenced by the rules may have changed
+        self._reindex_sg_ports(sg_id)
 
     def update_security_group_members(self, sg_id, sg_members):
         LOG.debug("Update members of security group (%s)", sg_id)
+        old_members = self.sg_members.get(sg_id, {})
         self.sg_members[sg_id] = collections.defaultdict(list, sg_members)
+        for ip_version, remote_sg_ports in (
+                self.remote_sg_port_index.iteritems()):
+            devices = remote_sg_ports.get(sg_id)
+            old_ips = old_members.get(ip_version, [])
+            new_ips = self.sg_members[sg_id][ip_version]
+            if not devices or old_ips == new_ips:
+                continue
+            if self.enable_ipset and bool(old_ips) == bool(new_ips):
+                # the port chains only reference the ipset, refreshing
+                # its members is enough
+                self._dirty_ipset_sgs[ip_version].add(sg_id)
+            else:
+                self._dirty_ports.update(devices)
 
     def _ps_enabled(self, port):
         return port.get(psec.PORTSECURITY, True)
@@ -91,18 +124,63 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         if not self._ps_enabled(port):
             self.unfiltered_ports[port['device']] = port
             self.filtered_ports.pop(port['device'], None)
+            self._unindex_port(port['device'])
         else:
             self.filtered_ports[port['device']] = port
             self.unfiltered_ports.pop(port['device'], None)
+            self._index_port(port)
 
     def _unset_ports(self, port):
         self.unfiltered_ports.pop(port['device'], None)
         self.filtered_ports.pop(port['device'], None)
+        self._unindex_port(port['device'])
+        self._dirty_ports.discard(port['device'])
+
+    def _index_port(self, port):
+        device = port['device']
+        self._unindex_port(device)
+        sg_ids = set(port.get('security_groups', []))
+        remote_sg_ids = self._get_remote_sg_ids(port)
+        for sg_id in sg_ids:
+            self.sg_port_index[sg_id].add(device)
+        for ip_version, remote_ids in remote_sg_ids.iteritems():
+            for remote_sg_id in remote_ids:
+                self.remote_sg_port_index[ip_version][remote_sg_id].add(
+                    device)
+        self._port_index_refs[device] = (sg_ids, remote_sg_ids)
+
+    def _unindex_port(self, device):
+        refs = self._port_index_refs.pop(device, None)
+        if not refs:
+            return
+        sg_ids, remote_sg_ids = refs
+        for sg_id in sg_ids:
+            self._discard_indexed_port(self.sg_port_index, sg_id, device)
+        for ip_version, remote_ids in remote_sg_ids.iteritems():
+            for remote_sg_id in remote_ids:
+                self._discard_indexed_port(
+                    self.remote_sg_port_index[ip_version], remote_sg_id,
+                    device)
+
+    @staticmethod
+    def _discard_indexed_port(index, key, device):
+        devices = index.get(key)
+        if devices is not None:
+            devices.discard(device)
+            if not devices:
+                del index[key]
+
+    def _reindex_sg_ports(self, sg_id):
+        for device in list(self.sg_port_index.get(sg_id, ())):
+            port = self.filtered_ports.get(device)
+            if port:
+                self._index_port(port)
 
     def prepare_port_filter(self, port):
         LOG.debug("Preparing device (%s) filter", port['device'])
         self._remove_chains()
         self._set_ports(port)
+        self._dirty_ports.add(port['device'])
 
         # each security group has it own chains
         self._setup_chains()
@@ -114,9 +192,15 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             LOG.info(_LI('Attempted to update port filter which is not '
                          'filtered %s'), port['device'])
             return
-        self._remove_chains()
-        self._set_ports(port)
-        self._setup_chains()
+        if port['device'] in self.filtered_ports and self._ps_enabled(port):
+            # the port keeps its chains, only their content is regenerated
+            self._set_ports(port)
+            self._dirty_ports.add(port['device'])
+            self._update_chains()
+        else:
+            self._remove_chains()
+            self._set_ports(port)
+            self._setup_chains()
         self.iptables.apply()
 
     def remove_port_filter(self, port):
@@ -150,6 +234,9 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                                      self.unfiltered_ports)
 
     def _setup_chains_apply(self, ports, unfiltered_ports):
+        # every chain is regenerated, nothing is left to update in place
+        self._dirty_ports.clear()
+        self._dirty_ipset_sgs.clear()
         self._add_chain_by_name_v4v6(SG_CHAIN)
         for port in ports.values():
             self._setup_chain(port, INGRESS_DIRECTION)
@@ -161,6 +248,29 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             self._add_accept_rule_port_sec(port, INGRESS_DIRECTION)
             self._add_accept_rule_port_sec(port, EGRESS_DIRECTION)
 
+    def _update_chains(self):
+        """Regenerate the chains of the ports affected by a change."""
+        if not self._defer_apply:
+            self._update_chains_apply()
+
+    def _update_chains_apply(self):
+        if self.enable_ipset:
+            self._update_ipset_members(self._dirty_ipset_sgs)
+        self._dirty_ipset_sgs.clear()
+        for device in sorted(self._dirty_ports):
+            port = self.filtered_ports.get(device)
+            if port:
+                self._update_port_chains(port)
+        self._dirty_ports.clear()
+
+    def _update_port_chains(self, port):
+        # the spoofing chain is filled again along with the egress chain
+        for chain_type in (SPOOF_FILTER, INGRESS_DIRECTION, EGRESS_DIRECTION):
+            self._empty_chain_by_name_v4v6(
+                self._port_chain_name(port, chain_type))
+        for direction in (INGRESS_DIRECTION, EGRESS_DIRECTION):
+            self._add_rules_by_security_group(port, direction)
+
     def _remove_chains(self):
         """Remove ingress and egress chain for a port."""
         if not self._defer_apply:
@@ -209,6 +319,12 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self.iptables.ipv4['filter'].remove_chain(chain_name)
         self.iptables.ipv6['filter'].remove_chain(chain_name)
 
+    def _empty_chain_by_name_v4v6(self, chain_name):
+        self.iptables.ipv4['filter'].empty_chain(chain_name,
+                                                 keep_positions=True)
+        self.iptables.ipv6['filter'].empty_chain(chain_name,
+                                                 keep_positions=True)
+
     def _add_rules_to_chain_v4v6(self, chain_name, ipv4_rules, ipv6_rules,
                                  comment=None):
         for rule in ipv4_rules:
@@ -572,6 +688,8 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
     def filter_defer_apply_on(self):
         if not self._defer_apply:
             self.iptables.defer_apply_on()
+            if self.enable_ipset:
+                self.ipset.defer_apply_on()
             self._pre_defer_filtered_ports = dict(self.filtered_ports)
             self._pre_defer_unfiltered_ports = dict(self.unfiltered_ports)
             self.pre_sg_members = dict(self.sg_members)
@@ -585,10 +703,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         rules, so we're in a point where no iptable rule depends
         on an ipset we're going to delete.
         """
-        filtered_ports = self.filtered_ports.values()
-
-        remote_sgs_to_remove = self._determine_remote_sgs_to_remove(
-            filtered_ports)
+        remote_sgs_to_remove = self._determine_remote_sgs_to_remove()
 
         for ip_version, remote_sg_ids in remote_sgs_to_remove.iteritems():
             self._clear_sg_members(ip_version, remote_sg_ids)
@@ -598,50 +713,30 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self._remove_unused_sg_members()
 
         # Remove unused security group rules
-        for remove_group_id in self._determine_sg_rules_to_remove(
-                filtered_ports):
+        for remove_group_id in self._determine_sg_rules_to_remove():
             self.sg_rules.pop(remove_group_id, None)
 
-    def _determine_remote_sgs_to_remove(self, filtered_ports):
+    def _determine_remote_sgs_to_remove(self):
         """Calculate which remote security groups we don't need anymore.
 
-        We do the calculation for each ip_version.
+        We do the calculation for each ip_version, the remote groups still
+        referenced by the filtered ports are found in the port index.
         """
         sgs_to_remove_per_ipversion = {constants.IPv4: set(),
                                        constants.IPv6: set()}
-        remote_group_id_sets = self._get_remote_sg_ids_sets_by_ipversion(
-            filtered_ports)
-        for ip_version, remote_group_id_set in (
-                remote_group_id_sets.iteritems()):
+        for ip_version, remote_sg_ports in (
+                self.remote_sg_port_index.iteritems()):
             sgs_to_remove_per_ipversion[ip_version].update(
-                set(self.pre_sg_members) - remote_group_id_set)
+                set(self.pre_sg_members) - set(remote_sg_ports))
         return sgs_to_remove_per_ipversion
 
-    def _get_remote_sg_ids_sets_by_ipversion(self, filtered_ports):
-        """Given a port, calculates the remote sg references by ip_version."""
-        remote_group_id_sets = {constants.IPv4: set(),
-                                constants.IPv6: set()}
-        for port in filtered_ports:
-            for ip_version, sg_ids in self._get_remote_sg_ids(
-                    port).iteritems():
-                remote_group_id_sets[ip_version].update(sg_ids)
-        return remote_group_id_sets
-
-    def _determine_sg_rules_to_remove(self, filtered_ports):
+    def _determine_sg_rules_to_remove(self):
         """Calculate which security groups need to be removed.
 
         We find out by subtracting our previous sg group ids,
-        with the security groups associated to a set of ports.
+        with the security groups associated to the filtered ports.
         """
-        port_group_ids = self._get_sg_ids_set_for_ports(filtered_ports)
-        return set(self.pre_sg_rules) - port_group_ids
-
-    def _get_sg_ids_set_for_ports(self, filtered_ports):
-        """Get the port security group ids as a set."""
-        port_group_ids = set()
-        for port in filtered_ports:
-            port_group_ids.update(port.get('security_groups', []))
-        return port_group_ids
+        return set(self.pre_sg_rules) - set(self.sg_port_index)
 
     def _clear_sg_members(self, ip_version, remote_sg_ids):
         """Clear our internal cache of sg members matching the parameters."""
@@ -662,13 +757,26 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             if not sg_has_members:
                 del self.sg_members[sg_id]
 
+    def _ports_unchanged_since_defer(self):
+        """Whether the chains of the filtered ports can be kept in place."""
+        return (set(self._pre_defer_filtered_ports) ==
+                set(self.filtered_ports) and
+                set(self._pre_defer_unfiltered_ports) ==
+                set(self.unfiltered_ports))
+
     def filter_defer_apply_off(self):
         if self._defer_apply:
             self._defer_apply = False
-            self._remove_chains_apply(self._pre_defer_filtered_ports,
-                                      self._pre_defer_unfiltered_ports)
-            self._setup_chains_apply(self.filtered_ports,
-                                     self.unfiltered_ports)
+            if self._ports_unchanged_since_defer():
+                self._update_chains_apply()
+            else:
+                self._remove_chains_apply(self._pre_defer_filtered_ports,
+                                          self._pre_defer_unfiltered_ports)
+                self._setup_chains_apply(self.filtered_ports,
+                                         self.unfiltered_ports)
+            # ipsets must exist before the rules referring to them are
+            # applied.
+            self.ipset.defer_apply_off()
             self.iptables.defer_apply_off()
             self._remove_unused_security_group_info()
             self._pre_defer_filtered_ports = None
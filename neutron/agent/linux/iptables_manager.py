@@ -18,10 +18,13 @@
 
 """Implements iptables rules using linux utilities."""
 
+import collections
 import contextlib
+import itertools
 import os
 import re
 import sys
+import time
 
 from oslo_concurrency import lockutils
 from oslo_config import cfg
@@ -33,7 +36,7 @@ from neutron.agent.linux import iptables_comments as ic
 from neutron.agent.linux import utils as linux_utils
 from neutron.common import exceptions as n_exc
 from neutron.common import utils
-from neutron.i18n import _LE, _LW
+from neutron.i18n import _LE, _LI, _LW
 
 LOG = logging.getLogger(__name__)
 
@@ -108,16 +111,108 @@ class IptablesRule(object):
         return comment_rule('-A %s %s' % (chain, self.rule), self.comment)
 
 
+def _get_jump_targets(rule):
+    """Return the chains a rule jumps to."""
+    args = rule.split()
+    return set(args[i + 1] for i, arg in enumerate(args[:-1]) if arg == '-j')
+
+
 class IptablesTable(object):
     """An iptables table."""
 
     def __init__(self, binary_name=binary_name):
-        self.rules = []
+        # Rules are stored by sequence number, which keeps their order, and
+        # indexed by identity (see IptablesRule.__eq__), chain, tag and jump
+        # target so that none of the operations below need to scan all the
+        # rules of the table. Sequence numbers are tuples so that rules can
+        # be inserted between existing ones (see empty_chain).
+        self._rules = collections.OrderedDict()
+        self._next_seq = itertools.count()
+        self._rules_unordered = False
+        # (chain, wrap) -> positions kept by empty_chain for the next rules
+        # added to that chain
+        self._reserved_seqs = {}
+        # (chain, rule, wrap, top) -> sequence numbers of identical rules
+        self._rules_by_key = collections.defaultdict(list)
+        # (chain, wrap) -> sequence numbers of the rules of that chain
+        self._chain_rules = collections.defaultdict(collections.OrderedDict)
+        # tag -> sequence numbers of the rules with that tag
+        self._tag_rules = collections.defaultdict(set)
+        # chain -> sequence numbers of the rules jumping to that chain
+        self._jump_rules = collections.defaultdict(set)
         self.remove_rules = []
         self.chains = set()
         self.unwrapped_chains = set()
         self.remove_chains = set()
         self.wrap_name = binary_name[:16]
+        # (chain, wrap) tuples of the chains modified since the last call
+        # to clear_dirty_chains()
+        self.dirty_chains = set()
+
+    @property
+    def rules(self):
+        if self._rules_unordered:
+            self._rules = collections.OrderedDict(sorted(self._rules.items()))
+            self._rules_unordered = False
+        return list(self._rules.values())
+
+    def clear_dirty_chains(self):
+        self.dirty_chains.clear()
+        self._reserved_seqs.clear()
+
+    @staticmethod
+    def _rule_key(rule):
+        return (rule.chain, rule.rule, rule.wrap, rule.top)
+
+    def _get_seq(self, chain_key):
+        reserved = self._reserved_seqs.get(chain_key)
+        if reserved is None:
+            return (next(self._next_seq),)
+        free_seqs, extra = reserved
+        self._rules_unordered = True
+        if free_seqs:
+            seq = free_seqs.popleft()
+            reserved[1] = [seq, itertools.count(1)]
+            return seq
+        # more rules than kept positions, insert them right after the
+        # last one used
+        last_seq, counter = extra
+        return last_seq + (next(counter),)
+
+    def _insert_rule(self, rule):
+        seq = self._get_seq((rule.chain, rule.wrap))
+        self._rules[seq] = rule
+        self._rules_by_key[self._rule_key(rule)].append(seq)
+        self._chain_rules[(rule.chain, rule.wrap)][seq] = None
+        if rule.tag:
+            self._tag_rules[rule.tag].add(seq)
+        for target in _get_jump_targets(rule.rule):
+            self._jump_rules[target].add(seq)
+        self.dirty_chains.add((rule.chain, rule.wrap))
+
+    def _pop_rule(self, seq):
+        rule = self._rules.pop(seq)
+        key = self._rule_key(rule)
+        self._rules_by_key[key].remove(seq)
+        if not self._rules_by_key[key]:
+            del self._rules_by_key[key]
+        chain_rules = self._chain_rules[(rule.chain, rule.wrap)]
+        del chain_rules[seq]
+        if not chain_rules:
+            del self._chain_rules[(rule.chain, rule.wrap)]
+        if rule.tag:
+            self._discard_index_seq(self._tag_rules, rule.tag, seq)
+        for target in _get_jump_targets(rule.rule):
+            self._discard_index_seq(self._jump_rules, target, seq)
+        self.dirty_chains.add((rule.chain, rule.wrap))
+        return rule
+
+    @staticmethod
+    def _discard_index_seq(index, name, seq):
+        seqs = index[name]
+        seqs.discard(seq)
+        if not seqs:
+            del index[name]
 
     def add_chain(self, name, wrap=True):
         """Adds a named chain to the table.
@@ -136,6 +231,7 @@ class IptablesTable(object):
             self.chains.add(name)
         else:
             self.unwrapped_chains.add(name)
+        self.dirty_chains.add((name, wrap))
 
     def _select_chain_set(self, wrap):
         if wrap:
@@ -161,29 +257,30 @@ class IptablesTable(object):
             return
 
         chain_set.remove(name)
+        self.dirty_chains.add((name, wrap))
 
         if not wrap:
             # non-wrapped chains and rules need to be dealt with specially,
             # so we keep a list of them to be iterated over in apply()
             self.remove_chains.add(name)
 
-            # first, add rules to remove that have a matching chain name
-            self.remove_rules += [r for r in self.rules if r.chain == name]
-
-        # next, remove rules from list that have a matching chain name
-        self.rules = [r for r in self.rules if r.chain != name]
+        # first, remove the rules that have a matching chain name
+        seqs = (list(self._chain_rules.get((name, False), ())) +
+                list(self._chain_rules.get((name, True), ())))
+        self._remove_rule_seqs(sorted(seqs), wrap)
 
-        if not wrap:
-            jump_snippet = '-j %s' % name
-            # next, add rules to remove that have a matching jump chain
-            self.remove_rules += [r for r in self.rules
-                                  if jump_snippet in r.rule]
+        # next, remove the rules that have a matching jump chain
+        if wrap:
+            target = '%s-%s' % (self.wrap_name, name)
         else:
-            jump_snippet = '-j %s-%s' % (self.wrap_name, name)
+            target = name
+        self._remove_rule_seqs(sorted(self._jump_rules.get(target, ())), wrap)
 
-        # finally, remove rules from list that have a matching jump chain
-        self.rules = [r for r in self.rules
-                      if jump_snippet not in r.rule]
+    def _remove_rule_seqs(self, seqs, wrap):
+        for seq in seqs:
+            rule = self._pop_rule(seq)
+            if not wrap:
+                self.remove_rules.append(rule)
 
     def add_rule(self, chain, rule, wrap=True, top=False, tag=None,
                  comment=None):
@@ -205,7 +302,7 @@ class IptablesTable(object):
             rule = ' '.join(
                 self._wrap_target_chain(e, wrap) for e in rule.split(' '))
 
-        self.rules.append(IptablesRule(chain, rule, wrap, top, self.wrap_name,
+        self._insert_rule(IptablesRule(chain, rule, wrap, top, self.wrap_name,
                                        tag, comment))
 
     def _wrap_target_chain(self, s, wrap):
@@ -223,41 +320,88 @@ class IptablesTable(object):
 
         """
         chain = get_chain_name(chain, wrap)
-        try:
-            if '$' in rule:
-                rule = ' '.join(
-                    self._wrap_target_chain(e, wrap) for e in rule.split(' '))
+        if '$' in rule:
+            rule = ' '.join(
+                self._wrap_target_chain(e, wrap) for e in rule.split(' '))
 
-            self.rules.remove(IptablesRule(chain, rule, wrap, top,
-                                           self.wrap_name,
-                                           comment=comment))
-            if not wrap:
-                self.remove_rules.append(IptablesRule(chain, rule, wrap, top,
-                                                      self.wrap_name,
-                                                      comment=comment))
-        except ValueError:
+        seqs = self._rules_by_key.get((chain, rule, wrap, top))
+        if not seqs:
             LOG.warn(_LW('Tried to remove rule that was not there:'
                          ' %(chain)r %(rule)r %(wrap)r %(top)r'),
                      {'chain': chain, 'rule': rule,
                       'top': top, 'wrap': wrap})
+            return
+        self._pop_rule(min(seqs))
+        if not wrap:
+            self.remove_rules.append(IptablesRule(chain, rule, wrap, top,
+                                                  self.wrap_name,
+                                                  comment=comment))
 
     def _get_chain_rules(self, chain, wrap):
         chain = get_chain_name(chain, wrap)
-        return [rule for rule in self.rules
-                if rule.chain == chain and rule.wrap == wrap]
+        return [self._rules[seq]
+                for seq in self._chain_rules.get((chain, wrap), ())]
 
-    def empty_chain(self, chain, wrap=True):
-        """Remove all rules from a chain."""
-        chained_rules = self._get_chain_rules(chain, wrap)
-        for rule in chained_rules:
-            self.rules.remove(rule)
+    def empty_chain(self, chain, wrap=True, keep_positions=False):
+        """Remove all rules from a chain.
+
+        With keep_positions, the rules added to the chain until the next
+        apply take the place of the removed ones in the table, so that
+        regenerating a chain doesn't reorder the generated rules.
+        """
+        chain = get_chain_name(chain, wrap)
+        chain_key = (chain, wrap)
+        seqs = list(self._chain_rules.get(chain_key, ()))
+        for seq in seqs:
+            self._pop_rule(seq)
+        if keep_positions and seqs:
+            reserved = self._reserved_seqs.get(chain_key)
+            if reserved:
+                seqs.extend(reserved[0])
+            self._reserved_seqs[chain_key] = [
+                collections.deque(sorted(seqs)), None]
 
     def clear_rules_by_tag(self, tag):
         if not tag:
             return
-        rules = [rule for rule in self.rules if rule.tag == tag]
-        for rule in rules:
-            self.rules.remove(rule)
+        for seq in list(self._tag_rules.get(tag, ())):
+            self._pop_rule(seq)
+
+
+class ApplyStats(object):
+    """Number of applies of all the managers of the process, by mode."""
+
+    MODES = ('full', 'incremental', 'noop', 'fallback')
+
+    def __init__(self):
+        self.counts = dict.fromkeys(self.MODES, 0)
+        # Seconds spent applying rules, waiting for the lock included.
+        self.apply_time = 0.0
+        self.last_report = time.time()
+
+    def record(self, mode):
+        self.counts[mode] += 1
+
+    def add_time(self, elapsed):
+        self.apply_time += elapsed
+        interval = cfg.CONF.AGENT.iptables_apply_report_interval
+        if interval and time.time() - self.last_report >= interval:
+            self.report()
+
+    def get_stats(self):
+        stats = dict(self.counts)
+        stats['apply_time'] = round(self.apply_time, 3)
+        return stats
+
+    def report(self):
+        self.last_report = time.time()
+        LOG.info(_LI("iptables applies: %(full)d full, %(incremental)d "
+                     "incremental, %(noop)d without changes, %(fallback)d "
+                     "incremental failed, %(apply_time).3f seconds in "
+                     "total"), self.get_stats())
+
+
+total_apply_stats = ApplyStats()
 
 
 class IptablesManager(object):
@@ -295,6 +439,15 @@ class IptablesManager(object):
         self.iptables_apply_deferred = False
         self.wrap_name = binary_name[:16]
 
+        # Last applied state of the managed chains, per iptables command,
+        # used by the incremental apply mode. See _get_managed_state().
+        self._applied_state = {}
+        # Number of applies done in each mode, for monitoring purposes.
+        # Those of all the managers are logged by total_apply_stats.
+        self.apply_stats = dict.fromkeys(ApplyStats.MODES, 0)
+        # Seconds spent applying rules, waiting for the lock included.
+        self.apply_time = 0.0
+
         self.ipv4 = {'filter': IptablesTable(binary_name=self.wrap_name)}
         self.ipv6 = {'filter': IptablesTable(binary_name=self.wrap_name)}
 
@@ -413,12 +566,20 @@ class IptablesManager(object):
         if self.namespace:
             lock_name += '-' + self.namespace
 
+        start = time.time()
         try:
             with lockutils.lock(lock_name, utils.SYNCHRONIZED_PREFIX, True):
                 LOG.debug('Got semaphore / lock "%s"', lock_name)
                 return self._apply_synchronized()
         finally:
             LOG.debug('Semaphore / lock released "%s"', lock_name)
+            elapsed = time.time() - start
+            self.apply_time += elapsed
+            total_apply_stats.add_time(elapsed)
+
+    def _count_apply(self, mode):
+        self.apply_stats[mode] += 1
+        total_apply_stats.record(mode)
 
     def _apply_synchronized(self):
         """Apply the current in-memory set of iptables rules.
@@ -432,47 +593,164 @@ class IptablesManager(object):
         if self.use_ipv6:
             s += [('ip6tables', self.ipv6)]
 
+        incremental = cfg.CONF.AGENT.iptables_incremental_apply
         for cmd, tables in s:
-            args = ['%s-save' % (cmd,), '-c']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            all_tables = self.execute(args, run_as_root=True)
-            all_lines = all_tables.split('\n')
-            # Traverse tables in sorted order for predictable dump output
-            for table_name in sorted(tables):
-                table = tables[table_name]
-                start, end = self._find_table(all_lines, table_name)
-                all_lines[start:end] = self._modify_rules(
-                    all_lines[start:end], table, table_name)
-
-            args = ['%s-restore' % (cmd,), '-c']
+            if incremental and self._apply_incremental(cmd, tables):
+                continue
+            # The state of the chains is unknown until the full restore
+            # succeeds.
+            self._applied_state.pop(cmd, None)
+            self._apply_full(cmd, tables)
+            self._count_apply('full')
+            if incremental:
+                self._applied_state[cmd] = self._get_managed_state(tables)
+            for table in tables.values():
+                table.clear_dirty_chains()
+        LOG.debug("IPTablesManager.apply completed with success")
+
+    def _apply_full(self, cmd, tables):
+        """Rewrite the whole iptables-save dump and restore it."""
+        args = ['%s-save' % (cmd,), '-c']
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        all_tables = self.execute(args, run_as_root=True)
+        all_lines = all_tables.split('\n')
+        # Traverse tables in sorted order for predictable dump output
+        for table_name in sorted(tables):
+            table = tables[table_name]
+            start, end = self._find_table(all_lines, table_name)
+            all_lines[start:end] = self._modify_rules(
+                all_lines[start:end], table, table_name)
+
+        args = ['%s-restore' % (cmd,), '-c']
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        try:
+            self.execute(args, process_input='\n'.join(all_lines),
+                         run_as_root=True)
+        except RuntimeError as r_error:
+            with excutils.save_and_reraise_exception():
+                try:
+                    line_no = int(re.search(
+                        'iptables-restore: line ([0-9]+?) failed',
+                        str(r_error)).group(1))
+                    context = IPTABLES_ERROR_LINES_OF_CONTEXT
+                    log_start = max(0, line_no - context)
+                    log_end = line_no + context
+                except AttributeError:
+                    # line error wasn't found, print all lines instead
+                    log_start = 0
+                    log_end = len(all_lines)
+                log_lines = ('%7d. %s' % (idx, l)
+                             for idx, l in enumerate(
+                                 all_lines[log_start:log_end],
+                                 log_start + 1)
+                             )
+                LOG.error(_LE("IPTablesManager.apply failed to apply the "
+                              "following set of iptables rules:\n%s"),
+                          '\n'.join(log_lines))
+
+    def _get_chain_state(self, table, chain):
+        """Return the rules of a wrapped chain, as fed to iptables-restore."""
+        rules = table._get_chain_rules(chain, wrap=True)
+        rules = ([str(r) for r in rules if r.top] +
+                 [str(r) for r in rules if not r.top])
+        # Like _modify_rules, let the last occurrence of a duplicated rule
+        # take precedence.
+        seen = set()
+        chain_rules = []
+        for rule in reversed(rules):
+            if rule not in seen:
+                seen.add(rule)
+                chain_rules.append(rule)
+        chain_rules.reverse()
+        return chain_rules
+
+    def _get_managed_state(self, tables):
+        """Return the rules of all the wrapped chains, per table."""
+        state = {}
+        for table_name, table in tables.items():
+            state[table_name] = dict(
+                (chain, self._get_chain_state(table, chain))
+                for chain in table.chains)
+        return state
+
+    def _generate_chains_diff(self, table_name, table, old_chains):
+        """Generate iptables-restore --noflush input for changed chains.
+
+        Only the chains marked as dirty in the table are regenerated.
+        Declaring an existing chain in --noflush mode flushes it, so changed
+        chains are simply declared and refilled, and deleted chains are
+        declared, to flush them, and then removed.
+
+        Returns the generated lines and the new state of the chains.
+        """
+        new_chains = dict(old_chains)
+        changed = []
+        removed = []
+        for chain in sorted(c for c, wrap in table.dirty_chains if wrap):
+            if chain in table.chains:
+                rules = self._get_chain_state(table, chain)
+                if old_chains.get(chain) != rules:
+                    new_chains[chain] = rules
+                    changed.append(chain)
+            elif chain in old_chains:
+                del new_chains[chain]
+                removed.append(chain)
+        if not changed and not removed:
+            return [], new_chains
+        lines = ['*%s' % table_name]
+        lines += [':%s-%s - [0:0]' % (self.wrap_name, chain)
+                  for chain in changed + removed]
+        for chain in changed:
+            lines += new_chains[chain]
+        lines += ['-X %s-%s' % (self.wrap_name, chain) for chain in removed]
+        lines.append('COMMIT')
+        return lines, new_chains
+
+    def _apply_incremental(self, cmd, tables):
+        """Apply only the wrapped chains which changed since last apply.
+
+        Returns False when a full save/restore is needed instead: when the
+        previous state is unknown, when unwrapped chains or rules changed,
+        since those are shared with other components and cannot be
+        flushed, or when iptables-restore failed because the chains on the
+        system drifted from the last applied state.
+        """
+        old_state = self._applied_state.get(cmd)
+        if old_state is None:
+            return False
+        new_state = {}
+        all_lines = []
+        for table_name in sorted(tables):
+            table = tables[table_name]
+            if (table_name not in old_state or
+                    table.remove_rules or table.remove_chains or
+                    any(not wrap for chain, wrap in table.dirty_chains)):
+                return False
+            lines, new_state[table_name] = self._generate_chains_diff(
+                table_name, table, old_state[table_name])
+            all_lines += lines
+
+        if all_lines:
+            args = ['%s-restore' % (cmd,), '-n']
             if self.namespace:
                 args = ['ip', 'netns', 'exec', self.namespace] + args
             try:
                 self.execute(args, process_input='\n'.join(all_lines),
                              run_as_root=True)
-            except RuntimeError as r_error:
-                with excutils.save_and_reraise_exception():
-                    try:
-                        line_no = int(re.search(
-                            'iptables-restore: line ([0-9]+?) failed',
-                            str(r_error)).group(1))
-                        context = IPTABLES_ERROR_LINES_OF_CONTEXT
-                        log_start = max(0, line_no - context)
-                        log_end = line_no + context
-                    except AttributeError:
-                        # line error wasn't found, print all lines instead
-                        log_start = 0
-                        log_end = len(all_lines)
-                    log_lines = ('%7d. %s' % (idx, l)
-                                 for idx, l in enumerate(
-                                     all_lines[log_start:log_end],
-                                     log_start + 1)
-                                 )
-                    LOG.error(_LE("IPTablesManager.apply failed to apply the "
-                                  "following set of iptables rules:\n%s"),
-                              '\n'.join(log_lines))
-        LOG.debug("IPTablesManager.apply completed with success")
+            except RuntimeError:
+                LOG.warn(_LW("Incremental %s-restore failed, falling back "
+                             "to a full restore"), cmd, exc_info=True)
+                self._count_apply('fallback')
+                return False
+            self._count_apply('incremental')
+        else:
+            self._count_apply('noop')
+        self._applied_state[cmd] = new_state
+        for table in tables.values():
+            table.clear_dirty_chains()
+        return True
 
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
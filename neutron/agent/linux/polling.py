@@ -15,8 +15,10 @@
 import contextlib
 
 import eventlet
+from oslo_config import cfg
 
 from neutron.agent.common import base_polling
+from neutron.agent.common import ovs_lib
 from neutron.agent.linux import ovsdb_monitor
 from neutron.plugins.openvswitch.common import constants
 
@@ -25,7 +27,10 @@ from neutron.plugins.openvswitch.common import constants
 def get_polling_manager(minimize_polling=False,
                         ovsdb_monitor_respawn_interval=(
                             constants.DEFAULT_OVSDBMON_RESPAWN)):
-    if minimize_polling:
+    if minimize_polling and cfg.CONF.OVS.ovsdb_interface == 'native':
+        pm = IdlPollingMinimizer()
+        pm.start()
+    elif minimize_polling:
         pm = InterfacePollingMinimizer(
             ovsdb_monitor_respawn_interval=ovsdb_monitor_respawn_interval)
         pm.start()
@@ -60,3 +65,46 @@ class InterfacePollingMinimizer(base_polling.BasePollingManager):
         # collect output.
         eventlet.sleep()
         return self._monitor.has_updates
+
+
+class IdlPollingMinimizer(base_polling.BasePollingManager):
+    """Uses the native OVSDB replica to determine when polling is required.
+
+    The IDL connection of the native OVSDB interface already receives all
+    the database updates, so no ovsdb-client monitor needs to be spawned:
+    the interfaces are only listed from the replica when its change sequence
+    number moved, and polling is required when their name, ofport or
+    external ids changed.
+    """
+
+    def __init__(self):
+        super(IdlPollingMinimizer, self).__init__()
+        self._ovsdb = None
+        self._seqno = None
+        self._interfaces = None
+
+    def start(self):
+        self._ovsdb = ovs_lib.BaseOVS().ovsdb
+
+    def stop(self):
+        pass
+
+    def _get_interfaces(self):
+        interfaces = self._ovsdb.db_list(
+            'Interface', columns=['name', 'ofport', 'external_ids']).execute(
+                check_error=True)
+        return set((i['name'], str(i['ofport']),
+                    tuple(sorted(i['external_ids'].items())))
+                   for i in interfaces)
+
+    def _is_polling_required(self):
+        # Read before listing the interfaces, so that changes made while
+        # they are listed are noticed on the next call
+        seqno = self._ovsdb.idl.change_seqno
+        if seqno == self._seqno:
+            return False
+        self._seqno = seqno
+        interfaces = self._get_interfaces()
+        changed = interfaces != self._interfaces
+        self._interfaces = interfaces
+        return changed
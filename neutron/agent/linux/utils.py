@@ -13,9 +13,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import bisect
+import collections
+import contextlib
 import fcntl
 import glob
 import grp
+import itertools
 import os
 import pwd
 import shlex
@@ -23,6 +27,7 @@ import socket
 import struct
 import tempfile
 import threading
+import time
 
 import eventlet
 from eventlet.green import subprocess
@@ -33,11 +38,12 @@ from oslo_log import loggers
 from oslo_rootwrap import client
 from oslo_utils import excutils
 from six.moves import http_client as httplib
+from six.moves import queue as Queue
 
 from neutron.agent.common import config
 from neutron.common import constants
 from neutron.common import utils
-from neutron.i18n import _LE
+from neutron.i18n import _LE, _LI
 from neutron import wsgi
 
 
@@ -46,20 +52,114 @@ config.register_root_helper(cfg.CONF)
 
 
 class RootwrapDaemonHelper(object):
-    __client = None
+    __clients = None
     __lock = threading.Lock()
+    __local = threading.local()
 
     def __new__(cls):
         """There is no reason to instantiate this class"""
         raise NotImplementedError()
 
     @classmethod
-    def get_client(cls):
+    def _get_pool(cls):
         with cls.__lock:
-            if cls.__client is None:
-                cls.__client = client.Client(
-                    shlex.split(cfg.CONF.AGENT.root_helper_daemon))
-            return cls.__client
+            if cls.__clients is None:
+                # Clients only start their daemon when first used
+                cls.__clients = Queue.Queue()
+                daemon_cmd = shlex.split(cfg.CONF.AGENT.root_helper_daemon)
+                for i in range(
+                        max(cfg.CONF.AGENT.root_helper_daemon_pool_size, 1)):
+                    cls.__clients.put(client.Client(daemon_cmd))
+            return cls.__clients
+
+    @classmethod
+    @contextlib.contextmanager
+    def get_client(cls):
+        """Borrow a client from the pool, waiting for one to be free.
+
+        Nested calls in the same thread get the client already borrowed.
+        """
+        daemon_client = getattr(cls.__local, 'client', None)
+        if daemon_client is not None:
+            yield daemon_client
+            return
+        pool = cls._get_pool()
+        daemon_client = pool.get()
+        cls.__local.client = daemon_client
+        try:
+            yield daemon_client
+        finally:
+            cls.__local.client = None
+            pool.put(daemon_client)
+
+
+class CommandLatencies(object):
+    """Histograms of the execution time of commands, by command name."""
+
+    # Upper bounds of the histogram buckets, in seconds
+    BUCKETS = (0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5)
+
+    def __init__(self):
+        self.histograms = collections.defaultdict(
+            lambda: [0] * (len(self.BUCKETS) + 1))
+        self.totals = collections.defaultdict(float)
+        self.last_report = time.time()
+
+    @staticmethod
+    def get_name(cmd):
+        """Return the name commands are grouped by, e.g. 'ip link'."""
+        cmd = list(cmd)
+        if cmd[:3] == ['ip', 'netns', 'exec']:
+            cmd = cmd[4:]
+        if cmd[:1] == ['env']:
+            cmd = list(itertools.dropwhile(lambda arg: '=' in arg, cmd[1:]))
+        if not cmd:
+            return ''
+        name = os.path.basename(cmd[0])
+        if name in ('ip', 'ovs-ofctl'):
+            subcommand = next((arg for arg in cmd[1:]
+                               if not arg.startswith('-')), None)
+            if subcommand:
+                name = '%s %s' % (name, subcommand)
+        return name
+
+    def record(self, cmd, elapsed):
+        name = self.get_name(map(str, cmd))
+        self.histograms[name][bisect.bisect_left(self.BUCKETS, elapsed)] += 1
+        self.totals[name] += elapsed
+        interval = cfg.CONF.AGENT.command_latency_report_interval
+        if interval and time.time() - self.last_report >= interval:
+            self.report()
+
+    def get_stats(self):
+        """Return the histogram of each command name.
+
+        The histograms map the upper bound of their non empty buckets, e.g.
+        '<=5ms' or '>5000ms' for the last one, to the number of executions.
+        """
+        bounds = ['<=%gms' % (b * 1000) for b in self.BUCKETS]
+        bounds.append('>%gms' % (self.BUCKETS[-1] * 1000))
+        stats = {}
+        for name, counts in self.histograms.items():
+            count = sum(counts)
+            stats[name] = {'count': count,
+                           'average': self.totals[name] * 1000 / count,
+                           'histogram': [(bound, c) for bound, c
+                                         in zip(bounds, counts) if c]}
+        return stats
+
+    def report(self):
+        self.last_report = time.time()
+        for name, stats in sorted(self.get_stats().items()):
+            LOG.info(_LI("Command %(name)s executed %(count)d times, "
+                         "%(average).1fms on average: %(histogram)s"),
+                     {'name': name, 'count': stats['count'],
+                      'average': stats['average'],
+                      'histogram': ', '.join('%s: %d' % bucket for bucket
+                                             in stats['histogram'])})
+
+
+command_latencies = CommandLatencies()
 
 
 def addl_env_args(addl_env):
@@ -98,14 +198,16 @@ def execute_rootwrap_daemon(cmd, process_input, addl_env):
     # would throw those errors, and if it does it should be fixed as opposed to
     # just logging the execution error.
     LOG.debug("Running command (rootwrap daemon): %s", cmd)
-    client = RootwrapDaemonHelper.get_client()
-    return client.execute(cmd, process_input)
+    with RootwrapDaemonHelper.get_client() as daemon_client:
+        return daemon_client.execute(cmd, process_input)
 
 
 def execute(cmd, process_input=None, addl_env=None,
             check_exit_code=True, return_stderr=False, log_fail_as_error=True,
             extra_ok_codes=None, run_as_root=False):
     try:
+        start = time.time()
+        command = cmd
         if run_as_root and cfg.CONF.AGENT.root_helper_daemon:
             returncode, _stdout, _stderr = (
                 execute_rootwrap_daemon(cmd, process_input, addl_env))
@@ -115,6 +217,7 @@ def execute(cmd, process_input=None, addl_env=None,
             _stdout, _stderr = obj.communicate(process_input)
             returncode = obj.returncode
             obj.stdin.close()
+        command_latencies.record(command, time.time() - start)
 
         m = _("\nCommand: {cmd}\nExit code: {code}\nStdin: {stdin}\n"
               "Stdout: {stdout}\nStderr: {stderr}").format(
@@ -144,6 +247,27 @@ def execute(cmd, process_input=None, addl_env=None,
     return (_stdout, _stderr) if return_stderr else _stdout
 
 
+def execute_reusing_client(cmds, check_exit_code=True,
+                           log_fail_as_error=True, run_as_root=False):
+    """Execute commands in order and return the list of their outputs.
+
+    The commands are still executed one at a time and the ones following a
+    failed one are not executed. With the root helper daemon, they are all
+    sent to the same daemon client of the pool, borrowed once instead of
+    waiting for a free one before each command.
+    """
+    def execute_all():
+        return [execute(cmd, check_exit_code=check_exit_code,
+                        log_fail_as_error=log_fail_as_error,
+                        run_as_root=run_as_root)
+                for cmd in cmds]
+
+    if run_as_root and cfg.CONF.AGENT.root_helper_daemon:
+        with RootwrapDaemonHelper.get_client():
+            return execute_all()
+    return execute_all()
+
+
 def get_interface_mac(interface):
     MAC_START = 18
     MAC_END = 24
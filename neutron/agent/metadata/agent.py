@@ -12,9 +12,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import contextlib
 import hashlib
 import hmac
+import time
 
+import eventlet
+from eventlet import pools
 import httplib2
 from neutronclient.v2_0 import client
 from oslo_config import cfg
@@ -31,7 +36,7 @@ from neutron.common import rpc as n_rpc
 from neutron.common import topics
 from neutron.common import utils
 from neutron import context
-from neutron.i18n import _LE, _LW
+from neutron.i18n import _LE, _LI, _LW
 from neutron.openstack.common.cache import cache
 from neutron.openstack.common import loopingcall
 
@@ -70,6 +75,210 @@ class MetadataPluginAPI(object):
         return cctxt.call(context, 'get_ports', filters=filters)
 
 
+class HttpClientPool(object):
+    """Bounded pool of HTTP clients keeping their connections alive.
+
+    httplib2.Http objects keep the connection of their last request open,
+    but can not be used by several greenthreads at once. The pool lends
+    each request a client, creating at most max_size of them, so that
+    consecutive requests reuse established (and for https, negotiated)
+    connections instead of opening a new one each time. Its statistics are
+    logged every report_interval seconds, unless it is 0.
+    """
+
+    def __init__(self, max_size, create, report_interval=0):
+        self._pool = pools.Pool(max_size=max_size, create=create)
+        self.report_interval = report_interval
+        self.last_report = time.time()
+        self.stats = {
+            # Requests sent through the pool
+            'requests': 0,
+            # Requests which had to open a connection
+            'connections': 0,
+            # Requests which had to wait for a client to be released
+            'waits': 0,
+            # Requests which failed without a response
+            'errors': 0,
+        }
+
+    @contextlib.contextmanager
+    def _get_client(self):
+        if not self._pool.free():
+            self.stats['waits'] += 1
+        with self._pool.item() as client:
+            yield client
+
+    def request(self, uri, method='GET', headers=None, body=None):
+        """Send a request with a pooled client, see httplib2.Http.request."""
+        try:
+            return self._request(uri, method, headers, body)
+        finally:
+            if (self.report_interval and
+                    time.time() - self.last_report >= self.report_interval):
+                self.report()
+
+    def _request(self, uri, method, headers, body):
+        self.stats['requests'] += 1
+        scheme, authority = urlparse.urlsplit(uri)[:2]
+        with self._get_client() as client:
+            conn = client.connections.get('%s:%s' % (scheme, authority))
+            if conn is None or conn.sock is None:
+                self.stats['connections'] += 1
+            try:
+                return client.request(uri, method=method, headers=headers,
+                                      body=body)
+            except Exception:
+                self.stats['errors'] += 1
+                # Do not reuse a connection in an unknown state
+                for conn in client.connections.values():
+                    conn.close()
+                raise
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['size'] = self._pool.current_size
+        stats['free'] = self._pool.free()
+        return stats
+
+    def report(self):
+        self.last_report = time.time()
+        LOG.info(_LI("Nova metadata server connections: %(requests)d "
+                     "requests, %(connections)d connections opened, "
+                     "%(waits)d waits for a free connection, %(errors)d "
+                     "errors, %(size)d connections of which %(free)d "
+                     "free"), self.get_stats())
+
+
+class PortIndex(object):
+    """Local index of the ports resolving metadata requests.
+
+    Ports are indexed by network and fixed IP address, and router interface
+    ports by router, so that the instance behind a request is found without
+    querying the server. The index is loaded with all the ports and updated
+    with the port_update and port_delete notifications the plugin fans out
+    to the L2 agents.
+    """
+
+    # 1.0 Initial version of the L2 agent notifications
+    target = oslo_messaging.Target(version='1.0')
+
+    def __init__(self):
+        # port_id -> (network_id, ip addresses, device_id, tenant_id,
+        #             time it was indexed at)
+        self._ports = {}
+        # (network_id, ip_address) -> set of port_ids
+        self._by_address = collections.defaultdict(set)
+        # router_id -> set of router interface port_ids
+        self._by_router = collections.defaultdict(set)
+        self.loaded = False
+        # Notifications received since the ports being loaded were fetched,
+        # None when no load is in progress
+        self._changes = None
+
+    def __len__(self):
+        return len(self._ports)
+
+    def start_load(self):
+        """Record the notifications received until the ports are loaded.
+
+        Must be called before fetching the ports passed to load(), the
+        changes notified while they are fetched are applied on top of them.
+        """
+        self._changes = []
+
+    def abort_load(self):
+        self._changes = None
+
+    def load(self, ports):
+        """Replace the indexed ports."""
+        changes, self._changes = self._changes or [], None
+        self._ports.clear()
+        self._by_address.clear()
+        self._by_router.clear()
+        self.update_ports(ports)
+        # The fetched ports may predate these notifications
+        for change, arg in changes:
+            change(arg)
+        self.loaded = True
+
+    def update_ports(self, ports):
+        for port in ports:
+            self.update_port(port)
+
+    def update_port(self, port):
+        self.remove_port(port['id'])
+        ips = tuple(ip['ip_address'] for ip in port.get('fixed_ips', []))
+        self._ports[port['id']] = (port['network_id'], ips,
+                                   port['device_id'], port['tenant_id'],
+                                   time.time())
+        for ip in ips:
+            self._by_address[(port['network_id'], ip)].add(port['id'])
+        if port['device_owner'] in n_const.ROUTER_INTERFACE_OWNERS:
+            self._by_router[port['device_id']].add(port['id'])
+
+    def remove_port(self, port_id):
+        entry = self._ports.pop(port_id, None)
+        if entry is None:
+            return
+        network_id, ips, device_id = entry[:3]
+        for ip in ips:
+            self._discard(self._by_address, (network_id, ip), port_id)
+        self._discard(self._by_router, device_id, port_id)
+
+    @staticmethod
+    def _discard(index, key, port_id):
+        port_ids = index.get(key)
+        if port_ids is not None:
+            port_ids.discard(port_id)
+            if not port_ids:
+                del index[key]
+
+    def get_router_networks(self, router_id):
+        return tuple(set(self._ports[port_id][0]
+                         for port_id in self._by_router.get(router_id, ())))
+
+    def get_ports(self, ip_address, networks, max_age=None):
+        """Return the ports with the address, like the get_ports RPC.
+
+        :param max_age: if set, no port is returned when one of them was
+        indexed more than max_age seconds ago, so that they are looked up
+        on the server again.
+        """
+        ports = []
+        oldest = None if max_age is None else time.time() - max_age
+        for network_id in networks:
+            for port_id in self._by_address.get((network_id, ip_address), ()):
+                (network_id, ips, device_id, tenant_id,
+                 indexed_at) = self._ports[port_id]
+                if oldest is not None and indexed_at < oldest:
+                    return []
+                ports.append({'id': port_id,
+                              'network_id': network_id,
+                              'device_id': device_id,
+                              'tenant_id': tenant_id})
+        return ports
+
+    def set_address_ports(self, ip_address, networks, ports):
+        """Replace the ports indexed with the address by the given ones."""
+        port_ids = set(port['id'] for port in ports)
+        for network_id in networks:
+            for port_id in list(self._by_address.get((network_id, ip_address),
+                                                     ())):
+                if port_id not in port_ids:
+                    self.remove_port(port_id)
+        self.update_ports(ports)
+
+    def port_update(self, context, **kwargs):
+        self.update_port(kwargs['port'])
+        if self._changes is not None:
+            self._changes.append((self.update_port, kwargs['port']))
+
+    def port_delete(self, context, **kwargs):
+        self.remove_port(kwargs['port_id'])
+        if self._changes is not None:
+            self._changes.append((self.remove_port, kwargs['port_id']))
+
+
 class MetadataProxyHandler(object):
 
     def __init__(self, conf):
@@ -84,6 +293,25 @@ class MetadataProxyHandler(object):
         self.context = context.get_admin_context_without_session()
         # Use RPC by default
         self.use_rpc = True
+        self.nova_client_pool = HttpClientPool(
+            self.conf.nova_metadata_pool_size, self._create_nova_client,
+            report_interval=self.conf.nova_metadata_pool_report_interval)
+        # Created by the first request of each worker process, as neither
+        # RPC connections nor the greenthreads loading the index would
+        # survive the fork of the workers
+        self.port_index = None
+
+    def _create_nova_client(self):
+        h = httplib2.Http(
+            ca_certs=self.conf.auth_ca_cert,
+            disable_ssl_certificate_validation=self.conf.nova_metadata_insecure
+        )
+        if self.conf.nova_client_cert and self.conf.nova_client_priv_key:
+            h.add_certificate(self.conf.nova_client_priv_key,
+                              self.conf.nova_client_cert,
+                              '%s:%s' % (self.conf.nova_metadata_ip,
+                                         self.conf.nova_metadata_port))
+        return h
 
     def _get_neutron_client(self):
         qclient = client.Client(
@@ -178,6 +406,65 @@ class MetadataProxyHandler(object):
         self.auth_info = client.get_auth_info()
         return ports['ports']
 
+    def _get_port_index(self):
+        if self.port_index is None:
+            self.port_index = PortIndex()
+            # Listen to the notifications before loading the ports, not to
+            # miss the changes made while they are fetched
+            self.connection = agent_rpc.create_consumers(
+                [self.port_index], topics.AGENT,
+                [[topics.PORT, topics.UPDATE], [topics.PORT, topics.DELETE]])
+            interval = self.conf.metadata_port_index_resync_interval
+            if interval:
+                self.port_index_loop = loopingcall.FixedIntervalLoopingCall(
+                    self._load_port_index)
+                self.port_index_loop.start(interval=interval)
+            else:
+                eventlet.spawn_n(self._load_port_index)
+        return self.port_index
+
+    def _load_port_index(self):
+        self.port_index.start_load()
+        try:
+            ports = self._get_ports_from_server()
+        except Exception:
+            self.port_index.abort_load()
+            LOG.exception(_LE("Unable to load the port index"))
+            return
+        self.port_index.load(ports)
+        LOG.debug("Loaded %d ports in the port index", len(ports))
+
+    def _get_indexed_ports(self, remote_address, network_id, router_id):
+        """Look the ports up in the index, then on the server if missing.
+
+        Ports missing from the index (e.g. created or bound without
+        notification, or looked up before the index is loaded), or indexed
+        more than metadata_port_index_max_age seconds ago, are looked up on
+        the server and indexed again.
+        """
+        index = self._get_port_index()
+        if network_id:
+            networks = (network_id,)
+        else:
+            networks = index.get_router_networks(router_id)
+        ports = index.get_ports(remote_address, networks,
+                                max_age=self.conf.metadata_port_index_max_age)
+        if ports:
+            return ports
+        if not network_id:
+            # The interface of the router on the network of the instance may
+            # be missing too
+            router_ports = self._get_ports_from_server(router_id=router_id)
+            index.update_ports(router_ports)
+            networks = tuple(p['network_id'] for p in router_ports)
+            if not networks:
+                return []
+        ports = self._get_ports_from_server(networks=networks,
+                                            ip_address=remote_address)
+        # Forget the stale ports which no longer have the address
+        index.set_address_ports(remote_address, networks, ports)
+        return ports
+
     def _get_ports(self, remote_address, network_id=None, router_id=None):
         """Search for all ports that contain passed ip address and belongs to
         given network.
@@ -186,13 +473,17 @@ class MetadataProxyHandler(object):
         given router. Either one of network_id or router_id must be passed.
 
         """
+        if not (network_id or router_id):
+            raise TypeError(_("Either one of parameter network_id or router_id"
+                              " must be passed to _get_ports method."))
+        if self.conf.metadata_port_index:
+            return self._get_indexed_ports(remote_address, network_id,
+                                           router_id)
+
         if network_id:
             networks = (network_id,)
-        elif router_id:
-            networks = self._get_router_networks(router_id)
         else:
-            raise TypeError(_("Either one of parameter network_id or router_id"
-                              " must be passed to _get_ports method."))
+            networks = self._get_router_networks(router_id)
 
         return self._get_ports_for_remote_address(remote_address, networks)
 
@@ -224,16 +515,8 @@ class MetadataProxyHandler(object):
             req.query_string,
             ''))
 
-        h = httplib2.Http(
-            ca_certs=self.conf.auth_ca_cert,
-            disable_ssl_certificate_validation=self.conf.nova_metadata_insecure
-        )
-        if self.conf.nova_client_cert and self.conf.nova_client_priv_key:
-            h.add_certificate(self.conf.nova_client_priv_key,
-                              self.conf.nova_client_cert,
-                              nova_ip_port)
-        resp, content = h.request(url, method=req.method, headers=headers,
-                                  body=req.body)
+        resp, content = self.nova_client_pool.request(
+            url, method=req.method, headers=headers, body=req.body)
 
         if resp.status == 200:
             LOG.debug(str(resp))
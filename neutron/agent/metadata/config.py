@@ -46,6 +46,16 @@ DRIVER_OPTS = [
                        "metadata_proxy_user: watch log is enabled if "
                        "metadata_proxy_user is agent effective user "
                        "id/name.")),
+    cfg.BoolOpt('metadata_proxy_multiplexed',
+                default=False,
+                help=_("Serve the metadata requests of all the routers or "
+                       "networks of the agent with a single "
+                       "neutron-multiplexed-metadata-proxy process "
+                       "listening in their namespaces, instead of a "
+                       "neutron-ns-metadata-proxy process per namespace. "
+                       "A helper process keeps running as root to enter new "
+                       "namespaces, the requests are served as "
+                       "metadata_proxy_user/group.")),
 ]
 
 
@@ -95,7 +105,41 @@ METADATA_PROXY_HANDLER_OPTS = [
                 help=_("Client certificate for nova metadata api server.")),
      cfg.StrOpt('nova_client_priv_key',
                 default='',
-                help=_("Private key of client certificate."))
+                help=_("Private key of client certificate.")),
+     cfg.IntOpt('nova_metadata_pool_size',
+                default=16,
+                help=_("Maximum number of connections kept open to the Nova "
+                       "metadata server by each metadata agent worker.")),
+     cfg.IntOpt('nova_metadata_pool_report_interval',
+                default=300,
+                help=_("Seconds between logging the statistics of the "
+                       "connections to the Nova metadata server of each "
+                       "metadata agent worker. 0 disables it.")),
+     cfg.BoolOpt('metadata_port_index',
+                 default=False,
+                 help=_("Look instances up in a local index of the ports, "
+                        "loaded from the Neutron server and kept up to date "
+                        "with the port update and delete notifications sent "
+                        "to the L2 agents, instead of querying the server "
+                        "for each request. The cache_url cache is not used "
+                        "when enabled.")),
+     cfg.IntOpt('metadata_port_index_resync_interval',
+                default=600,
+                help=_("Interval in seconds between full reloads of the port "
+                       "index, repairing it from missed notifications. 0 "
+                       "disables them.")),
+     cfg.IntOpt('metadata_port_index_max_age',
+                default=5,
+                help=_("Maximum age in seconds of the index entry of a port "
+                       "for a request to be answered from it. Older "
+                       "entries are checked on the server and indexed "
+                       "again. The server does not notify every port "
+                       "change, e.g. of the fixed IPs of a port without "
+                       "security group, or of its device_id: a port reusing "
+                       "an address can be served the metadata of the "
+                       "previous instance for up to this long. Higher "
+                       "values save requests to the server at the expense "
+                       "of this staleness, like the TTL of cache_url.")),
 ]
 
 DEDUCE_MODE = 'deduce'
@@ -14,8 +14,11 @@
 #    under the License.
 
 import os
+import socket
+import time
 
 from oslo_log import log as logging
+from oslo_serialization import jsonutils
 
 from neutron.agent.common import config
 from neutron.agent.l3 import namespaces
@@ -25,12 +28,18 @@ from neutron.callbacks import events
 from neutron.callbacks import registry
 from neutron.callbacks import resources
 from neutron.common import exceptions
+from neutron.i18n import _LE
 
 LOG = logging.getLogger(__name__)
 
 # Access with redirection to metadata proxy iptables mark mask
 METADATA_ACCESS_MARK_MASK = '0xffffffff'
 METADATA_SERVICE_NAME = 'metadata-proxy'
+MULTIPLEXED_PROXY_SERVICE_NAME = 'multiplexed-metadata-proxy'
+# Attempts to reach the control socket of the multiplexed proxy, which is
+# not listening yet right after the proxy is spawned.
+MULTIPLEXED_PROXY_CONNECT_ATTEMPTS = 20
+MULTIPLEXED_PROXY_CONNECT_INTERVAL = 0.5
 
 
 class MetadataDriver(object):
@@ -114,6 +123,20 @@ class MetadataDriver(object):
     def spawn_monitored_metadata_proxy(cls, monitor, ns_name, port, conf,
                                        network_id=None, router_id=None):
         uuid = network_id or router_id
+        if conf.metadata_proxy_multiplexed:
+            if uuid is None:
+                raise exceptions.NetworkIdOrRouterIdRequiredError()
+            cls._ensure_multiplexed_metadata_proxy(monitor, conf)
+            listener = {'namespace': ns_name, 'port': port,
+                        'network_id': network_id, 'router_id': router_id}
+            status = cls._call_multiplexed_metadata_proxy(
+                monitor, conf, 'PUT', uuid, listener)
+            if status not in (201, 204):
+                LOG.error(_LE("Unable to proxy metadata requests in "
+                              "namespace %(ns)s: the multiplexed metadata "
+                              "proxy returned %(status)s"),
+                          {'ns': ns_name, 'status': status})
+            return
         callback = cls._get_metadata_proxy_callback(
             port, conf, network_id=network_id, router_id=router_id)
         pm = cls._get_metadata_proxy_process_manager(uuid, ns_name, conf,
@@ -123,6 +146,16 @@ class MetadataDriver(object):
 
     @classmethod
     def destroy_monitored_metadata_proxy(cls, monitor, uuid, ns_name, conf):
+        if conf.metadata_proxy_multiplexed:
+            try:
+                cls._call_multiplexed_metadata_proxy(
+                    monitor, conf, 'DELETE', uuid, attempts=1)
+            except socket.error:
+                # The proxy forgets the listeners of deleted namespaces
+                # when it is respawned.
+                LOG.debug("Multiplexed metadata proxy not running, no "
+                          "listener to remove for %s", uuid)
+            return
         monitor.unregister(uuid, METADATA_SERVICE_NAME)
         pm = cls._get_metadata_proxy_process_manager(uuid, ns_name, conf)
         pm.disable()
@@ -136,6 +169,80 @@ class MetadataDriver(object):
             namespace=ns_name,
             default_cmd_callback=callback)
 
+    @classmethod
+    def _get_multiplexed_proxy_uuid(cls, monitor):
+        # The L3 and DHCP agents of a host each run their own proxy
+        return '%s-%s' % (MULTIPLEXED_PROXY_SERVICE_NAME,
+                          monitor.resource_type)
+
+    @classmethod
+    def _get_multiplexed_proxy_path(cls, conf, proxy_uuid, suffix):
+        return os.path.join(conf.state_path, proxy_uuid + suffix)
+
+    @classmethod
+    def _get_multiplexed_proxy_callback(cls, conf, proxy_uuid):
+        def callback(pid_file):
+            user, group, watch_log = (
+                cls._get_metadata_proxy_user_group_watchlog(conf))
+            proxy_cmd = ['neutron-multiplexed-metadata-proxy',
+                         '--pid_file=%s' % pid_file,
+                         '--control_socket=%s' %
+                         cls._get_multiplexed_proxy_path(conf, proxy_uuid,
+                                                         '.sock'),
+                         '--state_file=%s' %
+                         cls._get_multiplexed_proxy_path(conf, proxy_uuid,
+                                                         '.json'),
+                         '--control_socket_uid=%s' % os.geteuid(),
+                         '--control_socket_gid=%s' % os.getegid(),
+                         '--metadata_proxy_socket=%s' %
+                         conf.metadata_proxy_socket,
+                         '--state_path=%s' % conf.state_path,
+                         '--metadata_proxy_user=%s' % user,
+                         '--metadata_proxy_group=%s' % group]
+            proxy_cmd.extend(config.get_log_args(
+                conf, '%s.log' % proxy_uuid,
+                metadata_proxy_watch_log=watch_log))
+            return proxy_cmd
+
+        return callback
+
+    @classmethod
+    def _ensure_multiplexed_metadata_proxy(cls, monitor, conf):
+        proxy_uuid = cls._get_multiplexed_proxy_uuid(monitor)
+        pm = external_process.ProcessManager(
+            conf=conf,
+            uuid=proxy_uuid,
+            default_cmd_callback=cls._get_multiplexed_proxy_callback(
+                conf, proxy_uuid),
+            run_as_root=True)
+        pm.enable()
+        monitor.register(proxy_uuid, MULTIPLEXED_PROXY_SERVICE_NAME, pm)
+
+    @classmethod
+    def _call_multiplexed_metadata_proxy(
+            cls, monitor, conf, method, uuid, listener=None,
+            attempts=MULTIPLEXED_PROXY_CONNECT_ATTEMPTS):
+        """Send a request to the control socket of the multiplexed proxy.
+
+        :returns: the HTTP status of the response.
+        """
+        proxy_uuid = cls._get_multiplexed_proxy_uuid(monitor)
+        body = jsonutils.dumps(listener) if listener else None
+        for attempt in range(attempts):
+            conn = utils.UnixDomainHTTPConnection('localhost')
+            conn.socket_path = cls._get_multiplexed_proxy_path(
+                conf, proxy_uuid, '.sock')
+            try:
+                conn.request(method, '/listeners/%s' % uuid, body,
+                             {'Content-Type': 'application/json'})
+                return conn.getresponse().status
+            except socket.error:
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(MULTIPLEXED_PROXY_CONNECT_INTERVAL)
+            finally:
+                conn.close()
+
 
 def after_router_added(resource, event, l3_agent, **kwargs):
     router = kwargs['router']
@@ -0,0 +1,401 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Metadata proxy serving the namespaces of all the routers or networks.
+
+Instead of a neutron-ns-metadata-proxy process per router or isolated
+network, the agent runs one neutron-multiplexed-metadata-proxy process and
+asks it through a UNIX domain control socket to listen in the namespaces of
+its routers or networks. The listening sockets are opened in each namespace
+with setns(2) and served by a single event loop; requests are forwarded to
+the metadata agent tagged with the router or network ID of the listener
+they were received on, like neutron-ns-metadata-proxy does.
+
+The listeners are saved in a state file, so that the proxy listens again in
+the same namespaces when it is respawned by the agent process monitor.
+
+Entering a namespace requires root privileges. A helper process forked by
+the proxy at startup keeps them to enter the namespaces and open the
+listening sockets, and passes the sockets to the proxy, which serves the
+requests of the instances as metadata_proxy_user/group.
+"""
+
+import contextlib
+import ctypes
+import ctypes.util
+from multiprocessing import reduction
+import os
+import signal
+import socket
+
+import eventlet
+from eventlet import hubs
+from eventlet import semaphore
+import eventlet.wsgi
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_log import loggers
+from oslo_serialization import jsonutils
+import six
+import webob
+import webob.dec
+import webob.exc
+
+from neutron.agent.linux import daemon
+from neutron.agent.linux import utils as agent_utils
+from neutron.agent.metadata import namespace_proxy
+from neutron.common import config
+from neutron.common import utils
+from neutron.i18n import _LE, _LI
+
+LOG = logging.getLogger(__name__)
+
+CLONE_NEWNET = 0x40000000
+NETNS_RUN_DIR = '/var/run/netns'
+LISTENER_KEYS = ('namespace', 'port', 'network_id', 'router_id')
+
+_libc = None
+
+
+def _setns(fd):
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    if _libc.setns(fd, CLONE_NEWNET) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+
+@contextlib.contextmanager
+def _in_namespace(namespace):
+    """Switch the process to a network namespace for the block duration.
+
+    The block must not yield to other greenthreads, as they would run in
+    the namespace too.
+    """
+    with open('/proc/self/ns/net') as own_ns:
+        with open(os.path.join(NETNS_RUN_DIR, namespace)) as ns:
+            _setns(ns.fileno())
+        try:
+            yield
+        finally:
+            _setns(own_ns.fileno())
+
+
+def listen_in_namespace(namespace, port, backlog=128):
+    """Return a TCP socket listening on the port inside the namespace."""
+    with _in_namespace(namespace):
+        return eventlet.listen(('0.0.0.0', port), backlog=backlog)
+
+
+def _recv_line(sock):
+    # Read byte by byte, not to consume a passed file descriptor
+    data = []
+    while True:
+        char = sock.recv(1)
+        if not char or char == '\n':
+            return ''.join(data)
+        data.append(char)
+
+
+class ListenerHelper(object):
+    """Open listening sockets in the namespaces from a root process.
+
+    start() forks the helper process while the proxy still runs as root.
+    The helper only enters namespaces and opens the sockets the proxy asks
+    for through a socket pair, and passes their file descriptors back. It
+    exits when the proxy closes its end of the pair.
+    """
+
+    def __init__(self):
+        self._sock = None
+        self._lock = semaphore.Semaphore()
+
+    def start(self):
+        proxy_sock, helper_sock = socket.socketpair()
+        if os.fork():
+            helper_sock.close()
+            self._sock = proxy_sock
+            return
+        proxy_sock.close()
+        # Leave the pid file of the proxy alone
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        try:
+            self._serve(helper_sock)
+        finally:
+            os._exit(0)
+
+    @staticmethod
+    def _serve(sock):
+        while True:
+            request = _recv_line(sock)
+            if not request:
+                return
+            request = jsonutils.loads(request)
+            try:
+                listener = listen_in_namespace(request['namespace'],
+                                               request['port'])
+            except Exception as e:
+                sock.sendall('1%s\n' % str(e).replace('\n', ' '))
+                continue
+            try:
+                sock.sendall('0')
+                reduction.send_handle(sock, listener.fileno(), None)
+            finally:
+                listener.close()
+
+    def listen(self, namespace, port):
+        """Return a TCP socket listening on the port inside the namespace."""
+        with self._lock:
+            try:
+                self._sock.sendall(jsonutils.dumps({'namespace': namespace,
+                                                    'port': port}) + '\n')
+                status = self._sock.recv(1)
+            except socket.error:
+                status = ''
+            if status != '0':
+                raise RuntimeError(_recv_line(self._sock) if status else
+                                   _('The listener helper exited'))
+            hubs.trampoline(self._sock, read=True)
+            fd = reduction.recv_handle(self._sock)
+        try:
+            return socket.fromfd(fd, socket.AF_INET, socket.SOCK_STREAM)
+        finally:
+            os.close(fd)
+
+
+class MultiplexedProxy(object):
+    """Listeners of the proxy, one per router or network namespace."""
+
+    def __init__(self, state_file, listen=None):
+        self.state_file = state_file
+        self._listen = listen
+        # uuid -> (listener dict, server greenthread)
+        self._listeners = {}
+
+    def get_listeners(self):
+        return dict((uuid, listener)
+                    for uuid, (listener, thread) in self._listeners.items())
+
+    def add(self, uuid, namespace, port, network_id=None, router_id=None):
+        """Listen in the namespace, replacing the listener of the uuid.
+
+        :returns: False if the same listener was already running.
+        """
+        listener = {'namespace': namespace, 'port': port,
+                    'network_id': network_id, 'router_id': router_id}
+        if uuid in self._listeners:
+            if self._listeners[uuid][0] == listener:
+                return False
+            self._stop(uuid)
+        handler = namespace_proxy.NetworkMetadataProxyHandler(
+            network_id=network_id, router_id=router_id)
+        sock = (self._listen or listen_in_namespace)(namespace, port)
+        thread = eventlet.spawn(eventlet.wsgi.server, sock, handler,
+                                log=loggers.WritableLogger(LOG))
+        self._listeners[uuid] = (listener, thread)
+        self._save()
+        LOG.info(_LI("Proxying metadata requests received in namespace "
+                     "%(namespace)s on port %(port)s for %(uuid)s"),
+                 {'namespace': namespace, 'port': port, 'uuid': uuid})
+        return True
+
+    def remove(self, uuid):
+        """Stop the listener of the uuid.
+
+        :returns: False if there was no listener for the uuid.
+        """
+        if uuid not in self._listeners:
+            return False
+        self._stop(uuid)
+        self._save()
+        LOG.info(_LI("Stopped proxying metadata requests for %s"), uuid)
+        return True
+
+    def _stop(self, uuid):
+        listener, thread = self._listeners.pop(uuid)
+        # The server closes its socket when it exits
+        thread.kill()
+
+    def _save(self):
+        agent_utils.replace_file(self.state_file,
+                                 jsonutils.dumps(self.get_listeners()))
+
+    def restore(self):
+        """Listen again in the namespaces saved in the state file."""
+        if not os.path.exists(self.state_file):
+            return
+        with open(self.state_file) as f:
+            listeners = jsonutils.loads(f.read())
+        for uuid, listener in listeners.items():
+            try:
+                self.add(uuid, **listener)
+            except Exception:
+                # e.g. the namespace was deleted while the proxy was down
+                LOG.exception(_LE("Unable to restore the metadata proxy "
+                                  "listener of %s"), uuid)
+        self._save()
+
+
+class ControlHandler(object):
+    """Control API of the proxy, served on its UNIX domain socket.
+
+    GET /listeners returns the listeners by uuid, PUT /listeners/<uuid> adds
+    or replaces the listener of the uuid from a JSON body with its
+    namespace, port and network_id or router_id, and
+    DELETE /listeners/<uuid> removes it.
+    """
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+
+    @webob.dec.wsgify(RequestClass=webob.Request)
+    def __call__(self, req):
+        parts = req.path_info.strip('/').split('/')
+        if parts[0] != 'listeners' or len(parts) > 2:
+            return webob.exc.HTTPNotFound()
+        try:
+            if len(parts) == 1:
+                if req.method != 'GET':
+                    return webob.exc.HTTPMethodNotAllowed()
+                return self._json_response(self.proxy.get_listeners())
+            uuid = parts[1]
+            if req.method == 'PUT':
+                return self._add(uuid, req)
+            elif req.method == 'DELETE':
+                if not self.proxy.remove(uuid):
+                    return webob.exc.HTTPNotFound()
+                return webob.exc.HTTPNoContent()
+            return webob.exc.HTTPMethodNotAllowed()
+        except Exception:
+            LOG.exception(_LE("Unexpected error."))
+            return webob.exc.HTTPInternalServerError()
+
+    def _add(self, uuid, req):
+        try:
+            listener = jsonutils.loads(req.body)
+            kwargs = dict((key, listener.get(key)) for key in LISTENER_KEYS)
+            kwargs['port'] = int(kwargs['port'])
+        except (ValueError, TypeError):
+            return webob.exc.HTTPBadRequest()
+        if not self._is_valid_namespace(kwargs['namespace']) or not (
+                kwargs['network_id'] or kwargs['router_id']):
+            return webob.exc.HTTPBadRequest()
+        if self.proxy.add(uuid, **kwargs):
+            return webob.exc.HTTPCreated()
+        return webob.exc.HTTPNoContent()
+
+    @staticmethod
+    def _is_valid_namespace(namespace):
+        # The namespace is opened in NETNS_RUN_DIR, it must not be able to
+        # name a file elsewhere
+        return (isinstance(namespace, six.string_types) and
+                namespace not in ('', '.') and
+                '/' not in namespace and '..' not in namespace)
+
+    @staticmethod
+    def _json_response(data):
+        response = webob.Response()
+        response.headers['Content-Type'] = 'application/json'
+        response.body = jsonutils.dumps(data)
+        return response
+
+
+class MultiplexedProxyDaemon(daemon.Daemon):
+    def __init__(self, pidfile, control_socket, state_file,
+                 control_socket_uid=None, control_socket_gid=None,
+                 user=None, group=None, watch_log=True):
+        super(MultiplexedProxyDaemon, self).__init__(
+            pidfile, uuid=control_socket, user=user, group=group,
+            watch_log=watch_log)
+        self.control_socket = control_socket
+        self.state_file = state_file
+        self.control_socket_uid = control_socket_uid
+        self.control_socket_gid = control_socket_gid
+
+    def run(self):
+        helper = ListenerHelper()
+        helper.start()
+        proxy = MultiplexedProxy(self.state_file, listen=helper.listen)
+        agent_utils.ensure_directory_exists_without_file(self.control_socket)
+        server = agent_utils.UnixDomainWSGIServer(
+            'neutron-multiplexed-metadata-proxy')
+        server.start(ControlHandler(proxy), self.control_socket,
+                     workers=0, backlog=128, mode=0o600)
+        # Only the agent which spawned the proxy may manage its listeners
+        os.chown(self.control_socket,
+                 -1 if self.control_socket_uid is None
+                 else self.control_socket_uid,
+                 -1 if self.control_socket_gid is None
+                 else self.control_socket_gid)
+        # Drop the privileges, only the helper keeps them
+        super(MultiplexedProxyDaemon, self).run()
+        proxy.restore()
+        server.wait()
+
+
+def main():
+    opts = [
+        cfg.StrOpt('pid_file',
+                   help=_('Location of pid file of this process.')),
+        cfg.BoolOpt('daemonize',
+                    default=True,
+                    help=_('Run as daemon.')),
+        cfg.StrOpt('control_socket',
+                   help=_('Location of the UNIX domain socket on which the '
+                          'agent manages the listeners of the proxy.')),
+        cfg.StrOpt('state_file',
+                   help=_('Location of the file in which the listeners are '
+                          'saved.')),
+        cfg.IntOpt('control_socket_uid',
+                   help=_('Owner of the control socket.')),
+        cfg.IntOpt('control_socket_gid',
+                   help=_('Group of the control socket.')),
+        cfg.StrOpt('metadata_proxy_socket',
+                   default='$state_path/metadata_proxy',
+                   help=_('Location of Metadata Proxy UNIX domain '
+                          'socket')),
+        cfg.StrOpt('metadata_proxy_user',
+                   help=_("User (uid or name) serving the metadata requests "
+                          "after the initialization of the proxy")),
+        cfg.StrOpt('metadata_proxy_group',
+                   help=_("Group (gid or name) serving the metadata requests "
+                          "after the initialization of the proxy")),
+        cfg.BoolOpt('metadata_proxy_watch_log',
+                    default=True,
+                    help=_("Watch file log. Log watch should be disabled when "
+                           "metadata_proxy_user/group has no read/write "
+                           "permissions on the log file, or when log files "
+                           "are managed by logrotate without the "
+                           "copytruncate option.")),
+    ]
+
+    cfg.CONF.register_cli_opts(opts)
+    # Don't get the default configuration file
+    cfg.CONF(project='neutron', default_config_files=[])
+    config.setup_logging()
+    utils.log_opt_values(LOG)
+
+    proxy = MultiplexedProxyDaemon(
+        cfg.CONF.pid_file,
+        cfg.CONF.control_socket,
+        cfg.CONF.state_file,
+        control_socket_uid=cfg.CONF.control_socket_uid,
+        control_socket_gid=cfg.CONF.control_socket_gid,
+        user=cfg.CONF.metadata_proxy_user,
+        group=cfg.CONF.metadata_proxy_group,
+        watch_log=cfg.CONF.metadata_proxy_watch_log)
+
+    if cfg.CONF.daemonize:
+        proxy.start()
+    else:
+        proxy.run()
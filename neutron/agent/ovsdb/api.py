@@ -312,3 +312,18 @@ class API(object):
         :type bridge:  string
         :returns:      :class:`Command` with list of port names result
         """
+
+    @abc.abstractmethod
+    def list_port_records(self, bridge, table, columns=None):
+        """Create a command to list the records of the ports on a bridge
+
+        :param bridge:  The name of the bridge
+        :type bridge:   string
+        :param table:   'Port' for the ports or 'Interface' for their
+                        interfaces
+        :type table:    string
+        :param columns: The columns of the records to return, all of them if
+                        None
+        :type columns:  list of column names
+        :returns:       :class:`Command` with [{'column': value}, ...] result
+        """
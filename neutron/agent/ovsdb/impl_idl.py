@@ -201,3 +201,6 @@ class OvsdbIdl(api.API):
 
     def list_ports(self, bridge):
         return cmd.ListPortsCommand(self, bridge)
+
+    def list_port_records(self, bridge, table, columns=None):
+        return cmd.ListPortRecordsCommand(self, bridge, table, columns)
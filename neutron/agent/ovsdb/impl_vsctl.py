@@ -156,6 +156,33 @@ class BrExistsCommand(DbCommand):
                                                     log_errors=False)
 
 
+class PortRecordsCommand(ovsdb.Command):
+    """Command listing the records of the ports on a bridge
+
+    ovs-vsctl cannot select records by bridge, so this runs list-ports and
+    then lists the records of the returned ports. It can only be executed on
+    its own, not added to a transaction.
+    """
+    def __init__(self, api, bridge, table, columns):
+        self.api = api
+        self.bridge = bridge
+        self.table = table
+        self.columns = columns
+        self.result = None
+
+    def execute(self, check_error=False, log_errors=True):
+        port_names = self.api.list_ports(self.bridge).execute(
+            check_error=check_error, log_errors=log_errors)
+        if not port_names:
+            self.result = []
+        else:
+            cmd = self.api.db_list(self.table, port_names,
+                                   columns=self.columns, if_exists=True)
+            self.result = cmd.execute(check_error=check_error,
+                                      log_errors=log_errors) or []
+        return self.result
+
+
 class OvsdbVsctl(ovsdb.API):
     def transaction(self, check_error=False, log_errors=True, **kwargs):
         return Transaction(self.context, check_error, log_errors, **kwargs)
@@ -241,6 +268,9 @@ class OvsdbVsctl(ovsdb.API):
     def list_ports(self, bridge):
         return MultiLineCommand(self.context, 'list-ports', args=[bridge])
 
+    def list_port_records(self, bridge, table, columns=None):
+        return PortRecordsCommand(self, bridge, table, columns)
+
 
 def _set_colval_args(*col_values):
     args = []
@@ -332,6 +332,32 @@ class ListPortsCommand(BaseCommand):
         self.result = [p.name for p in br.ports if p.name != self.bridge]
 
 
+class ListPortRecordsCommand(BaseCommand):
+    def __init__(self, api, bridge, table, columns):
+        super(ListPortRecordsCommand, self).__init__(api)
+        self.bridge = bridge
+        self.table = table
+        self.columns = (columns or
+                        self.api._tables[table].columns.keys() + ['_uuid'])
+
+    def run_idl(self, txn):
+        # Walk the rows referenced by the bridge rather than looking each
+        # port up by name, which would scan the whole table for every port
+        br = idlutils.row_by_value(self.api.idl, 'Bridge', 'name', self.bridge)
+        rows = []
+        for port in br.ports:
+            if port.name == self.bridge:
+                continue
+            if self.table == 'Port':
+                rows.append(port)
+            else:
+                rows.extend(port.interfaces)
+        self.result = [
+            {c: idlutils.get_column_value(row, c) for c in self.columns}
+            for row in rows
+        ]
+
+
 class PortToBridgeCommand(BaseCommand):
     def __init__(self, api, name):
         super(PortToBridgeCommand, self).__init__(api)
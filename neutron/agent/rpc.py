@@ -22,7 +22,7 @@ from oslo_utils import timeutils
 from neutron.common import constants
 from neutron.common import rpc as n_rpc
 from neutron.common import topics
-from neutron.i18n import _LW
+from neutron.i18n import _LE, _LW
 
 
 LOG = logging.getLogger(__name__)
@@ -89,6 +89,7 @@ class PluginApi(object):
               return value to include fixed_ips and device_owner for
               the device port
         1.4 - tunnel_sync rpc signature upgrade to obtain 'host'
+        1.5 - Support update_device_list
     '''
 
     def __init__(self, topic):
@@ -127,6 +128,44 @@ class PluginApi(object):
         return cctxt.call(context, 'update_device_up', device=device,
                           agent_id=agent_id, host=host)
 
+    def _device_list_rpc_call_with_failed_dev(self, rpc_call, context,
+                                              agent_id, host, devices):
+        succeeded_devices = []
+        failed_devices = []
+        for device in devices:
+            try:
+                rpc_device = rpc_call(context, device, agent_id, host)
+            except Exception:
+                LOG.error(_LE("Failed to update device %s"), device)
+                failed_devices.append(device)
+            else:
+                # update_device_up doesn't return the device
+                succeeded_dev = rpc_device or device
+                succeeded_devices.append(succeeded_dev)
+        return {'devices': succeeded_devices, 'failed_devices': failed_devices}
+
+    def update_device_list(self, context, devices_up, devices_down,
+                           agent_id, host):
+        try:
+            cctxt = self.client.prepare(version='1.5')
+            res = cctxt.call(context, 'update_device_list',
+                             devices_up=devices_up, devices_down=devices_down,
+                             agent_id=agent_id, host=host)
+        except oslo_messaging.UnsupportedVersion:
+            # If the server has not been upgraded yet, fall back to one
+            # update_device_up/update_device_down call per device.
+            dev_up = self._device_list_rpc_call_with_failed_dev(
+                self.update_device_up, context, agent_id, host, devices_up)
+            dev_down = self._device_list_rpc_call_with_failed_dev(
+                self.update_device_down, context, agent_id, host,
+                devices_down)
+
+            res = {'devices_up': dev_up.get('devices'),
+                   'failed_devices_up': dev_up.get('failed_devices'),
+                   'devices_down': dev_down.get('devices'),
+                   'failed_devices_down': dev_down.get('failed_devices')}
+        return res
+
     def tunnel_sync(self, context, tunnel_ip, tunnel_type=None, host=None):
         try:
             cctxt = self.client.prepare(version='1.4')
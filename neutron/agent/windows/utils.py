@@ -77,3 +77,11 @@ def execute(cmd, process_input=None, addl_env=None,
         greenthread.sleep(0)
 
     return (_stdout, _stderr) if return_stderr else _stdout
+
+
+def execute_reusing_client(cmds, check_exit_code=True,
+                           log_fail_as_error=True, run_as_root=False):
+    return [execute(cmd, check_exit_code=check_exit_code,
+                    log_fail_as_error=log_fail_as_error,
+                    run_as_root=run_as_root)
+            for cmd in cmds]
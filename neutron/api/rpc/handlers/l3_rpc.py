@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
+
 from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging
@@ -42,7 +44,8 @@ class L3RpcCallback(object):
     # 1.4 Added L3 HA update_router_state. This method was later removed,
     #     since it was unused. The RPC version was not changed
     # 1.5 Added update_ha_routers_states
-    target = oslo_messaging.Target(version='1.5')
+    # 1.6 Added sync_routers_delta
+    target = oslo_messaging.Target(version='1.6')
 
     @property
     def plugin(self):
@@ -89,6 +92,44 @@ class L3RpcCallback(object):
                                               routers, indent=5))
         return routers
 
+    @staticmethod
+    def _get_router_revision(router):
+        """Return the revision of the data of a router.
+
+        It is a digest of the router data, which changes with the router
+        but also with its interfaces, floating IPs and subnets.
+        """
+        data = jsonutils.dumps(router, sort_keys=True)
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def sync_routers_delta(self, context, **kwargs):
+        """Sync the routers of an agent which changed since its last sync.
+
+        @param context: contain user information
+        @param kwargs: host, router_ids, revisions, the revision of each
+                       router known by the agent
+        @return: a dict with routers, the list of routers with their
+                 revision which are not known by the agent with the same
+                 revision, and deleted, the IDs of the routers of the
+                 revisions which are not hosted by the agent anymore
+        """
+        revisions = kwargs.get('revisions') or {}
+        routers = self.sync_routers(context, host=kwargs.get('host'),
+                                    router_ids=kwargs.get('router_ids'))
+        changed = []
+        for router in routers:
+            router['revision'] = self._get_router_revision(router)
+            if revisions.get(router['id']) != router['revision']:
+                changed.append(router)
+        router_ids = set(router['id'] for router in routers)
+        deleted = [router_id for router_id in revisions
+                   if router_id not in router_ids]
+        LOG.debug("Routers changed since the last sync of l3 agent "
+                  "%(host)s: %(changed)d of %(count)d, %(deleted)d deleted",
+                  {'host': kwargs.get('host'), 'changed': len(changed),
+                   'count': len(routers), 'deleted': len(deleted)})
+        return {'routers': changed, 'deleted': deleted}
+
     def _ensure_host_set_on_ports(self, context, host, routers):
         for router in routers:
             LOG.debug("Checking router: %(id)s for host: %(host)s",
@@ -71,6 +71,15 @@ core_opts = [
                help=_("Maximum number of host routes per subnet")),
     cfg.IntOpt('max_fixed_ips_per_port', default=5,
                help=_("Maximum number of fixed ips per port")),
+    cfg.StrOpt('ip_allocation_backend', default='availability_range',
+               choices=['availability_range', 'interval'],
+               help=_("How IP addresses are allocated from subnets. "
+                      "'availability_range' locks and updates the "
+                      "availability ranges of a subnet for each allocation. "
+                      "'interval' picks a random free address from ranges "
+                      "kept in memory and claims it with an insert, without "
+                      "locking, which scales better with concurrent port "
+                      "creation on large subnets.")),
     cfg.StrOpt('default_ipv4_subnet_pool', default=None,
                help=_("Default IPv4 subnet-pool to be used for automatic "
                       "subnet CIDR allocation")),
@@ -407,6 +407,16 @@ def ip_version_from_int(ip_version_int):
     raise ValueError(_('Illegal IP version number'))
 
 
+def chunks(items, size):
+    """Split a sequence into lists of at most size items.
+
+    Useful to keep the IN clauses of queries on many rows to a bounded
+    number of bind parameters.
+    """
+    items = list(items)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
 class DelayedStringRenderer(object):
     """Takes a callable and its args and calls when __str__ is called
 
@@ -13,6 +13,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+import hashlib
+
 from eventlet import greenthread
 from oslo_config import cfg
 from oslo_db import exception as db_exc
@@ -26,11 +29,14 @@ from sqlalchemy import sql
 
 from neutron.api.v2 import attributes
 from neutron.common import constants
+from neutron.common import utils
+from neutron import context as n_ctx
 from neutron.db import model_base
 from neutron.db import models_v2
 from neutron.extensions import agent as ext_agent
 from neutron.i18n import _LE, _LW
 from neutron import manager
+from neutron.openstack.common import loopingcall
 
 LOG = logging.getLogger(__name__)
 
@@ -56,6 +62,15 @@ AGENT_OPTS = [
                       'dhcp_load_type can be configured to represent the '
                       'choice for the resource being balanced. '
                       'Example: dhcp_load_type=networks')),
+    cfg.IntOpt('agent_heartbeat_flush_interval', default=0,
+               help=_('Seconds during which the heartbeats of agents whose '
+                      'configuration did not change are kept in memory by '
+                      'each server worker, before being written to the '
+                      'database in a single statement. Agents are then '
+                      'regarded as down agent_down_time plus this interval '
+                      'after their last heartbeat, so it should be small '
+                      'compared to agent_down_time. 0 writes each '
+                      'heartbeat when it is received.')),
 ]
 cfg.CONF.register_opts(AGENT_OPTS)
 
@@ -96,9 +111,123 @@ class Agent(model_base.BASEV2, models_v2.HasId):
         return not AgentDbMixin.is_agent_down(self.heartbeat_timestamp)
 
 
+class HeartbeatAggregator(object):
+    """Write-behind buffer of the heartbeats of the agents.
+
+    A report is only absorbed when it is a plain heartbeat: the agent row
+    was written by this worker with the same configurations less than
+    agent_down_time ago, and the agent is not starting. Other reports are
+    written to the database as they are received, and recorded here.
+
+    The absorbed heartbeats are flushed every flush_interval seconds with a
+    single UPDATE, which never moves a heartbeat timestamp backwards when
+    another worker wrote a more recent one.
+    """
+
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+        # (agent_type, host) -> (agent id, configurations hash, expiry time)
+        self._agents = {}
+        # agent id -> heartbeat time
+        self._heartbeats = {}
+        self._loop = None
+
+    @staticmethod
+    def _get_key(agent_state):
+        return agent_state['agent_type'], agent_state['host']
+
+    @staticmethod
+    def _get_configurations_hash(agent_state):
+        data = jsonutils.dumps(agent_state.get('configurations', {}),
+                               sort_keys=True)
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def record(self, agent_state, agent_id, current_time):
+        """Record an agent state written to the database."""
+        expiry = current_time + datetime.timedelta(
+            seconds=cfg.CONF.agent_down_time)
+        self._agents[self._get_key(agent_state)] = (
+            agent_id, self._get_configurations_hash(agent_state), expiry)
+
+    def forget(self, agent_id):
+        for key, (cached_id, config_hash, expiry) in list(
+                self._agents.items()):
+            if cached_id == agent_id:
+                del self._agents[key]
+        self._heartbeats.pop(agent_id, None)
+
+    def absorb(self, agent_state, current_time):
+        """Buffer the report if it is a plain heartbeat.
+
+        :returns: False if the report must be written to the database.
+        """
+        if agent_state.get('start_flag'):
+            return False
+        cached = self._agents.get(self._get_key(agent_state))
+        if not cached:
+            return False
+        agent_id, config_hash, expiry = cached
+        if (expiry < current_time or
+                config_hash != self._get_configurations_hash(agent_state)):
+            return False
+        self._heartbeats[agent_id] = current_time
+        if not self._loop:
+            self._loop = loopingcall.FixedIntervalLoopingCall(self.flush)
+            self._loop.start(interval=self.flush_interval,
+                             initial_delay=self.flush_interval)
+        return True
+
+    def flush(self):
+        heartbeats, self._heartbeats = self._heartbeats, {}
+        if not heartbeats:
+            return
+        context = n_ctx.get_admin_context()
+        deleted_ids = set()
+        try:
+            with context.session.begin(subtransactions=True):
+                for agent_ids in utils.chunks(list(heartbeats), 500):
+                    timestamp = sa.case(
+                        [(sa.and_(Agent.id == agent_id,
+                                  Agent.heartbeat_timestamp <
+                                  heartbeats[agent_id]),
+                          heartbeats[agent_id])
+                         for agent_id in agent_ids],
+                        else_=Agent.heartbeat_timestamp)
+                    query = context.session.query(Agent).filter(
+                        Agent.id.in_(agent_ids))
+                    count = query.update({'heartbeat_timestamp': timestamp},
+                                         synchronize_session=False)
+                    if count < len(agent_ids):
+                        # Agents deleted by another server worker
+                        existing_ids = set(
+                            row.id for row in context.session.query(
+                                Agent.id).filter(Agent.id.in_(agent_ids)))
+                        deleted_ids.update(set(agent_ids) - existing_ids)
+        except Exception:
+            LOG.exception(_LE("Failed to write the heartbeats of %d agents"),
+                          len(heartbeats))
+            # Retry on the next flush, unless more recent ones came in
+            for agent_id, heartbeat in heartbeats.items():
+                self._heartbeats.setdefault(agent_id, heartbeat)
+            return
+        # Their next report recreates them
+        for agent_id in deleted_ids:
+            self.forget(agent_id)
+
+
 class AgentDbMixin(ext_agent.AgentPluginBase):
     """Mixin class to add agent extension to db_base_plugin_v2."""
 
+    _heartbeat_aggregator = None
+
+    def _get_heartbeat_aggregator(self):
+        if not cfg.CONF.agent_heartbeat_flush_interval:
+            return
+        if not self._heartbeat_aggregator:
+            self._heartbeat_aggregator = HeartbeatAggregator(
+                cfg.CONF.agent_heartbeat_flush_interval)
+        return self._heartbeat_aggregator
+
     def _get_agent(self, context, id):
         try:
             agent = self._get_by_id(context, Agent, id)
@@ -125,8 +254,11 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
 
     @classmethod
     def is_agent_down(cls, heart_beat_time):
-        return timeutils.is_older_than(heart_beat_time,
-                                       cfg.CONF.agent_down_time)
+        # Heartbeats may be waiting in the memory of a server worker for up
+        # to agent_heartbeat_flush_interval seconds
+        return timeutils.is_older_than(
+            heart_beat_time, cfg.CONF.agent_down_time +
+            cfg.CONF.agent_heartbeat_flush_interval)
 
     def get_configuration_dict(self, agent_db):
         try:
@@ -163,6 +295,8 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
         with context.session.begin(subtransactions=True):
             agent = self._get_agent(context, id)
             context.session.delete(agent)
+        if self._heartbeat_aggregator:
+            self._heartbeat_aggregator.forget(id)
 
     def update_agent(self, context, id, agent):
         agent_data = agent['agent']
@@ -230,10 +364,22 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
                 greenthread.sleep(0)
                 context.session.add(agent_db)
             greenthread.sleep(0)
+        return agent_db
 
     def create_or_update_agent(self, context, agent):
         """Create or update agent according to report."""
 
+        aggregator = self._get_heartbeat_aggregator()
+        if aggregator:
+            current_time = timeutils.utcnow()
+            if aggregator.absorb(agent, current_time):
+                return
+            agent_db = self._create_or_update_agent_with_retry(context, agent)
+            aggregator.record(agent, agent_db.id, current_time)
+            return agent_db
+        return self._create_or_update_agent_with_retry(context, agent)
+
+    def _create_or_update_agent_with_retry(self, context, agent):
         try:
             return self._create_or_update_agent(context, agent)
         except db_exc.DBDuplicateEntry:
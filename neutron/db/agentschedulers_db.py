@@ -147,8 +147,10 @@ class AgentSchedulerDbMixin(agents_db.AgentDbMixin):
         self._clock_jump_canary = timeutils.utcnow()
 
     def get_cutoff_time(self, agent_dead_limit):
+        # Heartbeats may be waiting in the memory of a server worker for up
+        # to agent_heartbeat_flush_interval seconds
         cutoff = timeutils.utcnow() - datetime.timedelta(
-            seconds=agent_dead_limit)
+            seconds=agent_dead_limit + cfg.CONF.agent_heartbeat_flush_interval)
         return cutoff
 
 
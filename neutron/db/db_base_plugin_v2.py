@@ -33,10 +33,12 @@ from neutron import context as ctx
 from neutron.db import api as db_api
 from neutron.db import common_db_mixin
 from neutron.db import models_v2
+from neutron.db import quota_usage
 from neutron.db import sqlalchemyutils
 from neutron.extensions import l3
 from neutron.i18n import _LE, _LI
 from neutron import ipam
+from neutron.ipam import interval_allocator
 from neutron.ipam import subnet_alloc
 from neutron import manager
 from neutron import neutron_plugin_base_v2
@@ -46,6 +48,8 @@ from neutron.plugins.common import constants as service_constants
 
 LOG = logging.getLogger(__name__)
 
+IP_ALLOCATION_INTERVAL = 'interval'
+
 # Ports with the following 'device_owner' values will not prevent
 # network deletion.  If delete_network() finds that all ports on a
 # network have these owners, it will explicitly delete each port
@@ -170,6 +174,10 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                    'network_id': network_id,
                    'subnet_id': subnet_id,
                    'port_id': port_id})
+        if (cfg.CONF.ip_allocation_backend == IP_ALLOCATION_INTERVAL and
+            interval_allocator.get_allocator().store_allocation(
+                context, ip_address, subnet_id, port_id)):
+            return
         allocated = models_v2.IPAllocation(
             network_id=network_id,
             port_id=port_id,
@@ -180,6 +188,13 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
 
     @staticmethod
     def _generate_ip(context, subnets):
+        if cfg.CONF.ip_allocation_backend == IP_ALLOCATION_INTERVAL:
+            result = interval_allocator.get_allocator().generate_ip(context,
+                                                                    subnets)
+            if not result:
+                raise n_exc.IpAddressGenerationFailure(
+                    net_id=subnets[0]['network_id'])
+            return result
         try:
             return NeutronDbPluginV2._try_generate_ip(context, subnets)
         except n_exc.IpAddressGenerationFailure:
@@ -280,6 +295,10 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
     @staticmethod
     def _allocate_specific_ip(context, subnet_id, ip_address):
         """Allocate a specific IP address on the subnet."""
+        if cfg.CONF.ip_allocation_backend == IP_ALLOCATION_INTERVAL:
+            # The IPAllocation primary key guards against duplicates and
+            # availability ranges are not used by the interval allocator.
+            return
         ip = int(netaddr.IPAddress(ip_address))
         range_qry = context.session.query(
             models_v2.IPAvailabilityRange).join(
@@ -985,10 +1004,10 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         with context.session.begin(subtransactions=True):
             network = self._get_network(context, id)
 
-            context.session.query(models_v2.Port).filter_by(
+            query = context.session.query(models_v2.Port).filter_by(
                 network_id=id).filter(
-                models_v2.Port.device_owner.
-                in_(AUTO_DELETE_PORT_OWNERS)).delete(synchronize_session=False)
+                models_v2.Port.device_owner.in_(AUTO_DELETE_PORT_OWNERS))
+            quota_usage.bulk_delete(query, 'port', synchronize_session=False)
 
             port_in_use = context.session.query(models_v2.Port).filter_by(
                 network_id=id).first()
@@ -1919,7 +1938,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                  enable_eagerloads(False).filter_by(id=id))
         if not context.is_admin:
             query = query.filter_by(tenant_id=context.tenant_id)
-        query.delete()
+        quota_usage.bulk_delete(query, 'port')
 
     def get_port(self, context, id, fields=None):
         port = self._get_port(context, id)
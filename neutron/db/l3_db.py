@@ -51,6 +51,8 @@ EXTERNAL_GW_INFO = l3.EXTERNAL_GW_INFO
 # API parameter name and Database column names may differ.
 # Useful to keep the filtering between API and Database.
 API_TO_DB_COLUMN_MAP = {'port_id': 'fixed_port_id'}
+# Maximum number of IDs in the IN clauses of the sync data queries
+SYNC_DATA_CHUNK_SIZE = 500
 CORE_ROUTER_ATTRS = ('id', 'name', 'tenant_id', 'admin_state_up', 'status')
 
 
@@ -1109,12 +1111,20 @@ class L3_NAT_dbonly_mixin(l3.RouterPluginBase):
                            if it is None, all of routers will be queried.
         @return: a list of dicted routers with dicted gw_port populated if any
         """
-        filters = {'id': router_ids} if router_ids else {}
+        filters = {}
         if active is not None:
             filters['admin_state_up'] = [active]
-        router_dicts = self._get_collection(
-            context, Router, self._make_router_dict_with_gw_port,
-            filters=filters)
+        if router_ids:
+            router_dicts = []
+            for chunk in utils.chunks(router_ids, SYNC_DATA_CHUNK_SIZE):
+                filters['id'] = chunk
+                router_dicts.extend(self._get_collection(
+                    context, Router, self._make_router_dict_with_gw_port,
+                    filters=filters))
+        else:
+            router_dicts = self._get_collection(
+                context, Router, self._make_router_dict_with_gw_port,
+                filters=filters)
         if not router_dicts:
             return []
         gw_ports = dict((r['gw_port']['id'], r['gw_port'])
@@ -1126,21 +1136,26 @@ class L3_NAT_dbonly_mixin(l3.RouterPluginBase):
         """Query floating_ips that relate to list of router_ids."""
         if not router_ids:
             return []
-        return self.get_floatingips(context, {'router_id': router_ids})
+        floating_ips = []
+        for chunk in utils.chunks(router_ids, SYNC_DATA_CHUNK_SIZE):
+            floating_ips.extend(
+                self.get_floatingips(context, {'router_id': chunk}))
+        return floating_ips
 
     def _get_sync_interfaces(self, context, router_ids, device_owners=None):
         """Query router interfaces that relate to list of router_ids."""
         device_owners = device_owners or [DEVICE_OWNER_ROUTER_INTF]
         if not router_ids:
             return []
-        qry = context.session.query(RouterPort)
-        qry = qry.filter(
-            Router.id.in_(router_ids),
-            RouterPort.port_type.in_(device_owners)
-        )
-
-        interfaces = [self._core_plugin._make_port_dict(rp.port, None)
-                      for rp in qry]
+        interfaces = []
+        for chunk in utils.chunks(router_ids, SYNC_DATA_CHUNK_SIZE):
+            qry = context.session.query(RouterPort)
+            qry = qry.filter(
+                RouterPort.router_id.in_(chunk),
+                RouterPort.port_type.in_(device_owners)
+            )
+            interfaces.extend(self._core_plugin._make_port_dict(rp.port, None)
+                              for rp in qry)
         return interfaces
 
     def _populate_subnets_for_ports(self, context, ports):
@@ -1165,13 +1180,22 @@ class L3_NAT_dbonly_mixin(l3.RouterPluginBase):
 
         network_ids = set(p['network_id']
                           for p in each_port_having_fixed_ips())
-        filters = {'network_id': [id for id in network_ids]}
-        fields = ['id', 'cidr', 'gateway_ip',
-                  'network_id', 'ipv6_ra_mode']
 
+        # Only the columns needed are queried, instead of loading the subnets
+        # with their allocation pools, DNS servers and host routes.
         subnets_by_network = dict((id, []) for id in network_ids)
-        for subnet in self._core_plugin.get_subnets(context, filters, fields):
-            subnets_by_network[subnet['network_id']].append(subnet)
+        for chunk in utils.chunks(network_ids, SYNC_DATA_CHUNK_SIZE):
+            qry = context.session.query(
+                models_v2.Subnet.id, models_v2.Subnet.cidr,
+                models_v2.Subnet.gateway_ip, models_v2.Subnet.network_id,
+                models_v2.Subnet.ipv6_ra_mode)
+            qry = qry.filter(models_v2.Subnet.network_id.in_(chunk))
+            for subnet in qry:
+                subnets_by_network[subnet.network_id].append(
+                    {'id': subnet.id,
+                     'cidr': subnet.cidr,
+                     'gateway_ip': subnet.gateway_ip,
+                     'ipv6_ra_mode': subnet.ipv6_ra_mode})
 
         for port in each_port_having_fixed_ips():
 
@@ -1182,10 +1206,7 @@ class L3_NAT_dbonly_mixin(l3.RouterPluginBase):
                 # in the port's fixed_ips), then add this subnet to the
                 # port's subnets list, and populate the fixed_ips entry
                 # entry with the subnet's prefix length.
-                subnet_info = {'id': subnet['id'],
-                               'cidr': subnet['cidr'],
-                               'gateway_ip': subnet['gateway_ip'],
-                               'ipv6_ra_mode': subnet['ipv6_ra_mode']}
+                subnet_info = dict(subnet)
                 for fixed_ip in port['fixed_ips']:
                     if fixed_ip['subnet_id'] == subnet['id']:
                         port['subnets'].append(subnet_info)
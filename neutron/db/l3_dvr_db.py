@@ -16,6 +16,7 @@ import collections
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import excutils
+from sqlalchemy import orm
 
 from neutron.api.v2 import attributes
 from neutron.callbacks import events
@@ -354,15 +355,16 @@ class L3_NAT_with_dvr_db_mixin(l3_db.L3_NAT_db_mixin,
         """Query router interfaces that relate to list of router_ids."""
         if not router_ids:
             return []
-        qry = context.session.query(l3_db.RouterPort)
-        qry = qry.filter(
-            l3_db.RouterPort.router_id.in_(router_ids),
-            l3_db.RouterPort.port_type == DEVICE_OWNER_DVR_SNAT
-        )
         interfaces = collections.defaultdict(list)
-        for rp in qry:
-            interfaces[rp.router_id].append(
-                self._core_plugin._make_port_dict(rp.port, None))
+        for chunk in n_utils.chunks(router_ids, l3_db.SYNC_DATA_CHUNK_SIZE):
+            qry = context.session.query(l3_db.RouterPort)
+            qry = qry.filter(
+                l3_db.RouterPort.router_id.in_(chunk),
+                l3_db.RouterPort.port_type == DEVICE_OWNER_DVR_SNAT
+            )
+            for rp in qry:
+                interfaces[rp.router_id].append(
+                    self._core_plugin._make_port_dict(rp.port, None))
         LOG.debug("Return the SNAT ports: %s", interfaces)
         return interfaces
 
@@ -372,9 +374,12 @@ class L3_NAT_with_dvr_db_mixin(l3_db.L3_NAT_db_mixin,
             return []
         router_ids = [r['id'] for r in routers]
         snat_binding = l3_dvrsched_db.CentralizedSnatL3AgentBinding
-        query = (context.session.query(snat_binding).
-                 filter(snat_binding.router_id.in_(router_ids))).all()
-        bindings = dict((b.router_id, b) for b in query)
+        bindings = {}
+        for chunk in n_utils.chunks(router_ids, l3_db.SYNC_DATA_CHUNK_SIZE):
+            query = (context.session.query(snat_binding).
+                     options(orm.joinedload('l3_agent')).
+                     filter(snat_binding.router_id.in_(chunk)))
+            bindings.update((b.router_id, b) for b in query)
 
         for rtr in routers:
             gw_port_id = rtr['gw_port_id']
@@ -25,6 +25,7 @@ from neutron.api.v2 import attributes
 from neutron.common import constants
 from neutron.common import utils as n_utils
 from neutron.db import agents_db
+from neutron.db import l3_db
 from neutron.db import l3_dvr_db
 from neutron.db import model_base
 from neutron.db import models_v2
@@ -423,10 +424,13 @@ class L3_HA_NAT_db_mixin(l3_dvr_db.L3_NAT_with_dvr_db_mixin):
                     context, ha_network, router_db.extra_attributes.ha_vr_id)
                 self._delete_ha_interfaces(context, router_db.id)
 
-    def get_ha_router_port_bindings(self, context, router_ids, host=None):
+    def get_ha_router_port_bindings(self, context, router_ids, host=None,
+                                    load_ports=False):
         if not router_ids:
             return []
         query = context.session.query(L3HARouterAgentPortBinding)
+        if load_ports:
+            query = query.options(orm.joinedload('port'))
 
         if host:
             query = query.join(agents_db.Agent).filter(
@@ -446,20 +450,20 @@ class L3_HA_NAT_db_mixin(l3_dvr_db.L3_NAT_with_dvr_db_mixin):
     def _process_sync_ha_data(self, context, routers, host):
         routers_dict = dict((router['id'], router) for router in routers)
 
-        bindings = self.get_ha_router_port_bindings(context,
-                                                    routers_dict.keys(),
-                                                    host)
-        for binding in bindings:
-            port_dict = self._core_plugin._make_port_dict(binding.port)
+        interfaces = []
+        for chunk in n_utils.chunks(routers_dict.keys(),
+                                    l3_db.SYNC_DATA_CHUNK_SIZE):
+            bindings = self.get_ha_router_port_bindings(context, chunk, host,
+                                                        load_ports=True)
+            for binding in bindings:
+                port_dict = self._core_plugin._make_port_dict(binding.port)
 
-            router = routers_dict.get(binding.router_id)
-            router[constants.HA_INTERFACE_KEY] = port_dict
-            router[constants.HA_ROUTER_STATE_KEY] = binding.state
+                router = routers_dict.get(binding.router_id)
+                router[constants.HA_INTERFACE_KEY] = port_dict
+                router[constants.HA_ROUTER_STATE_KEY] = binding.state
+                interfaces.append(port_dict)
 
-        for router in routers_dict.values():
-            interface = router.get(constants.HA_INTERFACE_KEY)
-            if interface:
-                self._populate_subnets_for_ports(context, [interface])
+        self._populate_subnets_for_ports(context, interfaces)
 
         return routers_dict.values()
 
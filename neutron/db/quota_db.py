@@ -13,11 +13,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+
+from oslo_config import cfg
+from oslo_db import exception as db_exc
+from oslo_utils import timeutils
 import sqlalchemy as sa
 
 from neutron.common import exceptions
 from neutron.db import model_base
 from neutron.db import models_v2
+from neutron.db import quota_usage
 
 
 class Quota(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
@@ -161,3 +167,54 @@ class DbQuotaDriver(object):
                  if quotas[key] >= 0 and quotas[key] < val]
         if overs:
             raise exceptions.OverQuota(overs=sorted(overs))
+
+
+class TrackingDbQuotaDriver(DbQuotaDriver):
+    """Quota driver which tracks resource usage in the database.
+
+    Instead of counting the resources of a tenant on each create request,
+    the usage of the tracked resources is read from the quotausages table.
+    """
+
+    def count_usage(self, context, resource, plugin, resources, tenant_id):
+        """Return the number of instances of resource owned by tenant_id.
+
+        :param context: The request context, for access checks.
+        :param resource: The registered resource to count.
+        :param plugin: The plugin which manages the resource.
+        :param resources: The collection name of the resource.
+        :param tenant_id: The ID of the tenant to count the resource of.
+        """
+        if resource.name not in quota_usage.TRACKED_RESOURCES:
+            return resource.count(context, plugin, resources, tenant_id)
+
+        usage = context.session.query(quota_usage.QuotaUsage).filter_by(
+            tenant_id=tenant_id, resource=resource.name).first()
+        resync_interval = datetime.timedelta(
+            seconds=cfg.CONF.QUOTAS.quota_usage_resync_interval)
+        if usage and usage.synced_at + resync_interval > timeutils.utcnow():
+            return usage.in_use
+        return self._resync_usage(context, resource, plugin, resources,
+                                  tenant_id)
+
+    @staticmethod
+    def _resync_usage(context, resource, plugin, resources, tenant_id):
+        # NOTE: a resource created or deleted between the count and the
+        # write below may be missed; the next resync corrects the drift.
+        in_use = resource.count(context, plugin, resources, tenant_id)
+        values = {'in_use': in_use, 'synced_at': timeutils.utcnow()}
+        try:
+            with context.session.begin(subtransactions=True):
+                usage = context.session.query(
+                    quota_usage.QuotaUsage).filter_by(
+                        tenant_id=tenant_id, resource=resource.name).first()
+                if usage:
+                    usage.update(values)
+                else:
+                    context.session.add(quota_usage.QuotaUsage(
+                        tenant_id=tenant_id, resource=resource.name,
+                        **values))
+        except db_exc.DBDuplicateEntry:
+            # Another request created the usage row concurrently.
+            pass
+        return in_use
@@ -0,0 +1,108 @@
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import datetime
+
+from oslo_config import cfg
+import sqlalchemy as sa
+from sqlalchemy import event
+
+from neutron.db import model_base
+from neutron.db import models_v2
+from neutron import quota
+
+# Resources whose usage can be tracked in the quotausages table, along with
+# the model whose rows make up the usage of the resource.
+TRACKED_RESOURCES = {
+    'network': models_v2.Network,
+    'subnet': models_v2.Subnet,
+    'port': models_v2.Port,
+}
+
+
+class QuotaUsage(model_base.BASEV2):
+    """Represent the number of instances of a resource a tenant owns.
+
+    Rows are created the first time the usage is counted, kept up to date
+    in the same transaction that creates or deletes a tracked resource and
+    recounted once they are older than quota_usage_resync_interval.
+    """
+    tenant_id = sa.Column(sa.String(255), primary_key=True)
+    resource = sa.Column(sa.String(255), primary_key=True)
+    in_use = sa.Column(sa.Integer, nullable=False, server_default='0')
+    synced_at = sa.Column(sa.DateTime, nullable=False)
+
+
+def is_usage_tracked():
+    return cfg.CONF.QUOTAS.quota_driver == quota.QUOTA_TRACKING_DB_DRIVER
+
+
+def _update_usage(connection, resource, tenant_id, values):
+    usages = QuotaUsage.__table__
+    connection.execute(
+        usages.update().
+        where(usages.c.tenant_id == tenant_id).
+        where(usages.c.resource == resource).
+        values(**values))
+
+
+def _usage_updater(resource, delta):
+    def _update(mapper, connection, target):
+        if not target.tenant_id or not is_usage_tracked():
+            return
+        # Runs within the flush which inserts or deletes the resource, so
+        # the usage is updated in the same transaction. Rows which were not
+        # counted yet are left alone, the first count will create them.
+        _update_usage(connection, resource, target.tenant_id,
+                      {'in_use': QuotaUsage.__table__.c.in_use + delta})
+    return _update
+
+
+def bulk_delete(query, resource, **kwargs):
+    """Delete the rows of a tracked resource selected by query.
+
+    Query.delete() does not fire the mapper events which keep the usage up
+    to date, so the usage of the tenants owning the deleted rows is updated
+    here, in the transaction of the delete.
+
+    :param query: query selecting the rows to delete.
+    :param resource: name of the tracked resource the rows make up.
+    :param kwargs: passed to Query.delete().
+    :returns: the number of deleted rows.
+    """
+    if not is_usage_tracked():
+        return query.delete(**kwargs)
+
+    model = TRACKED_RESOURCES[resource]
+    tenants = collections.Counter(
+        tenant_id for tenant_id, in query.with_entities(model.tenant_id))
+    count = query.delete(**kwargs)
+    connection = query.session.connection()
+    for tenant_id, deleted in tenants.items():
+        if not tenant_id:
+            continue
+        if count == sum(tenants.values()):
+            values = {'in_use': QuotaUsage.__table__.c.in_use - deleted}
+        else:
+            # Rows changed since they were selected, recount on next use
+            values = {'synced_at': datetime.datetime(1970, 1, 1)}
+        _update_usage(connection, resource, tenant_id, values)
+    return count
+
+
+for _resource, _model in TRACKED_RESOURCES.items():
+    event.listen(_model, 'after_insert', _usage_updater(_resource, 1))
+    event.listen(_model, 'after_delete', _usage_updater(_resource, -1))
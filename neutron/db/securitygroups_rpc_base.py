@@ -34,6 +34,10 @@ DIRECTION_IP_PREFIX = {'ingress': 'source_ip_prefix',
 
 DHCP_RULE_PORT = {4: (67, 68, q_const.IPv4), 6: (547, 546, q_const.IPv6)}
 
+RULE_FIELDS = ('security_group_id', 'remote_group_id', 'direction',
+               'ethertype', 'protocol', 'port_range_min', 'port_range_max',
+               'remote_ip_prefix')
+
 
 class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
     """Mixin class to add agent-based security group implementation."""
@@ -174,7 +178,7 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         sg_info = {'devices': ports,
                    'security_groups': {},
                    'sg_member_ips': {}}
-        rules_in_db = self._select_rules_for_ports(context, ports)
+        rules_in_db = self._get_rules_for_ports(context, ports)
         remote_security_group_info = {}
         for (port_id, rule_in_db) in rules_in_db:
             remote_gid = rule_in_db.get('remote_group_id')
@@ -248,6 +252,37 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         query = query.filter(sg_binding_port.in_(ports.keys()))
         return query.all()
 
+    def _get_rules_for_ports(self, context, ports):
+        """Return (port_id, rule) pairs of the rules applied to ports.
+
+        Unlike _select_rules_for_ports, the rules of a security group are
+        read once however many of the ports are bound to it.
+        """
+        if not ports:
+            return []
+        sg_binding_port = sg_db.SecurityGroupPortBinding.port_id
+        sg_binding_sgid = sg_db.SecurityGroupPortBinding.security_group_id
+
+        query = context.session.query(sg_binding_port, sg_binding_sgid)
+        query = query.filter(sg_binding_port.in_(ports.keys()))
+        bindings = query.all()
+        rules = self._select_rules_for_security_groups(
+            context, set(sg_id for _port_id, sg_id in bindings))
+        return [(port_id, rule) for port_id, sg_id in bindings
+                for rule in rules[sg_id]]
+
+    def _select_rules_for_security_groups(self, context, sg_ids):
+        rules_by_group = dict((sg_id, []) for sg_id in sg_ids)
+        if not sg_ids:
+            return rules_by_group
+        sgr_sgid = sg_db.SecurityGroupRule.security_group_id
+        query = context.session.query(sg_db.SecurityGroupRule)
+        query = query.filter(sgr_sgid.in_(sg_ids))
+        for rule in query:
+            rules_by_group[rule['security_group_id']].append(
+                dict((key, rule[key]) for key in RULE_FIELDS))
+        return rules_by_group
+
     def _select_ips_for_remote_group(self, context, remote_group_ids):
         ips_by_group = {}
         if not remote_group_ids:
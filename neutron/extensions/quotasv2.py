@@ -121,7 +121,8 @@ class Quotasv2(extensions.ExtensionDescriptor):
     @classmethod
     def get_description(cls):
         description = 'Expose functions for quotas management'
-        if cfg.CONF.QUOTAS.quota_driver == DB_QUOTA_DRIVER:
+        if cfg.CONF.QUOTAS.quota_driver in (DB_QUOTA_DRIVER,
+                                            quota.QUOTA_TRACKING_DB_DRIVER):
             description += ' per tenant'
         return description
 
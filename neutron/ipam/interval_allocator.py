@@ -0,0 +1,240 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""IP address allocation without availability range locking.
+
+The availability range allocator locks the IPAvailabilityRange rows of a
+subnet with SELECT ... FOR UPDATE and rewrites one of them for every address
+it hands out, which serializes all port creations on a subnet.
+
+This allocator instead keeps the free addresses of each subnet in memory as
+a list of disjoint intervals, computed from the allocation pools and the
+IPAllocation table. It picks a random free address and claims it by
+inserting its IPAllocation row: the primary key of that table makes the
+insert fail when another server claimed the address first, in which case
+another candidate is tried. Addresses released by other servers are picked
+up when the intervals of the subnet are reloaded, which happens when they
+run out or when claims keep conflicting.
+"""
+
+import bisect
+import random
+
+import netaddr
+from oslo_db import exception as db_exc
+from oslo_log import log as logging
+
+from neutron.db import models_v2
+
+LOG = logging.getLogger(__name__)
+
+# Consecutive claim conflicts after which the cached free intervals of a
+# subnet are considered stale and reloaded from the database.
+MAX_CLAIM_CONFLICTS = 5
+
+# Key of the claimed allocations in the session info dict.
+CLAIMS_KEY = 'ip_allocation_claims'
+
+
+class FreeIntervals(object):
+    """Sorted, disjoint [first, last] intervals of free integer addresses."""
+
+    def __init__(self, intervals=()):
+        self._firsts = []
+        self._lasts = []
+        for first, last in sorted(intervals):
+            self._firsts.append(first)
+            self._lasts.append(last)
+        self._update_offsets()
+
+    @classmethod
+    def from_pools(cls, pools, allocated):
+        """Build the intervals of the pools minus the allocated addresses.
+
+        :param pools: iterable of (first, last) integer address ranges.
+        :param allocated: iterable of integer addresses.
+        """
+        allocated = sorted(allocated)
+        intervals = []
+        for first, last in sorted(pools):
+            index = bisect.bisect_left(allocated, first)
+            while index < len(allocated) and allocated[index] <= last:
+                ip = allocated[index]
+                if ip > first:
+                    intervals.append((first, ip - 1))
+                first = max(first, ip + 1)
+                index += 1
+            if first <= last:
+                intervals.append((first, last))
+        return cls(intervals)
+
+    def _update_offsets(self):
+        # Index of the first address of each interval among all the free
+        # addresses, used to map a random index to an address.
+        self._offsets = []
+        self.size = 0
+        for first, last in zip(self._firsts, self._lasts):
+            self._offsets.append(self.size)
+            self.size += last - first + 1
+
+    def _find(self, ip):
+        index = bisect.bisect_right(self._firsts, ip) - 1
+        if index >= 0 and ip <= self._lasts[index]:
+            return index
+
+    def __contains__(self, ip):
+        return self._find(ip) is not None
+
+    @property
+    def intervals(self):
+        return list(zip(self._firsts, self._lasts))
+
+    def nth(self, index):
+        """Return the index-th free address in ascending order."""
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        interval = bisect.bisect_right(self._offsets, index) - 1
+        return self._firsts[interval] + index - self._offsets[interval]
+
+    def remove(self, ip):
+        interval = self._find(ip)
+        if interval is None:
+            return
+        first = self._firsts[interval]
+        last = self._lasts[interval]
+        if first == last:
+            del self._firsts[interval]
+            del self._lasts[interval]
+        elif ip == first:
+            self._firsts[interval] = ip + 1
+        elif ip == last:
+            self._lasts[interval] = ip - 1
+        else:
+            self._lasts[interval] = ip - 1
+            self._firsts.insert(interval + 1, ip + 1)
+            self._lasts.insert(interval + 1, last)
+        self._update_offsets()
+
+
+class IntervalIpAllocator(object):
+    """Allocates subnet addresses by claiming them in the IPAllocation table.
+
+    A claimed address has an IPAllocation row without a port in the current
+    transaction; store_allocation() binds it to its port.
+    """
+
+    def __init__(self):
+        # subnet id -> (allocation pools, FreeIntervals)
+        self._free = {}
+
+    def generate_ip(self, context, subnets):
+        """Claim an address from the first subnet which has one free.
+
+        :returns: dict with the ip_address and subnet_id allocated, or None
+        if all the subnets are full.
+        """
+        for subnet in subnets:
+            ip_address = self._allocate_from_subnet(context, subnet)
+            if ip_address:
+                return {'ip_address': ip_address,
+                        'subnet_id': subnet['id']}
+            LOG.debug("All IPs from subnet %(subnet_id)s (%(cidr)s) "
+                      "allocated",
+                      {'subnet_id': subnet['id'],
+                       'cidr': subnet['cidr']})
+
+    def store_allocation(self, context, ip_address, subnet_id, port_id):
+        """Bind a claimed address to its port.
+
+        :returns: False if the address was not claimed by generate_ip in
+        this session and its allocation still has to be added.
+        """
+        claims = context.session.info.get(CLAIMS_KEY, {})
+        allocation = claims.pop((ip_address, subnet_id), None)
+        if allocation is None:
+            return False
+        allocation.port_id = port_id
+        return True
+
+    def _allocate_from_subnet(self, context, subnet):
+        pools = self._get_pools(context, subnet['id'])
+        for fresh in (False, True):
+            free = self._get_free_intervals(context, subnet, pools, fresh)
+            conflicts = 0
+            while free.size and (fresh or conflicts < MAX_CLAIM_CONFLICTS):
+                ip = free.nth(random.randrange(free.size))
+                free.remove(ip)
+                ip_address = str(netaddr.IPAddress(ip, subnet['ip_version']))
+                if self._claim(context, subnet, ip_address):
+                    return ip_address
+                conflicts += 1
+
+    def _get_pools(self, context, subnet_id):
+        query = context.session.query(models_v2.IPAllocationPool.id,
+                                      models_v2.IPAllocationPool.first_ip,
+                                      models_v2.IPAllocationPool.last_ip)
+        return dict((pool_id, (int(netaddr.IPAddress(first_ip)),
+                               int(netaddr.IPAddress(last_ip))))
+                    for pool_id, first_ip, last_ip in
+                    query.filter_by(subnet_id=subnet_id))
+
+    def _get_free_intervals(self, context, subnet, pools, fresh):
+        cached = self._free.get(subnet['id'])
+        if not fresh and cached and cached[0] == pools:
+            return cached[1]
+        self._delete_availability_ranges(context, pools)
+        query = context.session.query(models_v2.IPAllocation.ip_address)
+        allocated = [int(netaddr.IPAddress(ip_address)) for ip_address, in
+                     query.filter_by(subnet_id=subnet['id'])]
+        free = FreeIntervals.from_pools(pools.values(), allocated)
+        LOG.debug("Loaded %(size)s free IPs in %(count)d ranges for subnet "
+                  "%(subnet_id)s",
+                  {'size': free.size, 'count': len(free.intervals),
+                   'subnet_id': subnet['id']})
+        self._free[subnet['id']] = (pools, free)
+        return free
+
+    def _delete_availability_ranges(self, context, pools):
+        # This allocator does not keep the availability ranges up to date.
+        # Dropping them makes the availability range allocator rebuild them
+        # from the allocations if it is configured again.
+        if not pools:
+            return
+        query = context.session.query(models_v2.IPAvailabilityRange).filter(
+            models_v2.IPAvailabilityRange.allocation_pool_id.in_(
+                pools.keys()))
+        for ip_range in query:
+            context.session.delete(ip_range)
+
+    def _claim(self, context, subnet, ip_address):
+        allocation = models_v2.IPAllocation(network_id=subnet['network_id'],
+                                            subnet_id=subnet['id'],
+                                            ip_address=ip_address,
+                                            port_id=None)
+        try:
+            with context.session.begin_nested():
+                context.session.add(allocation)
+        except db_exc.DBDuplicateEntry:
+            LOG.debug("IP %(ip_address)s of subnet %(subnet_id)s was "
+                      "allocated concurrently",
+                      {'ip_address': ip_address, 'subnet_id': subnet['id']})
+            return False
+        claims = context.session.info.setdefault(CLAIMS_KEY, {})
+        claims[(ip_address, subnet['id'])] = allocation
+        return True
+
+
+_allocator = IntervalIpAllocator()
+
+
+def get_allocator():
+    return _allocator
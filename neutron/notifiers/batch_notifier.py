@@ -11,14 +11,18 @@
 #    under the License.
 
 import eventlet
+from eventlet import semaphore
 
 
 class BatchNotifier(object):
-    def __init__(self, batch_interval, callback):
+    def __init__(self, batch_interval, callback, max_batch_size=None):
         self.pending_events = []
         self._waiting_to_send = False
         self.callback = callback
         self.batch_interval = batch_interval
+        self.max_batch_size = max_batch_size
+        # Batches are sent one at a time, in the order they were queued
+        self._send_lock = semaphore.Semaphore()
 
     def queue_event(self, event):
         """Called to queue sending an event with the next batch of events.
@@ -38,6 +42,10 @@ class BatchNotifier(object):
         If a thread is already alive and waiting, this call will simply queue
         the event and return leaving it up to the thread to send it.
 
+        If max_batch_size is set, a batch reaching that size is sent right
+        away by the caller instead of waiting for the thread to wake up. It
+        waits for a batch being sent by the thread to be sent first.
+
         :param event: the event that occurred.
         """
         if not event:
@@ -45,6 +53,11 @@ class BatchNotifier(object):
 
         self.pending_events.append(event)
 
+        if (self.max_batch_size and
+                len(self.pending_events) >= self.max_batch_size):
+            self._notify()
+            return
+
         if self._waiting_to_send:
             return
 
@@ -58,9 +71,10 @@ class BatchNotifier(object):
         eventlet.spawn_n(last_out_sends)
 
     def _notify(self):
-        if not self.pending_events:
-            return
+        with self._send_lock:
+            if not self.pending_events:
+                return
 
-        batched_events = self.pending_events
-        self.pending_events = []
-        self.callback(batched_events)
+            batched_events = self.pending_events
+            self.pending_events = []
+            self.callback(batched_events)
@@ -863,6 +863,8 @@ class LinuxBridgeNeutronAgentRPC(object):
             # resync is needed
             return True
 
+        devices_up = []
+        devices_down = []
         for device_details in devices_details_list:
             device = device_details['device']
             LOG.debug("Port %s added", device)
@@ -886,44 +888,52 @@ class LinuxBridgeNeutronAgentRPC(object):
                         device_details['physical_network'],
                         segmentation_id,
                         device_details['port_id']):
-
-                        # update plugin about port status
-                        self.plugin_rpc.update_device_up(self.context,
-                                                         device,
-                                                         self.agent_id,
-                                                         cfg.CONF.host)
+                        devices_up.append(device)
                     else:
-                        self.plugin_rpc.update_device_down(self.context,
-                                                           device,
-                                                           self.agent_id,
-                                                           cfg.CONF.host)
+                        devices_down.append(device)
                 else:
                     self.remove_port_binding(device_details['network_id'],
                                              device_details['port_id'])
             else:
                 LOG.info(_LI("Device %s not defined on plugin"), device)
-        return False
+
+        if not (devices_up or devices_down):
+            return False
+        # update plugin about port status in a single round trip
+        try:
+            devices_set = self.plugin_rpc.update_device_list(
+                self.context, devices_up, devices_down, self.agent_id,
+                cfg.CONF.host)
+        except Exception as e:
+            LOG.debug("Unable to update status for %(devices)s: %(e)s",
+                      {'devices': devices_up + devices_down, 'e': e})
+            return True
+        return bool(devices_set.get('failed_devices_up') or
+                    devices_set.get('failed_devices_down'))
 
     def treat_devices_removed(self, devices):
-        resync = False
         self.sg_agent.remove_devices_filter(devices)
         for device in devices:
             LOG.info(_LI("Attachment %s removed"), device)
-            details = None
-            try:
-                details = self.plugin_rpc.update_device_down(self.context,
-                                                             device,
-                                                             self.agent_id,
-                                                             cfg.CONF.host)
-            except Exception as e:
-                LOG.debug("port_removed failed for %(device)s: %(e)s",
-                          {'device': device, 'e': e})
-                resync = True
-            if details and details['exists']:
-                LOG.info(_LI("Port %s updated."), device)
+        devices_down = []
+        try:
+            devices_set = self.plugin_rpc.update_device_list(
+                self.context, [], list(devices), self.agent_id,
+                cfg.CONF.host)
+        except Exception as e:
+            LOG.debug("port_removed failed for %(devices)s: %(e)s",
+                      {'devices': devices, 'e': e})
+            resync = True
+        else:
+            devices_down = devices_set.get('devices_down', [])
+            resync = bool(devices_set.get('failed_devices_down'))
+        for details in devices_down:
+            if details['exists']:
+                LOG.info(_LI("Port %s updated."), details['device'])
             else:
-                LOG.debug("Device %s not defined on plugin", device)
-            self.br_mgr.remove_empty_bridges()
+                LOG.debug("Device %s not defined on plugin",
+                          details['device'])
+        self.br_mgr.remove_empty_bridges()
         return resync
 
     def scan_devices(self, previous, sync):
@@ -59,7 +59,39 @@ ml2_opts = [
                       "will have the same type as tenant networks. Allowed "
                       "values for external_network_type config option depend "
                       "on the network type values configured in type_drivers "
-                      "config option."))
+                      "config option.")),
+    cfg.ListOpt('async_postcommit_drivers',
+                default=[],
+                help=_("List of mechanism driver entrypoints whose "
+                       "postcommit methods are called asynchronously, after "
+                       "the API request returned. A failure of such a call "
+                       "is retried and then kept to be retried later, it no "
+                       "longer fails the request. The calls not processed "
+                       "when the server stops are lost. These drivers are "
+                       "given a copy of the driver context, whose plugin "
+                       "context is an admin context with its own database "
+                       "session.")),
+    cfg.IntOpt('async_postcommit_workers', default=4,
+               help=_("Number of postcommit calls processed in parallel for "
+                      "each driver listed in async_postcommit_drivers. The "
+                      "calls for a given network and its subnets and ports "
+                      "are processed in order.")),
+    cfg.IntOpt('async_postcommit_retries', default=3,
+               help=_("Number of times a failed asynchronous postcommit "
+                      "call is retried.")),
+    cfg.IntOpt('async_postcommit_resync_interval', default=60,
+               help=_("Interval in seconds at which the asynchronous "
+                      "postcommit calls which failed after their retries "
+                      "are retried again, and the statistics of the "
+                      "asynchronous postcommit calls are logged. At most "
+                      "1000 failed calls are kept per driver. 0 disables "
+                      "it.")),
+    cfg.BoolOpt('sparse_tunnel_allocations', default=False,
+                help=_("Only store the allocated tunnel IDs of the GRE and "
+                       "VXLAN type drivers in the database, instead of one "
+                       "row per ID of the configured ranges. The startup "
+                       "time and the size of the allocation tables then no "
+                       "longer depend on the size of the ranges.")),
 ]
 
 
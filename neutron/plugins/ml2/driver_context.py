@@ -13,10 +13,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import copy
+
 from oslo_log import log
 from oslo_serialization import jsonutils
 
 from neutron.common import constants
+from neutron import context as n_context
 from neutron.extensions import portbindings
 from neutron.i18n import _LW
 from neutron.plugins.ml2 import db
@@ -25,6 +28,16 @@ from neutron.plugins.ml2 import driver_api as api
 LOG = log.getLogger(__name__)
 
 
+def _copy_row(row):
+    """Return a copy of a database row which is not in any session."""
+    if row is None:
+        return None
+    copied = type(row)()
+    for column in row.__table__.columns:
+        setattr(copied, column.key, getattr(row, column.key))
+    return copied
+
+
 class MechanismDriverContext(object):
     """MechanismDriver context base class."""
     def __init__(self, plugin, plugin_context):
@@ -34,6 +47,19 @@ class MechanismDriverContext(object):
         # method call of the plugin.
         self._plugin_context = plugin_context
 
+    def _snapshot(self, plugin_context=None):
+        """Return a copy of the context usable after the plugin call.
+
+        The plugin keeps changing the resources of the context after the
+        drivers are called, so they are copied. The copy uses an admin
+        context with its own database session instead of the session of
+        the request.
+        """
+        snapshot = copy.copy(self)
+        snapshot._plugin_context = (plugin_context or
+                                    n_context.get_admin_context())
+        return snapshot
+
 
 class NetworkContext(MechanismDriverContext, api.NetworkContext):
 
@@ -57,6 +83,13 @@ class NetworkContext(MechanismDriverContext, api.NetworkContext):
     def network_segments(self):
         return self._segments
 
+    def _snapshot(self, plugin_context=None):
+        snapshot = super(NetworkContext, self)._snapshot(plugin_context)
+        snapshot._network = copy.deepcopy(self._network)
+        snapshot._original_network = copy.deepcopy(self._original_network)
+        snapshot._segments = copy.deepcopy(self._segments)
+        return snapshot
+
 
 class SubnetContext(MechanismDriverContext, api.SubnetContext):
 
@@ -73,6 +106,12 @@ class SubnetContext(MechanismDriverContext, api.SubnetContext):
     def original(self):
         return self._original_subnet
 
+    def _snapshot(self, plugin_context=None):
+        snapshot = super(SubnetContext, self)._snapshot(plugin_context)
+        snapshot._subnet = copy.deepcopy(self._subnet)
+        snapshot._original_subnet = copy.deepcopy(self._original_subnet)
+        return snapshot
+
 
 class PortContext(MechanismDriverContext, api.PortContext):
 
@@ -97,6 +136,20 @@ class PortContext(MechanismDriverContext, api.PortContext):
     # The following methods are for use by the ML2 plugin and are not
     # part of the driver API.
 
+    def _snapshot(self, plugin_context=None):
+        snapshot = super(PortContext, self)._snapshot(plugin_context)
+        snapshot._port = copy.deepcopy(self._port)
+        snapshot._original_port = copy.deepcopy(self._original_port)
+        snapshot._network_context = self._network_context._snapshot(
+            snapshot._plugin_context)
+        snapshot._binding = _copy_row(self._binding)
+        for attr in ('_binding_levels', '_original_binding_levels'):
+            levels = getattr(self, attr)
+            if levels is not None:
+                setattr(snapshot, attr, [_copy_row(level)
+                                         for level in levels])
+        return snapshot
+
     def _prepare_to_bind(self, segments_to_bind):
         self._segments_to_bind = segments_to_bind
         self._new_bound_segment = None
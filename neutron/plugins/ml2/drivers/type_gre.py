@@ -83,6 +83,9 @@ class GreTypeDriver(type_tunnel.TunnelTypeDriver):
             raise SystemExit()
 
     def sync_allocations(self):
+        if self.sparse_allocations:
+            self._sync_sparse_allocations()
+            return
 
         # determine current configured allocatable gres
         gre_ids = set()
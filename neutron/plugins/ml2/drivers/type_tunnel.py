@@ -13,12 +13,16 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 import abc
+import random
 
 from oslo_config import cfg
+from oslo_db import exception as db_exc
 from oslo_log import log
+from sqlalchemy import orm
 
 from neutron.common import exceptions as exc
 from neutron.common import topics
+from neutron.db import api as db_api
 from neutron.i18n import _LI, _LW
 from neutron.plugins.common import utils as plugin_utils
 from neutron.plugins.ml2 import driver_api as api
@@ -28,6 +32,9 @@ LOG = log.getLogger(__name__)
 
 TUNNEL = 'tunnel'
 
+cfg.CONF.import_opt('sparse_tunnel_allocations', 'neutron.plugins.ml2.config',
+                    group='ml2')
+
 
 class TunnelTypeDriver(helpers.SegmentTypeDriver):
     """Define stable abstract interface for ML2 type drivers.
@@ -40,10 +47,30 @@ class TunnelTypeDriver(helpers.SegmentTypeDriver):
         super(TunnelTypeDriver, self).__init__(model)
         self.segmentation_key = iter(self.primary_keys).next()
 
+    @property
+    def sparse_allocations(self):
+        """Whether the allocation table only contains allocated tunnels.
+
+        The configured ranges then describe the free tunnels: they are not
+        materialized as unallocated rows.
+        """
+        return cfg.CONF.ml2.sparse_tunnel_allocations
+
     @abc.abstractmethod
     def sync_allocations(self):
         """Synchronize type_driver allocation table with configured ranges."""
 
+    def _sync_sparse_allocations(self):
+        """Remove the unallocated tunnels from the allocation table."""
+        session = db_api.get_session()
+        with session.begin(subtransactions=True):
+            count = (session.query(self.model).filter_by(allocated=False).
+                     delete(synchronize_session=False))
+        if count:
+            LOG.info(_LI("Removed %(count)s unallocated %(type)s tunnels "
+                         "from the allocation table"),
+                     {'count': count, 'type': self.get_type()})
+
     @abc.abstractmethod
     def add_endpoint(self, ip, host):
         """Register the endpoint in the type_driver database.
@@ -149,6 +176,81 @@ class TunnelTypeDriver(helpers.SegmentTypeDriver):
                 api.SEGMENTATION_ID: getattr(alloc, self.segmentation_key),
                 api.MTU: self.get_mtu()}
 
+    def _get_free_tunnel_id(self, session):
+        """Return a tunnel ID of the ranges which is not allocated.
+
+        The search starts from a random tunnel ID of the ranges and wraps
+        around, so that concurrent allocations seldom select the same ID
+        and fail on the primary key.
+        """
+        if not self.tunnel_ranges:
+            return
+        offset = random.randrange(
+            sum(tun_max - tun_min + 1
+                for tun_min, tun_max in self.tunnel_ranges))
+        for i, (tun_min, tun_max) in enumerate(self.tunnel_ranges):
+            if offset <= tun_max - tun_min:
+                start = tun_min + offset
+                break
+            offset -= tun_max - tun_min + 1
+        # From the start to the end of its range, the next ranges, then
+        # from the beginning of the ranges up to the start.
+        intervals = ([(start, tun_max)] + self.tunnel_ranges[i + 1:] +
+                     self.tunnel_ranges[:i])
+        if start > tun_min:
+            intervals.append((tun_min, start - 1))
+        for low, high in intervals:
+            tunnel_id = self._get_lowest_free_tunnel_id(session, low, high)
+            if tunnel_id is not None:
+                return tunnel_id
+
+    def _get_lowest_free_tunnel_id(self, session, low, high):
+        """Return the lowest tunnel ID in [low, high] which is not allocated.
+
+        The interval is free from its minimum, or else from the first
+        allocated tunnel whose successor is not allocated.
+        """
+        column = getattr(self.model, self.segmentation_key)
+        next_alloc = orm.aliased(self.model)
+        next_column = getattr(next_alloc, self.segmentation_key)
+        if not session.query(column).filter(column == low).first():
+            return low
+        free = (session.query(column + 1).
+                outerjoin(next_alloc, next_column == column + 1).
+                filter(column >= low, column < high,
+                       next_column.is_(None)).
+                order_by(column).first())
+        if free:
+            return free[0]
+
+    def allocate_partially_specified_segment(self, session, **filters):
+        if not self.sparse_allocations:
+            return super(TunnelTypeDriver,
+                         self).allocate_partially_specified_segment(
+                             session, **filters)
+
+        tunnel_id = self._get_free_tunnel_id(session)
+        if tunnel_id is None:
+            # No resource available
+            return
+        raw_segment = {self.segmentation_key: tunnel_id}
+        try:
+            # The primary key makes the insert fail if the tunnel was
+            # allocated since it was selected.
+            alloc = self.model(allocated=True, **raw_segment)
+            alloc.save(session)
+        except db_exc.DBDuplicateEntry:
+            LOG.debug("Allocate %(type)s segment from ranges failed with "
+                      "segment %(segment)s",
+                      {"type": self.get_type(), "segment": raw_segment})
+            # saving real exception in case we exceeded amount of attempts
+            raise db_exc.RetryRequest(
+                exc.NoNetworkFoundInMaximumAllowedAttempts())
+        LOG.debug("%(type)s segment allocate from ranges success with "
+                  "%(segment)s",
+                  {"type": self.get_type(), "segment": raw_segment})
+        return alloc
+
     def allocate_tenant_segment(self, session):
         alloc = self.allocate_partially_specified_segment(session)
         if not alloc:
@@ -167,7 +269,7 @@ class TunnelTypeDriver(helpers.SegmentTypeDriver):
         with session.begin(subtransactions=True):
             query = (session.query(self.model).
                      filter_by(**{self.segmentation_key: tunnel_id}))
-            if inside:
+            if inside and not self.sparse_allocations:
                 count = query.update({"allocated": False})
                 if count:
                     LOG.debug("Releasing %(type)s tunnel %(id)s to pool",
@@ -175,8 +277,7 @@ class TunnelTypeDriver(helpers.SegmentTypeDriver):
             else:
                 count = query.delete()
                 if count:
-                    LOG.debug("Releasing %(type)s tunnel %(id)s outside pool",
-                              info)
+                    LOG.debug("Releasing %(type)s tunnel %(id)s", info)
 
         if not count:
             LOG.warning(_LW("%(type)s tunnel %(id)s not found"), info)
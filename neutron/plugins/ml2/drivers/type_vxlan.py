@@ -87,6 +87,9 @@ class VxlanTypeDriver(type_tunnel.TunnelTypeDriver):
             raise SystemExit()
 
     def sync_allocations(self):
+        if self.sparse_allocations:
+            self._sync_sparse_allocations()
+            return
 
         # determine current configured allocatable vnis
         vxlan_vnis = set()
@@ -24,11 +24,12 @@ from neutron.extensions import multiprovidernet as mpnet
 from neutron.extensions import portbindings
 from neutron.extensions import providernet as provider
 from neutron.extensions import vlantransparent
-from neutron.i18n import _LE, _LI
+from neutron.i18n import _LE, _LI, _LW
 from neutron.plugins.ml2.common import exceptions as ml2_exc
 from neutron.plugins.ml2 import db
 from neutron.plugins.ml2 import driver_api as api
 from neutron.plugins.ml2 import models
+from neutron.plugins.ml2 import postcommit_queue
 
 LOG = log.getLogger(__name__)
 
@@ -289,6 +290,9 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
         # Ordered list of mechanism drivers, defining
         # the order in which the drivers are called.
         self.ordered_mech_drivers = []
+        # Dispatchers of the drivers whose postcommit methods are called
+        # asynchronously, keyed by driver name.
+        self.async_postcommit_dispatchers = {}
 
         LOG.info(_LI("Configured mechanism driver names: %s"),
                  cfg.CONF.ml2.mechanism_drivers)
@@ -310,6 +314,22 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
             self.ordered_mech_drivers.append(ext)
         LOG.info(_LI("Registered mechanism drivers: %s"),
                  [driver.name for driver in self.ordered_mech_drivers])
+        for name in cfg.CONF.ml2.async_postcommit_drivers:
+            if name not in self.mech_drivers:
+                LOG.warning(_LW("Mechanism driver '%s' configured for "
+                                "asynchronous postcommit calls is not "
+                                "loaded"), name)
+                continue
+            self.async_postcommit_dispatchers[name] = (
+                postcommit_queue.AsyncPostcommitDispatcher(
+                    self.mech_drivers[name],
+                    cfg.CONF.ml2.async_postcommit_workers,
+                    cfg.CONF.ml2.async_postcommit_retries,
+                    cfg.CONF.ml2.async_postcommit_resync_interval))
+        if self.async_postcommit_dispatchers:
+            LOG.info(_LI("Mechanism drivers with asynchronous postcommit "
+                         "calls: %s"),
+                     sorted(self.async_postcommit_dispatchers))
 
     def initialize(self):
         for driver in self.ordered_mech_drivers:
@@ -344,7 +364,17 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
         if any mechanism driver call fails.
         """
         error = False
+        postcommit = method_name.endswith('_postcommit')
+        snapshot = None
         for driver in self.ordered_mech_drivers:
+            dispatcher = (postcommit and
+                          self.async_postcommit_dispatchers.get(driver.name))
+            if dispatcher:
+                # The context is used after the request returned
+                if snapshot is None:
+                    snapshot = context._snapshot()
+                dispatcher.dispatch(method_name, snapshot)
+                continue
             try:
                 getattr(driver.obj, method_name)(context)
             except Exception:
@@ -0,0 +1,233 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import time
+
+import eventlet
+from oslo_log import log
+from six.moves import queue as Queue
+
+from neutron.i18n import _LE, _LI, _LW
+from neutron.openstack.common import loopingcall
+
+LOG = log.getLogger(__name__)
+
+# Number of seconds to wait before retrying a failed postcommit call, it is
+# multiplied by the number of the attempt.
+RETRY_INTERVAL = 1
+# Number of completed calls the latency statistics are computed from.
+LATENCY_SAMPLES = 100
+# Maximum number of failed calls kept to be retried, the oldest ones are
+# dropped beyond it.
+MAX_FAILED_CALLS = 1000
+
+
+def get_queue_key(context):
+    """Return the key ordering the postcommit calls of a resource.
+
+    The calls for the subnets and ports of a network are ordered with the
+    calls for the network, so that e.g. a port is not created on the
+    backend before its network, nor the network deleted before its ports.
+    """
+    return context.current.get('network_id') or context.current['id']
+
+
+class PostcommitQueue(object):
+    """Queue of the postcommit calls of a mechanism driver.
+
+    The calls with the same key are processed in the order they were added
+    and one at a time: a call added while a worker processes the key is
+    handed out once the worker calls done(). Calls with different keys are
+    processed in parallel.
+    """
+    def __init__(self):
+        # resource_id -> deque of calls waiting to be processed
+        self._pending = {}
+        self._in_progress = set()
+        self._ready = Queue.Queue()
+        self._depth = 0
+
+    def add(self, resource_id, call):
+        self._depth += 1
+        pending = self._pending.get(resource_id)
+        if pending is not None:
+            pending.append(call)
+            return
+        self._pending[resource_id] = collections.deque([call])
+        if resource_id not in self._in_progress:
+            self._ready.put(resource_id)
+
+    def get(self):
+        """Wait for a call to process
+
+        :returns: (resource_id, call) tuple. done() must be called with the
+        resource_id once the call is processed.
+        """
+        resource_id = self._ready.get()
+        self._in_progress.add(resource_id)
+        pending = self._pending[resource_id]
+        call = pending.popleft()
+        if not pending:
+            del self._pending[resource_id]
+        self._depth -= 1
+        return resource_id, call
+
+    def done(self, resource_id):
+        self._in_progress.discard(resource_id)
+        if resource_id in self._pending:
+            self._ready.put(resource_id)
+
+    @property
+    def depth(self):
+        """Number of calls waiting to be processed"""
+        return self._depth
+
+
+class AsyncPostcommitDispatcher(object):
+    """Call the postcommit methods of a mechanism driver asynchronously.
+
+    The calls are queued and processed by a pool of workers, so that the
+    API request does not wait for the driver. A failing call is retried,
+    then kept and retried again every resync_interval seconds: it can no
+    longer fail the request it originates from. At most MAX_FAILED_CALLS
+    are kept, and the failed calls of a resource are dropped once its
+    delete succeeded. The statistics of the queue are logged every
+    resync_interval seconds as well.
+
+    The queue is held in memory, the calls not yet processed when the
+    server stops are lost and the driver must resync with the database.
+    """
+    def __init__(self, driver, workers, retries, resync_interval):
+        self.driver = driver
+        self._queue = PostcommitQueue()
+        self._workers = workers
+        self._retries = retries
+        self._resync_interval = resync_interval
+        self._started = False
+        self._latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self._stats = collections.Counter()
+        # (method_name, context) of the calls which failed after retries
+        self._failed = collections.deque()
+        # Number of completed calls when the statistics were last logged
+        self._logged_completed = 0
+
+    def _start(self):
+        if not self._started:
+            self._started = True
+            for i in range(self._workers):
+                eventlet.spawn_n(self._process_calls_loop)
+            if self._resync_interval:
+                self._resync_loop = loopingcall.FixedIntervalLoopingCall(
+                    self._resync)
+                self._resync_loop.start(interval=self._resync_interval,
+                                        initial_delay=self._resync_interval)
+
+    def dispatch(self, method_name, context):
+        self._queue.add(get_queue_key(context),
+                        (method_name, context, time.time()))
+        self._stats['dispatched'] += 1
+        self._start()
+
+    def retry_failed_calls(self):
+        """Queue the failed calls again, in the order they were made."""
+        failed, self._failed = self._failed, collections.deque()
+        for method_name, context in failed:
+            self.dispatch(method_name, context)
+        return len(failed)
+
+    def _resync(self):
+        retried = self.retry_failed_calls()
+        stats = self.get_stats()
+        if retried or stats['completed'] != self._logged_completed:
+            self._logged_completed = stats['completed']
+            stats.update(name=self.driver.name, retried_failed=retried)
+            LOG.info(_LI("Asynchronous postcommit calls of mechanism driver "
+                         "'%(name)s': %(dispatched)s dispatched, "
+                         "%(completed)s completed, %(failed)s failed, "
+                         "%(dropped)s dropped, %(backlog)s queued, "
+                         "%(retried_failed)s failed calls queued again, "
+                         "latency avg %(latency_avg)s max %(latency_max)s"),
+                     stats)
+
+    def _process_calls_loop(self):
+        while True:
+            resource_id, call = self._queue.get()
+            try:
+                self._process_call(*call)
+            finally:
+                self._queue.done(resource_id)
+
+    def _process_call(self, method_name, context, queued_at):
+        for attempt in range(1, self._retries + 2):
+            try:
+                getattr(self.driver.obj, method_name)(context)
+                if method_name.startswith('delete_'):
+                    self._forget_failed_calls(context.current['id'])
+                break
+            except Exception:
+                if attempt > self._retries:
+                    LOG.exception(
+                        _LE("Mechanism driver '%(name)s' failed in "
+                            "%(method)s for %(id)s"),
+                        {'name': self.driver.name, 'method': method_name,
+                         'id': context.current['id']})
+                    self._stats['failed'] += 1
+                    self._add_failed_call(method_name, context)
+                    break
+                LOG.warning(
+                    _LW("Mechanism driver '%(name)s' failed in %(method)s "
+                        "for %(id)s, retrying (attempt %(attempt)s)"),
+                    {'name': self.driver.name, 'method': method_name,
+                     'id': context.current['id'], 'attempt': attempt})
+                self._stats['retried'] += 1
+                eventlet.sleep(RETRY_INTERVAL * attempt)
+        self._latencies.append(time.time() - queued_at)
+        self._stats['completed'] += 1
+
+    def _add_failed_call(self, method_name, context):
+        if len(self._failed) >= MAX_FAILED_CALLS:
+            dropped_method, dropped_context = self._failed.popleft()
+            LOG.error(_LE("Too many failed postcommit calls of mechanism "
+                          "driver '%(name)s', dropping %(method)s for "
+                          "%(id)s"),
+                      {'name': self.driver.name, 'method': dropped_method,
+                       'id': dropped_context.current['id']})
+            self._stats['dropped'] += 1
+        self._failed.append((method_name, context))
+
+    def _forget_failed_calls(self, resource_id):
+        # The resource is gone, retrying its failed calls would recreate it
+        self._failed = collections.deque(
+            call for call in self._failed
+            if call[1].current['id'] != resource_id)
+
+    def get_stats(self):
+        """Return the backlog and latency statistics of the driver.
+
+        The latency of a call is the time from its dispatch until the
+        driver completed it, including the time spent in the queue.
+        """
+        stats = dict((key, self._stats[key]) for key in
+                     ('dispatched', 'completed', 'retried', 'failed',
+                      'dropped'))
+        stats.update(backlog=self._queue.depth,
+                     failed_pending=len(self._failed),
+                     latency_avg=None, latency_max=None)
+        if self._latencies:
+            stats['latency_avg'] = (sum(self._latencies) /
+                                    len(self._latencies))
+            stats['latency_max'] = max(self._latencies)
+        return stats
@@ -28,7 +28,7 @@ from neutron.common import rpc as n_rpc
 from neutron.common import topics
 from neutron.extensions import portbindings
 from neutron.extensions import portsecurity as psec
-from neutron.i18n import _LW
+from neutron.i18n import _LE, _LW
 from neutron import manager
 from neutron.plugins.ml2 import driver_api as api
 from neutron.plugins.ml2.drivers import type_tunnel
@@ -48,7 +48,8 @@ class RpcCallbacks(type_tunnel.TunnelRpcCallbackMixin):
     #       return value to include fixed_ips and device_owner for
     #       the device port
     #   1.4 tunnel_sync rpc signature upgrade to obtain 'host'
-    target = oslo_messaging.Target(version='1.4')
+    #   1.5 Support update_device_list
+    target = oslo_messaging.Target(version='1.5')
 
     def __init__(self, notifier, type_manager):
         self.setup_tunnel_callback_mixin(notifier, type_manager)
@@ -200,6 +201,43 @@ class RpcCallbacks(type_tunnel.TunnelRpcCallbackMixin):
             registry.notify(
                 resources.PORT, events.AFTER_UPDATE, plugin, **kwargs)
 
+    def update_device_list(self, rpc_context, **kwargs):
+        """Agent reports status changes for a set of devices.
+
+        Devices which fail to be updated are reported back to the agent
+        instead of failing the whole request, so that the agent can retry
+        only those.
+        """
+        devices_up = []
+        failed_devices_up = []
+        devices_down = []
+        failed_devices_down = []
+        devices = kwargs.pop('devices_up', None)
+        for device in devices or []:
+            try:
+                self.update_device_up(rpc_context, device=device, **kwargs)
+            except Exception:
+                failed_devices_up.append(device)
+                LOG.exception(_LE("Failed to update device %s up"), device)
+            else:
+                devices_up.append(device)
+
+        devices = kwargs.pop('devices_down', None)
+        for device in devices or []:
+            try:
+                dev = self.update_device_down(rpc_context, device=device,
+                                              **kwargs)
+            except Exception:
+                failed_devices_down.append(device)
+                LOG.exception(_LE("Failed to update device %s down"), device)
+            else:
+                devices_down.append(dev)
+
+        return {'devices_up': devices_up,
+                'failed_devices_up': failed_devices_up,
+                'devices_down': devices_down,
+                'failed_devices_down': failed_devices_down}
+
 
 class AgentNotifierApi(dvr_rpc.DVRAgentRpcApiMixin,
                        sg_rpc.SecurityGroupAgentRpcApiMixin,
@@ -290,10 +290,15 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
 
     def _restore_local_vlan_map(self):
         cur_ports = self.int_br.get_vif_ports()
+        if not cur_ports:
+            return
+        port_records = dict(
+            (r['name'], r) for r in self.int_br.get_port_records(
+                'Port', ['name', 'other_config', 'tag']))
         for port in cur_ports:
-            local_vlan_map = self.int_br.db_get_val("Port", port.port_name,
-                                                    "other_config")
-            local_vlan = self.int_br.db_get_val("Port", port.port_name, "tag")
+            record = port_records.get(port.port_name, {})
+            local_vlan_map = record.get('other_config', {})
+            local_vlan = record.get('tag')
             net_uuid = local_vlan_map.get('net_uuid')
             if (net_uuid and net_uuid not in self.local_vlan_map
                 and local_vlan != DEAD_VLAN_TAG):
@@ -732,6 +737,11 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                                      port_other_config)
 
     def _bind_devices(self, need_binding_ports):
+        devices_up = []
+        devices_down = []
+        if not need_binding_ports:
+            return
+        port_tags = self.int_br.get_port_tag_dict()
         for port_detail in need_binding_ports:
             lvm = self.local_vlan_map.get(port_detail['network_id'])
             if not lvm:
@@ -741,27 +751,41 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
             port = port_detail['vif_port']
             device = port_detail['device']
             # Do not bind a port if it's already bound
-            cur_tag = self.int_br.db_get_val("Port", port.port_name, "tag")
+            cur_tag = port_tags.get(port.port_name)
             if cur_tag != lvm.vlan:
                 self.int_br.set_db_attribute(
                     "Port", port.port_name, "tag", lvm.vlan)
                 if port.ofport != -1:
                     self.int_br.delete_flows(in_port=port.ofport)
 
-            # update plugin about port status
-            # FIXME(salv-orlando): Failures while updating device status
-            # must be handled appropriately. Otherwise this might prevent
-            # neutron server from sending network-vif-* events to the nova
-            # API server, thus possibly preventing instance spawn.
             if port_detail.get('admin_state_up'):
                 LOG.debug("Setting status for %s to UP", device)
-                self.plugin_rpc.update_device_up(
-                    self.context, device, self.agent_id, cfg.CONF.host)
+                devices_up.append(device)
             else:
                 LOG.debug("Setting status for %s to DOWN", device)
-                self.plugin_rpc.update_device_down(
-                    self.context, device, self.agent_id, cfg.CONF.host)
-            LOG.info(_LI("Configuration for device %s completed."), device)
+                devices_down.append(device)
+        if not (devices_up or devices_down):
+            return
+        # update plugin about port status in a single round trip
+        try:
+            devices_set = self.plugin_rpc.update_device_list(
+                self.context, devices_up, devices_down, self.agent_id,
+                cfg.CONF.host)
+        except Exception as e:
+            raise DeviceListRetrievalError(devices=devices_up + devices_down,
+                                           error=e)
+        failed_devices = (devices_set.get('failed_devices_up') +
+                          devices_set.get('failed_devices_down'))
+        if failed_devices:
+            # Failures while updating device status must trigger a resync,
+            # otherwise the server might never send the network-vif-*
+            # events to nova, thus preventing instance spawn.
+            raise DeviceListRetrievalError(
+                devices=failed_devices,
+                error=_("device status update failed on the server"))
+        LOG.info(_LI("Configuration for devices up %(up)s and devices "
+                     "down %(down)s completed."),
+                 {'up': devices_up, 'down': devices_down})
 
     @staticmethod
     def setup_arp_spoofing_protection(bridge, vif, port_details):
@@ -1338,54 +1362,56 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
         except Exception as e:
             raise DeviceListRetrievalError(devices=devices, error=e)
 
-        for details in devices_details_list:
-            device = details['device']
-            LOG.info(_LI("Ancillary Port %s added"), device)
+        devices_added = [d['device'] for d in devices_details_list]
+        LOG.info(_LI("Ancillary Ports %s added"), devices_added)
 
-            # update plugin about port status
-            self.plugin_rpc.update_device_up(self.context,
-                                             device,
-                                             self.agent_id,
-                                             cfg.CONF.host)
+        # update plugin about port status
+        try:
+            devices_set = self.plugin_rpc.update_device_list(
+                self.context, devices_added, [], self.agent_id,
+                cfg.CONF.host)
+        except Exception as e:
+            raise DeviceListRetrievalError(devices=devices_added, error=e)
+        if devices_set.get('failed_devices_up'):
+            raise DeviceListRetrievalError(
+                devices=devices_set['failed_devices_up'],
+                error=_("device status update failed on the server"))
+
+    def _update_devices_down(self, devices):
+        """Report devices as down, returning (details, failed_devices)."""
+        try:
+            devices_set = self.plugin_rpc.update_device_list(
+                self.context, [], list(devices), self.agent_id,
+                cfg.CONF.host)
+        except Exception as e:
+            LOG.debug("port_removed failed for %(devices)s: %(e)s",
+                      {'devices': devices, 'e': e})
+            return [], list(devices)
+        return (devices_set.get('devices_down', []),
+                devices_set.get('failed_devices_down', []))
 
     def treat_devices_removed(self, devices):
-        resync = False
         self.sg_agent.remove_devices_filter(devices)
         for device in devices:
             LOG.info(_LI("Attachment %s removed"), device)
-            try:
-                self.plugin_rpc.update_device_down(self.context,
-                                                   device,
-                                                   self.agent_id,
-                                                   cfg.CONF.host)
-            except Exception as e:
-                LOG.debug("port_removed failed for %(device)s: %(e)s",
-                          {'device': device, 'e': e})
-                resync = True
-                continue
-            self.port_unbound(device)
-        return resync
+        devices_down, failed_devices = self._update_devices_down(devices)
+        for device in devices:
+            if device not in failed_devices:
+                self.port_unbound(device)
+        return bool(failed_devices)
 
     def treat_ancillary_devices_removed(self, devices):
-        resync = False
         for device in devices:
             LOG.info(_LI("Attachment %s removed"), device)
-            try:
-                details = self.plugin_rpc.update_device_down(self.context,
-                                                             device,
-                                                             self.agent_id,
-                                                             cfg.CONF.host)
-            except Exception as e:
-                LOG.debug("port_removed failed for %(device)s: %(e)s",
-                          {'device': device, 'e': e})
-                resync = True
-                continue
+        devices_down, failed_devices = self._update_devices_down(devices)
+        for details in devices_down:
             if details['exists']:
-                LOG.info(_LI("Port %s updated."), device)
+                LOG.info(_LI("Port %s updated."), details['device'])
                 # Nothing to do regarding local networking
             else:
-                LOG.debug("Device %s not defined on plugin", device)
-        return resync
+                LOG.debug("Device %s not defined on plugin",
+                          details['device'])
+        return bool(failed_devices)
 
     def process_network_ports(self, port_info, ovs_restarted):
         resync_a = False
@@ -55,12 +55,51 @@ DEPRECATED_ACTION_MAP = {
     'set': ['create', 'update']
 }
 
+# Caches of the checks of read actions, which do not depend on the target
+# attributes, valid as long as the rules of the enforcer are not replaced
+_RULES = None
+# (action, pluralized) -> match rule
+_READ_MATCH_RULES = {}
+# action -> whether the rule of the action depends on the credentials only
+_CREDENTIALS_ONLY_ACTIONS = {}
+# Profiling counters, see get_stats()
+_STATS = collections.Counter()
+
 
 def reset():
     global _ENFORCER
     if _ENFORCER:
         _ENFORCER.clear()
         _ENFORCER = None
+    _clear_caches()
+    _STATS.clear()
+
+
+def _clear_caches():
+    global _RULES
+    _RULES = None
+    _READ_MATCH_RULES.clear()
+    _CREDENTIALS_ONLY_ACTIONS.clear()
+
+
+def _check_caches():
+    """Clear the caches if the rules were loaded again."""
+    global _RULES
+    if _ENFORCER.rules is not _RULES:
+        _clear_caches()
+        _RULES = _ENFORCER.rules
+
+
+def get_stats():
+    """Return the counters of the policy checks.
+
+    checks: calls of check() and enforce()
+    evaluations: evaluations of a rule by the enforcer
+    memoized: checks answered from the results memoized for the request
+    rule_cache_hits: match rules of read actions found in the cache
+    credentials_cache_hits: credentials of a context reused
+    """
+    return dict(_STATS)
 
 
 def init():
@@ -125,6 +164,7 @@ def set_rules(policies, overwrite=True):
                               "not be enforced"), pol)
     init()
     _ENFORCER.set_rules(policies, overwrite)
+    _clear_caches()
 
 
 def _is_attribute_explicitly_set(attribute_name, resource, target, action):
@@ -196,9 +236,19 @@ def _build_match_rule(action, target, pluralized):
        action is being executed
        (e.g.: create_router:external_gateway_info:network_id)
     """
-    match_rule = policy.RuleCheck('rule', action)
     resource, is_write = get_resource_and_action(action, pluralized)
-    # Attribute-based checks shall not be enforced on GETs
+    if not is_write:
+        # Attribute-based checks shall not be enforced on GETs, the rule
+        # only depends on the action
+        _check_caches()
+        match_rule = _READ_MATCH_RULES.get((action, pluralized))
+        if match_rule is None:
+            match_rule = policy.RuleCheck('rule', action)
+            _READ_MATCH_RULES[(action, pluralized)] = match_rule
+        else:
+            _STATS['rule_cache_hits'] += 1
+        return match_rule
+    match_rule = policy.RuleCheck('rule', action)
     if is_write:
         # assigning to variable with short name for improving readability
         res_map = attributes.RESOURCE_ATTRIBUTE_MAP
@@ -347,13 +397,67 @@ class FieldCheck(policy.Check):
         return target_value == self.value
 
 
+def _depends_on_credentials_only(rule, seen=()):
+    """Whether a rule can be evaluated without looking at the target."""
+    if isinstance(rule, (policy.RoleCheck, policy.TrueCheck,
+                         policy.FalseCheck)):
+        return True
+    if isinstance(rule, policy.NotCheck):
+        return _depends_on_credentials_only(rule.rule, seen)
+    if isinstance(rule, (policy.AndCheck, policy.OrCheck)):
+        return all(_depends_on_credentials_only(r, seen) for r in rule.rules)
+    if isinstance(rule, policy.RuleCheck):
+        if rule.match in seen:
+            return False
+        try:
+            referenced_rule = _ENFORCER.rules[rule.match]
+        except KeyError:
+            # A missing rule fails closed whatever the target
+            return True
+        return _depends_on_credentials_only(referenced_rule,
+                                            seen + (rule.match,))
+    # Checks on the target fields or their owner, and unknown checks
+    return False
+
+
+def _is_credentials_only_action(action):
+    """Whether the result of a read action only depends on the user."""
+    _check_caches()
+    result = _CREDENTIALS_ONLY_ACTIONS.get(action)
+    if result is None:
+        result = _depends_on_credentials_only(
+            policy.RuleCheck('rule', action))
+        _CREDENTIALS_ONLY_ACTIONS[action] = result
+    return result
+
+
+def _get_request_cache(context):
+    """Return the policy cache of the context, computing its credentials.
+
+    The credentials are computed once per request and the results of the
+    checks which do not depend on the target are memoized with them. Both
+    are dropped when the identity or the roles of the context change.
+    """
+    key = (context.user_id, context.tenant_id, context.is_admin,
+           tuple(context.roles), context.user_name, context.tenant_name,
+           context.read_deleted)
+    cache = getattr(context, '_policy_cache', None)
+    if cache is None or cache['key'] != key or cache['rules'] is not _RULES:
+        cache = {'key': key, 'rules': _RULES,
+                 'credentials': context.to_dict(), 'results': {}}
+        context._policy_cache = cache
+    else:
+        _STATS['credentials_cache_hits'] += 1
+    return cache
+
+
 def _prepare_check(context, action, target, pluralized):
     """Prepare rule, target, and credentials for the policy engine."""
     # Compare with None to distinguish case in which target is {}
     if target is None:
         target = {}
     match_rule = _build_match_rule(action, target, pluralized)
-    credentials = context.to_dict()
+    credentials = _get_request_cache(context)['credentials']
     return match_rule, target, credentials
 
 
@@ -383,16 +487,28 @@ def check(context, action, target, plugin=None, might_not_exist=False,
 
     :return: Returns True if access is permitted else False.
     """
+    _STATS['checks'] += 1
     if might_not_exist and not (_ENFORCER.rules and action in _ENFORCER.rules):
         return True
     match_rule, target, credentials = _prepare_check(context,
                                                      action,
                                                      target,
                                                      pluralized)
+    memoize = (not get_resource_and_action(action, pluralized)[1] and
+               _is_credentials_only_action(action))
+    if memoize:
+        # The cache was brought up to date by _prepare_check
+        results = context._policy_cache['results']
+        if action in results:
+            _STATS['memoized'] += 1
+            return results[action]
+    _STATS['evaluations'] += 1
     result = _ENFORCER.enforce(match_rule,
                                target,
                                credentials,
                                pluralized=pluralized)
+    if memoize:
+        results[action] = result
     # logging applied rules in case of failure
     if not result:
         log_rule_list(match_rule)
@@ -416,10 +532,12 @@ def enforce(context, action, target, plugin=None, pluralized=None):
     :raises neutron.openstack.common.policy.PolicyNotAuthorized:
             if verification fails.
     """
+    _STATS['checks'] += 1
     rule, target, credentials = _prepare_check(context,
                                                action,
                                                target,
                                                pluralized)
+    _STATS['evaluations'] += 1
     try:
         result = _ENFORCER.enforce(rule, target, credentials, action=action,
                                    do_raise=True)
@@ -29,6 +29,7 @@ from neutron.openstack.common import versionutils
 LOG = logging.getLogger(__name__)
 QUOTA_DB_MODULE = 'neutron.db.quota_db'
 QUOTA_DB_DRIVER = 'neutron.db.quota_db.DbQuotaDriver'
+QUOTA_TRACKING_DB_DRIVER = 'neutron.db.quota_db.TrackingDbQuotaDriver'
 QUOTA_CONF_DRIVER = 'neutron.quota.ConfDriver'
 
 quota_opts = [
@@ -55,6 +56,11 @@ quota_opts = [
     cfg.StrOpt('quota_driver',
                default=QUOTA_DB_DRIVER,
                help=_('Default driver to use for quota checks')),
+    cfg.IntOpt('quota_usage_resync_interval',
+               default=600,
+               help=_('Number of seconds after which the resource usage '
+                      'tracked by neutron.db.quota_db.TrackingDbQuotaDriver '
+                      'is recounted to correct any drift.')),
 ]
 # Register the configuration options
 cfg.CONF.register_opts(quota_opts, 'QUOTAS')
@@ -210,7 +216,8 @@ class QuotaEngine(object):
         if self._driver is None:
             _driver_class = (self._driver_class or
                              cfg.CONF.QUOTAS.quota_driver)
-            if (_driver_class == QUOTA_DB_DRIVER and
+            if (_driver_class in (QUOTA_DB_DRIVER,
+                                  QUOTA_TRACKING_DB_DRIVER) and
                     QUOTA_DB_MODULE not in sys.modules):
                 # If quotas table is not loaded, force config quota driver.
                 _driver_class = QUOTA_CONF_DRIVER
@@ -267,6 +274,10 @@ class QuotaEngine(object):
         if not res or not hasattr(res, 'count'):
             raise exceptions.QuotaResourceUnknown(unknown=[resource])
 
+        # Drivers tracking the resource usage can avoid counting it
+        count_usage = getattr(self.get_driver(), 'count_usage', None)
+        if count_usage:
+            return count_usage(context, res, *args, **kwargs)
         return res.count(context, *args, **kwargs)
 
     def limit_check(self, context, tenant_id, **values):
@@ -0,0 +1,129 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Helpers shared by the benchmarks of this package.
+
+The benchmarks are standalone scripts driving the DB layer directly; they
+are not collected by the unit test runner.
+"""
+
+import collections
+import os
+import tempfile
+
+from oslo_config import cfg
+
+from neutron import context
+from neutron.db import api as db_api
+# Register all the models with the metadata
+from neutron.db.migration.models import head  # noqa
+from neutron.db import model_base
+
+
+def percentile(values, percent):
+    """Return the percent-th percentile of values (nearest rank)."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    rank = int(round(percent / 100.0 * len(values) + 0.5)) - 1
+    return values[max(0, min(rank, len(values) - 1))]
+
+
+class Results(object):
+    """Latencies and event counts collected by benchmark workers."""
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.counters = collections.Counter()
+        self.elapsed = 0.0
+
+    def add(self, latency):
+        self.latencies.append(latency)
+
+    def count(self, event, value=1):
+        self.counters[event] += value
+
+    def report(self, unit):
+        done = len(self.latencies)
+        rate = done / self.elapsed if self.elapsed else 0.0
+        lines = ['%s: %d %s in %.2fs, %.1f %s/s' % (
+                     self.name, done, unit, self.elapsed, rate, unit),
+                 '  latency p50 %.1fms p99 %.1fms max %.1fms' % (
+                     percentile(self.latencies, 50) * 1000,
+                     percentile(self.latencies, 99) * 1000,
+                     max(self.latencies or [0]) * 1000)]
+        for event in sorted(self.counters):
+            lines.append('  %s: %d' % (event, self.counters[event]))
+        return '\n'.join(lines)
+
+
+def instrument(cls, name, on_call=None, on_return=None, on_raise=None):
+    """Wrap a method of cls with callbacks, returning a function undoing it.
+
+    on_call is called with no arguments, on_return with the result and
+    on_raise with the exception, which is then re-raised.
+    """
+    original = cls.__dict__[name]
+    is_static = isinstance(original, staticmethod)
+    func = original.__get__(None, cls) if is_static else original
+
+    def wrapper(*args, **kwargs):
+        if on_call:
+            on_call()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if on_raise:
+                on_raise(e)
+            raise
+        if on_return:
+            on_return(result)
+        return result
+
+    setattr(cls, name, staticmethod(wrapper) if is_static else wrapper)
+    return lambda: setattr(cls, name, original)
+
+
+class Database(object):
+    """The neutron database used by a benchmark.
+
+    The connection is set in the [database] section of the configuration
+    so that all the DB code, including the plugins, uses it. Without a
+    connection URL a temporary SQLite file is used and removed by cleanup().
+    """
+
+    def __init__(self, connection=None):
+        self._path = None
+        if not connection:
+            fd, self._path = tempfile.mkstemp(suffix='.sqlite',
+                                              prefix='neutron-bench-')
+            os.close(fd)
+            connection = 'sqlite:///%s' % self._path
+        cfg.CONF.set_override('connection', connection, group='database')
+        self.reset()
+
+    def reset(self):
+        """Recreate all the tables, empty."""
+        engine = db_api.get_engine()
+        model_base.BASEV2.metadata.drop_all(engine)
+        model_base.BASEV2.metadata.create_all(engine)
+
+    def get_context(self):
+        """Return an admin context, which opens a session of its own."""
+        return context.Context(user_id=None, tenant_id=None, is_admin=True,
+                               load_admin_roles=False)
+
+    def cleanup(self):
+        db_api.dispose()
+        if self._path:
+            os.unlink(self._path)
@@ -0,0 +1,147 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare the IP allocation backends under concurrent load.
+
+Each worker thread allocates addresses from the same subnet, one
+transaction per address, like concurrent port creations do. For example:
+
+    python -m neutron.tests.benchmark.ip_allocation --workers 16 \\
+        --allocations 200 --cidr 10.0.0.0/16
+
+Pass --connection to run against MySQL or PostgreSQL instead of a temporary
+SQLite file; SQLite serializes writers so it mostly shows the per
+allocation cost rather than lock contention.
+"""
+
+import argparse
+import threading
+import time
+
+import netaddr
+from oslo_config import cfg
+from oslo_db import exception as db_exc
+
+from neutron.common import config  # noqa
+from neutron.db import db_base_plugin_v2
+from neutron.db import models_v2
+from neutron.ipam import interval_allocator
+from neutron.tests.benchmark import base
+
+BACKENDS = ('availability_range', 'interval')
+NETWORK_ID = 'bench-network'
+SUBNET_ID = 'bench-subnet'
+
+
+def create_subnet(ctx, cidr):
+    net = netaddr.IPNetwork(cidr)
+    first, last = net[2], net[-2] if net.version == 4 else net[-1]
+    with ctx.session.begin():
+        ctx.session.add(models_v2.Network(id=NETWORK_ID, name='bench',
+                                          tenant_id='bench', status='ACTIVE',
+                                          admin_state_up=True, shared=False))
+        ctx.session.add(models_v2.Subnet(id=SUBNET_ID, name='bench',
+                                         tenant_id='bench',
+                                         network_id=NETWORK_ID,
+                                         ip_version=net.version,
+                                         cidr=str(net.cidr),
+                                         gateway_ip=str(net[1]),
+                                         enable_dhcp=False))
+        pool = models_v2.IPAllocationPool(subnet_id=SUBNET_ID,
+                                          first_ip=str(first),
+                                          last_ip=str(last))
+        ctx.session.add(pool)
+        ctx.session.flush()
+        ctx.session.add(models_v2.IPAvailabilityRange(
+            allocation_pool_id=pool.id, first_ip=str(first),
+            last_ip=str(last)))
+    return {'id': SUBNET_ID, 'network_id': NETWORK_ID,
+            'cidr': str(net.cidr), 'ip_version': net.version}
+
+
+def allocate(ctx, subnet, results, max_retries):
+    for attempt in range(max_retries + 1):
+        start = time.time()
+        try:
+            with ctx.session.begin():
+                ip = db_base_plugin_v2.NeutronDbPluginV2._generate_ip(
+                    ctx, [subnet])
+                db_base_plugin_v2.NeutronDbPluginV2._store_ip_allocation(
+                    ctx, ip['ip_address'], NETWORK_ID, SUBNET_ID, None)
+        except db_exc.DBDeadlock:
+            results.count('deadlocks')
+        except db_exc.DBDuplicateEntry:
+            results.count('duplicate entries')
+        except db_exc.DBError:
+            # e.g. lock wait timeouts or SQLite "database is locked"
+            results.count('database errors')
+        else:
+            results.add(time.time() - start)
+            return
+        results.count('retries')
+    results.count('failed allocations')
+
+
+def run(database, backend, args):
+    cfg.CONF.set_override('ip_allocation_backend', backend)
+    # Start each run with empty in-memory free intervals
+    interval_allocator._allocator = interval_allocator.IntervalIpAllocator()
+    subnet = create_subnet(database.get_context(), args.cidr)
+    results = base.Results(backend)
+
+    def worker():
+        ctx = database.get_context()
+        for i in range(args.allocations):
+            allocate(ctx, subnet, results, args.max_retries)
+
+    threads = [threading.Thread(target=worker) for i in range(args.workers)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.elapsed = time.time() - start
+
+    ctx = database.get_context()
+    query = ctx.session.query(models_v2.IPAllocation.ip_address)
+    allocated = [ip for ip, in query.filter_by(subnet_id=SUBNET_ID)]
+    results.count('duplicate addresses', len(allocated) - len(set(allocated)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=BACKENDS + ('all',),
+                        default='all')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='Number of concurrent worker threads')
+    parser.add_argument('--allocations', type=int, default=100,
+                        help='Addresses allocated by each worker')
+    parser.add_argument('--cidr', default='10.0.0.0/16')
+    parser.add_argument('--max-retries', type=int, default=10,
+                        help='Retries of a failed allocation transaction')
+    parser.add_argument('--connection',
+                        help='Database URL, a temporary SQLite file if unset')
+    args = parser.parse_args()
+
+    backends = BACKENDS if args.backend == 'all' else (args.backend,)
+    database = base.Database(args.connection)
+    try:
+        for backend in backends:
+            database.reset()
+            print(run(database, backend, args).report('allocations'))
+    finally:
+        database.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure the queries and time taken to build the L3 agent sync data.
+
+The database is seeded with routers having a gateway, interfaces on tenant
+networks and floating IPs, then get_sync_data is called for all of them,
+for a batch of them and for a single one, like on full syncs and router
+updates of the L3 agents. For example:
+
+    python -m neutron.tests.benchmark.l3_sync_data --routers 5000 \\
+        --max-queries 100 --max-seconds 30
+
+It reports the number of SQL statements and the wall time of each call.
+With --max-queries or --max-seconds, it exits with an error status when a
+call exceeds them.
+"""
+
+import argparse
+import sys
+import time
+
+import netaddr
+from oslo_config import cfg
+from oslo_messaging import conffixture as messaging_conffixture
+from sqlalchemy import event
+
+from neutron.common import config  # noqa
+from neutron.common import constants
+from neutron.common import rpc as n_rpc
+from neutron.db import api as db_api
+from neutron.db import external_net_db
+from neutron.db import l3_db
+from neutron.db import models_v2
+from neutron import manager
+from neutron.openstack.common import uuidutils
+from neutron.plugins.common import constants as service_constants
+from neutron.plugins.ml2 import config as ml2_config  # noqa
+from neutron.tests.benchmark import base
+
+TENANT_ID = 'bench-tenant'
+EXTERNAL_CIDR = netaddr.IPNetwork('100.64.0.0/10')
+TENANT_CIDR = netaddr.IPNetwork('10.0.0.0/8')
+
+
+def configure():
+    cfg.CONF.set_override('core_plugin', 'ml2')
+    cfg.CONF.set_override('service_plugins', ['router'])
+    cfg.CONF.set_override('notify_nova_on_port_status_changes', False)
+    cfg.CONF.set_override('notify_nova_on_port_data_changes', False)
+    # Notifications to agents go nowhere
+    messaging_conffixture.ConfFixture(cfg.CONF).transport_driver = 'fake'
+    cfg.CONF.set_override('type_drivers', ['local'], group='ml2')
+    cfg.CONF.set_override('tenant_network_types', ['local'], group='ml2')
+    cfg.CONF.set_override('mechanism_drivers', [], group='ml2')
+    n_rpc.init(cfg.CONF)
+
+
+class Seeder(object):
+    """Insert the routers and their resources straight into the tables."""
+
+    def __init__(self, session):
+        self.session = session
+        self.mac = 0
+
+    def network(self, cidr, external=False):
+        network_id = uuidutils.generate_uuid()
+        subnet_id = uuidutils.generate_uuid()
+        self.session.add(models_v2.Network(
+            id=network_id, name='bench', tenant_id=TENANT_ID,
+            status='ACTIVE', admin_state_up=True, shared=False))
+        self.session.add(models_v2.Subnet(
+            id=subnet_id, name='bench', tenant_id=TENANT_ID,
+            network_id=network_id, ip_version=cidr.version,
+            cidr=str(cidr), gateway_ip=str(cidr[1]), enable_dhcp=False))
+        if external:
+            self.session.add(external_net_db.ExternalNetwork(
+                network_id=network_id))
+        return network_id, subnet_id
+
+    def port(self, network_id, subnet_id, ip, device_id, device_owner):
+        port_id = uuidutils.generate_uuid()
+        self.mac += 1
+        mac = netaddr.EUI(0xfa163e000000 + self.mac,
+                          dialect=netaddr.mac_unix_expanded)
+        self.session.add(models_v2.Port(
+            id=port_id, name='', tenant_id=TENANT_ID,
+            network_id=network_id, mac_address=str(mac),
+            admin_state_up=True, status='ACTIVE', device_id=device_id,
+            device_owner=device_owner))
+        self.session.add(models_v2.IPAllocation(
+            port_id=port_id, ip_address=str(ip), subnet_id=subnet_id,
+            network_id=network_id))
+        return port_id
+
+    def router(self, external, tenant, index, interfaces, floatingips):
+        router_id = uuidutils.generate_uuid()
+        ext_network_id, ext_subnet_id = external
+        gw_port_id = self.port(ext_network_id, ext_subnet_id,
+                               EXTERNAL_CIDR[2 + index * (1 + floatingips)],
+                               router_id, constants.DEVICE_OWNER_ROUTER_GW)
+        self.session.add(l3_db.Router(
+            id=router_id, name='bench-%d' % index, tenant_id=TENANT_ID,
+            status='ACTIVE', admin_state_up=True, gw_port_id=gw_port_id))
+        self.session.add(l3_db.RouterPort(
+            router_id=router_id, port_id=gw_port_id,
+            port_type=constants.DEVICE_OWNER_ROUTER_GW))
+        for i, (network_id, subnet_id, cidr) in enumerate(
+                tenant[:interfaces]):
+            port_id = self.port(network_id, subnet_id, cidr[1], router_id,
+                                constants.DEVICE_OWNER_ROUTER_INTF)
+            self.session.add(l3_db.RouterPort(
+                router_id=router_id, port_id=port_id,
+                port_type=constants.DEVICE_OWNER_ROUTER_INTF))
+        network_id, subnet_id, cidr = tenant[0]
+        for i in range(floatingips):
+            fixed_ip = cidr[10 + i]
+            fixed_port_id = self.port(network_id, subnet_id, fixed_ip,
+                                      uuidutils.generate_uuid(),
+                                      'compute:bench')
+            floating_ip = EXTERNAL_CIDR[3 + index * (1 + floatingips) + i]
+            floatingip_id = uuidutils.generate_uuid()
+            floating_port_id = self.port(ext_network_id, ext_subnet_id,
+                                         floating_ip, floatingip_id,
+                                         constants.DEVICE_OWNER_FLOATINGIP)
+            self.session.add(l3_db.FloatingIP(
+                id=floatingip_id, tenant_id=TENANT_ID,
+                floating_ip_address=str(floating_ip),
+                floating_network_id=ext_network_id,
+                floating_port_id=floating_port_id,
+                fixed_port_id=fixed_port_id, fixed_ip_address=str(fixed_ip),
+                router_id=router_id, status='ACTIVE'))
+        return router_id
+
+
+def seed(database, args):
+    ctx = database.get_context()
+    subnets = TENANT_CIDR.subnet(24)
+    router_ids = []
+    with ctx.session.begin():
+        seeder = Seeder(ctx.session)
+        external = seeder.network(EXTERNAL_CIDR, external=True)
+        for index in range(args.routers):
+            # Each router has networks of its own
+            tenant = []
+            for i in range(args.interfaces):
+                cidr = next(subnets)
+                tenant.append(seeder.network(cidr) + (cidr,))
+            router_ids.append(seeder.router(external, tenant, index,
+                                            args.interfaces,
+                                            args.floatingips))
+    return router_ids
+
+
+class QueryCounter(object):
+    """Count the SQL statements executed by the engine."""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def measure(database, plugin, counter, router_ids, expected):
+    ctx = database.get_context()
+    counter.count = 0
+    start = time.time()
+    routers = plugin.get_sync_data(ctx, router_ids=router_ids)
+    elapsed = time.time() - start
+    if len(routers) != expected:
+        raise AssertionError('%d routers returned instead of %d' %
+                             (len(routers), expected))
+    return counter.count, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--routers', type=int, default=5000,
+                        help='Routers seeded in the database')
+    parser.add_argument('--interfaces', type=int, default=2,
+                        help='Interfaces of each router, on networks of '
+                             'their own')
+    parser.add_argument('--floatingips', type=int, default=1,
+                        help='Floating IPs of each router')
+    parser.add_argument('--batch', type=int, default=32,
+                        help='Routers requested by the batch call')
+    parser.add_argument('--max-queries', type=int,
+                        help='Fail if a call runs more SQL statements')
+    parser.add_argument('--max-seconds', type=float,
+                        help='Fail if a call takes longer')
+    parser.add_argument('--connection',
+                        help='Database URL, a temporary SQLite file if unset')
+    args = parser.parse_args()
+
+    configure()
+    database = base.Database(args.connection)
+    try:
+        plugin = manager.NeutronManager.get_service_plugins()[
+            service_constants.L3_ROUTER_NAT]
+        start = time.time()
+        router_ids = seed(database, args)
+        print('seeded %d routers in %.2fs' % (len(router_ids),
+                                              time.time() - start))
+        counter = QueryCounter(db_api.get_engine())
+        failed = False
+        for name, ids, expected in (
+                ('all routers', None, len(router_ids)),
+                ('batch', router_ids[:args.batch],
+                 min(args.batch, len(router_ids))),
+                ('single router', router_ids[:1], 1)):
+            queries, elapsed = measure(database, plugin, counter, ids,
+                                       expected)
+            print('%s: %d queries, %.3fs' % (name, queries, elapsed))
+            if ((args.max_queries is not None and
+                 queries > args.max_queries) or
+                    (args.max_seconds is not None and
+                     elapsed > args.max_seconds)):
+                failed = True
+        if failed:
+            print('FAILED: limits exceeded')
+            sys.exit(1)
+    finally:
+        database.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure concurrent network and port creation through a core plugin.
+
+The plugin is driven directly, without the API layer, agents or a message
+bus, by a number of greenthreads creating ports (one by one or in bulk) on
+networks created beforehand. For example:
+
+    python -m neutron.tests.benchmark.port_create --plugin ml2 \\
+        --workers 16 --ports 100 --bulk 10
+
+It reports networks and ports per second, p50/p99 latencies and how often
+IP allocation, MAC generation and segment allocation had to retry.
+
+By default a temporary SQLite file is used. SQLite serializes writers and
+its driver does not yield to other greenthreads, so lock contention only
+shows with --connection pointing to a MySQL or PostgreSQL database using a
+pure Python driver such as PyMySQL.
+"""
+
+import argparse
+import time
+
+import eventlet
+import netaddr
+from oslo_config import cfg
+from oslo_db import exception as db_exc
+from oslo_messaging import conffixture as messaging_conffixture
+
+from neutron.api.v2 import attributes
+from neutron.common import config  # noqa
+from neutron.common import eventlet_utils
+from neutron.common import exceptions as n_exc
+from neutron.common import rpc as n_rpc
+from neutron.db import db_base_plugin_v2
+from neutron.ipam import interval_allocator
+from neutron.plugins.ml2 import config as ml2_config  # noqa
+from neutron.plugins.ml2.drivers import helpers
+from neutron.plugins.ml2.drivers import type_vlan  # noqa
+from neutron.plugins.ml2.drivers import type_vxlan  # noqa
+from neutron.plugins.ml2 import plugin as ml2_plugin
+from neutron.tests.benchmark import base
+
+TENANT_ID = 'bench-tenant'
+
+
+def configure(args):
+    cfg.CONF.set_override('notify_nova_on_port_status_changes', False)
+    cfg.CONF.set_override('notify_nova_on_port_data_changes', False)
+    cfg.CONF.set_override('ip_allocation_backend', args.ip_allocation_backend)
+    # Notifications to agents go nowhere
+    messaging_conffixture.ConfFixture(cfg.CONF).transport_driver = 'fake'
+    cfg.CONF.set_override('type_drivers', [args.network_type], group='ml2')
+    cfg.CONF.set_override('tenant_network_types', [args.network_type],
+                          group='ml2')
+    cfg.CONF.set_override('mechanism_drivers', [], group='ml2')
+    cfg.CONF.set_override('network_vlan_ranges', ['physnet:1:4094'],
+                          group='ml2_type_vlan')
+    cfg.CONF.set_override('vni_ranges', ['1:%d' % (args.networks * 10)],
+                          group='ml2_type_vxlan')
+    n_rpc.init(cfg.CONF)
+
+
+def instrument(results):
+    """Count the attempts and retries of the allocations done by plugins."""
+    def count(event):
+        return lambda *args: results.count(event)
+
+    plugin = db_base_plugin_v2.NeutronDbPluginV2
+    return [
+        base.instrument(plugin, '_generate_ip',
+                        on_call=count('ip allocations'),
+                        on_raise=count('ip allocation failures')),
+        base.instrument(plugin, '_rebuild_availability_ranges',
+                        on_call=count('ip availability range rebuilds')),
+        base.instrument(interval_allocator.IntervalIpAllocator, '_claim',
+                        on_return=lambda claimed: claimed or results.count(
+                            'ip claim conflicts')),
+        base.instrument(plugin, '_generate_mac',
+                        on_call=count('mac generations')),
+        base.instrument(plugin, '_create_port_with_mac',
+                        on_raise=count('mac collisions')),
+        base.instrument(helpers.SegmentTypeDriver,
+                        'allocate_partially_specified_segment',
+                        on_call=count('segment allocations'),
+                        on_raise=count('segment allocation retries')),
+    ]
+
+
+def call(results, max_retries, func, *args):
+    """Call func, retrying on database errors, and record its latency."""
+    for attempt in range(max_retries + 1):
+        start = time.time()
+        try:
+            result = func(*args)
+        except db_exc.DBDeadlock:
+            results.count('deadlocks')
+        except db_exc.RetryRequest:
+            results.count('retry requests')
+        except db_exc.DBDuplicateEntry:
+            results.count('duplicate entries')
+        except db_exc.DBError:
+            # e.g. lock wait timeouts or SQLite "database is locked"
+            results.count('database errors')
+        except n_exc.NeutronException as e:
+            results.count(type(e).__name__)
+            return
+        else:
+            results.add(time.time() - start)
+            return result
+        results.count('retries')
+    results.count('failures')
+
+
+def network_body(index):
+    return {'network': {'name': 'bench-%d' % index,
+                        'tenant_id': TENANT_ID,
+                        'admin_state_up': True,
+                        'shared': False}}
+
+
+def subnet_body(network_id, cidr):
+    return {'subnet': {'name': 'bench',
+                       'network_id': network_id,
+                       'tenant_id': TENANT_ID,
+                       'cidr': str(cidr),
+                       'ip_version': cidr.version,
+                       'gateway_ip': attributes.ATTR_NOT_SPECIFIED,
+                       'allocation_pools': attributes.ATTR_NOT_SPECIFIED,
+                       'dns_nameservers': attributes.ATTR_NOT_SPECIFIED,
+                       'host_routes': attributes.ATTR_NOT_SPECIFIED,
+                       'enable_dhcp': True,
+                       'ipv6_ra_mode': attributes.ATTR_NOT_SPECIFIED,
+                       'ipv6_address_mode': attributes.ATTR_NOT_SPECIFIED,
+                       'subnetpool_id': attributes.ATTR_NOT_SPECIFIED,
+                       'prefixlen': attributes.ATTR_NOT_SPECIFIED}}
+
+
+def port_body(network_id, index):
+    return {'port': {'name': 'bench-%d' % index,
+                     'network_id': network_id,
+                     'tenant_id': TENANT_ID,
+                     'mac_address': attributes.ATTR_NOT_SPECIFIED,
+                     'fixed_ips': attributes.ATTR_NOT_SPECIFIED,
+                     'admin_state_up': True,
+                     'device_id': 'bench-device-%d' % index,
+                     'device_owner': 'compute:bench'}}
+
+
+def run_concurrently(workers, func):
+    pool = eventlet.GreenPool(workers)
+    start = time.time()
+    for index in range(workers):
+        pool.spawn_n(func, index)
+    pool.waitall()
+    return time.time() - start
+
+
+def create_networks(database, plugin, args):
+    results = base.Results('networks')
+    network_ids = []
+    cidrs = netaddr.IPNetwork(args.cidr).subnet(args.prefixlen)
+
+    def worker(index):
+        ctx = database.get_context()
+        for i in range(index, args.networks, args.workers):
+            network = call(results, args.max_retries, plugin.create_network,
+                           ctx, network_body(i))
+            if network:
+                network_ids.append(network['id'])
+                plugin.create_subnet(ctx, subnet_body(network['id'],
+                                                      next(cidrs)))
+
+    undo = instrument(results)
+    try:
+        results.elapsed = run_concurrently(min(args.workers, args.networks),
+                                           worker)
+    finally:
+        for func in undo:
+            func()
+    return results, network_ids
+
+
+def create_ports(database, plugin, network_ids, args):
+    results = base.Results('ports')
+    # Latencies are recorded per call, which creates several ports in bulk
+    results.ports = 0
+    undo = instrument(results)
+
+    def worker(index):
+        ctx = database.get_context()
+        for i in range(0, args.ports, args.bulk):
+            network_id = network_ids[(index + i) % len(network_ids)]
+            count = min(args.bulk, args.ports - i)
+            if args.bulk > 1:
+                ports = [port_body(network_id, i + j) for j in range(count)]
+                created = call(results, args.max_retries,
+                               plugin.create_port_bulk, ctx, {'ports': ports})
+            else:
+                created = call(results, args.max_retries, plugin.create_port,
+                               ctx, port_body(network_id, i))
+            if created:
+                results.ports += count
+
+    try:
+        results.elapsed = run_concurrently(args.workers, worker)
+    finally:
+        for func in undo:
+            func()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--plugin', choices=['db', 'ml2'], default='ml2',
+                        help='NeutronDbPluginV2 or Ml2Plugin')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='Number of concurrent greenthreads')
+    parser.add_argument('--networks', type=int, default=4,
+                        help='Networks the ports are spread on')
+    parser.add_argument('--ports', type=int, default=100,
+                        help='Ports created by each worker')
+    parser.add_argument('--bulk', type=int, default=1,
+                        help='Ports created per call, using create_port_bulk '
+                             'when above 1')
+    parser.add_argument('--cidr', default='10.0.0.0/8',
+                        help='Address space the subnets are taken from')
+    parser.add_argument('--prefixlen', type=int, default=16,
+                        help='Prefix length of the subnets')
+    parser.add_argument('--network-type', choices=['vlan', 'vxlan'],
+                        default='vlan', help='ML2 tenant network type')
+    parser.add_argument('--ip-allocation-backend',
+                        choices=['availability_range', 'interval'],
+                        default='availability_range')
+    parser.add_argument('--max-retries', type=int, default=10,
+                        help='Retries of a call failing with a DB error')
+    parser.add_argument('--connection',
+                        help='Database URL, a temporary SQLite file if unset')
+    args = parser.parse_args()
+
+    eventlet_utils.monkey_patch()
+    configure(args)
+    database = base.Database(args.connection)
+    try:
+        if args.plugin == 'ml2':
+            plugin = ml2_plugin.Ml2Plugin()
+        else:
+            plugin = db_base_plugin_v2.NeutronDbPluginV2()
+        results, network_ids = create_networks(database, plugin, args)
+        print(results.report('networks'))
+        results = create_ports(database, plugin, network_ids, args)
+        print(results.report('calls'))
+        print('  %d ports, %.1f ports/s' % (
+            results.ports, results.ports / results.elapsed))
+    finally:
+        database.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -514,9 +514,10 @@ class L3AgentTestCase(L3AgentTestFramework):
         # Mock the plugin RPC API to Simulate a situation where the agent
         # was handling the 4 routers created above, it went down and after
         # starting up again, two of the routers were deleted via the API
-        mocked_get_routers = (
-            neutron_l3_agent.L3PluginApi.return_value.get_routers)
-        mocked_get_routers.return_value = routers_to_keep
+        mocked_get_routers_delta = (
+            neutron_l3_agent.L3PluginApi.return_value.get_routers_delta)
+        mocked_get_routers_delta.return_value = {'routers': routers_to_keep,
+                                                 'deleted': []}
 
         # Synchonize the agent with the plug-in
         with mock.patch.object(namespace_manager.NamespaceManager, 'list_all',
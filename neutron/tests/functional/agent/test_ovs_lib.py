@@ -185,6 +185,17 @@ class OVSBridgeTestCase(OVSBridgeTestBase):
         self.assertEqual(sorted([x.port_name for x in vif_ports]),
                          sorted([x.port_name for x in ports]))
 
+    def test_get_port_records(self):
+        port_names = [self.create_ovs_port()[0] for i in range(2)]
+        self.br.set_db_attribute('Port', port_names[0], 'tag', 42)
+        ports = self.br.get_port_records('Port', ['name', 'tag'])
+        self.assertEqual({port_names[0]: 42, port_names[1]: []},
+                         {p['name']: p['tag'] for p in ports})
+        interfaces = self.br.get_port_records('Interface', ['name', 'ofport'])
+        self.assertEqual(sorted(port_names),
+                         sorted(i['name'] for i in interfaces))
+        self.assertTrue(all(i['ofport'] > 0 for i in interfaces))
+
     def test_get_vif_port_set(self):
         for i in range(2):
             self.create_ovs_port()
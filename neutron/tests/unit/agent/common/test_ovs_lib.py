@@ -466,23 +466,20 @@ class OVS_Lib_Test(base.BaseTestCase):
     def _test_get_vif_ports(self, is_xen=False):
         pname = "tap99"
         ofport = 6
-        ofport_data = self._encode_ovs_json(['ofport'], [[ofport]])
         vif_id = uuidutils.generate_uuid()
         mac = "ca:fe:de:ad:be:ef"
         id_field = 'xs-vif-uuid' if is_xen else 'iface-id'
-        external_ids = ('{"data":[[["map",[["attached-mac","%(mac)s"],'
-                        '["%(id_field)s","%(vif)s"],'
-                        '["iface-status","active"]]]]],'
-                        '"headings":["external_ids"]}' % {
-                            'mac': mac, 'vif': vif_id, 'id_field': id_field})
+        headings = ['name', 'external_ids', 'ofport']
+        data = [[pname, {'attached-mac': mac, id_field: vif_id,
+                         'iface-status': 'active'}, ofport]]
 
         # Each element is a tuple of (expected mock call, return_value)
         expected_calls_and_values = [
             (self._vsctl_mock("list-ports", self.BR_NAME), "%s\n" % pname),
-            (self._vsctl_mock("--columns=external_ids", "list",
-                              "Interface", pname), external_ids),
-            (self._vsctl_mock("--columns=ofport", "list", "Interface", pname),
-             ofport_data),
+            (self._vsctl_mock("--if-exists",
+                              "--columns=name,external_ids,ofport",
+                              "list", "Interface", pname),
+             self._encode_ovs_json(headings, data)),
         ]
         if is_xen:
             expected_calls_and_values.append(
@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import copy
 import sys
 import uuid
@@ -185,8 +186,8 @@ fake_meta_network = dhcp.NetModel(
                subnets=[fake_meta_subnet],
                ports=[fake_meta_port]))
 
-fake_meta_dvr_network = dhcp.NetModel(True, fake_meta_network.copy())
-fake_meta_dvr_network.ports = [fake_meta_dvr_port]
+fake_meta_dvr_network = dhcp.NetModel(True, dict(fake_meta_network.copy(),
+                                                 ports=[fake_meta_dvr_port]))
 
 fake_dist_network = dhcp.NetModel(
     True, dict(id='12345678-1234-5678-1234567890ab',
@@ -251,6 +252,46 @@ class TestDhcpAgent(base.BaseTestCase):
                             [mock.call(mock.ANY),
                              mock.call().report_state(mock.ANY, mock.ANY,
                                                       mock.ANY)])
+                        agent_state = (state_rpc.return_value.report_state.
+                                       call_args[0][1])
+                        self.assertIn('network_events',
+                                      agent_state['configurations'])
+
+    def _report_state(self, agent, state_rpc):
+        agent._report_state()
+        return (state_rpc.return_value.report_state.call_args[0][1]
+                ['configurations']['network_events'])
+
+    def test_report_state_network_event_stats(self):
+        with contextlib.nested(
+            mock.patch.object(dhcp_agent.agent_rpc, 'PluginReportStateAPI'),
+            mock.patch.object(dhcp_agent.DhcpAgentWithStateReport, 'run'),
+            mock.patch.object(dhcp_agent, 'time')
+        ) as (state_rpc, run, time):
+            time.time.return_value = 1000
+            agent = dhcp_agent.DhcpAgentWithStateReport(HOSTNAME)
+            stats = {'event_queue_depth': 0, 'events_merged': 0,
+                     'events_processed': 0}
+            self.assertEqual(stats, self._report_state(agent, state_rpc))
+            agent._queue.add('net1', 'reload_allocations')
+            time.time.return_value = 1299
+            # Unchanged until network_event_stats_interval elapsed
+            self.assertEqual(stats, self._report_state(agent, state_rpc))
+            time.time.return_value = 1300
+            self.assertEqual(dict(stats, event_queue_depth=1),
+                             self._report_state(agent, state_rpc))
+
+    def test_report_state_network_event_stats_disabled(self):
+        cfg.CONF.set_override('network_event_stats_interval', 0)
+        with contextlib.nested(
+            mock.patch.object(dhcp_agent.agent_rpc, 'PluginReportStateAPI'),
+            mock.patch.object(dhcp_agent.DhcpAgentWithStateReport, 'run')
+        ) as (state_rpc, run):
+            agent = dhcp_agent.DhcpAgentWithStateReport(HOSTNAME)
+            agent._report_state()
+        self.assertNotIn('network_events',
+                         state_rpc.return_value.report_state.call_args[0][1]
+                         ['configurations'])
 
     def test_dhcp_agent_main_agent_manager(self):
         logging_str = 'neutron.agent.common.config.setup_logging'
@@ -270,11 +311,16 @@ class TestDhcpAgent(base.BaseTestCase):
             dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
             attrs_to_mock = dict(
                 [(a, mock.DEFAULT) for a in
-                 ['sync_state', 'periodic_resync']])
+                 ['sync_state', 'periodic_resync',
+                  '_process_network_events_loop']])
             with mock.patch.multiple(dhcp, **attrs_to_mock) as mocks:
-                dhcp.run()
+                with mock.patch.object(dhcp_agent.eventlet,
+                                       'spawn_n') as spawn_n:
+                    dhcp.run()
                 mocks['sync_state'].assert_called_once_with()
                 mocks['periodic_resync'].assert_called_once_with()
+                spawn_n.assert_called_once_with(
+                    mocks['_process_network_events_loop'])
 
     def test_call_driver(self):
         network = mock.Mock()
@@ -568,6 +614,10 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         )
         self.external_process = self.external_process_p.start()
 
+    def _process_network_events(self):
+        while self.dhcp._queue.depth:
+            self.dhcp._process_network_event()
+
     def _process_manager_constructor_call(self):
         return mock.call(conf=cfg.CONF,
                          uuid=FAKE_NETWORK_UUID,
@@ -599,32 +649,40 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
                                  is_isolated_network=True)
 
     def test_enable_dhcp_helper_enable_metadata_no_gateway(self):
-        isolated_network_no_gateway = copy.deepcopy(isolated_network)
-        isolated_network_no_gateway.subnets[0].gateway_ip = None
+        subnet = dhcp.SubnetModel(isolated_network.subnets[0],
+                                  gateway_ip=None)
+        isolated_network_no_gateway = dhcp.NetModel(
+            True, dict(isolated_network.copy(), subnets=[subnet]))
 
         self._enable_dhcp_helper(isolated_network_no_gateway,
                                  enable_isolated_metadata=True,
                                  is_isolated_network=True)
 
+    def _router_port(self, port, device_owner):
+        fixed_ip = dhcp.FixedIpModel(port.fixed_ips[0],
+                                     ip_address='172.9.9.1')
+        return dhcp.PortModel(port, device_owner=device_owner,
+                              fixed_ips=[fixed_ip])
+
     def test_enable_dhcp_helper_enable_metadata_nonisolated_network(self):
-        nonisolated_network = copy.deepcopy(isolated_network)
-        nonisolated_network.ports[0].device_owner = (
-            const.DEVICE_OWNER_ROUTER_INTF)
-        nonisolated_network.ports[0].fixed_ips[0].ip_address = '172.9.9.1'
+        port = self._router_port(isolated_network.ports[0],
+                                 const.DEVICE_OWNER_ROUTER_INTF)
+        nonisolated_network = dhcp.NetModel(
+            True, dict(isolated_network.copy(), ports=[port]))
 
         self._enable_dhcp_helper(nonisolated_network,
                                  enable_isolated_metadata=True,
                                  is_isolated_network=False)
 
     def test_enable_dhcp_helper_enable_metadata_nonisolated_dist_network(self):
-        nonisolated_dist_network.ports[0].device_owner = (
-            const.DEVICE_OWNER_ROUTER_INTF)
-        nonisolated_dist_network.ports[0].fixed_ips[0].ip_address = '172.9.9.1'
-        nonisolated_dist_network.ports[1].device_owner = (
-            const.DEVICE_OWNER_DVR_INTERFACE)
-        nonisolated_dist_network.ports[1].fixed_ips[0].ip_address = '172.9.9.1'
-
-        self._enable_dhcp_helper(nonisolated_dist_network,
+        ports = [self._router_port(nonisolated_dist_network.ports[0],
+                                   const.DEVICE_OWNER_ROUTER_INTF),
+                 self._router_port(nonisolated_dist_network.ports[1],
+                                   const.DEVICE_OWNER_DVR_INTERFACE)]
+        network = dhcp.NetModel(
+            True, dict(nonisolated_dist_network.copy(), ports=ports))
+
+        self._enable_dhcp_helper(network,
                                  enable_isolated_metadata=True,
                                  is_isolated_network=False)
 
@@ -911,6 +969,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.cache.get_network_by_id.return_value = fake_network
         self.cache.get_port_by_id.return_value = fake_port2
         self.dhcp.port_update_end(None, payload)
+        self._process_network_events()
         self.cache.assert_has_calls(
             [mock.call.get_network_by_id(fake_port2.network_id),
              mock.call.put_port(mock.ANY)])
@@ -924,6 +983,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         updated_fake_port1.fixed_ips[0].ip_address = '172.9.9.99'
         self.cache.get_port_by_id.return_value = updated_fake_port1
         self.dhcp.port_update_end(None, payload)
+        self._process_network_events()
         self.cache.assert_has_calls(
             [mock.call.get_network_by_id(fake_port1.network_id),
              mock.call.put_port(mock.ANY)])
@@ -939,6 +999,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         payload['port']['fixed_ips'][0]['ip_address'] = '172.9.9.99'
         payload['port']['device_id'] = device_id
         self.dhcp.port_update_end(None, payload)
+        self._process_network_events()
         self.call_driver.assert_has_calls(
             [mock.call.call_driver('restart', fake_network)])
 
@@ -950,6 +1011,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
             payload['port']['network_id'], self.dhcp.conf.host)
         payload['port']['device_id'] = device_id
         self.dhcp.port_update_end(None, payload)
+        self._process_network_events()
         self.call_driver.assert_has_calls(
             [mock.call.call_driver('reload_allocations', fake_network)])
 
@@ -959,6 +1021,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.cache.get_port_by_id.return_value = fake_port2
 
         self.dhcp.port_delete_end(None, payload)
+        self._process_network_events()
         self.cache.assert_has_calls(
             [mock.call.get_port_by_id(fake_port2.id),
              mock.call.get_network_by_id(fake_network.id),
@@ -966,11 +1029,36 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.call_driver.assert_has_calls(
             [mock.call.call_driver('reload_allocations', fake_network)])
 
+    def test_port_events_merged(self):
+        self.cache.get_network_by_id.return_value = fake_network
+        self.cache.get_port_by_id.return_value = fake_port2
+        self.dhcp.port_update_end(None, dict(port=fake_port2))
+        self.dhcp.port_create_end(None, dict(port=fake_port1))
+        self.dhcp.port_delete_end(None, dict(port_id=fake_port2.id))
+        self.assertEqual(1, self.dhcp._queue.depth)
+        self.assertFalse(self.call_driver.called)
+        self._process_network_events()
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 fake_network)
+        self.assertEqual({'event_queue_depth': 0,
+                          'events_merged': 2,
+                          'events_processed': 1},
+                         self.dhcp._queue.get_state())
+
+    def test_port_event_on_deleted_network(self):
+        self.cache.get_network_by_id.return_value = fake_network
+        self.cache.get_port_by_id.return_value = fake_port2
+        self.dhcp.port_update_end(None, dict(port=fake_port2))
+        self.cache.get_network_by_id.return_value = None
+        self._process_network_events()
+        self.assertFalse(self.call_driver.called)
+
     def test_port_delete_end_unknown_port(self):
         payload = dict(port_id='unknown')
         self.cache.get_port_by_id.return_value = None
 
         self.dhcp.port_delete_end(None, payload)
+        self._process_network_events()
 
         self.cache.assert_has_calls([mock.call.get_port_by_id('unknown')])
         self.assertEqual(self.call_driver.call_count, 0)
@@ -1133,7 +1221,43 @@ class TestNetworkCache(base.BaseTestCase):
     def test_get_port_by_id(self):
         nc = dhcp_agent.NetworkCache()
         nc.put(fake_network)
-        self.assertEqual(nc.get_port_by_id(fake_port1.id), fake_port1)
+        self.assertIs(nc.get_port_by_id(fake_port1.id),
+                      fake_network.ports[0])
+
+    def test_get_port_by_mac(self):
+        nc = dhcp_agent.NetworkCache()
+        nc.put(fake_network)
+        self.assertIs(nc.get_port_by_mac(fake_port1.mac_address),
+                      fake_network.ports[0])
+        self.assertIsNone(nc.get_port_by_mac('00:00:00:00:00:00'))
+
+    def test_get_subnet_by_id(self):
+        nc = dhcp_agent.NetworkCache()
+        nc.put(fake_network)
+        self.assertIs(nc.get_subnet_by_id(fake_subnet2.id),
+                      fake_network.subnets[1])
+        nc.remove(fake_network)
+        self.assertIsNone(nc.get_subnet_by_id(fake_subnet2.id))
+
+    def test_put_port_updates_indexes(self):
+        fake_net = dhcp.NetModel(
+            True, dict(id='12345678-1234-5678-1234567890ab',
+                       tenant_id='aaaaaaaa-aaaa-aaaa-aaaaaaaaaaaa',
+                       subnets=[fake_subnet1],
+                       ports=[fake_port1]))
+        nc = dhcp_agent.NetworkCache()
+        nc.put(fake_net)
+        updated_port = dhcp.PortModel(fake_port1,
+                                      mac_address='aa:bb:cc:dd:ee:00')
+        nc.put_port(updated_port)
+        self.assertEqual([updated_port], fake_net.ports)
+        self.assertIs(updated_port, nc.get_port_by_id(fake_port1.id))
+        self.assertIs(updated_port, nc.get_port_by_mac('aa:bb:cc:dd:ee:00'))
+        self.assertIsNone(nc.get_port_by_mac(fake_port1.mac_address))
+        nc.remove_port(updated_port)
+        self.assertEqual([], fake_net.ports)
+        self.assertIsNone(nc.get_port_by_id(fake_port1.id))
+        self.assertEqual({}, nc.mac_lookup)
 
 
 class FakePort1(object):
@@ -1238,7 +1362,7 @@ class TestDeviceManager(base.BaseTestCase):
         else:
             expected_ips = ['172.9.9.9/24', '169.254.169.254/16']
         expected = [
-            mock.call.get_device_name(port),
+            mock.call.get_device_name(mock.ANY),
             mock.call.init_l3(
                 'tap12345678-12',
                 expected_ips,
@@ -1252,6 +1376,10 @@ class TestDeviceManager(base.BaseTestCase):
                                            'aa:bb:cc:dd:ee:ff',
                                            namespace=net.namespace))
         self.mock_driver.assert_has_calls(expected)
+        device_port = self.mock_driver.get_device_name.call_args[0][0]
+        self.assertEqual(port.id, device_port.id)
+        self.assertEqual(port.fixed_ips[0].subnet_id,
+                         device_port.fixed_ips[0].subnet.id)
 
         dh._set_default_route.assert_called_once_with(net, 'tap12345678-12')
 
@@ -1275,6 +1403,15 @@ class TestDeviceManager(base.BaseTestCase):
     def test_setup_device_is_ready(self):
         self._test_setup_helper(True)
 
+    def _network_with_dhcp_port(self, dh, enable_dhcp_subnet2=False):
+        port = dhcp.PortModel(fake_network.ports[0],
+                              device_id=dh.get_device_id(fake_network))
+        subnets = list(fake_network.subnets)
+        if enable_dhcp_subnet2:
+            subnets[1] = dhcp.SubnetModel(subnets[1], enable_dhcp=True)
+        return dhcp.NetModel(True, dict(fake_network.copy(), ports=[port],
+                                        subnets=subnets))
+
     def test_create_dhcp_port_raise_conflict(self):
         plugin = mock.Mock()
         dh = dhcp.DeviceManager(cfg.CONF, plugin)
@@ -1300,9 +1437,8 @@ class TestDeviceManager(base.BaseTestCase):
     def test_create_dhcp_port_update_add_subnet(self):
         plugin = mock.Mock()
         dh = dhcp.DeviceManager(cfg.CONF, plugin)
-        fake_network_copy = copy.deepcopy(fake_network)
-        fake_network_copy.ports[0].device_id = dh.get_device_id(fake_network)
-        fake_network_copy.subnets[1].enable_dhcp = True
+        fake_network_copy = self._network_with_dhcp_port(
+            dh, enable_dhcp_subnet2=True)
         plugin.update_dhcp_port.return_value = fake_network.ports[0]
         dh.setup_dhcp_port(fake_network_copy)
         port_body = {'port': {
@@ -1318,9 +1454,8 @@ class TestDeviceManager(base.BaseTestCase):
     def test_update_dhcp_port_raises_conflict(self):
         plugin = mock.Mock()
         dh = dhcp.DeviceManager(cfg.CONF, plugin)
-        fake_network_copy = copy.deepcopy(fake_network)
-        fake_network_copy.ports[0].device_id = dh.get_device_id(fake_network)
-        fake_network_copy.subnets[1].enable_dhcp = True
+        fake_network_copy = self._network_with_dhcp_port(
+            dh, enable_dhcp_subnet2=True)
         plugin.update_dhcp_port.return_value = None
         self.assertRaises(exceptions.Conflict,
                           dh.setup_dhcp_port,
@@ -1329,8 +1464,7 @@ class TestDeviceManager(base.BaseTestCase):
     def test_create_dhcp_port_no_update_or_create(self):
         plugin = mock.Mock()
         dh = dhcp.DeviceManager(cfg.CONF, plugin)
-        fake_network_copy = copy.deepcopy(fake_network)
-        fake_network_copy.ports[0].device_id = dh.get_device_id(fake_network)
+        fake_network_copy = self._network_with_dhcp_port(dh)
         dh.setup_dhcp_port(fake_network_copy)
         self.assertFalse(plugin.setup_dhcp_port.called)
         self.assertFalse(plugin.update_dhcp_port.called)
@@ -1584,3 +1718,54 @@ class TestNetModel(base.BaseTestCase):
     def test_ns_name_none_namespace(self):
         network = dhcp.NetModel(None, {'id': 'foo'})
         self.assertIsNone(network.namespace)
+
+    def test_nested_records(self):
+        network = dhcp.NetModel(True, {
+            'id': 'foo',
+            'subnets': [{'id': 'bar', 'host_routes': [
+                {'destination': '0.0.0.0/0', 'nexthop': '10.0.0.1'}]}],
+            'ports': [{'id': 'baz', 'fixed_ips': [
+                {'subnet_id': 'bar', 'ip_address': '10.0.0.2'}]}]})
+        self.assertIsInstance(network.subnets[0], dhcp.SubnetModel)
+        self.assertEqual('10.0.0.1', network.subnets[0].host_routes[0].nexthop)
+        self.assertIsInstance(network.ports[0].fixed_ips[0],
+                              dhcp.FixedIpModel)
+        self.assertEqual('10.0.0.2', network.ports[0]['fixed_ips'][0]
+                         ['ip_address'])
+
+    def test_deepcopy(self):
+        network = dhcp.NetModel(True, {'id': 'foo', 'ports': [{'id': 'bar'}]})
+        network_copy = copy.deepcopy(network)
+        self.assertEqual(network, network_copy)
+        self.assertIsNot(network.ports[0], network_copy.ports[0])
+        self.assertEqual('qdhcp-foo', network_copy.namespace)
+
+
+class TestRecord(base.BaseTestCase):
+    def test_access(self):
+        port = dhcp.PortModel({'id': 'foo', 'mac_address': 'aa:bb'})
+        self.assertEqual('foo', port.id)
+        self.assertEqual('foo', port['id'])
+        self.assertEqual('aa:bb', port.get('mac_address'))
+        self.assertIn('id', port)
+        self.assertNotIn('device_id', port)
+        self.assertIsNone(port.get('device_id'))
+        self.assertFalse(getattr(port, 'extra_dhcp_opts', False))
+        self.assertRaises(AttributeError, getattr, port, 'device_id')
+        self.assertRaises(KeyError, port.__getitem__, 'device_id')
+
+    def test_read_only(self):
+        port = dhcp.PortModel({'id': 'foo'})
+        self.assertRaises(AttributeError, setattr, port, 'id', 'bar')
+        self.assertRaises(AttributeError, delattr, port, 'id')
+
+    def test_unknown_keys_dropped(self):
+        port = dhcp.PortModel({'id': 'foo', 'binding:host_id': 'host'})
+        self.assertEqual({'id': 'foo'}, port.to_dict())
+        self.assertNotIn('binding:host_id', port)
+
+    def test_replace_values(self):
+        port = dhcp.PortModel({'id': 'foo', 'device_id': 'bar'})
+        new_port = dhcp.PortModel(port, device_id='baz')
+        self.assertEqual('bar', port.device_id)
+        self.assertEqual({'id': 'foo', 'device_id': 'baz'}, new_port)
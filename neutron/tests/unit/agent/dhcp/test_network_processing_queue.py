@@ -0,0 +1,56 @@
+# Copyright 2014 Hewlett-Packard Development Company, L.P.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from neutron.agent.dhcp import network_processing_queue as dhcp_queue
+from neutron.openstack.common import uuidutils
+from neutron.tests import base
+
+_uuid = uuidutils.generate_uuid
+FAKE_ID = _uuid()
+FAKE_ID_2 = _uuid()
+
+
+class TestNetworkProcessingQueue(base.BaseTestCase):
+    def setUp(self):
+        super(TestNetworkProcessingQueue, self).setUp()
+        self.queue = dhcp_queue.NetworkProcessingQueue()
+
+    def test_actions_merged(self):
+        self.queue.add(FAKE_ID, dhcp_queue.RELOAD_ALLOCATIONS)
+        self.queue.add(FAKE_ID_2, dhcp_queue.RELOAD_ALLOCATIONS)
+        self.queue.add(FAKE_ID, dhcp_queue.RESTART)
+        self.queue.add(FAKE_ID, dhcp_queue.RELOAD_ALLOCATIONS)
+        self.assertEqual(2, self.queue.depth)
+        self.assertEqual(2, self.queue.merged)
+        self.assertEqual((FAKE_ID, dhcp_queue.RESTART), self.queue.get())
+        self.assertEqual((FAKE_ID_2, dhcp_queue.RELOAD_ALLOCATIONS),
+                         self.queue.get())
+        self.assertEqual(0, self.queue.depth)
+
+    def test_action_added_while_in_progress(self):
+        self.queue.add(FAKE_ID, dhcp_queue.RELOAD_ALLOCATIONS)
+        self.assertEqual(FAKE_ID, self.queue.get()[0])
+        self.queue.add(FAKE_ID, dhcp_queue.RELOAD_ALLOCATIONS)
+        self.queue.add(FAKE_ID_2, dhcp_queue.RELOAD_ALLOCATIONS)
+        # The network is not handed to another worker until it is done
+        self.assertEqual(FAKE_ID_2, self.queue.get()[0])
+        self.queue.done(FAKE_ID_2)
+        self.queue.done(FAKE_ID)
+        self.assertEqual((FAKE_ID, dhcp_queue.RELOAD_ALLOCATIONS),
+                         self.queue.get())
+        self.queue.done(FAKE_ID)
+        self.assertEqual({'event_queue_depth': 0,
+                          'events_merged': 0,
+                          'events_processed': 3},
+                         self.queue.get_state())
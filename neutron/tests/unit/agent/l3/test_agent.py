@@ -13,7 +13,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import copy
+import datetime
 
 import eventlet
 from itertools import chain as iter_chain
@@ -34,9 +36,11 @@ from neutron.agent.l3 import legacy_router
 from neutron.agent.l3 import link_local_allocator as lla
 from neutron.agent.l3 import namespaces
 from neutron.agent.l3 import router_info as l3router
+from neutron.agent.l3 import router_processing_queue
 from neutron.agent.linux import external_process
 from neutron.agent.linux import interface
 from neutron.agent.linux import ra
+from neutron.agent.metadata import config as metadata_config
 from neutron.agent.metadata import driver as metadata_driver
 from neutron.callbacks import manager
 from neutron.callbacks import registry
@@ -273,6 +277,35 @@ def get_ha_interface(ip='169.254.192.1', mac='12:34:56:78:2b:5d'):
             'priority': 1}
 
 
+class TestL3PluginApi(base.BaseTestCase):
+    def setUp(self):
+        super(TestL3PluginApi, self).setUp()
+        self.api = l3_agent.L3PluginApi('topic', HOSTNAME)
+        self.client = mock.patch.object(self.api, 'client').start()
+        self.cctxt = self.client.prepare.return_value
+
+    def test_get_routers_delta(self):
+        self.cctxt.call.return_value = {'routers': [], 'deleted': ['r1']}
+        self.assertEqual({'routers': [], 'deleted': ['r1']},
+                         self.api.get_routers_delta(mock.sentinel.ctx,
+                                                    {'r1': 'rev1'}))
+        self.client.prepare.assert_called_once_with(version='1.6')
+        self.cctxt.call.assert_called_once_with(
+            mock.sentinel.ctx, 'sync_routers_delta', host=HOSTNAME,
+            revisions={'r1': 'rev1'})
+
+    def test_get_routers_delta_unsupported(self):
+        routers = [{'id': 'r1'}, {'id': 'r3'}]
+        self.cctxt.call.side_effect = [
+            oslo_messaging.UnsupportedVersion('1.6'), routers]
+        delta = self.api.get_routers_delta(mock.sentinel.ctx,
+                                           {'r1': 'rev1', 'r2': 'rev2'})
+        self.assertEqual({'routers': routers, 'deleted': ['r2']}, delta)
+        self.cctxt.call.assert_called_with(
+            mock.sentinel.ctx, 'sync_routers', host=HOSTNAME,
+            router_ids=None)
+
+
 class BasicRouterOperationsFramework(base.BaseTestCase):
 
     def setUp(self):
@@ -288,6 +321,7 @@ class BasicRouterOperationsFramework(base.BaseTestCase):
         agent_config.register_process_monitor_opts(self.conf)
         self.conf.register_opts(interface.OPTS)
         self.conf.register_opts(external_process.OPTS)
+        self.conf.register_opts(metadata_config.DRIVER_OPTS)
         self.conf.set_override('router_id', 'fake_id')
         self.conf.set_override('interface_driver',
                                'neutron.agent.linux.interface.NullDriver')
@@ -402,9 +436,92 @@ class TestBasicRouterOperations(BasicRouterOperationsFramework):
             l3_agent.L3NATAgent(HOSTNAME, self.conf)
             self.ensure_dir.assert_called_once_with('/etc/ha/')
 
+    def test_process_state_change(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router_id = _uuid()
+        ri = mock.Mock()
+        agent.router_info[router_id] = ri
+        agent.enqueue_state_change(router_id, 'backup')
+        agent.enqueue_state_change(router_id, 'master')
+        with contextlib.nested(
+                mock.patch.object(agent, '_update_metadata_proxy'),
+                mock.patch.object(agent, '_update_radvd_daemon'),
+                mock.patch.object(agent.state_change_notifier,
+                                  'queue_event')) as (
+                update_proxy, update_radvd, queue_event):
+            agent._process_state_change()
+        update_proxy.assert_called_once_with(ri, router_id, 'master')
+        update_radvd.assert_called_once_with(ri, 'master')
+        queue_event.assert_called_once_with((router_id, 'master', mock.ANY))
+        self.assertEqual({'ha_state_changes_pending': 0,
+                          'ha_state_changes_merged': 1,
+                          'ha_state_report_latency': None},
+                         agent.get_ha_state_change_stats())
+
+    def _report_state_configurations(self, agent, state_rpc):
+        agent._report_state()
+        return (state_rpc.return_value.report_state.call_args[0][1]
+                ['configurations'])
+
+    def test_report_state_reported_ha_state_change_stats(self):
+        agent_config.register_agent_state_opts_helper(self.conf)
+        self.conf.set_override('report_interval', 0, 'AGENT')
+        with mock.patch.object(l3_agent.agent_rpc,
+                               'PluginReportStateAPI') as state_rpc:
+            agent = l3_agent.L3NATAgentWithStateReport(HOSTNAME, self.conf)
+        configurations = self._report_state_configurations(agent, state_rpc)
+        self.assertEqual(0, configurations['routers'])
+        self.assertNotIn('ha_state_changes', configurations)
+
+        agent.enqueue_state_change('r1', 'backup')
+        agent.enqueue_state_change('r1', 'master')
+        # Unchanged until a batch is reported
+        configurations = self._report_state_configurations(agent, state_rpc)
+        self.assertNotIn('ha_state_changes', configurations)
+
+        with mock.patch.object(ha, 'time') as time:
+            time.time.return_value = 110
+            agent.notify_server([('r1', 'master', 100)])
+        agent.enqueue_state_change('r2', 'master')
+        stats = {'ha_state_changes_pending': 1,
+                 'ha_state_changes_merged': 1,
+                 'ha_state_report_latency': 10}
+        configurations = self._report_state_configurations(agent, state_rpc)
+        self.assertEqual(stats, configurations['ha_state_changes'])
+        configurations = self._report_state_configurations(agent, state_rpc)
+        self.assertEqual(stats, configurations['ha_state_changes'])
+
+    def test_process_state_change_router_not_managed(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.enqueue_state_change(_uuid(), 'master')
+        with mock.patch.object(agent.state_change_notifier,
+                               'queue_event') as queue_event:
+            agent._process_state_change()
+        self.assertFalse(queue_event.called)
+
+    def test_notify_server(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        with mock.patch.object(ha, 'time') as time:
+            time.time.return_value = 110
+            agent.notify_server([('r1', 'master', 100),
+                                 ('r2', 'fault', 105),
+                                 ('r1', 'backup', 108)])
+        self.plugin_api.update_ha_routers_states.assert_called_once_with(
+            agent.context, {'r1': 'standby', 'r2': 'standby'})
+        self.assertEqual(10, agent.ha_state_report_latency)
+
+    def test_notify_server_failure(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.update_ha_routers_states.side_effect = Exception
+        with mock.patch.object(ha, 'LOG') as log:
+            agent.notify_server([('r1', 'master', 100)])
+        self.assertTrue(log.exception.called)
+        self.assertIsNone(agent.ha_state_report_latency)
+        self.assertIsNone(agent.reported_ha_state_change_stats)
+
     def test_periodic_sync_routers_task_raise_exception(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
-        self.plugin_api.get_routers.side_effect = ValueError
+        self.plugin_api.get_routers_delta.side_effect = ValueError
         self.assertRaises(ValueError,
                           agent.periodic_sync_routers_task,
                           agent.context)
@@ -420,10 +537,61 @@ class TestBasicRouterOperations(BasicRouterOperationsFramework):
 
     def test_periodic_sync_routers_task_call_clean_stale_namespaces(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
-        self.plugin_api.get_routers.return_value = []
+        self.plugin_api.get_routers_delta.return_value = {'routers': [],
+                                                          'deleted': []}
         agent.periodic_sync_routers_task(agent.context)
         self.assertFalse(agent.namespaces_manager._clean_stale)
 
+    def test_periodic_sync_routers_task_sends_revisions(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        unchanged, changed, deleted, unknown, added = [
+            _uuid() for i in range(5)]
+        for router_id in (unchanged, changed, deleted, unknown):
+            agent.router_info[router_id] = mock.Mock()
+        agent._router_revisions = {unchanged: 'rev1', changed: 'rev2',
+                                   deleted: 'rev3', 'removed': 'rev4'}
+        routers = [{'id': changed, 'revision': 'rev5'},
+                   {'id': unknown, 'revision': 'rev6'},
+                   {'id': added, 'revision': 'rev7'}]
+        self.plugin_api.get_routers_delta.return_value = {
+            'routers': routers, 'deleted': [deleted]}
+        agent._queue = mock.Mock()
+        with mock.patch.object(agent, 'namespaces_manager') as ns_manager:
+            agent.periodic_sync_routers_task(agent.context)
+        self.plugin_api.get_routers_delta.assert_called_once_with(
+            agent.context, {unchanged: 'rev1', changed: 'rev2',
+                            deleted: 'rev3'})
+        updates = [call[0][0] for call in agent._queue.add.call_args_list]
+        self.assertEqual(routers, [u.router for u in updates[:3]])
+        self.assertEqual(deleted, updates[3].id)
+        self.assertEqual(router_processing_queue.DELETE_ROUTER,
+                         updates[3].action)
+        self.assertEqual(4, len(updates))
+        keep_router = ns_manager.__enter__.return_value.keep_router
+        self.assertEqual(set([unchanged, changed, deleted, unknown, added]),
+                         set(c[0][0] for c in keep_router.call_args_list))
+        self.assertFalse(agent.fullsync)
+
+    def test_process_router_update_records_revision(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = {'id': _uuid(), 'revision': 'rev1'}
+        agent._process_router_if_compatible = mock.Mock(
+            side_effect=lambda r: agent.router_info.setdefault(
+                r['id'], mock.Mock(timings={})))
+        agent._queue.add(router_processing_queue.RouterUpdate(
+            router['id'], router_processing_queue.PRIORITY_SYNC_ROUTERS_TASK,
+            router=router))
+        agent._process_router_update()
+        self.assertEqual({router['id']: 'rev1'}, agent._router_revisions)
+
+        agent._process_router_if_compatible.side_effect = Exception
+        agent._queue.add(router_processing_queue.RouterUpdate(
+            router['id'], router_processing_queue.PRIORITY_SYNC_ROUTERS_TASK,
+            router=dict(router, revision='rev2')))
+        agent._process_router_update()
+        self.assertEqual({}, agent._router_revisions)
+        self.assertTrue(agent.fullsync)
+
     def test_router_info_create(self):
         id = _uuid()
         ri = l3router.RouterInfo(id, {}, **self.ri_kwargs)
@@ -2012,6 +2180,71 @@ class TestBasicRouterOperations(BasicRouterOperationsFramework):
         self.assertTrue(agent.fullsync)
         self.assertFalse(agent._process_router_if_compatible.called)
 
+    def _test_process_router_updates(self, updates):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._process_router_if_compatible = mock.Mock()
+        for update in updates:
+            agent._queue.add(update)
+        for update in updates:
+            agent._process_router_update()
+        return agent
+
+    def test_process_router_updates_fetched_in_batch(self):
+        routers = [{'id': _uuid()}, {'id': _uuid()}, {'id': _uuid()}]
+        updates = [router_processing_queue.RouterUpdate(
+            r['id'], router_processing_queue.PRIORITY_RPC) for r in routers]
+        self.plugin_api.get_routers.return_value = routers[1:]
+        agent = self._test_process_router_updates(updates)
+        self.plugin_api.get_routers.assert_called_once_with(
+            agent.context, [r['id'] for r in routers])
+        agent._process_router_if_compatible.assert_has_calls(
+            [mock.call(routers[1]), mock.call(routers[2])])
+        self.assertEqual(2, agent._process_router_if_compatible.call_count)
+        self.assertEqual({}, agent._prefetched_routers)
+
+    def test_process_router_updates_batch_size(self):
+        self.conf.set_override('router_fetch_batch_size', 2)
+        routers = [{'id': _uuid()}, {'id': _uuid()}, {'id': _uuid()}]
+        updates = [router_processing_queue.RouterUpdate(
+            r['id'], router_processing_queue.PRIORITY_RPC) for r in routers]
+        self.plugin_api.get_routers.side_effect = [routers[:2], routers[2:]]
+        agent = self._test_process_router_updates(updates)
+        self.plugin_api.get_routers.assert_has_calls(
+            [mock.call(agent.context, [routers[0]['id'], routers[1]['id']]),
+             mock.call(agent.context, [routers[2]['id']])])
+        self.assertEqual(3, agent._process_router_if_compatible.call_count)
+
+    def test_process_router_update_refetches_stale_prefetched_router(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._process_router_if_compatible = mock.Mock()
+        router = {'id': _uuid()}
+        agent._prefetched_routers[router['id']] = (
+            datetime.datetime.min, {'id': router['id'], 'stale': True})
+        agent._queue.add(router_processing_queue.RouterUpdate(
+            router['id'], router_processing_queue.PRIORITY_RPC))
+        self.plugin_api.get_routers.return_value = [router]
+        agent._process_router_update()
+        agent._process_router_if_compatible.assert_called_once_with(router)
+        self.assertEqual({}, agent._prefetched_routers)
+
+    def test_process_router_update_records_fetch_timing(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = {'id': _uuid()}
+        ri = mock.Mock(timings={'iptables': 0.25})
+
+        def process_router(router):
+            agent.router_info[router['id']] = ri
+
+        agent._process_router_if_compatible = mock.Mock(
+            side_effect=process_router)
+        agent._queue.add(router_processing_queue.RouterUpdate(
+            router['id'], router_processing_queue.PRIORITY_RPC))
+        self.plugin_api.get_routers.return_value = [router]
+        with mock.patch.object(l3_agent, 'time') as time:
+            time.time.side_effect = [1.0, 1.5]
+            agent._process_router_update()
+        self.assertEqual({'fetch': 0.5, 'iptables': 0.25}, ri.timings)
+
     def test_process_routers_update_rpc_timeout_on_get_ext_net(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         agent.fullsync = False
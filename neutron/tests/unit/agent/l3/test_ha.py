@@ -0,0 +1,45 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.agent.l3 import ha
+from neutron.tests import base
+
+
+class TestStateChangeQueue(base.BaseTestCase):
+    def setUp(self):
+        super(TestStateChangeQueue, self).setUp()
+        self.time = mock.patch.object(ha, 'time').start()
+        self.time.time.return_value = 100
+        self.queue = ha.StateChangeQueue()
+
+    def test_add_keeps_last_state(self):
+        self.queue.add('r1', 'backup')
+        self.time.time.return_value = 105
+        self.queue.add('r1', 'master')
+        self.assertEqual(1, self.queue.depth)
+        self.assertEqual(1, self.queue.merged)
+        self.assertEqual(('r1', 'master', 100), self.queue.get())
+        self.assertEqual(0, self.queue.depth)
+
+    def test_add_while_in_progress(self):
+        self.queue.add('r1', 'master')
+        self.queue.add('r2', 'master')
+        self.assertEqual('r1', self.queue.get()[0])
+        self.queue.add('r1', 'backup')
+        # r1 is queued again once its processing is done
+        self.assertEqual('r2', self.queue.get()[0])
+        self.queue.done('r2')
+        self.assertTrue(self.queue._ready.empty())
+        self.queue.done('r1')
+        self.assertEqual(('r1', 'backup', 100), self.queue.get())
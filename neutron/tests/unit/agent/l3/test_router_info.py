@@ -173,6 +173,29 @@ class TestBasicRouterOperations(BasicRouterTestCaseFramework):
         # Be sure that add_rule is called somewhere in the middle
         self.assertFalse(ipv4_nat.add_rule.called)
 
+    def test_timed(self):
+        ri = self._create_router()
+        with mock.patch.object(router_info, 'time') as time:
+            time.time.side_effect = [1.0, 1.5, 2.0, 2.25]
+            with ri.timed('namespace'):
+                pass
+            with ri.timed('namespace'):
+                pass
+        self.assertEqual({'namespace': 0.75}, ri.timings)
+
+    def test_process_records_iptables_timing(self):
+        ri = self._create_router()
+        ri.iptables_manager = mock.Mock(apply_time=1.0)
+
+        def apply_iptables(*args):
+            ri.iptables_manager.apply_time += 0.5
+
+        ri._process_internal_ports = mock.Mock()
+        ri.process_external = mock.Mock(side_effect=apply_iptables)
+        ri.routes_updated = mock.Mock()
+        ri.process(mock.Mock())
+        self.assertEqual({'iptables': 0.5}, ri.timings)
+
     def _test_add_fip_addr_to_device_error(self, device):
         ri = self._create_router()
         ip = '15.1.2.3'
@@ -100,3 +100,23 @@ class TestExclusiveRouterProcessor(base.BaseTestCase):
             raise Exception("Only the master should process a router")
 
         self.assertEqual(2, len([i for i in master.updates()]))
+
+
+class TestRouterProcessingQueue(base.BaseTestCase):
+    def test_get_router_ids_to_fetch(self):
+        queue = l3_queue.RouterProcessingQueue()
+        now = datetime.datetime.utcnow()
+        later = now + datetime.timedelta(seconds=1)
+        queue.add(l3_queue.RouterUpdate(
+            'r3', l3_queue.PRIORITY_SYNC_ROUTERS_TASK, timestamp=now))
+        queue.add(l3_queue.RouterUpdate('r2', l3_queue.PRIORITY_RPC,
+                                        timestamp=later))
+        queue.add(l3_queue.RouterUpdate('r1', l3_queue.PRIORITY_RPC,
+                                        timestamp=now))
+        queue.add(l3_queue.RouterUpdate('r4', l3_queue.PRIORITY_RPC,
+                                        router={'id': 'r4'}))
+        queue.add(l3_queue.RouterUpdate('r5', l3_queue.PRIORITY_RPC,
+                                        action=l3_queue.DELETE_ROUTER))
+        self.assertEqual(['r1', 'r2', 'r3'],
+                         queue.get_router_ids_to_fetch(10))
+        self.assertEqual(['r1', 'r2'], queue.get_router_ids_to_fetch(2))
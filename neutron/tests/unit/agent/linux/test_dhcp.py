@@ -627,6 +627,8 @@ class TestBase(base.BaseTestCase):
 
         self.external_process = mock.patch(
             'neutron.agent.linux.external_process.ProcessManager').start()
+        mock.patch.dict(dhcp.Dnsmasq._written_files, clear=True).start()
+        mock.patch.dict(dhcp.Dnsmasq._written_leases, clear=True).start()
 
 
 class TestDhcpBase(TestBase):
@@ -1335,6 +1337,45 @@ class TestDnsmasq(TestBase):
         dnsmasq._release_lease.assert_has_calls([mock.call(mac2, ip2)],
                                                 any_order=True)
 
+    def test_release_unused_leases_from_written_hosts(self):
+        dnsmasq = self._get_dnsmasq(FakeDualNetwork())
+        dnsmasq._read_hosts_file_leases = mock.Mock()
+        dnsmasq._release_lease = mock.Mock()
+        dnsmasq._output_hosts_file()
+        port = dnsmasq.network.ports[0]
+        dnsmasq.network.ports = dnsmasq.network.ports[1:]
+
+        dnsmasq._release_unused_leases()
+
+        self.assertFalse(dnsmasq._read_hosts_file_leases.called)
+        dnsmasq._release_lease.assert_has_calls(
+            [mock.call(port.mac_address, alloc.ip_address)
+             for alloc in port.fixed_ips], any_order=True)
+        self.assertEqual(len(port.fixed_ips),
+                         dnsmasq._release_lease.call_count)
+
+    def test_unchanged_config_files_not_written(self):
+        dnsmasq = self._get_dnsmasq(FakeDualNetwork())
+        with mock.patch('os.path.exists', return_value=True):
+            self.assertTrue(dnsmasq._output_config_files())
+            self.assertEqual(3, self.safe.call_count)
+            self.safe.reset_mock()
+            self.assertFalse(dnsmasq._output_config_files())
+            self.assertFalse(self.safe.called)
+            dnsmasq.network.ports = dnsmasq.network.ports[1:]
+            self.assertTrue(dnsmasq._output_config_files())
+            self.assertEqual(['host', 'addn_hosts'],
+                             [os.path.basename(c[0][0])
+                              for c in self.safe.call_args_list])
+
+    def test_reload_allocations_unchanged_does_not_signal(self):
+        dnsmasq = self._get_dnsmasq(FakeDualNetwork())
+        with mock.patch('os.path.exists', return_value=True):
+            dnsmasq._output_config_files()
+            dnsmasq._spawn_or_reload_process(reload_with_HUP=True)
+        self.external_process.return_value.enable.assert_called_once_with(
+            reload_cfg=False)
+
     def test_read_hosts_file_leases(self):
         filename = '/path/to/file'
         with mock.patch('os.path.exists') as mock_exists:
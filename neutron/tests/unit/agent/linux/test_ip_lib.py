@@ -910,6 +910,17 @@ class TestIpNetnsCommand(TestIPCmdBase):
                                             check_exit_code=True,
                                             extra_ok_codes=None)
 
+    def test_execute_reusing_client(self):
+        self.parent.namespace = 'ns'
+        with mock.patch('neutron.agent.common.utils.'
+                        'execute_reusing_client') as execute:
+            self.netns_cmd.execute_reusing_client([['sysctl', '-w', 'a=1'],
+                                                   ['ip', 'link', 'list']])
+            execute.assert_called_once_with(
+                [['ip', 'netns', 'exec', 'ns', 'sysctl', '-w', 'a=1'],
+                 ['ip', 'netns', 'exec', 'ns', 'ip', 'link', 'list']],
+                check_exit_code=True, run_as_root=True)
+
     def test_execute_env_var_prepend(self):
         self.parent.namespace = 'ns'
         with mock.patch('neutron.agent.common.utils.execute') as execute:
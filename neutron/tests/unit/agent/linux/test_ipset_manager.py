@@ -118,3 +118,116 @@ class IpsetManagerTestCase(BaseIpsetManagerTest):
         self.expect_destroy()
         self.ipset.destroy(TEST_SET_ID, ETHERTYPE)
         self.verify_mock_calls()
+
+    def test_set_members_after_load_sets_uses_single_restore(self):
+        self.execute.return_value = ''
+        self.ipset.load_sets()
+        self.expected_calls = [
+            mock.call(['ipset', 'list', '-output', 'save'],
+                      process_input=None,
+                      run_as_root=True),
+            mock.call(['ipset', 'restore', '-exist'],
+                      process_input='\n'.join([
+                          'create %s hash:net family inet' % TEST_SET_NAME,
+                          'add %s %s' % (TEST_SET_NAME, FAKE_IPS[0])]),
+                      run_as_root=True)]
+        self.ipset.set_members(TEST_SET_ID, ETHERTYPE, [FAKE_IPS[0]])
+        self.verify_mock_calls()
+        self.assertEqual(2, self.execute.call_count)
+
+    def test_load_sets(self):
+        self.execute.return_value = '\n'.join([
+            'create %s hash:net family inet hashsize 1024' % TEST_SET_NAME,
+            'add %s %s' % (TEST_SET_NAME, FAKE_IPS[0]),
+            'add %s %s' % (TEST_SET_NAME, FAKE_IPS[1]),
+            'create %s hash:net family inet' % TEST_SET_NAME_NEW,
+            'create foreign hash:ip family inet',
+            'add foreign 10.1.0.1'])
+        self.ipset.load_sets()
+        self.assertTrue(self.ipset.sets_loaded)
+        self.assertEqual({TEST_SET_NAME: FAKE_IPS[0:2]},
+                         self.ipset.ipset_sets)
+
+    def test_load_sets_normalizes_members(self):
+        self.execute.return_value = '\n'.join([
+            'create %s hash:net family inet6' % TEST_SET_NAME,
+            'add %s fe80::1' % TEST_SET_NAME,
+            'add %s 2001:db8::/64' % TEST_SET_NAME])
+        self.ipset.load_sets()
+        self.execute.reset_mock()
+        # Same members, as given by the agent
+        self.ipset.set_members(TEST_SET_ID, ETHERTYPE,
+                               ['FE80:0:0:0:0:0:0:1', '2001:db8::1/64'])
+        self.assertFalse(self.execute.called)
+
+    def test_load_sets_failure(self):
+        self.execute.side_effect = RuntimeError
+        self.ipset.load_sets()
+        self.assertFalse(self.ipset.sets_loaded)
+        self.assertEqual({}, self.ipset.ipset_sets)
+
+
+class IpsetManagerDeferApplyTestCase(BaseIpsetManagerTest):
+
+    def setUp(self):
+        super(IpsetManagerDeferApplyTestCase, self).setUp()
+        self.ipset.ipset_sets[TEST_SET_NAME] = list(FAKE_IPS[0:1])
+        self.ipset.defer_apply_on()
+
+    def _expect_restore(self, lines):
+        return mock.call(['ipset', 'restore', '-exist'],
+                         process_input='\n'.join(lines),
+                         run_as_root=True)
+
+    def test_set_members_is_deferred(self):
+        self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[0:2])
+        self.assertFalse(self.execute.called)
+        self.assertEqual(FAKE_IPS[0:2], self.ipset.ipset_sets[TEST_SET_NAME])
+
+    def test_defer_apply_off_single_restore(self):
+        other_set = ipset_manager.IpsetManager.get_name('other', 'IPv6')
+        self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[1:2])
+        self.ipset.set_members('other', 'IPv6', ['fe80::1'])
+        self.ipset.defer_apply_off()
+        self.execute.assert_called_once_with(
+            ['ipset', 'restore', '-exist'],
+            process_input='\n'.join([
+                'add %s %s' % (TEST_SET_NAME, FAKE_IPS[1]),
+                'del %s %s' % (TEST_SET_NAME, FAKE_IPS[0]),
+                'create %s hash:net family inet6' % other_set,
+                'create %s-new hash:net family inet6' % other_set,
+                'add %s-new fe80::1' % other_set,
+                'swap %s-new %s' % (other_set, other_set),
+                'destroy %s-new' % other_set]),
+            run_as_root=True)
+
+    def test_defer_apply_off_swaps_large_changes(self):
+        self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS)
+        self.ipset.defer_apply_off()
+        lines = ['create %s hash:net family inet' % TEST_SET_NAME_NEW]
+        lines.extend('add %s %s' % (TEST_SET_NAME_NEW, ip) for ip in FAKE_IPS)
+        lines.extend(['swap %s %s' % (TEST_SET_NAME_NEW, TEST_SET_NAME),
+                      'destroy %s' % TEST_SET_NAME_NEW])
+        self.assertEqual([self._expect_restore(lines)],
+                         self.execute.call_args_list)
+
+    def test_defer_apply_off_without_changes(self):
+        self.ipset.defer_apply_off()
+        self.assertFalse(self.execute.called)
+
+    def test_destroy_flushes_pending_changes(self):
+        self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[0:2])
+        self.ipset.destroy(TEST_SET_ID, ETHERTYPE)
+        self.expected_calls = [
+            self._expect_restore(['add %s %s' % (TEST_SET_NAME,
+                                                 FAKE_IPS[1])])]
+        self.expect_destroy()
+        self.verify_mock_calls()
+
+    def test_failed_restore_forgets_pending_sets(self):
+        self.ipset.sets_loaded = True
+        self.execute.side_effect = RuntimeError
+        self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[0:2])
+        self.assertRaises(RuntimeError, self.ipset.defer_apply_off)
+        self.assertFalse(self.ipset.set_exists(TEST_SET_ID, ETHERTYPE))
+        self.assertFalse(self.ipset.sets_loaded)
@@ -1093,22 +1093,9 @@ class IptablesFirewallTestCase(BaseIptablesFirewallTestCase):
                      'ofake_dev',
                      '-j $sg-fallback', comment=None),
                  mock.call.add_rule('sg-chain', '-j ACCEPT'),
-                 mock.call.remove_chain('ifake_dev'),
-                 mock.call.remove_chain('ofake_dev'),
-                 mock.call.remove_chain('sfake_dev'),
-                 mock.call.remove_chain('sg-chain'),
-                 mock.call.add_chain('sg-chain'),
-                 mock.call.add_chain('ifake_dev'),
-                 mock.call.add_rule(
-                     'FORWARD',
-                     '-m physdev --physdev-out tapfake_dev '
-                     '--physdev-is-bridged -j $sg-chain',
-                     comment=ic.VM_INT_SG),
-                 mock.call.add_rule(
-                     'sg-chain',
-                     '-m physdev --physdev-out tapfake_dev '
-                     '--physdev-is-bridged -j $ifake_dev',
-                     comment=ic.SG_TO_VM_SG),
+                 mock.call.empty_chain('sfake_dev', keep_positions=True),
+                 mock.call.empty_chain('ifake_dev', keep_positions=True),
+                 mock.call.empty_chain('ofake_dev', keep_positions=True),
                  mock.call.add_rule(
                      'ifake_dev',
                      '-m state --state INVALID -j DROP', comment=None),
@@ -1119,22 +1106,6 @@ class IptablesFirewallTestCase(BaseIptablesFirewallTestCase):
                  mock.call.add_rule(
                      'ifake_dev',
                      '-j $sg-fallback', comment=None),
-                 mock.call.add_chain('ofake_dev'),
-                 mock.call.add_rule(
-                     'FORWARD',
-                     '-m physdev --physdev-in tapfake_dev '
-                     '--physdev-is-bridged -j $sg-chain',
-                     comment=ic.VM_INT_SG),
-                 mock.call.add_rule(
-                     'sg-chain',
-                     '-m physdev --physdev-in tapfake_dev '
-                     '--physdev-is-bridged -j $ofake_dev',
-                     comment=ic.SG_TO_VM_SG),
-                 mock.call.add_rule(
-                     'INPUT',
-                     '-m physdev --physdev-in tapfake_dev '
-                     '--physdev-is-bridged -j $ofake_dev',
-                     comment=ic.INPUT_TO_SG),
                  mock.call.add_chain('sfake_dev'),
                  mock.call.add_rule(
                      'sfake_dev',
@@ -1166,7 +1137,6 @@ class IptablesFirewallTestCase(BaseIptablesFirewallTestCase):
                  mock.call.add_rule('ofake_dev',
                                     '-j $sg-fallback',
                                     comment=None),
-                 mock.call.add_rule('sg-chain', '-j ACCEPT'),
                  mock.call.remove_chain('ifake_dev'),
                  mock.call.remove_chain('ofake_dev'),
                  mock.call.remove_chain('sfake_dev'),
@@ -1212,6 +1182,7 @@ class IptablesFirewallTestCase(BaseIptablesFirewallTestCase):
         chain_applies = CopyingMock()
         self.firewall._setup_chains_apply = chain_applies.setup
         self.firewall._remove_chains_apply = chain_applies.remove
+        self.firewall._update_port_chains = chain_applies.update
         return chain_applies
 
     def test_mock_chain_applies(self):
@@ -1223,8 +1194,7 @@ class IptablesFirewallTestCase(BaseIptablesFirewallTestCase):
         self.firewall.remove_port_filter(port_update)
         chain_applies.assert_has_calls([mock.call.remove({}, {}),
                                 mock.call.setup({'d1': port_prepare}, {}),
-                                mock.call.remove({'d1': port_prepare}, {}),
-                                mock.call.setup({'d1': port_update}, {}),
+                                mock.call.update(port_update),
                                 mock.call.remove({'d1': port_update}, {}),
                                 mock.call.setup({}, {})])
 
@@ -1247,8 +1217,8 @@ class IptablesFirewallTestCase(BaseIptablesFirewallTestCase):
             self.firewall.prepare_port_filter(port)
             self.firewall.update_port_filter(port)
             self.firewall.remove_port_filter(port)
-        chain_applies.assert_has_calls([mock.call.remove({}, {}),
-                                        mock.call.setup({}, {})])
+        # no port was filtered before or after, nothing to regenerate
+        self.assertFalse(chain_applies.mock_calls)
 
     def test_defer_chain_apply_coalesce_multiple_ports(self):
         chain_applies = self._mock_chain_applies()
@@ -1479,45 +1449,104 @@ class IptablesFirewallEnhancedIpsetTestCase(BaseIptablesFirewallTestCase):
 
     def test_determine_remote_sgs_to_remove(self):
         self._prepare_rules_and_members_for_removal()
-        ports = [self._fake_port()]
+        self.firewall._set_ports(self._fake_port())
 
         self.assertEqual(
             {_IPv4: set([OTHER_SGID]), _IPv6: set([OTHER_SGID])},
-            self.firewall._determine_remote_sgs_to_remove(ports))
+            self.firewall._determine_remote_sgs_to_remove())
 
     def test_determine_remote_sgs_to_remove_ipv6_unreferenced(self):
         self._prepare_rules_and_members_for_removal()
-        ports = [self._fake_port()]
-        self.firewall.sg_rules = self._fake_sg_rules(
-            remote_groups={_IPv4: [OTHER_SGID, FAKE_SGID],
-                           _IPv6: [FAKE_SGID]})
+        self.firewall._set_ports(self._fake_port())
+        self.firewall.update_security_group_rules(
+            FAKE_SGID,
+            self._fake_sg_rules(
+                remote_groups={_IPv4: [OTHER_SGID, FAKE_SGID],
+                               _IPv6: [FAKE_SGID]})[FAKE_SGID])
         self.assertEqual(
             {_IPv4: set(), _IPv6: set([OTHER_SGID])},
-            self.firewall._determine_remote_sgs_to_remove(ports))
+            self.firewall._determine_remote_sgs_to_remove())
 
-    def test_get_remote_sg_ids_by_ipversion(self):
+    def test_remote_sg_port_index(self):
         self.firewall.sg_rules = self._fake_sg_rules(
             remote_groups={_IPv4: [FAKE_SGID], _IPv6: [OTHER_SGID]})
 
-        ports = [self._fake_port()]
+        self.firewall._set_ports(self._fake_port())
 
         self.assertEqual(
-            {_IPv4: set([FAKE_SGID]), _IPv6: set([OTHER_SGID])},
-            self.firewall._get_remote_sg_ids_sets_by_ipversion(ports))
+            {_IPv4: {FAKE_SGID: set(['tapfake_dev'])},
+             _IPv6: {OTHER_SGID: set(['tapfake_dev'])}},
+            self.firewall.remote_sg_port_index)
 
     def test_determine_sg_rules_to_remove(self):
         self.firewall.pre_sg_rules = self._fake_sg_rules(sg_id=OTHER_SGID)
-        ports = [self._fake_port()]
+        self.firewall._set_ports(self._fake_port())
 
         self.assertEqual(set([OTHER_SGID]),
-                         self.firewall._determine_sg_rules_to_remove(ports))
+                         self.firewall._determine_sg_rules_to_remove())
 
-    def test_get_sg_ids_set_for_ports(self):
+    def test_sg_port_index(self):
         sg_ids = set([FAKE_SGID, OTHER_SGID])
-        ports = [self._fake_port(sg_id) for sg_id in sg_ids]
+        for sg_id in sg_ids:
+            port = self._fake_port(sg_id)
+            port['device'] = 'tap%s' % sg_id
+            self.firewall._set_ports(port)
+
+        self.assertEqual({FAKE_SGID: set(['tap%s' % FAKE_SGID]),
+                          OTHER_SGID: set(['tap%s' % OTHER_SGID])},
+                         self.firewall.sg_port_index)
+
+        self.firewall._unset_ports({'device': 'tap%s' % FAKE_SGID})
+        self.assertEqual({OTHER_SGID: set(['tap%s' % OTHER_SGID])},
+                         self.firewall.sg_port_index)
+
+    def test_sg_rules_update_marks_only_member_ports(self):
+        self.firewall.sg_rules = self._fake_sg_rules()
+        self.firewall.sg_rules.update(self._fake_sg_rules(sg_id=OTHER_SGID))
+        port = self._fake_port(OTHER_SGID)
+        port['device'] = 'tapother_dev'
+        self.firewall._set_ports(self._fake_port())
+        self.firewall._set_ports(port)
+
+        self.firewall.update_security_group_rules(OTHER_SGID, [])
+
+        self.assertEqual(set(['tapother_dev']), self.firewall._dirty_ports)
+        self.assertNotIn(OTHER_SGID,
+                         self.firewall.remote_sg_port_index[_IPv4])
+
+    def test_sg_members_update_only_refreshes_ipset(self):
+        self.firewall.sg_rules = self._fake_sg_rules()
+        self.firewall.update_security_group_members(
+            FAKE_SGID, {_IPv4: ['10.0.0.1'], _IPv6: [FAKE_IP[_IPv6]]})
+        self.firewall._set_ports(self._fake_port())
 
-        self.assertEqual(sg_ids,
-                         self.firewall._get_sg_ids_set_for_ports(ports))
+        self.firewall.update_security_group_members(
+            FAKE_SGID, {_IPv4: ['10.0.0.1', '10.0.0.2'],
+                        _IPv6: [FAKE_IP[_IPv6]]})
+
+        self.assertFalse(self.firewall._dirty_ports)
+        self.assertEqual({_IPv4: set([FAKE_SGID])},
+                         self.firewall._dirty_ipset_sgs)
+
+    def test_update_port_filter_regenerates_dirty_ports_in_place(self):
+        self.firewall.sg_rules = self._fake_sg_rules()
+        self.firewall.sg_rules.update(self._fake_sg_rules(sg_id=OTHER_SGID))
+        self.firewall.sg_members = self._fake_sg_members()
+        port = self._fake_port()
+        other_port = self._fake_port(OTHER_SGID)
+        other_port['device'] = 'tapother_dev'
+        self.firewall.prepare_port_filter(port)
+        self.firewall.prepare_port_filter(other_port)
+        self.firewall.update_security_group_rules(FAKE_SGID, [])
+
+        remove_chains = mock.patch.object(self.firewall,
+                                          '_remove_chains_apply').start()
+        update_port_chains = mock.patch.object(self.firewall,
+                                               '_update_port_chains').start()
+        self.firewall.update_port_filter(port)
+
+        self.assertFalse(remove_chains.called)
+        update_port_chains.assert_called_once_with(port)
 
     def test_clear_sg_members(self):
         self.firewall.sg_members = self._fake_sg_members(
@@ -1611,11 +1640,35 @@ class IptablesFirewallEnhancedIpsetTestCase(BaseIptablesFirewallTestCase):
             mock.call.set_exists('fake_sgid', 'IPv4'),
             mock.call.get_name('fake_sgid', 'IPv6'),
             mock.call.set_exists('fake_sgid', 'IPv6'),
+            mock.call.defer_apply_on(),
+            mock.call.defer_apply_off(),
             mock.call.destroy('fake_sgid', 'IPv4'),
             mock.call.destroy('fake_sgid', 'IPv6')]
 
         self.firewall.ipset.assert_has_calls(calls)
 
+    def test_filter_defer_apply_batches_ipset_changes(self):
+        self.firewall.sg_rules = self._fake_sg_rules()
+        self.firewall.pre_sg_rules = self._fake_sg_rules()
+        self.firewall.sg_members = {'fake_sgid': {
+            'IPv4': ['10.0.0.1'],
+            'IPv6': ['fe80::1']}}
+        self.firewall.pre_sg_members = {}
+        self.firewall.filter_defer_apply_on()
+        self.firewall.prepare_port_filter(self._fake_port())
+        self.assertFalse(self.firewall.ipset.defer_apply_off.called)
+        self.firewall.filter_defer_apply_off()
+        calls = [
+            mock.call.defer_apply_on(),
+            mock.call.set_members('fake_sgid', 'IPv4', ['10.0.0.1']),
+            mock.call.set_members('fake_sgid', 'IPv6', ['fe80::1']),
+            mock.call.get_name('fake_sgid', 'IPv4'),
+            mock.call.set_exists('fake_sgid', 'IPv4'),
+            mock.call.get_name('fake_sgid', 'IPv6'),
+            mock.call.set_exists('fake_sgid', 'IPv6'),
+            mock.call.defer_apply_off()]
+        self.firewall.ipset.assert_has_calls(calls)
+
     def test_prepare_port_filter_with_sg_no_member(self):
         self.firewall.sg_rules = self._fake_sg_rules()
         self.firewall.sg_rules[FAKE_SGID].append(
@@ -1651,13 +1704,15 @@ class IptablesFirewallEnhancedIpsetTestCase(BaseIptablesFirewallTestCase):
         self.firewall.sg_rules.update()
         self.firewall._defer_apply = True
         port = self._fake_port()
-        self.firewall.filtered_ports['tapfake_dev'] = port
+        self.firewall._set_ports(port)
         self.firewall._pre_defer_filtered_ports = {}
         self.firewall._pre_defer_unfiltered_ports = {}
         self.firewall.filter_defer_apply_off()
         calls = [mock.call.destroy('fake_sgid', 'IPv4')]
 
         self.firewall.ipset.assert_has_calls(calls, True)
+        self.assertNotIn(mock.call.destroy('fake_sgid', 'IPv6'),
+                         self.firewall.ipset.mock_calls)
 
     def test_sg_rule_expansion_with_remote_ips(self):
         other_ips = ['10.0.0.2', '10.0.0.3', '10.0.0.4']
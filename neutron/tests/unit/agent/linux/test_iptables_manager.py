@@ -1034,3 +1034,263 @@ class IptablesManagerStateLessTestCase(base.BaseTestCase):
 
     def test_mangle_not_found(self):
         self.assertNotIn('mangle', self.iptables.ipv4)
+
+
+class ApplyStatsTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(ApplyStatsTestCase, self).setUp()
+        self.stats = iptables_manager.ApplyStats()
+        self.time = mock.patch.object(iptables_manager, 'time').start()
+        self.time.time.return_value = self.stats.last_report
+
+    def test_get_stats(self):
+        self.stats.record('full')
+        self.stats.record('noop')
+        self.stats.record('noop')
+        self.stats.add_time(0.5)
+        self.assertEqual({'full': 1, 'incremental': 0, 'noop': 2,
+                          'fallback': 0, 'apply_time': 0.5},
+                         self.stats.get_stats())
+
+    def test_report_after_interval(self):
+        cfg.CONF.set_override('iptables_apply_report_interval', 60, 'AGENT')
+        with mock.patch.object(iptables_manager, 'LOG') as log:
+            self.stats.record('full')
+            self.stats.add_time(0.1)
+            self.assertFalse(log.info.called)
+            self.time.time.return_value += 60
+            self.stats.add_time(0.1)
+            log.info.assert_called_once_with(mock.ANY,
+                                             self.stats.get_stats())
+            self.stats.add_time(0.1)
+        self.assertEqual(1, log.info.call_count)
+
+    def test_report_disabled(self):
+        cfg.CONF.set_override('iptables_apply_report_interval', 0, 'AGENT')
+        self.time.time.return_value += 3600
+        with mock.patch.object(iptables_manager, 'LOG') as log:
+            self.stats.add_time(0.1)
+        self.assertFalse(log.info.called)
+
+    def test_managers_applies_are_totaled(self):
+        stats = mock.patch.object(iptables_manager, 'total_apply_stats',
+                                  self.stats).start()
+        for i in range(2):
+            manager = iptables_manager.IptablesManager(state_less=True)
+            mock.patch.object(manager, 'execute', return_value='').start()
+            manager.apply()
+        self.assertEqual(2, stats.get_stats()['full'])
+
+
+class IptablesManagerIncrementalApplyTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IptablesManagerIncrementalApplyTestCase, self).setUp()
+        cfg.CONF.set_override('comment_iptables_rules', False, 'AGENT')
+        cfg.CONF.set_override('iptables_incremental_apply', True, 'AGENT')
+        self.iptables = iptables_manager.IptablesManager(state_less=True)
+        self.execute = mock.patch.object(self.iptables, "execute").start()
+        self.execute.return_value = ''
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+    def _get_restore_calls(self):
+        return [c for c in self.execute.call_args_list
+                if c[0][0][0] == 'iptables-restore']
+
+    def test_first_apply_is_full(self):
+        self.assertEqual(1, self.iptables.apply_stats['full'])
+        self.assertEqual(0, self.iptables.apply_stats['incremental'])
+
+    def test_apply_without_changes_is_noop(self):
+        self.iptables.apply()
+        self.assertFalse(self.execute.called)
+        self.assertEqual(1, self.iptables.apply_stats['noop'])
+
+    def test_apply_only_changed_chains(self):
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.ipv4['filter'].add_rule('filter', '-j DROP')
+        self.iptables.ipv4['filter'].add_rule('INPUT', '-s 0/0 -d 192.168.0.2')
+        self.iptables.apply()
+
+        expected = ('*filter\n'
+                    ':%(bn)s-INPUT - [0:0]\n'
+                    ':%(bn)s-filter - [0:0]\n'
+                    '-A %(bn)s-INPUT -s 0/0 -d 192.168.0.2\n'
+                    '-A %(bn)s-filter -j DROP\n'
+                    'COMMIT' % IPTABLES_ARG)
+        self.execute.assert_called_once_with(
+            ['iptables-restore', '-n'], process_input=expected,
+            run_as_root=True)
+        self.assertEqual(1, self.iptables.apply_stats['incremental'])
+
+    def test_apply_removed_chain(self):
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.ipv4['filter'].add_rule('INPUT', '-j $filter')
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+        self.iptables.ipv4['filter'].remove_chain('filter')
+        self.iptables.apply()
+
+        expected = ('*filter\n'
+                    ':%(bn)s-INPUT - [0:0]\n'
+                    ':%(bn)s-filter - [0:0]\n'
+                    '-X %(bn)s-filter\n'
+                    'COMMIT' % IPTABLES_ARG)
+        self.execute.assert_called_once_with(
+            ['iptables-restore', '-n'], process_input=expected,
+            run_as_root=True)
+
+    def test_apply_unwrapped_change_is_full(self):
+        self.iptables.ipv4['filter'].add_rule('INPUT', '-j DROP', wrap=False)
+        self.iptables.apply()
+        self.execute.assert_any_call(['iptables-save', '-c'],
+                                     run_as_root=True)
+        self.assertEqual(2, self.iptables.apply_stats['full'])
+
+    def test_apply_falls_back_to_full_on_failure(self):
+        self.execute.side_effect = [RuntimeError(), '', None]
+        self.iptables.ipv4['filter'].add_rule('INPUT', '-j DROP')
+        self.iptables.apply()
+
+        self.assertEqual(
+            [mock.call(['iptables-restore', '-n'], process_input=mock.ANY,
+                       run_as_root=True),
+             mock.call(['iptables-save', '-c'], run_as_root=True),
+             mock.call(['iptables-restore', '-c'], process_input=mock.ANY,
+                       run_as_root=True)],
+            self.execute.call_args_list)
+        self.assertEqual(1, self.iptables.apply_stats['fallback'])
+        self.assertEqual(2, self.iptables.apply_stats['full'])
+
+        # the state is known again after the full restore
+        self.execute.reset_mock()
+        self.execute.side_effect = None
+        self.iptables.ipv4['filter'].remove_rule('INPUT', '-j DROP')
+        self.iptables.apply()
+        self.assertEqual(1, len(self._get_restore_calls()))
+        self.assertEqual(1, self.iptables.apply_stats['incremental'])
+
+    def test_apply_regenerates_only_dirty_chains(self):
+        table = self.iptables.ipv4['filter']
+        table.add_chain('filter')
+        self.iptables.apply()
+        self.assertEqual(set(), table.dirty_chains)
+
+        with mock.patch.object(self.iptables, '_get_chain_state',
+                               return_value=['-A fake']) as get_state:
+            table.add_rule('filter', '-j DROP')
+            self.iptables.apply()
+        get_state.assert_called_once_with(table, 'filter')
+
+
+class IptablesTableTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IptablesTableTestCase, self).setUp()
+        self.table = iptables_manager.IptablesTable(binary_name='bn')
+        self.table.add_chain('chain1')
+        self.table.add_chain('chain2')
+
+    def test_rules_keep_insertion_order(self):
+        self.table.add_rule('chain1', '-j ACCEPT')
+        self.table.add_rule('chain2', '-j DROP')
+        self.table.add_rule('chain1', '-j DROP')
+        self.assertEqual(['-A bn-chain1 -j ACCEPT',
+                          '-A bn-chain2 -j DROP',
+                          '-A bn-chain1 -j DROP'],
+                         [str(r) for r in self.table.rules])
+        self.assertEqual(['-A bn-chain1 -j ACCEPT', '-A bn-chain1 -j DROP'],
+                         [str(r) for r in
+                          self.table._get_chain_rules('chain1', True)])
+
+    def test_remove_duplicated_rule(self):
+        self.table.add_rule('chain1', '-j ACCEPT')
+        self.table.add_rule('chain1', '-j ACCEPT')
+        self.table.remove_rule('chain1', '-j ACCEPT')
+        self.assertEqual(1, len(self.table.rules))
+        self.table.remove_rule('chain1', '-j ACCEPT')
+        self.assertEqual([], self.table.rules)
+        self.assertEqual([], self.table._get_chain_rules('chain1', True))
+
+    def test_empty_chain(self):
+        self.table.add_rule('chain1', '-j ACCEPT')
+        self.table.add_rule('chain2', '-j DROP')
+        self.table.empty_chain('chain1')
+        self.assertEqual(['-A bn-chain2 -j DROP'],
+                         [str(r) for r in self.table.rules])
+
+    def test_empty_chain_keep_positions(self):
+        self.table.add_rule('chain1', '-j ACCEPT')
+        self.table.add_rule('chain1', '-j RETURN')
+        self.table.add_rule('chain2', '-j DROP')
+        self.table.empty_chain('chain1', keep_positions=True)
+        for rule in ('-s 10.0.0.1 -j ACCEPT', '-s 10.0.0.2 -j ACCEPT',
+                     '-j RETURN'):
+            self.table.add_rule('chain1', rule)
+        self.table.add_rule('chain2', '-j ACCEPT')
+        self.assertEqual(['-A bn-chain1 -s 10.0.0.1 -j ACCEPT',
+                          '-A bn-chain1 -s 10.0.0.2 -j ACCEPT',
+                          '-A bn-chain1 -j RETURN',
+                          '-A bn-chain2 -j DROP',
+                          '-A bn-chain2 -j ACCEPT'],
+                         [str(r) for r in self.table.rules])
+        self.assertEqual(['-A bn-chain1 -s 10.0.0.1 -j ACCEPT',
+                          '-A bn-chain1 -s 10.0.0.2 -j ACCEPT',
+                          '-A bn-chain1 -j RETURN'],
+                         [str(r) for r in
+                          self.table._get_chain_rules('chain1', True)])
+
+    def test_empty_chain_positions_released_on_apply(self):
+        self.table.add_rule('chain1', '-j ACCEPT')
+        self.table.add_rule('chain2', '-j DROP')
+        self.table.empty_chain('chain1', keep_positions=True)
+        self.table.clear_dirty_chains()
+        self.table.add_rule('chain1', '-j RETURN')
+        self.assertEqual(['-A bn-chain2 -j DROP', '-A bn-chain1 -j RETURN'],
+                         [str(r) for r in self.table.rules])
+
+    def test_clear_rules_by_tag(self):
+        self.table.add_rule('chain1', '-j ACCEPT', tag='tag1')
+        self.table.add_rule('chain1', '-j ACCEPT', tag='tag2')
+        self.table.add_rule('chain2', '-j DROP', tag='tag1')
+        self.table.clear_rules_by_tag('tag1')
+        self.assertEqual(['-A bn-chain1 -j ACCEPT'],
+                         [str(r) for r in self.table.rules])
+        self.assertEqual('tag2', self.table.rules[0].tag)
+        self.table.clear_rules_by_tag('tag2')
+        self.assertEqual([], self.table.rules)
+
+    def test_remove_chain_removes_jump_rules(self):
+        self.table.add_rule('chain1', '-j $chain2')
+        self.table.add_rule('chain1', '-j ACCEPT')
+        self.table.add_rule('chain2', '-j DROP')
+        self.table.remove_chain('chain2')
+        self.assertEqual(['-A bn-chain1 -j ACCEPT'],
+                         [str(r) for r in self.table.rules])
+        self.assertEqual([], self.table.remove_rules)
+
+    def test_remove_unwrapped_chain_records_removed_rules(self):
+        self.table.add_chain('unwrapped', wrap=False)
+        self.table.add_rule('INPUT', '-j unwrapped', wrap=False)
+        self.table.add_rule('unwrapped', '-j $chain1', wrap=False)
+        self.table.remove_chain('unwrapped', wrap=False)
+        self.assertEqual([], self.table.rules)
+        self.assertEqual(['-A unwrapped -j bn-chain1',
+                          '-A INPUT -j unwrapped'],
+                         [str(r) for r in self.table.remove_rules])
+        self.assertEqual(set(['unwrapped']), self.table.remove_chains)
+
+    def test_dirty_chains(self):
+        self.table.clear_dirty_chains()
+        self.table.add_rule('chain1', '-j ACCEPT')
+        self.table.add_rule('INPUT', '-j DROP', wrap=False)
+        self.assertEqual(set([('chain1', True), ('INPUT', False)]),
+                         self.table.dirty_chains)
+        self.table.clear_dirty_chains()
+        self.table.remove_rule('chain2', '-j ACCEPT')
+        self.assertEqual(set(), self.table.dirty_chains)
+        self.table.empty_chain('chain1')
+        self.assertEqual(set([('chain1', True)]), self.table.dirty_chains)
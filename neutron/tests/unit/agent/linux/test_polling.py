@@ -13,6 +13,7 @@
 #    under the License.
 
 import mock
+from oslo_config import cfg
 
 from neutron.agent.common import base_polling
 from neutron.agent.linux import polling
@@ -35,6 +36,17 @@ class TestGetPollingManager(base.BaseTestCase):
                 mock_stop.assert_has_calls(mock.call())
             mock_start.assert_has_calls(mock.call())
 
+    def test_manage_idl_polling_minimizer(self):
+        cfg.CONF.set_override('ovsdb_interface', 'native', group='OVS')
+        mock_target = 'neutron.agent.linux.polling.IdlPollingMinimizer'
+        with mock.patch('%s.start' % mock_target) as mock_start:
+            with mock.patch('%s.stop' % mock_target) as mock_stop:
+                with polling.get_polling_manager(minimize_polling=True) as pm:
+                    self.assertEqual(pm.__class__,
+                                     polling.IdlPollingMinimizer)
+                mock_stop.assert_has_calls(mock.call())
+            mock_start.assert_has_calls(mock.call())
+
 
 class TestInterfacePollingMinimizer(base.BaseTestCase):
 
@@ -63,3 +75,45 @@ class TestInterfacePollingMinimizer(base.BaseTestCase):
     def test__is_polling_required_returns_when_updates_are_present(self):
         with self.mock_has_updates(True):
             self.assertTrue(self.pm._is_polling_required())
+
+
+class TestIdlPollingMinimizer(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestIdlPollingMinimizer, self).setUp()
+        self.pm = polling.IdlPollingMinimizer()
+        self.ovsdb = mock.Mock()
+        self.ovsdb.idl.change_seqno = 1
+        self.interfaces = [{'name': 'tap1', 'ofport': 1,
+                            'external_ids': {'iface-id': 'port1'}}]
+        self.ovsdb.db_list.return_value.execute.side_effect = (
+            lambda check_error: self.interfaces)
+        with mock.patch('neutron.agent.common.ovs_lib.BaseOVS') as base_ovs:
+            base_ovs.return_value.ovsdb = self.ovsdb
+            self.pm.start()
+
+    def test__is_polling_required_initially(self):
+        self.assertTrue(self.pm._is_polling_required())
+
+    def test__is_polling_required_without_changes(self):
+        self.pm._is_polling_required()
+        self.assertFalse(self.pm._is_polling_required())
+        self.assertEqual(1, self.ovsdb.db_list.call_count)
+
+    def test__is_polling_required_ignores_other_changes(self):
+        self.pm._is_polling_required()
+        self.ovsdb.idl.change_seqno = 2
+        self.interfaces = [dict(i) for i in self.interfaces]
+        self.assertFalse(self.pm._is_polling_required())
+        self.assertEqual(2, self.ovsdb.db_list.call_count)
+
+    def test__is_polling_required_on_interface_changes(self):
+        self.pm._is_polling_required()
+        self.ovsdb.idl.change_seqno = 2
+        self.interfaces = self.interfaces + [
+            {'name': 'tap2', 'ofport': [], 'external_ids': {}}]
+        self.assertTrue(self.pm._is_polling_required())
+        self.ovsdb.idl.change_seqno = 3
+        self.interfaces[1] = {'name': 'tap2', 'ofport': 2,
+                              'external_ids': {}}
+        self.assertTrue(self.pm._is_polling_required())
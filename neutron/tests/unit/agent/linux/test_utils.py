@@ -12,6 +12,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import mock
 import socket
 import testtools
@@ -107,6 +108,138 @@ class AgentUtilsExecuteTest(base.BaseTestCase):
             self.assertFalse(log.error.called)
 
 
+class AgentUtilsExecuteReusingClientTest(base.BaseTestCase):
+    def setUp(self):
+        super(AgentUtilsExecuteReusingClientTest, self).setUp()
+        self.execute = mock.patch.object(utils, 'execute').start()
+
+    def test_execute_reusing_client(self):
+        self.execute.side_effect = ['out1', 'out2']
+        self.assertEqual(['out1', 'out2'],
+                         utils.execute_reusing_client([['ls'], ['pwd']]))
+        self.execute.assert_has_calls([
+            mock.call(['ls'], check_exit_code=True, log_fail_as_error=True,
+                      run_as_root=False),
+            mock.call(['pwd'], check_exit_code=True, log_fail_as_error=True,
+                      run_as_root=False)])
+
+    def test_execute_reusing_client_stops_on_failure(self):
+        self.execute.side_effect = RuntimeError
+        self.assertRaises(RuntimeError, utils.execute_reusing_client,
+                          [['ls'], ['pwd']])
+        self.assertEqual(1, self.execute.call_count)
+
+    def test_execute_reusing_client_borrows_one_daemon_client(self):
+        self.config(group='AGENT', root_helper_daemon='daemon')
+        with mock.patch.object(utils.RootwrapDaemonHelper,
+                               'get_client') as get_client:
+            utils.execute_reusing_client([['ls'], ['pwd']], run_as_root=True)
+        get_client.assert_called_once_with()
+        self.assertEqual(2, self.execute.call_count)
+
+
+class RootwrapDaemonHelperTest(base.BaseTestCase):
+    def setUp(self):
+        super(RootwrapDaemonHelperTest, self).setUp()
+        self.config(group='AGENT', root_helper_daemon='daemon',
+                    root_helper_daemon_pool_size=2)
+        self.client = mock.patch('oslo_rootwrap.client.Client').start()
+        self.client.side_effect = lambda cmd: mock.Mock()
+        mock.patch.object(utils.RootwrapDaemonHelper,
+                          '_RootwrapDaemonHelper__clients', None).start()
+
+    def test_pool(self):
+        with utils.RootwrapDaemonHelper.get_client() as client1:
+            with utils.RootwrapDaemonHelper.get_client() as client2:
+                # Nested calls reuse the client of the thread
+                self.assertIs(client1, client2)
+        self.assertEqual(2, self.client.call_count)
+        self.client.assert_called_with(['daemon'])
+
+    def test_clients_are_returned_to_the_pool(self):
+        clients = set()
+        for i in range(4):
+            with utils.RootwrapDaemonHelper.get_client() as client:
+                clients.add(client)
+        self.assertEqual(2, self.client.call_count)
+        self.assertEqual(2, len(clients))
+
+    def test_execute_rootwrap_daemon(self):
+        self.config(group='AGENT', root_helper_daemon_pool_size=1)
+        with utils.RootwrapDaemonHelper.get_client() as client:
+            client.execute.return_value = (0, 'out', '')
+        self.assertEqual((0, 'out', ''),
+                         utils.execute_rootwrap_daemon(['ls'], None, None))
+        client.execute.assert_called_once_with(['ls'], None)
+
+
+class CommandLatenciesTest(base.BaseTestCase):
+    def setUp(self):
+        super(CommandLatenciesTest, self).setUp()
+        self.latencies = utils.CommandLatencies()
+
+    def test_get_name(self):
+        get_name = utils.CommandLatencies.get_name
+        self.assertEqual('ip link', get_name(['ip', '-o', 'link', 'show']))
+        self.assertEqual('ip addr', get_name(['ip', 'netns', 'exec', 'ns',
+                                              'ip', 'addr', 'show']))
+        self.assertEqual('dnsmasq', get_name(['ip', 'netns', 'exec', 'ns',
+                                              'env', 'A=1', 'B=2',
+                                              '/usr/sbin/dnsmasq', '-k']))
+        self.assertEqual('ovs-ofctl add-flows',
+                         get_name(['ovs-ofctl', 'add-flows', 'br-int', '-']))
+        self.assertEqual('iptables-save', get_name(['iptables-save', '-c']))
+
+    def test_record(self):
+        self.latencies.record(['ip', 'link', 'show'], 0.001)
+        self.latencies.record(['ip', 'link', 'show'], 0.003)
+        self.latencies.record(['ip', 'link', 'show'], 0.5)
+        self.latencies.record(['ip', 'link', 'show'], 10)
+        histogram = self.latencies.histograms['ip link']
+        self.assertEqual(2, histogram[0])
+        self.assertEqual(1, histogram[6])
+        self.assertEqual(1, histogram[-1])
+        self.assertEqual(4, sum(histogram))
+
+    def test_get_stats(self):
+        self.latencies.record(['ip', 'link', 'show'], 0.001)
+        self.latencies.record(['ip', 'link', 'show'], 0.003)
+        self.latencies.record(['ip', 'addr', 'show'], 10)
+        self.assertEqual(
+            {'ip link': {'count': 2, 'average': 2.0,
+                         'histogram': [('<=5ms', 2)]},
+             'ip addr': {'count': 1, 'average': 10000.0,
+                         'histogram': [('>5000ms', 1)]}},
+            self.latencies.get_stats())
+
+    def test_report_by_default(self):
+        self.latencies.last_report -= 300
+        with mock.patch.object(utils.LOG, 'info') as info:
+            self.latencies.record(['ls'], 0.001)
+        self.assertTrue(info.called)
+
+    def test_report(self):
+        self.config(group='AGENT', command_latency_report_interval=60)
+        with mock.patch.object(utils.LOG, 'info') as info:
+            self.latencies.record(['ls'], 0.001)
+            self.assertFalse(info.called)
+            self.latencies.last_report -= 60
+            self.latencies.record(['ls'], 0.001)
+        info.assert_called_once_with(mock.ANY, {'name': 'ls', 'count': 2,
+                                                'average': 1.0,
+                                                'histogram': '<=5ms: 2'})
+
+    def test_execute_records_latency(self):
+        with contextlib.nested(
+            mock.patch('eventlet.green.subprocess.Popen'),
+            mock.patch.object(utils.command_latencies, 'record')
+        ) as (popen, record):
+            popen.return_value.returncode = 0
+            popen.return_value.communicate.return_value = ('', '')
+            utils.execute(['ls'])
+        record.assert_called_once_with(['ls'], mock.ANY)
+
+
 class AgentUtilsGetInterfaceMAC(base.BaseTestCase):
     def test_get_interface_mac(self):
         expect_val = '01:02:03:04:05:06'
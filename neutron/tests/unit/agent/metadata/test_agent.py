@@ -12,7 +12,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import eventlet
+import eventlet.wsgi
+import httplib2
 import mock
+import oslo_messaging
 import testtools
 import webob
 
@@ -21,6 +25,7 @@ from neutron.agent.metadata import agent
 from neutron.agent.metadata import config
 from neutron.agent import metadata_agent
 from neutron.common import constants
+from neutron.common import topics
 from neutron.common import utils
 from neutron.tests import base
 
@@ -42,7 +47,12 @@ class FakeConf(object):
     nova_metadata_insecure = True
     nova_client_cert = 'nova_cert'
     nova_client_priv_key = 'nova_priv_key'
+    nova_metadata_pool_size = 2
+    nova_metadata_pool_report_interval = 0
     cache_url = ''
+    metadata_port_index = False
+    metadata_port_index_resync_interval = 600
+    metadata_port_index_max_age = 5
 
 
 class FakeConfCache(FakeConf):
@@ -441,6 +451,7 @@ class TestMetadataProxyHandlerCache(TestMetadataProxyHandlerBase):
                         "%s:%s" % (FakeConf.nova_metadata_ip,
                                    FakeConf.nova_metadata_port)
                     ),
+                    mock.call().connections.get('http:9.9.9.9:8775'),
                     mock.call().request(
                         'http://9.9.9.9:8775/the_path',
                         method=method,
@@ -511,6 +522,340 @@ class TestMetadataProxyHandlerNoCache(TestMetadataProxyHandlerCache):
             2, self.qclient.return_value.list_ports.call_count)
 
 
+class FakeConfPortIndex(FakeConf):
+    metadata_port_index = True
+
+
+def _port(port_id, network_id, ips, device_id='vm',
+          device_owner='compute:nova'):
+    return {'id': port_id, 'network_id': network_id,
+            'fixed_ips': [{'subnet_id': 'subnet', 'ip_address': ip}
+                          for ip in ips],
+            'device_id': device_id, 'device_owner': device_owner,
+            'tenant_id': 'tenant', 'mac_address': 'fa:16:3e:00:00:01'}
+
+
+def _index_port(port):
+    return {'id': port['id'], 'network_id': port['network_id'],
+            'device_id': port['device_id'], 'tenant_id': port['tenant_id']}
+
+
+class TestPortIndex(base.BaseTestCase):
+    def setUp(self):
+        super(TestPortIndex, self).setUp()
+        self.index = agent.PortIndex()
+        self.vm = _port('p1', 'n1', ['10.0.0.3', 'fd00::3'])
+        self.router = _port('p2', 'n1', ['10.0.0.1'], device_id='r1',
+                            device_owner=constants.DEVICE_OWNER_ROUTER_INTF)
+        self.index.load([self.vm, self.router])
+
+    def test_load(self):
+        self.assertTrue(self.index.loaded)
+        self.assertEqual(2, len(self.index))
+        self.assertEqual([_index_port(self.vm)],
+                         self.index.get_ports('10.0.0.3', ('n1',)))
+        self.assertEqual([_index_port(self.vm)],
+                         self.index.get_ports('fd00::3', ('n2', 'n1')))
+        self.assertEqual([], self.index.get_ports('10.0.0.3', ('n2',)))
+        self.assertEqual(('n1',), self.index.get_router_networks('r1'))
+        self.assertEqual((), self.index.get_router_networks('vm'))
+
+    def test_load_replaces_ports(self):
+        self.index.load([self.router])
+        self.assertEqual(1, len(self.index))
+        self.assertEqual([], self.index.get_ports('10.0.0.3', ('n1',)))
+
+    def test_load_applies_notifications_received_during_load(self):
+        vm = _port('p1', 'n1', ['10.0.0.4'])
+        self.index.start_load()
+        self.index.port_update(mock.Mock(), port=vm)
+        self.index.port_delete(mock.Mock(), port_id='p2')
+        # Ports fetched before the notifications were sent
+        self.index.load([self.vm, self.router])
+
+        self.assertEqual(1, len(self.index))
+        self.assertEqual([], self.index.get_ports('10.0.0.3', ('n1',)))
+        self.assertEqual([_index_port(vm)],
+                         self.index.get_ports('10.0.0.4', ('n1',)))
+        self.assertEqual((), self.index.get_router_networks('r1'))
+
+        # Only the notifications received during the load are applied
+        self.index.load([self.vm, self.router])
+        self.assertEqual(2, len(self.index))
+
+    def test_abort_load(self):
+        self.index.start_load()
+        self.index.port_delete(mock.Mock(), port_id='p2')
+        self.index.abort_load()
+        self.index.load([self.vm, self.router])
+        self.assertEqual(2, len(self.index))
+
+    def test_get_ports_max_age(self):
+        with mock.patch.object(agent, 'time') as time:
+            time.time.return_value = 100
+            self.index.load([self.vm])
+            time.time.return_value = 105
+            self.assertEqual([_index_port(self.vm)],
+                             self.index.get_ports('10.0.0.3', ('n1',),
+                                                  max_age=5))
+            time.time.return_value = 106
+            self.assertEqual([], self.index.get_ports('10.0.0.3', ('n1',),
+                                                      max_age=5))
+            self.assertEqual([_index_port(self.vm)],
+                             self.index.get_ports('10.0.0.3', ('n1',)))
+
+    def test_set_address_ports(self):
+        vm = _port('p3', 'n1', ['10.0.0.3'], device_id='vm2')
+        self.index.set_address_ports('10.0.0.3', ('n1',), [vm])
+        self.assertEqual([_index_port(vm)],
+                         self.index.get_ports('10.0.0.3', ('n1',)))
+        # The previous port of the address is forgotten
+        self.assertEqual([], self.index.get_ports('fd00::3', ('n1',)))
+        self.assertEqual(2, len(self.index))
+
+    def test_port_update(self):
+        vm = _port('p1', 'n1', ['10.0.0.4'], device_id='vm2')
+        self.index.port_update(mock.Mock(), port=vm, network_type='vlan',
+                               segmentation_id=1, physical_network='phys')
+        self.assertEqual([], self.index.get_ports('10.0.0.3', ('n1',)))
+        self.assertEqual([_index_port(vm)],
+                         self.index.get_ports('10.0.0.4', ('n1',)))
+
+    def test_port_update_router_interface_removed(self):
+        router = _port('p2', 'n1', ['10.0.0.1'], device_id='',
+                       device_owner='')
+        self.index.port_update(mock.Mock(), port=router)
+        self.assertEqual((), self.index.get_router_networks('r1'))
+
+    def test_port_delete(self):
+        self.index.port_delete(mock.Mock(), port_id='p2')
+        self.index.port_delete(mock.Mock(), port_id='unknown')
+        self.assertEqual(1, len(self.index))
+        self.assertEqual((), self.index.get_router_networks('r1'))
+        self.assertEqual([], self.index.get_ports('10.0.0.1', ('n1',)))
+
+
+class TestMetadataProxyHandlerPortIndex(TestMetadataProxyHandlerBase):
+    fake_conf = FakeConfPortIndex
+
+    def setUp(self):
+        super(TestMetadataProxyHandlerPortIndex, self).setUp()
+        self.consumers = mock.patch.object(agent.agent_rpc,
+                                           'create_consumers').start()
+        self.loop = mock.patch.object(agent.loopingcall,
+                                      'FixedIntervalLoopingCall').start()
+        self.get_ports = self.handler.plugin_rpc.get_ports
+        self.vm = _port('p1', 'n1', ['10.0.0.3'])
+        self.router = _port('p2', 'n1', ['10.0.0.1'], device_id='r1',
+                            device_owner=constants.DEVICE_OWNER_ROUTER_INTF)
+
+    def _load(self, ports):
+        index = self.handler._get_port_index()
+        self.get_ports.return_value = ports
+        self.loop.call_args[0][0]()
+        self.get_ports.reset_mock()
+        return index
+
+    def test_get_port_index(self):
+        index = self.handler._get_port_index()
+        self.assertIs(index, self.handler._get_port_index())
+        self.consumers.assert_called_once_with(
+            [index], topics.AGENT,
+            [[topics.PORT, topics.UPDATE], [topics.PORT, topics.DELETE]])
+        self.loop.return_value.start.assert_called_once_with(interval=600)
+        self.assertFalse(index.loaded)
+
+    def test_get_port_index_without_resync(self):
+        self.handler.conf = mock.Mock(metadata_port_index_resync_interval=0)
+        with mock.patch('eventlet.spawn_n') as spawn_n:
+            self.handler._get_port_index()
+        spawn_n.assert_called_once_with(self.handler._load_port_index)
+        self.assertFalse(self.loop.called)
+
+    def test_load_port_index(self):
+        index = self._load([self.vm, self.router])
+        self.assertTrue(index.loaded)
+        self.assertEqual(2, len(index))
+
+    def test_load_port_index_keeps_port_deleted_during_fetch_deleted(self):
+        index = self.handler._get_port_index()
+
+        def get_ports(*args):
+            index.port_delete(mock.Mock(), port_id='p1')
+            return [self.vm, self.router]
+
+        self.get_ports.side_effect = get_ports
+        self.handler._load_port_index()
+        self.assertEqual(1, len(index))
+        self.assertEqual([], index.get_ports('10.0.0.3', ('n1',)))
+
+    def test_load_port_index_error(self):
+        index = self.handler._get_port_index()
+        self.get_ports.side_effect = oslo_messaging.MessagingTimeout
+        self.handler._load_port_index()
+        self.assertFalse(index.loaded)
+
+    def test_get_ports_network_id(self):
+        self._load([self.vm, self.router])
+        ports = self.handler._get_ports('10.0.0.3', network_id='n1')
+        self.assertEqual([_index_port(self.vm)], ports)
+        self.assertFalse(self.get_ports.called)
+
+    def test_get_ports_router_id(self):
+        self._load([self.vm, self.router])
+        ports = self.handler._get_ports('10.0.0.3', router_id='r1')
+        self.assertEqual([_index_port(self.vm)], ports)
+        self.assertFalse(self.get_ports.called)
+
+    def test_get_ports_network_id_miss(self):
+        index = self._load([self.router])
+        self.get_ports.return_value = [self.vm]
+        ports = self.handler._get_ports('10.0.0.3', network_id='n1')
+        self.assertEqual([self.vm], ports)
+        self.get_ports.assert_called_once_with(
+            mock.ANY, {'network_id': ('n1',),
+                       'fixed_ips': {'ip_address': ['10.0.0.3']}})
+        self.assertEqual([_index_port(self.vm)],
+                         index.get_ports('10.0.0.3', ('n1',)))
+
+    def test_get_ports_router_id_miss(self):
+        index = self._load([])
+        self.get_ports.side_effect = [[self.router], [self.vm]]
+        ports = self.handler._get_ports('10.0.0.3', router_id='r1')
+        self.assertEqual([self.vm], ports)
+        self.assertEqual(2, self.get_ports.call_count)
+        self.assertEqual(('n1',), index.get_router_networks('r1'))
+        self.get_ports.reset_mock()
+        ports = self.handler._get_ports('10.0.0.3', router_id='r1')
+        self.assertEqual([_index_port(self.vm)], ports)
+        self.assertFalse(self.get_ports.called)
+
+    def test_get_ports_stale_hit_checked_on_server(self):
+        with mock.patch.object(agent, 'time') as time:
+            time.time.return_value = 100
+            index = self._load([self.vm, self.router])
+            # The address was given to another instance without
+            # notification
+            vm = _port('p3', 'n1', ['10.0.0.3'], device_id='vm2')
+            self.get_ports.return_value = [vm]
+            time.time.return_value = 106
+            ports = self.handler._get_ports('10.0.0.3', network_id='n1')
+        self.assertEqual([vm], ports)
+        self.get_ports.assert_called_once_with(
+            mock.ANY, {'network_id': ('n1',),
+                       'fixed_ips': {'ip_address': ['10.0.0.3']}})
+        self.assertEqual([_index_port(vm)],
+                         index.get_ports('10.0.0.3', ('n1',)))
+
+    def test_get_ports_router_without_networks(self):
+        self._load([])
+        self.get_ports.return_value = []
+        self.assertEqual([], self.handler._get_ports('10.0.0.3',
+                                                     router_id='r1'))
+        self.assertEqual(1, self.get_ports.call_count)
+
+    def test_get_instance_and_tenant_id(self):
+        self._load([self.vm, self.router])
+        req = mock.Mock(headers={'X-Forwarded-For': '10.0.0.3',
+                                 'X-Neutron-Router-ID': 'r1'})
+        self.assertEqual(('vm', 'tenant'),
+                         self.handler._get_instance_and_tenant_id(req))
+        self.assertFalse(self.get_ports.called)
+
+
+class TestHttpClientPool(base.BaseTestCase):
+    def setUp(self):
+        super(TestHttpClientPool, self).setUp()
+        # Stub Nova metadata server recording the client port of each
+        # request, i.e. the connection it was received on.
+        self.client_ports = []
+        sock = eventlet.listen(('127.0.0.1', 0))
+        self.url = 'http://127.0.0.1:%s/latest/meta-data' % (
+            sock.getsockname()[1])
+        server = eventlet.spawn(eventlet.wsgi.server, sock, self._app,
+                                log=mock.Mock())
+        self.addCleanup(server.kill)
+
+    def _app(self, environ, start_response):
+        self.client_ports.append(environ['REMOTE_PORT'])
+        if environ['PATH_INFO'].endswith('/error'):
+            start_response('500 Internal Server Error', [])
+            return ['']
+        start_response('200 OK', [('Content-Type', 'text/plain'),
+                                  ('Content-Length', '2')])
+        return ['ok']
+
+    def test_connection_reused(self):
+        pool = agent.HttpClientPool(2, httplib2.Http)
+        for i in range(5):
+            resp, content = pool.request(self.url)
+            self.assertEqual(200, resp.status)
+            self.assertEqual('ok', content)
+        self.assertEqual(5, len(self.client_ports))
+        self.assertEqual(1, len(set(self.client_ports)))
+        self.assertEqual({'requests': 5, 'connections': 1, 'waits': 0,
+                          'errors': 0, 'size': 1, 'free': 2},
+                         pool.get_stats())
+
+    def test_concurrent_requests_bounded(self):
+        pool = agent.HttpClientPool(2, httplib2.Http)
+        green_pool = eventlet.GreenPool()
+        responses = list(green_pool.imap(lambda i: pool.request(self.url),
+                                         range(10)))
+        self.assertEqual([200] * 10, [resp.status for resp, c in responses])
+        self.assertLessEqual(len(set(self.client_ports)), 2)
+        stats = pool.get_stats()
+        self.assertEqual(2, stats['size'])
+        self.assertEqual(stats['connections'], len(set(self.client_ports)))
+        self.assertEqual(10, stats['requests'])
+
+    def test_error_closes_connection(self):
+        client = mock.Mock(connections={})
+        client.request.side_effect = httplib2.HttpLib2Error
+        conn = mock.Mock()
+        client.connections['http:127.0.0.1:1'] = conn
+        pool = agent.HttpClientPool(1, lambda: client)
+        self.assertRaises(httplib2.HttpLib2Error,
+                          pool.request, 'http://127.0.0.1:1/')
+        conn.close.assert_called_once_with()
+        self.assertEqual(1, pool.get_stats()['errors'])
+        # The client is released to the pool
+        self.assertEqual(1, pool.get_stats()['free'])
+
+    def test_stats_reported_after_interval(self):
+        with mock.patch.object(agent, 'time') as time:
+            time.time.return_value = 1000
+            pool = agent.HttpClientPool(2, httplib2.Http, report_interval=60)
+            with mock.patch.object(agent, 'LOG') as log:
+                pool.request(self.url)
+                self.assertFalse(log.info.called)
+                time.time.return_value = 1060
+                pool.request(self.url)
+                log.info.assert_called_once_with(mock.ANY, pool.get_stats())
+                pool.request(self.url)
+                self.assertEqual(1, log.info.call_count)
+        self.assertEqual(1060, pool.last_report)
+
+    def test_stats_reported_after_error(self):
+        client = mock.Mock(connections={})
+        client.request.side_effect = httplib2.HttpLib2Error
+        with mock.patch.object(agent, 'time') as time:
+            time.time.return_value = 1000
+            pool = agent.HttpClientPool(1, lambda: client, report_interval=60)
+            time.time.return_value = 1060
+            with mock.patch.object(agent, 'LOG') as log:
+                self.assertRaises(httplib2.HttpLib2Error,
+                                  pool.request, 'http://127.0.0.1:1/')
+        log.info.assert_called_once_with(mock.ANY, pool.get_stats())
+
+    def test_stats_not_reported_without_interval(self):
+        pool = agent.HttpClientPool(2, httplib2.Http)
+        pool.last_report -= 3600
+        with mock.patch.object(agent, 'LOG') as log:
+            pool.request(self.url)
+        self.assertFalse(log.info.called)
+
+
 class TestUnixDomainMetadataProxy(base.BaseTestCase):
     def setUp(self):
         super(TestUnixDomainMetadataProxy, self).setUp()
@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import socket
+
 import mock
 
 from oslo_config import cfg
@@ -23,6 +25,7 @@ from neutron.agent.l3 import config as l3_config
 from neutron.agent.l3 import ha as l3_ha_agent
 from neutron.agent.metadata import config
 from neutron.agent.metadata import driver as metadata_driver
+from neutron.common import exceptions
 from neutron.openstack.common import uuidutils
 from neutron.tests import base
 
@@ -151,3 +154,116 @@ class TestMetadataDriverProcess(base.BaseTestCase):
 
     def test_spawn_metadata_proxy(self):
         self._test_spawn_metadata_proxy(str(self.EUID), str(self.EGID))
+
+
+class TestMultiplexedMetadataProxy(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestMultiplexedMetadataProxy, self).setUp()
+        cfg.CONF.register_opts(config.SHARED_OPTS)
+        cfg.CONF.register_opts(config.DRIVER_OPTS)
+        agent_config.register_process_monitor_opts(cfg.CONF)
+        cfg.CONF.set_override('metadata_proxy_multiplexed', True)
+        self.monitor = mock.Mock(resource_type='router')
+        self.pm_cls = mock.patch('neutron.agent.linux.external_process.'
+                                 'ProcessManager').start()
+        self.call = mock.patch.object(
+            metadata_driver.MetadataDriver,
+            '_call_multiplexed_metadata_proxy', return_value=201).start()
+
+    def test_spawn(self):
+        router_id = _uuid()
+        metadata_driver.MetadataDriver.spawn_monitored_metadata_proxy(
+            self.monitor, 'qrouter-%s' % router_id, 9697, cfg.CONF,
+            router_id=router_id)
+        self.pm_cls.assert_called_once_with(
+            conf=cfg.CONF, uuid='multiplexed-metadata-proxy-router',
+            default_cmd_callback=mock.ANY, run_as_root=True)
+        self.pm_cls.return_value.enable.assert_called_once_with()
+        self.monitor.register.assert_called_once_with(
+            'multiplexed-metadata-proxy-router',
+            metadata_driver.MULTIPLEXED_PROXY_SERVICE_NAME,
+            self.pm_cls.return_value)
+        self.call.assert_called_once_with(
+            self.monitor, cfg.CONF, 'PUT', router_id,
+            {'namespace': 'qrouter-%s' % router_id, 'port': 9697,
+             'network_id': None, 'router_id': router_id})
+
+    def test_spawn_requires_uuid(self):
+        self.assertRaises(
+            exceptions.NetworkIdOrRouterIdRequiredError,
+            metadata_driver.MetadataDriver.spawn_monitored_metadata_proxy,
+            self.monitor, 'qdhcp-foo', 80, cfg.CONF)
+
+    def test_destroy(self):
+        metadata_driver.MetadataDriver.destroy_monitored_metadata_proxy(
+            self.monitor, 'foo', 'qdhcp-foo', cfg.CONF)
+        self.call.assert_called_once_with(
+            self.monitor, cfg.CONF, 'DELETE', 'foo', attempts=1)
+        self.assertFalse(self.monitor.unregister.called)
+        self.assertFalse(self.pm_cls.called)
+
+    def test_destroy_proxy_not_running(self):
+        self.call.side_effect = socket.error
+        metadata_driver.MetadataDriver.destroy_monitored_metadata_proxy(
+            self.monitor, 'foo', 'qdhcp-foo', cfg.CONF)
+
+    def test_proxy_command(self):
+        callback = (metadata_driver.MetadataDriver.
+                    _get_multiplexed_proxy_callback(
+                        cfg.CONF, 'multiplexed-metadata-proxy-dhcp'))
+        with mock.patch('os.geteuid', return_value=123),\
+                mock.patch('os.getegid', return_value=456):
+            cmd = callback('/pids/proxy.pid')
+        state_path = cfg.CONF.state_path
+        self.assertEqual(
+            ['neutron-multiplexed-metadata-proxy',
+             '--pid_file=/pids/proxy.pid',
+             '--control_socket=%s/multiplexed-metadata-proxy-dhcp.sock' %
+             state_path,
+             '--state_file=%s/multiplexed-metadata-proxy-dhcp.json' %
+             state_path,
+             '--control_socket_uid=123',
+             '--control_socket_gid=456',
+             '--metadata_proxy_socket=%s' % cfg.CONF.metadata_proxy_socket,
+             '--state_path=%s' % state_path,
+             '--metadata_proxy_user=123',
+             '--metadata_proxy_group=456'],
+            cmd[:10])
+
+
+class TestMultiplexedMetadataProxyControl(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestMultiplexedMetadataProxyControl, self).setUp()
+        cfg.CONF.register_opts(config.SHARED_OPTS)
+        self.conn_cls = mock.patch('neutron.agent.linux.utils.'
+                                   'UnixDomainHTTPConnection').start()
+        self.conn = self.conn_cls.return_value
+        self.conn.getresponse.return_value.status = 204
+        self.sleep = mock.patch('time.sleep').start()
+        self.monitor = mock.Mock(resource_type='dhcp')
+
+    def test_call_retries_until_proxy_listens(self):
+        self.conn.request.side_effect = [socket.error, None]
+        status = (metadata_driver.MetadataDriver.
+                  _call_multiplexed_metadata_proxy(
+                      self.monitor, cfg.CONF, 'PUT', 'foo', {'port': 80}))
+        self.assertEqual(204, status)
+        self.assertEqual(2, self.conn.request.call_count)
+        self.conn.request.assert_called_with(
+            'PUT', '/listeners/foo', '{"port": 80}',
+            {'Content-Type': 'application/json'})
+        self.assertEqual(
+            '%s/multiplexed-metadata-proxy-dhcp.sock' % cfg.CONF.state_path,
+            self.conn.socket_path)
+        self.sleep.assert_called_once_with(
+            metadata_driver.MULTIPLEXED_PROXY_CONNECT_INTERVAL)
+
+    def test_call_gives_up(self):
+        self.conn.request.side_effect = socket.error
+        self.assertRaises(
+            socket.error,
+            metadata_driver.MetadataDriver._call_multiplexed_metadata_proxy,
+            self.monitor, cfg.CONF, 'DELETE', 'foo', attempts=1)
+        self.assertFalse(self.sleep.called)
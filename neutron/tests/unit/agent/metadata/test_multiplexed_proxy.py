@@ -0,0 +1,240 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+import socket
+
+import eventlet
+import mock
+from oslo_serialization import jsonutils
+import webob
+
+from neutron.agent.metadata import multiplexed_proxy
+from neutron.tests import base
+
+
+class TestMultiplexedProxy(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestMultiplexedProxy, self).setUp()
+        self.listen = mock.patch.object(multiplexed_proxy,
+                                        'listen_in_namespace').start()
+        self.spawn = mock.patch('eventlet.spawn').start()
+        self.state_file = self.get_temp_file_path('state')
+        self.proxy = multiplexed_proxy.MultiplexedProxy(self.state_file)
+
+    def _read_state(self):
+        with open(self.state_file) as f:
+            return jsonutils.loads(f.read())
+
+    def test_add(self):
+        self.assertTrue(self.proxy.add('r1', 'qrouter-r1', 9697,
+                                       router_id='r1'))
+        self.listen.assert_called_once_with('qrouter-r1', 9697)
+        server_args = self.spawn.call_args[0]
+        self.assertIs(self.listen.return_value, server_args[1])
+        self.assertEqual('r1', server_args[2].router_id)
+        listener = {'namespace': 'qrouter-r1', 'port': 9697,
+                    'network_id': None, 'router_id': 'r1'}
+        self.assertEqual({'r1': listener}, self.proxy.get_listeners())
+        self.assertEqual({'r1': listener}, self._read_state())
+
+    def test_add_same_listener(self):
+        self.proxy.add('r1', 'qrouter-r1', 9697, router_id='r1')
+        self.assertFalse(self.proxy.add('r1', 'qrouter-r1', 9697,
+                                        router_id='r1'))
+        self.assertEqual(1, self.listen.call_count)
+
+    def test_add_replaces_listener(self):
+        self.proxy.add('r1', 'qrouter-r1', 9697, router_id='r1')
+        thread = self.spawn.return_value
+        self.assertTrue(self.proxy.add('r1', 'qrouter-r1', 9698,
+                                       router_id='r1'))
+        thread.kill.assert_called_once_with()
+        self.assertEqual(9698, self.proxy.get_listeners()['r1']['port'])
+
+    def test_remove(self):
+        self.proxy.add('n1', 'qdhcp-n1', 80, network_id='n1')
+        self.assertTrue(self.proxy.remove('n1'))
+        self.spawn.return_value.kill.assert_called_once_with()
+        self.assertEqual({}, self.proxy.get_listeners())
+        self.assertEqual({}, self._read_state())
+        self.assertFalse(self.proxy.remove('n1'))
+
+    def test_restore(self):
+        self.proxy.add('n1', 'qdhcp-n1', 80, network_id='n1')
+        self.proxy.add('n2', 'qdhcp-n2', 80, network_id='n2')
+        self.listen.reset_mock()
+        self.listen.side_effect = [mock.Mock(), OSError]
+        proxy = multiplexed_proxy.MultiplexedProxy(self.state_file)
+        proxy.restore()
+        self.assertEqual(2, self.listen.call_count)
+        self.assertEqual(1, len(proxy.get_listeners()))
+        self.assertEqual(proxy.get_listeners(), self._read_state())
+
+    def test_restore_without_state_file(self):
+        self.proxy.restore()
+        self.assertEqual({}, self.proxy.get_listeners())
+
+    def test_add_uses_given_listen(self):
+        listen = mock.Mock()
+        proxy = multiplexed_proxy.MultiplexedProxy(self.state_file,
+                                                   listen=listen)
+        proxy.add('r1', 'qrouter-r1', 9697, router_id='r1')
+        listen.assert_called_once_with('qrouter-r1', 9697)
+        self.assertFalse(self.listen.called)
+
+
+class TestListenerHelper(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestListenerHelper, self).setUp()
+        self.listen = mock.patch.object(multiplexed_proxy,
+                                        'listen_in_namespace').start()
+        self.helper = multiplexed_proxy.ListenerHelper()
+        self.helper._sock, self.helper_sock = socket.socketpair()
+        self.addCleanup(self.helper._sock.close)
+        self.addCleanup(self.helper_sock.close)
+        self.thread = eventlet.spawn(self.helper._serve, self.helper_sock)
+        self.addCleanup(self.thread.kill)
+
+    def test_listen(self):
+        self.listen.side_effect = (
+            lambda namespace, port: eventlet.listen(('127.0.0.1', 0)))
+        sock = self.helper.listen('qrouter-r1', 9697)
+        self.addCleanup(sock.close)
+        self.listen.assert_called_once_with('qrouter-r1', 9697)
+        client = eventlet.connect(sock.getsockname())
+        self.addCleanup(client.close)
+        conn, _addr = sock.accept()
+        conn.close()
+
+    def test_listen_error(self):
+        self.listen.side_effect = IOError('Address already\nin use')
+        self.assertRaisesRegexp(RuntimeError, 'Address already in use',
+                                self.helper.listen, 'qrouter-r1', 9697)
+        # The helper keeps serving after an error
+        self.listen.side_effect = (
+            lambda namespace, port: eventlet.listen(('127.0.0.1', 0)))
+        self.helper.listen('qrouter-r1', 9697).close()
+
+    def test_listen_helper_exited(self):
+        self.helper._sock.sendall('\n')
+        self.thread.wait()
+        self.helper_sock.close()
+        self.assertRaises(RuntimeError,
+                          self.helper.listen, 'qrouter-r1', 9697)
+
+
+class TestMultiplexedProxyDaemon(base.BaseTestCase):
+
+    def test_run_drops_privileges_after_starting_helper(self):
+        manager = mock.Mock()
+        with contextlib.nested(
+            mock.patch.object(multiplexed_proxy, 'ListenerHelper'),
+            mock.patch.object(multiplexed_proxy, 'MultiplexedProxy'),
+            mock.patch.object(multiplexed_proxy.agent_utils,
+                              'UnixDomainWSGIServer'),
+            mock.patch.object(multiplexed_proxy.agent_utils,
+                              'ensure_directory_exists_without_file'),
+            mock.patch('os.chown'),
+            mock.patch('neutron.agent.linux.daemon.drop_privileges')
+        ) as (helper_cls, proxy_cls, server_cls, ensure_dir, chown,
+              drop_privileges):
+            manager.attach_mock(helper_cls.return_value.start, 'start')
+            manager.attach_mock(drop_privileges, 'drop_privileges')
+            manager.attach_mock(proxy_cls.return_value.restore, 'restore')
+            daemon = multiplexed_proxy.MultiplexedProxyDaemon(
+                self.get_temp_file_path('proxy.pid'), '/run/proxy.sock',
+                '/state/proxy.json',
+                control_socket_uid=123, control_socket_gid=456,
+                user='neutron', group='neutron')
+            daemon.run()
+        proxy_cls.assert_called_once_with(
+            '/state/proxy.json', listen=helper_cls.return_value.listen)
+        chown.assert_called_once_with('/run/proxy.sock', 123, 456)
+        self.assertEqual([mock.call.start(),
+                          mock.call.drop_privileges('neutron', 'neutron'),
+                          mock.call.restore()],
+                         manager.mock_calls)
+
+
+class TestControlHandler(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestControlHandler, self).setUp()
+        self.proxy = mock.Mock()
+        self.handler = multiplexed_proxy.ControlHandler(self.proxy)
+
+    def _request(self, method, path, body=None):
+        req = webob.Request.blank(path, method=method)
+        if body is not None:
+            req.body = jsonutils.dumps(body)
+        return req.get_response(self.handler)
+
+    def test_get_listeners(self):
+        self.proxy.get_listeners.return_value = {'r1': {'port': 9697}}
+        resp = self._request('GET', '/listeners')
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual({'r1': {'port': 9697}}, jsonutils.loads(resp.body))
+
+    def test_put_listener(self):
+        self.proxy.add.return_value = True
+        resp = self._request('PUT', '/listeners/r1',
+                             {'namespace': 'qrouter-r1', 'port': '9697',
+                              'router_id': 'r1'})
+        self.assertEqual(201, resp.status_int)
+        self.proxy.add.assert_called_once_with(
+            'r1', namespace='qrouter-r1', port=9697, network_id=None,
+            router_id='r1')
+
+    def test_put_existing_listener(self):
+        self.proxy.add.return_value = False
+        resp = self._request('PUT', '/listeners/n1',
+                             {'namespace': 'qdhcp-n1', 'port': 80,
+                              'network_id': 'n1'})
+        self.assertEqual(204, resp.status_int)
+
+    def test_put_invalid_listener(self):
+        for body in ({'namespace': 'qdhcp-n1', 'port': 80},
+                     {'namespace': 'qdhcp-n1', 'network_id': 'n1'},
+                     {'port': 80, 'network_id': 'n1'}):
+            resp = self._request('PUT', '/listeners/n1', body)
+            self.assertEqual(400, resp.status_int)
+        self.assertFalse(self.proxy.add.called)
+
+    def test_put_listener_outside_netns_dir(self):
+        for namespace in ('../../etc/passwd', '/proc/1/ns/net', '..', '.',
+                          ['qrouter-r1']):
+            resp = self._request('PUT', '/listeners/r1',
+                                 {'namespace': namespace, 'port': 9697,
+                                  'router_id': 'r1'})
+            self.assertEqual(400, resp.status_int)
+        self.assertFalse(self.proxy.add.called)
+
+    def test_delete_listener(self):
+        self.proxy.remove.return_value = True
+        self.assertEqual(204,
+                         self._request('DELETE', '/listeners/n1').status_int)
+        self.proxy.remove.return_value = False
+        self.assertEqual(404,
+                         self._request('DELETE', '/listeners/n1').status_int)
+
+    def test_unknown_path(self):
+        self.assertEqual(404, self._request('GET', '/foo').status_int)
+        self.assertEqual(405, self._request('POST', '/listeners').status_int)
+
+    def test_unexpected_error(self):
+        self.proxy.remove.side_effect = Exception
+        with mock.patch.object(multiplexed_proxy, 'LOG'):
+            resp = self._request('DELETE', '/listeners/n1')
+        self.assertEqual(500, resp.status_int)
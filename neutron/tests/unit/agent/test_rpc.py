@@ -60,6 +60,27 @@ class AgentRPCPluginApi(base.BaseTestCase):
     def test_update_device_down(self):
         self._test_rpc_call('update_device_down')
 
+    def test_update_device_list_unsupported(self):
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = oslo_context.RequestContext('fake_user', 'fake_project')
+        expect_val_update_device_down = {'device': 'fake_device2',
+                                         'exists': True}
+        expect_val = {'devices_up': ['fake_device1'],
+                      'failed_devices_up': [],
+                      'devices_down': [expect_val_update_device_down],
+                      'failed_devices_down': ['fake_device3']}
+        with mock.patch.object(agent.client, 'call') as mock_call, \
+                mock.patch.object(agent.client, 'prepare') as mock_prepare:
+            mock_prepare.return_value = agent.client
+            mock_call.side_effect = [oslo_messaging.UnsupportedVersion('1.5'),
+                                     None,
+                                     expect_val_update_device_down,
+                                     Exception()]
+            actual_val = agent.update_device_list(
+                ctxt, ['fake_device1'], ['fake_device2', 'fake_device3'],
+                'fake_agent_id', 'fake_host')
+        self.assertEqual(expect_val, actual_val)
+
     def test_tunnel_sync(self):
         self._test_rpc_call('tunnel_sync')
 
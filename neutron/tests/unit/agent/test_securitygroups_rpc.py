@@ -235,6 +235,81 @@ class SGServerRpcCallBackTestCase(test_sg.SecurityGroupDBTestCase):
                                  expected)
                 self._delete('ports', port_id1)
 
+    def _get_rules_by_port(self, rules_in_db):
+        rules_by_port = collections.defaultdict(list)
+        for port_id, rule in rules_in_db:
+            rules_by_port[port_id].append(
+                dict((key, rule[key]) for key in sg_db_rpc.RULE_FIELDS))
+        return rules_by_port
+
+    def test_get_rules_for_ports(self):
+        plugin = manager.NeutronManager.get_plugin()
+        ctx = context.get_admin_context()
+        with contextlib.nested(self.network(),
+                               self.security_group(),
+                               self.security_group()) as (n, sg1, sg2):
+            sg1_id = sg1['security_group']['id']
+            sg2_id = sg2['security_group']['id']
+            with contextlib.nested(
+                    self.subnet(n),
+                    self.port(network=n, security_groups=[sg1_id]),
+                    self.port(network=n, security_groups=[sg1_id, sg2_id]),
+                    self.port(network=n, security_groups=[])) as (
+                        subnet, p1, p2, p3):
+                ports = dict((port['port']['id'], port['port'])
+                             for port in (p1, p2, p3))
+                rules_in_db = plugin._get_rules_for_ports(ctx, ports)
+                expected = plugin._select_rules_for_ports(ctx, ports)
+
+        rules_by_port = self._get_rules_by_port(rules_in_db)
+        # Same rules as joining the bindings with the rules
+        self.assertEqual(
+            dict((port_id, sorted(rules)) for port_id, rules in
+                 self._get_rules_by_port(expected).items()),
+            dict((port_id, sorted(rules)) for port_id, rules in
+                 rules_by_port.items()))
+        # A port without security group has no rule
+        self.assertNotIn(p3['port']['id'], rules_by_port)
+        # A port in several groups gets the rules of each of them
+        p2_rules = rules_by_port[p2['port']['id']]
+        self.assertEqual(set([sg1_id, sg2_id]),
+                         set(rule['security_group_id'] for rule in p2_rules))
+        # The rules of a group are read once and shared by its ports
+        p1_sg1_rules = [rule for port_id, rule in rules_in_db
+                        if port_id == p1['port']['id']]
+        p2_sg1_rules = [rule for port_id, rule in rules_in_db
+                        if port_id == p2['port']['id'] and
+                        rule['security_group_id'] == sg1_id]
+        self.assertEqual(2, len(p1_sg1_rules))
+        self.assertEqual([id(rule) for rule in p1_sg1_rules],
+                         [id(rule) for rule in p2_sg1_rules])
+
+    def test_get_rules_for_ports_without_bindings(self):
+        plugin = manager.NeutronManager.get_plugin()
+        ctx = context.get_admin_context()
+        with self.port(security_groups=[]) as port:
+            ports = {port['port']['id']: port['port']}
+            self.assertEqual([], plugin._get_rules_for_ports(ctx, ports))
+        self.assertEqual([], plugin._get_rules_for_ports(ctx, {}))
+
+    def test_get_rules_for_ports_reads_rules_once_per_group(self):
+        plugin = manager.NeutronManager.get_plugin()
+        ctx = context.get_admin_context()
+        with self.security_group() as sg:
+            sg_id = sg['security_group']['id']
+            with contextlib.nested(
+                    self.port(security_groups=[sg_id]),
+                    self.port(security_groups=[sg_id])) as (p1, p2):
+                ports = dict((port['port']['id'], port['port'])
+                             for port in (p1, p2))
+                with mock.patch.object(
+                        plugin, '_select_rules_for_security_groups',
+                        wraps=plugin._select_rules_for_security_groups
+                ) as select_rules:
+                    rules_in_db = plugin._get_rules_for_ports(ctx, ports)
+        select_rules.assert_called_once_with(ctx, set([sg_id]))
+        self.assertEqual(4, len(rules_in_db))
+
     @contextlib.contextmanager
     def _port_with_addr_pairs_and_security_group(self):
         plugin_obj = manager.NeutronManager.get_plugin()
@@ -636,6 +636,18 @@ class TestIpVersionFromInt(base.BaseTestCase):
                           8)
 
 
+class TestChunks(base.BaseTestCase):
+    def test_chunks(self):
+        self.assertEqual([[1, 2], [3, 4], [5]],
+                         utils.chunks([1, 2, 3, 4, 5], 2))
+
+    def test_chunks_iterable(self):
+        self.assertEqual([[0, 1, 2]], utils.chunks(iter([0, 1, 2]), 3))
+
+    def test_chunks_empty(self):
+        self.assertEqual([], utils.chunks([], 2))
+
+
 class TestDelayedStringRederer(base.BaseTestCase):
     def test_call_deferred_until_str(self):
         my_func = mock.MagicMock(return_value='Brie cheese!')
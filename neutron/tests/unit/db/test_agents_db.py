@@ -16,6 +16,7 @@
 import datetime
 import mock
 
+from oslo_config import cfg
 from oslo_db import exception as exc
 from oslo_utils import timeutils
 import testscenarios
@@ -143,6 +144,115 @@ class TestAgentsDbMixin(TestAgentsDbBase):
                              "Agent entry creation hasn't been retried")
 
 
+class TestAgentsDbHeartbeatAggregation(TestAgentsDbBase):
+    def setUp(self):
+        super(TestAgentsDbHeartbeatAggregation, self).setUp()
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 10)
+        self.loop = mock.patch.object(
+            agents_db.loopingcall, 'FixedIntervalLoopingCall').start()
+        self.start_time = datetime.datetime(2015, 6, 1, 12, 0, 0)
+        timeutils.set_time_override(self.start_time)
+        self.addCleanup(timeutils.clear_time_override)
+        self.agent_status = {
+            'agent_type': 'Open vSwitch agent',
+            'binary': 'neutron-openvswitch-agent',
+            'host': 'overcloud-notcompute',
+            'topic': 'N/A',
+            'configurations': {'devices': 1}
+        }
+
+    def _report(self, seconds, **kwargs):
+        timeutils.set_time_override(
+            self.start_time + datetime.timedelta(seconds=seconds))
+        agent_state = dict(self.agent_status, **kwargs)
+        self.plugin.create_or_update_agent(self.context, agent_state)
+
+    def _get_agent(self):
+        self.context.session.expire_all()
+        return self.plugin.get_agents(self.context)[0]
+
+    def _assert_heartbeat(self, seconds):
+        self.assertEqual(
+            self.start_time + datetime.timedelta(seconds=seconds),
+            self._get_agent()['heartbeat_timestamp'])
+
+    def test_heartbeat_absorbed(self):
+        self._report(0)
+        self._report(30)
+        self._assert_heartbeat(0)
+        self.assertEqual(1, self.loop.return_value.start.call_count)
+        self.plugin._heartbeat_aggregator.flush()
+        self._assert_heartbeat(30)
+
+    def test_configurations_change_written(self):
+        self._report(0)
+        self._report(30, configurations={'devices': 2})
+        self._assert_heartbeat(30)
+        self.assertEqual({'devices': 2}, self._get_agent()['configurations'])
+        self.assertFalse(self.loop.called)
+
+    def test_start_flag_written(self):
+        self._report(0)
+        self._report(30, start_flag=True)
+        agent = self._get_agent()
+        self.assertEqual(agent['heartbeat_timestamp'], agent['started_at'])
+        self._assert_heartbeat(30)
+
+    def test_record_expires(self):
+        self._report(0)
+        self._report(cfg.CONF.agent_down_time + 1)
+        self._assert_heartbeat(cfg.CONF.agent_down_time + 1)
+
+    def test_flush_keeps_more_recent_heartbeat(self):
+        self._report(0)
+        self._report(30)
+        # Written by another server worker
+        agent_db = self.context.session.query(agents_db.Agent).one()
+        with self.context.session.begin():
+            agent_db.heartbeat_timestamp = (
+                self.start_time + datetime.timedelta(seconds=40))
+        self.plugin._heartbeat_aggregator.flush()
+        self._assert_heartbeat(40)
+
+    def test_delete_agent_forgets_it(self):
+        self._report(0)
+        self.plugin.delete_agent(self.context, self._get_agent()['id'])
+        self._report(30)
+        self._assert_heartbeat(30)
+
+    def test_flush_forgets_agent_deleted_by_another_worker(self):
+        self._report(0)
+        self._report(30)
+        with self.context.session.begin():
+            self.context.session.query(agents_db.Agent).delete()
+        aggregator = self.plugin._heartbeat_aggregator
+        aggregator.flush()
+        self.assertEqual({}, aggregator._agents)
+        self._report(60)
+        self._assert_heartbeat(60)
+
+    def test_forget(self):
+        self._report(0)
+        aggregator = self.plugin._heartbeat_aggregator
+        aggregator.record(dict(self.agent_status, host='other'),
+                          'other-id', self.start_time)
+        aggregator.forget(self._get_agent()['id'])
+        self.assertEqual(['other-id'],
+                         [agent[0] for agent in aggregator._agents.values()])
+
+    def test_configurations_hash_of_unicode(self):
+        config_hash = agents_db.HeartbeatAggregator._get_configurations_hash(
+            {'configurations': {'bridge': u'br-\xe9'}})
+        self.assertEqual(40, len(config_hash))
+
+    def test_is_agent_down(self):
+        heartbeat = timeutils.utcnow() - datetime.timedelta(
+            seconds=cfg.CONF.agent_down_time + 5)
+        self.assertFalse(self.plugin.is_agent_down(heartbeat))
+        heartbeat -= datetime.timedelta(seconds=10)
+        self.assertTrue(self.plugin.is_agent_down(heartbeat))
+
+
 class TestAgentsDbGetAgents(TestAgentsDbBase):
     scenarios = [
         ('Get all agents', dict(agents=5, down_agents=2,
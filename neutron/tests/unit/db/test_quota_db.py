@@ -13,10 +13,20 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import datetime
+
+import mock
+from oslo_config import cfg
+from oslo_utils import timeutils
+
+from neutron.common import constants
 from neutron.common import exceptions
 from neutron import context
 from neutron.db import db_base_plugin_v2 as base_plugin
+from neutron.db import models_v2
 from neutron.db import quota_db
+from neutron.db import quota_usage
+from neutron import quota as n_quota
 from neutron.tests.unit import testlib_api
 
 
@@ -132,3 +142,133 @@ class TestDbQuotaDriver(testlib_api.SqlTestCase):
         self.assertRaises(exceptions.InvalidQuotaValue,
                           self.plugin.limit_check, context.get_admin_context(),
                           PROJECT, resources, values)
+
+
+class TestTrackingDbQuotaDriver(testlib_api.SqlTestCase):
+    def setUp(self):
+        super(TestTrackingDbQuotaDriver, self).setUp()
+        cfg.CONF.set_override('quota_driver', n_quota.QUOTA_TRACKING_DB_DRIVER,
+                              group='QUOTAS')
+        self.plugin = FakePlugin()
+        self.driver = quota_db.TrackingDbQuotaDriver()
+        self.context = context.get_admin_context()
+        self.count = mock.Mock(wraps=n_quota._count_resource)
+        self.resource = n_quota.CountableResource('network', self.count,
+                                                'quota_network')
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+
+    def _create_network(self, tenant_id=PROJECT):
+        with self.context.session.begin():
+            network = models_v2.Network(tenant_id=tenant_id, name='net')
+            self.context.session.add(network)
+        return network
+
+    def _delete_network(self, network):
+        with self.context.session.begin():
+            self.context.session.delete(network)
+
+    def _create_port(self, network, tenant_id=PROJECT, device_owner=''):
+        with self.context.session.begin():
+            port = models_v2.Port(tenant_id=tenant_id,
+                                  network_id=network.id,
+                                  mac_address=self.plugin._generate_mac(),
+                                  admin_state_up=True, status='ACTIVE',
+                                  device_id='', device_owner=device_owner)
+            self.context.session.add(port)
+        return port
+
+    def _count_usage(self, tenant_id=PROJECT, resource=None,
+                     collection='networks'):
+        return self.driver.count_usage(self.context,
+                                       resource or self.resource,
+                                       self.plugin, collection, tenant_id)
+
+    def _count_ports(self, tenant_id=PROJECT):
+        resource = n_quota.CountableResource('port', self.count, 'quota_port')
+        return self._count_usage(tenant_id, resource, 'ports')
+
+    def _get_usage(self, tenant_id=PROJECT, resource='network'):
+        return self.context.session.query(quota_usage.QuotaUsage).filter_by(
+            tenant_id=tenant_id, resource=resource).one()
+
+    def test_count_usage_creates_usage(self):
+        self._create_network()
+        self._create_network()
+
+        self.assertEqual(2, self._count_usage())
+        self.assertEqual(2, self._get_usage().in_use)
+        self.assertEqual(1, self.count.call_count)
+
+    def test_count_usage_tracks_create_and_delete(self):
+        self.assertEqual(0, self._count_usage())
+        network = self._create_network()
+        self._create_network()
+        self._create_network(tenant_id='other')
+        self.assertEqual(2, self._count_usage())
+        self._delete_network(network)
+
+        self.assertEqual(1, self._count_usage())
+        self.assertEqual(1, self.count.call_count)
+
+    def test_count_usage_tracks_plugin_port_delete(self):
+        network = self._create_network()
+        port = self._create_port(network)
+        self._create_port(network)
+        self.assertEqual(2, self._count_ports())
+        self.plugin.delete_port(self.context, port.id)
+
+        self.assertEqual(1, self._count_ports())
+        self.assertEqual(1, self._get_usage(resource='port').in_use)
+        self.assertEqual(1, self.count.call_count)
+
+    def test_count_usage_tracks_auto_deleted_ports(self):
+        network = self._create_network()
+        self._create_port(network, device_owner=constants.DEVICE_OWNER_DHCP)
+        self.assertEqual(1, self._count_ports())
+        self.assertEqual(1, self._count_usage())
+        self.plugin.delete_network(self.context, network.id)
+
+        self.assertEqual(0, self._count_ports())
+        self.assertEqual(0, self._count_usage())
+        self.assertEqual(2, self.count.call_count)
+
+    def test_bulk_delete_marks_usage_stale_on_concurrent_delete(self):
+        network = self._create_network()
+        port = self._create_port(network)
+        self._count_ports()
+        query = self.context.session.query(models_v2.Port)
+        with mock.patch.object(query, 'delete', return_value=0):
+            quota_usage.bulk_delete(query, 'port')
+        self.plugin.delete_port(self.context, port.id)
+
+        self.assertEqual(0, self._count_ports())
+        self.assertEqual(2, self.count.call_count)
+
+    def test_count_usage_not_tracked_by_other_drivers(self):
+        self._count_usage()
+        cfg.CONF.set_override('quota_driver', n_quota.QUOTA_DB_DRIVER,
+                              group='QUOTAS')
+        self._create_network()
+
+        self.assertEqual(0, self._get_usage().in_use)
+
+    def test_count_usage_resyncs_expired_usage(self):
+        self._count_usage()
+        self._get_usage().update({'in_use': 5})
+        timeutils.advance_time_delta(datetime.timedelta(
+            seconds=cfg.CONF.QUOTAS.quota_usage_resync_interval + 1))
+
+        self.assertEqual(0, self._count_usage())
+        self.assertEqual(0, self._get_usage().in_use)
+        self.assertEqual(2, self.count.call_count)
+
+    def test_count_usage_untracked_resource(self):
+        resource = mock.Mock()
+        resource.name = 'router'
+        count = self.driver.count_usage(self.context, resource, self.plugin,
+                                        'routers', PROJECT)
+
+        self.assertEqual(resource.count.return_value, count)
+        self.assertFalse(self.context.session.query(
+            quota_usage.QuotaUsage).count())
@@ -2415,6 +2415,35 @@ class L3AgentDbTestCaseBase(L3NatTestCaseMixin):
                 wanted_subnetid = p['port']['fixed_ips'][0]['subnet_id']
                 self.assertEqual(wanted_subnetid, subnet_id)
 
+    def _test_l3_agent_routers_query_interfaces_of_routers(self, chunk_size):
+        with contextlib.nested(self.router(), self.router(),
+                               self.subnet(cidr='10.0.1.0/24'),
+                               self.subnet(cidr='10.0.2.0/24')) as (
+                r1, r2, s1, s2):
+            self._router_interface_action('add', r1['router']['id'],
+                                          s1['subnet']['id'], None)
+            self._router_interface_action('add', r2['router']['id'],
+                                          s2['subnet']['id'], None)
+            ctx = context.get_admin_context()
+            with mock.patch.object(l3_db, 'SYNC_DATA_CHUNK_SIZE',
+                                   chunk_size):
+                routers = self.plugin.get_sync_data(ctx, None)
+                self.assertEqual(2, len(routers))
+                for router, subnet in ((r1, s1), (r2, s2)):
+                    routers = self.plugin.get_sync_data(
+                        ctx, [router['router']['id']])
+                    self.assertEqual(1, len(routers))
+                    interfaces = routers[0][l3_constants.INTERFACE_KEY]
+                    self.assertEqual(1, len(interfaces))
+                    self.assertEqual(subnet['subnet']['id'],
+                                     interfaces[0]['subnets'][0]['id'])
+
+    def test_l3_agent_routers_query_interfaces_of_routers(self):
+        self._test_l3_agent_routers_query_interfaces_of_routers(500)
+
+    def test_l3_agent_routers_query_interfaces_of_routers_chunked(self):
+        self._test_l3_agent_routers_query_interfaces_of_routers(1)
+
     def test_l3_agent_routers_query_ignore_interfaces_with_moreThanOneIp(self):
         with self.router() as r:
             with self.subnet(cidr='9.0.1.0/24') as subnet:
@@ -2693,6 +2722,33 @@ class L3RpcCallbackTestCase(base.BaseTestCase):
         actual_message = mock_log.call_args[0][0] % mock_log.call_args[0][1]
         self.assertEqual(expected_message, actual_message)
 
+    def test_sync_routers_delta(self):
+        routers = [{'id': 'r1', 'name': 'unchanged'},
+                   {'id': 'r2', 'name': 'changed'},
+                   {'id': 'r3', 'name': 'unknown'}]
+        revisions = {'r1': self.l3_rpc_cb._get_router_revision(routers[0]),
+                     'r2': self.l3_rpc_cb._get_router_revision(
+                         {'id': 'r2', 'name': 'old'}),
+                     'r4': 'deleted'}
+        with mock.patch.object(self.l3_rpc_cb, 'sync_routers',
+                               return_value=routers) as sync_routers:
+            delta = self.l3_rpc_cb.sync_routers_delta(
+                mock.sentinel.ctx, host='host', revisions=revisions)
+        sync_routers.assert_called_once_with(mock.sentinel.ctx, host='host',
+                                             router_ids=None)
+        self.assertEqual(['r2', 'r3'], [r['id'] for r in delta['routers']])
+        self.assertEqual(['r4'], delta['deleted'])
+        self.assertEqual(revisions['r1'], routers[0]['revision'])
+        self.assertNotEqual(revisions['r2'], routers[1]['revision'])
+
+    def test_get_router_revision(self):
+        revision = self.l3_rpc_cb._get_router_revision(
+            {'id': 'r1', 'interfaces': [{'id': 'p1'}]})
+        self.assertEqual(revision, self.l3_rpc_cb._get_router_revision(
+            {'interfaces': [{'id': 'p1'}], 'id': 'r1'}))
+        self.assertNotEqual(revision, self.l3_rpc_cb._get_router_revision(
+            {'id': 'r1', 'interfaces': [{'id': 'p2'}]}))
+
 
 class L3AgentDbIntTestCase(L3BaseForIntTests, L3AgentDbTestCaseBase):
 
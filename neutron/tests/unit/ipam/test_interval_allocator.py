@@ -0,0 +1,193 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import netaddr
+from oslo_config import cfg
+
+from neutron.api.v2 import attributes
+from neutron.common import exceptions as n_exc
+from neutron import context
+from neutron.db import models_v2
+from neutron.ipam import interval_allocator
+from neutron import manager
+from neutron.tests import base
+from neutron.tests.unit.db import test_db_base_plugin_v2
+from neutron.tests.unit import testlib_api
+
+
+class TestFreeIntervals(base.BaseTestCase):
+
+    def test_from_pools(self):
+        free = interval_allocator.FreeIntervals.from_pools(
+            [(20, 29), (1, 10)], [1, 3, 3, 4, 10, 25, 40])
+        self.assertEqual([(2, 2), (5, 9), (20, 24), (26, 29)],
+                         free.intervals)
+        self.assertEqual(15, free.size)
+
+    def test_from_pools_fully_allocated(self):
+        free = interval_allocator.FreeIntervals.from_pools(
+            [(1, 3)], [1, 2, 3])
+        self.assertEqual([], free.intervals)
+        self.assertEqual(0, free.size)
+
+    def test_nth(self):
+        free = interval_allocator.FreeIntervals([(1, 2), (10, 12)])
+        self.assertEqual([1, 2, 10, 11, 12],
+                         [free.nth(i) for i in range(free.size)])
+        self.assertRaises(IndexError, free.nth, 5)
+
+    def test_nth_large_interval(self):
+        last = 2 ** 64
+        free = interval_allocator.FreeIntervals([(1, last)])
+        self.assertEqual(last, free.nth(last - 1))
+
+    def test_remove(self):
+        free = interval_allocator.FreeIntervals([(1, 5), (7, 7)])
+        for ip in (3, 1, 5, 7, 8):
+            free.remove(ip)
+        self.assertEqual([(2, 2), (4, 4)], free.intervals)
+        self.assertEqual(2, free.size)
+        self.assertIn(4, free)
+        self.assertNotIn(3, free)
+
+
+class TestIntervalIpAllocator(testlib_api.SqlTestCase):
+
+    def setUp(self):
+        super(TestIntervalIpAllocator, self).setUp()
+        cfg.CONF.set_override('ip_allocation_backend', 'interval')
+        self.setup_coreplugin(test_db_base_plugin_v2.DB_PLUGIN_KLASS)
+        self.plugin = manager.NeutronManager.get_plugin()
+        self.ctx = context.get_admin_context()
+        self.allocator = interval_allocator.IntervalIpAllocator()
+        mock.patch.object(interval_allocator, 'get_allocator',
+                          return_value=self.allocator).start()
+        self.net_id = self.plugin.create_network(
+            self.ctx, {'network': {'name': 'net',
+                                   'admin_state_up': True,
+                                   'shared': False,
+                                   'tenant_id': 'tenant'}})['id']
+
+    def _create_subnet(self, cidr, allocation_pools=None):
+        subnet = {'name': 'subnet',
+                  'network_id': self.net_id,
+                  'tenant_id': 'tenant',
+                  'cidr': cidr,
+                  'ip_version': 4,
+                  'gateway_ip': attributes.ATTR_NOT_SPECIFIED,
+                  'allocation_pools': (allocation_pools or
+                                       attributes.ATTR_NOT_SPECIFIED),
+                  'dns_nameservers': attributes.ATTR_NOT_SPECIFIED,
+                  'host_routes': attributes.ATTR_NOT_SPECIFIED,
+                  'enable_dhcp': False,
+                  'ipv6_ra_mode': attributes.ATTR_NOT_SPECIFIED,
+                  'ipv6_address_mode': attributes.ATTR_NOT_SPECIFIED,
+                  'subnetpool_id': attributes.ATTR_NOT_SPECIFIED,
+                  'prefixlen': attributes.ATTR_NOT_SPECIFIED}
+        return self.plugin.create_subnet(self.ctx, {'subnet': subnet})
+
+    def _create_port(self, fixed_ips=attributes.ATTR_NOT_SPECIFIED):
+        port = {'name': 'port',
+                'network_id': self.net_id,
+                'tenant_id': 'tenant',
+                'mac_address': attributes.ATTR_NOT_SPECIFIED,
+                'fixed_ips': fixed_ips,
+                'admin_state_up': True,
+                'device_id': 'device',
+                'device_owner': 'compute:nova'}
+        return self.plugin.create_port(self.ctx, {'port': port})
+
+    def _get_allocations(self):
+        query = self.ctx.session.query(models_v2.IPAllocation)
+        return dict((a.ip_address, a.port_id) for a in query)
+
+    def test_create_ports_until_exhausted(self):
+        self._create_subnet('10.0.0.0/29')
+        ports = [self._create_port() for i in range(5)]
+        allocated = set(p['fixed_ips'][0]['ip_address'] for p in ports)
+        self.assertEqual(set('10.0.0.%d' % i for i in range(2, 7)),
+                         allocated)
+        self.assertEqual(dict((p['fixed_ips'][0]['ip_address'], p['id'])
+                              for p in ports),
+                         self._get_allocations())
+        self.assertRaises(n_exc.IpAddressGenerationFailure,
+                          self._create_port)
+
+    def test_released_address_reused_when_exhausted(self):
+        self._create_subnet('10.0.0.0/29')
+        ports = [self._create_port() for i in range(5)]
+        self.plugin.delete_port(self.ctx, ports[2]['id'])
+        port = self._create_port()
+        self.assertEqual(ports[2]['fixed_ips'], port['fixed_ips'])
+
+    def test_availability_ranges_dropped(self):
+        self._create_subnet('10.0.0.0/29')
+        self._create_port()
+        query = self.ctx.session.query(models_v2.IPAvailabilityRange)
+        self.assertEqual(0, query.count())
+
+    def test_allocation_skips_specific_ip(self):
+        subnet = self._create_subnet(
+            '10.0.0.0/24',
+            allocation_pools=[{'start': '10.0.0.2', 'end': '10.0.0.3'}])
+        self._create_port()
+        specific = self._create_port(
+            fixed_ips=[{'subnet_id': subnet['id'],
+                        'ip_address': '10.0.0.10'}])
+        self.assertEqual('10.0.0.10', specific['fixed_ips'][0]['ip_address'])
+        self._create_port()
+        self.assertEqual(set(['10.0.0.2', '10.0.0.3', '10.0.0.10']),
+                         set(self._get_allocations()))
+        self.assertRaises(n_exc.IpAddressGenerationFailure,
+                          self._create_port)
+
+    def test_allocation_retries_on_conflict(self):
+        subnet = self._create_subnet('10.0.0.0/29')
+        # Warm the cache, then take all but one address behind its back
+        self._create_port()
+        free = sorted(set('10.0.0.%d' % i for i in range(2, 7)) -
+                      set(self._get_allocations()))
+        with self.ctx.session.begin():
+            for ip_address in free[:-1]:
+                self.ctx.session.add(models_v2.IPAllocation(
+                    network_id=self.net_id, subnet_id=subnet['id'],
+                    ip_address=ip_address, port_id=None))
+        self.assertEqual(free[-1],
+                         self._create_port()['fixed_ips'][0]['ip_address'])
+
+    def test_allocation_uses_updated_pools(self):
+        subnet = self._create_subnet('10.0.0.0/24')
+        self._create_port()
+        self.plugin.update_subnet(
+            self.ctx, subnet['id'],
+            {'subnet': {'allocation_pools': [{'start': '10.0.0.100',
+                                              'end': '10.0.0.100'}]}})
+        port = self._create_port()
+        self.assertEqual('10.0.0.100', port['fixed_ips'][0]['ip_address'])
+
+    def test_generate_ip_returns_none_when_full(self):
+        subnet = self._create_subnet(
+            '10.0.0.0/24',
+            allocation_pools=[{'start': '10.0.0.2', 'end': '10.0.0.2'}])
+        self._create_port()
+        with self.ctx.session.begin():
+            self.assertIsNone(
+                self.allocator.generate_ip(self.ctx, [subnet]))
+
+    def test_allocated_addresses_in_pool(self):
+        self._create_subnet('10.0.0.0/24')
+        pool = netaddr.IPRange('10.0.0.2', '10.0.0.254')
+        for i in range(20):
+            ip_address = self._create_port()['fixed_ips'][0]['ip_address']
+            self.assertIn(netaddr.IPAddress(ip_address), pool)
+        self.assertEqual(20, len(self._get_allocations()))
@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import eventlet
 import mock
 
 from neutron.notifiers import batch_notifier
@@ -49,3 +50,32 @@ class TestBatchNotifier(base.BaseTestCase):
             self.notifier.queue_event(mock.Mock())
             self.assertFalse(self.notifier._waiting_to_send)
             self.assertTrue(send_events.called)
+
+    def test_queue_event_max_batch_size(self):
+        callback = mock.Mock()
+        notifier = batch_notifier.BatchNotifier(0.1, callback,
+                                                max_batch_size=3)
+        for i in range(1, 4):
+            notifier.queue_event(i)
+        callback.assert_called_once_with([1, 2, 3])
+        self.assertEqual([], notifier.pending_events)
+        self.assertEqual(1, self.spawn_n.call_count)
+
+    def test_max_batch_size_waits_for_batch_being_sent(self):
+        sent = []
+
+        def callback(events):
+            # Sending a batch yields, e.g. to wait for an RPC reply, the
+            # first one longer than the next
+            eventlet.sleep(0.01 if events == [1] else 0)
+            sent.append(events)
+
+        notifier = batch_notifier.BatchNotifier(0.1, callback,
+                                                max_batch_size=2)
+        notifier.queue_event(1)
+        sender = eventlet.spawn(notifier._notify)
+        eventlet.sleep(0)
+        notifier.queue_event(2)
+        notifier.queue_event(3)
+        sender.wait()
+        self.assertEqual([[1], [2, 3]], sent)
@@ -15,6 +15,8 @@
 
 import contextlib
 import mock
+from oslo_config import cfg
+from oslo_db import exception as db_exc
 from six import moves
 import testtools
 from testtools import matchers
@@ -22,6 +24,7 @@ from testtools import matchers
 from neutron.common import exceptions as exc
 from neutron.db import api as db
 from neutron.plugins.ml2 import driver_api as api
+from neutron.plugins.ml2.drivers import type_tunnel
 
 TUNNEL_IP_ONE = "10.10.10.10"
 TUNNEL_IP_TWO = "10.10.10.20"
@@ -197,6 +200,107 @@ class TunnelTypeTestMixin(object):
             self.driver.release_segment(self.session, segment)
 
 
+class TunnelTypeSparseAllocationTestMixin(TunnelTypeTestMixin):
+
+    def setUp(self):
+        super(TunnelTypeSparseAllocationTestMixin, self).setUp()
+        cfg.CONF.set_override('sparse_tunnel_allocations', True, group='ml2')
+        self.driver.sync_allocations()
+        # Search from the beginning of the ranges unless a test says else
+        self.randrange = mock.patch.object(type_tunnel.random, 'randrange',
+                                           return_value=0).start()
+
+    def test_sync_tunnel_allocations(self):
+        self.driver.reserve_provider_segment(
+            self.session, {api.NETWORK_TYPE: self.TYPE,
+                           api.PHYSICAL_NETWORK: None,
+                           api.SEGMENTATION_ID: TUN_MIN + 1})
+
+        self.driver.tunnel_ranges = [(1, 16000000)]
+        self.driver.sync_allocations()
+
+        allocs = self.session.query(self.driver.model).all()
+        self.assertEqual([TUN_MIN + 1],
+                         [getattr(alloc, self.driver.segmentation_key)
+                          for alloc in allocs])
+        self.assertTrue(allocs[0].allocated)
+
+    def test_reserve_provider_segment_full_specs(self):
+        segment = {api.NETWORK_TYPE: self.TYPE,
+                   api.PHYSICAL_NETWORK: None,
+                   api.SEGMENTATION_ID: 101}
+        observed = self.driver.reserve_provider_segment(self.session, segment)
+        alloc = self.driver.get_allocation(self.session,
+                                           observed[api.SEGMENTATION_ID])
+        self.assertTrue(alloc.allocated)
+
+        with testtools.ExpectedException(exc.TunnelIdInUse):
+            self.driver.reserve_provider_segment(self.session, segment)
+
+        self.driver.release_segment(self.session, segment)
+        self.assertIsNone(self.driver.get_allocation(
+            self.session, observed[api.SEGMENTATION_ID]))
+
+    def test_allocate_tenant_segment_fills_gaps(self):
+        for tunnel_id in (TUN_MIN, TUN_MIN + 1, TUN_MIN + 3):
+            self.driver.reserve_provider_segment(
+                self.session, {api.NETWORK_TYPE: self.TYPE,
+                               api.PHYSICAL_NETWORK: None,
+                               api.SEGMENTATION_ID: tunnel_id})
+
+        segment_ids = [
+            self.driver.allocate_tenant_segment(self.session)[
+                api.SEGMENTATION_ID] for i in range(3)]
+        self.assertEqual([TUN_MIN + 2, TUN_MIN + 4, TUN_MIN + 5],
+                         segment_ids)
+
+    def test_allocate_tenant_segment_multi_ranges(self):
+        self.driver.tunnel_ranges = [(TUN_MAX + 10, TUN_MAX + 11),
+                                     (TUN_MIN, TUN_MIN + 1)]
+
+        segment_ids = [
+            self.driver.allocate_tenant_segment(self.session)[
+                api.SEGMENTATION_ID] for i in range(4)]
+        self.assertEqual([TUN_MAX + 10, TUN_MAX + 11, TUN_MIN, TUN_MIN + 1],
+                         segment_ids)
+        self.assertIsNone(self.driver.allocate_tenant_segment(self.session))
+
+    def test_allocate_tenant_segment_from_random_start(self):
+        self.driver.tunnel_ranges = [(TUN_MIN, TUN_MIN + 3),
+                                     (TUN_MAX + 10, TUN_MAX + 11)]
+        self.driver.reserve_provider_segment(
+            self.session, {api.NETWORK_TYPE: self.TYPE,
+                           api.PHYSICAL_NETWORK: None,
+                           api.SEGMENTATION_ID: TUN_MIN + 2})
+        # Start at TUN_MIN + 2, which is allocated
+        self.randrange.return_value = 2
+        segment_ids = [
+            self.driver.allocate_tenant_segment(self.session)[
+                api.SEGMENTATION_ID] for i in range(5)]
+        self.randrange.assert_called_with(6)
+        self.assertEqual([TUN_MIN + 3, TUN_MAX + 10, TUN_MAX + 11,
+                          TUN_MIN, TUN_MIN + 1], segment_ids)
+        self.assertIsNone(self.driver.allocate_tenant_segment(self.session))
+
+    def test_allocate_tenant_segment_start_in_later_range(self):
+        self.driver.tunnel_ranges = [(TUN_MIN, TUN_MIN + 1),
+                                     (TUN_MAX + 10, TUN_MAX + 12)]
+        self.randrange.return_value = 3
+        segment_ids = [
+            self.driver.allocate_tenant_segment(self.session)[
+                api.SEGMENTATION_ID] for i in range(5)]
+        self.assertEqual([TUN_MAX + 11, TUN_MAX + 12, TUN_MIN, TUN_MIN + 1,
+                          TUN_MAX + 10], segment_ids)
+
+    def test_allocate_tenant_segment_retries_allocated_id(self):
+        self.driver.allocate_tenant_segment(self.session)
+        with mock.patch.object(self.driver, '_get_free_tunnel_id',
+                               return_value=TUN_MIN):
+            self.assertRaises(db_exc.RetryRequest,
+                              self.driver.allocate_tenant_segment,
+                              self.session)
+
+
 class TunnelTypeMultiRangeTestMixin(object):
     DRIVER_CLASS = None
 
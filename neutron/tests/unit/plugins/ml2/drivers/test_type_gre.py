@@ -151,6 +151,13 @@ class GreTypeTest(base_type_tunnel.TunnelTypeTestMixin,
         self.assertEqual(0, self.driver.get_mtu('physnet1'))
 
 
+class GreTypeSparseAllocationTest(
+        base_type_tunnel.TunnelTypeSparseAllocationTestMixin,
+        testlib_api.SqlTestCase):
+    DRIVER_CLASS = type_gre.GreTypeDriver
+    TYPE = p_const.TYPE_GRE
+
+
 class GreTypeMultiRangeTest(base_type_tunnel.TunnelTypeMultiRangeTestMixin,
                             testlib_api.SqlTestCase):
     DRIVER_CLASS = type_gre.GreTypeDriver
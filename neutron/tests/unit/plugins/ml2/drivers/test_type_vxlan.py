@@ -119,6 +119,13 @@ class VxlanTypeTest(base_type_tunnel.TunnelTypeTestMixin,
         self.assertEqual(0, self.driver.get_mtu('physnet1'))
 
 
+class VxlanTypeSparseAllocationTest(
+        base_type_tunnel.TunnelTypeSparseAllocationTestMixin,
+        testlib_api.SqlTestCase):
+    DRIVER_CLASS = type_vxlan.VxlanTypeDriver
+    TYPE = p_const.TYPE_VXLAN
+
+
 class VxlanTypeMultiRangeTest(base_type_tunnel.TunnelTypeMultiRangeTestMixin,
                               testlib_api.SqlTestCase):
     DRIVER_CLASS = type_vxlan.VxlanTypeDriver
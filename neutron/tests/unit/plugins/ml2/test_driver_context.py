@@ -18,6 +18,7 @@ import mock
 from neutron.common import constants
 from neutron.extensions import portbindings
 from neutron.plugins.ml2 import driver_context
+from neutron.plugins.ml2 import models
 from neutron.tests import base
 
 
@@ -101,3 +102,73 @@ class TestPortContext(base.BaseTestCase):
                                              binding,
                                              None)
         self.assertEqual('status', ctx.status)
+
+
+class TestContextSnapshot(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestContextSnapshot, self).setUp()
+        self.plugin_context = mock.Mock()
+        self.admin_context = mock.patch.object(
+            driver_context.n_context, 'get_admin_context').start()
+        self.get_segments = mock.patch.object(
+            driver_context.db, 'get_network_segments',
+            return_value=[{'id': 'seg1'}]).start()
+
+    def test_network_snapshot(self):
+        network = {'id': 'net1', 'name': 'net'}
+        ctx = driver_context.NetworkContext(mock.Mock(), self.plugin_context,
+                                            network, {'id': 'net1'})
+        snapshot = ctx._snapshot()
+        network['name'] = 'changed'
+        ctx.network_segments[0]['id'] = 'changed'
+
+        self.assertEqual({'id': 'net1', 'name': 'net'}, snapshot.current)
+        self.assertEqual({'id': 'net1'}, snapshot.original)
+        self.assertEqual([{'id': 'seg1'}], snapshot.network_segments)
+        self.assertIs(self.admin_context.return_value,
+                      snapshot._plugin_context)
+        self.assertIs(self.plugin_context, ctx._plugin_context)
+
+    def test_subnet_snapshot(self):
+        subnet = {'id': 'sub1', 'network_id': 'net1'}
+        ctx = driver_context.SubnetContext(mock.Mock(), self.plugin_context,
+                                           subnet)
+        snapshot = ctx._snapshot()
+        subnet['network_id'] = 'changed'
+
+        self.assertEqual({'id': 'sub1', 'network_id': 'net1'},
+                         snapshot.current)
+        self.assertIsNone(snapshot.original)
+
+    def test_port_snapshot(self):
+        port = {'id': 'port1', 'device_owner': 'compute',
+                portbindings.HOST_ID: 'host1'}
+        binding = models.PortBinding(port_id='port1', host='host1',
+                                     vif_type='ovs')
+        level = models.PortBindingLevel(port_id='port1', host='host1',
+                                        level=0, driver='openvswitch',
+                                        segment_id='seg1')
+        ctx = driver_context.PortContext(
+            mock.Mock(), self.plugin_context, port, {'id': 'net1'}, binding,
+            [level], original_port=dict(port))
+        snapshot = ctx._snapshot()
+        # Changed by the plugin once the drivers were called
+        port[portbindings.HOST_ID] = 'host2'
+        binding.host = 'host2'
+        level.driver = 'other'
+
+        self.assertEqual('host1', snapshot.host)
+        self.assertEqual('host1', snapshot.original_host)
+        self.assertEqual('host1', snapshot._binding.host)
+        self.assertEqual('ovs', snapshot._binding.vif_type)
+        self.assertIsNot(binding, snapshot._binding)
+        self.assertEqual(['openvswitch'],
+                         [l.driver for l in snapshot._binding_levels])
+        self.assertEqual(['openvswitch'],
+                         [l.driver for l in snapshot._original_binding_levels])
+        self.assertEqual({'id': 'net1'}, snapshot.network.current)
+        self.assertIs(snapshot._plugin_context,
+                      snapshot.network._plugin_context)
+        self.assertIs(self.admin_context.return_value,
+                      snapshot._plugin_context)
@@ -24,6 +24,7 @@ import webob
 import fixtures
 from oslo_db import exception as db_exc
 
+from neutron.agent.linux import utils as agent_utils
 from neutron.callbacks import registry
 from neutron.common import constants
 from neutron.common import exceptions as exc
@@ -48,6 +49,7 @@ from neutron.plugins.ml2 import driver_context
 from neutron.plugins.ml2.drivers import type_vlan
 from neutron.plugins.ml2 import models
 from neutron.plugins.ml2 import plugin as ml2_plugin
+from neutron.plugins.ml2 import postcommit_queue
 from neutron.tests import base
 from neutron.tests.unit import _test_extension_portbindings as test_bindings
 from neutron.tests.unit.agent import test_securitygroups_rpc as test_sg_rpc
@@ -1170,6 +1172,59 @@ class DHCPOptsTestCase(test_dhcpopts.TestExtraDhcpOpt):
             plugin=PLUGIN_NAME)
 
 
+class TestMl2AsyncPostcommit(Ml2PluginV2TestCase):
+
+    def setUp(self):
+        config.cfg.CONF.set_override('async_postcommit_drivers', ['test'],
+                                     group='ml2')
+        config.cfg.CONF.set_override('async_postcommit_resync_interval', 0,
+                                     group='ml2')
+        super(TestMl2AsyncPostcommit, self).setUp()
+        plugin = manager.NeutronManager.get_plugin()
+        self.mech_manager = plugin.mechanism_manager
+
+    def test_postcommit_failure_does_not_fail_request(self):
+        with mock.patch.object(mech_test.TestMechanismDriver,
+                               'create_network_postcommit',
+                               side_effect=ml2_exc.MechanismDriverError
+                               ) as postcommit,\
+                mock.patch.object(postcommit_queue, 'RETRY_INTERVAL', 0):
+            with self.network() as network:
+                dispatcher = (
+                    self.mech_manager.async_postcommit_dispatchers['test'])
+                agent_utils.wait_until_true(
+                    lambda: dispatcher.get_stats()['failed'], timeout=5,
+                    sleep=0.01)
+                self.assertEqual(1, dispatcher.get_stats()['failed_pending'])
+            self.assertEqual(network['network']['id'],
+                             postcommit.call_args[0][0].current['id'])
+            # The network deletion drops its failed creation
+            self._delete('networks', network['network']['id'])
+            agent_utils.wait_until_true(
+                lambda: dispatcher.get_stats()['completed'] == 2,
+                timeout=5, sleep=0.01)
+            self.assertEqual(0, dispatcher.get_stats()['failed_pending'])
+
+    def test_postcommit_call_given_a_snapshot(self):
+        contexts = []
+        with mock.patch.object(mech_test.TestMechanismDriver,
+                               'create_port_postcommit',
+                               side_effect=contexts.append):
+            with self.port() as port:
+                agent_utils.wait_until_true(
+                    lambda: contexts, timeout=5, sleep=0.01)
+        self.assertEqual(port['port']['id'], contexts[0].current['id'])
+        # Not the context of the request
+        self.assertTrue(contexts[0]._plugin_context.is_admin)
+        self.assertIsNone(contexts[0]._plugin_context.tenant_id)
+
+    def test_postcommit_calls_dispatched(self):
+        with self.port():
+            dispatcher = (
+                self.mech_manager.async_postcommit_dispatchers['test'])
+            self.assertEqual(3, dispatcher.get_stats()['dispatched'])
+
+
 class Ml2PluginV2FaultyDriverTestCase(test_plugin.NeutronDbPluginV2TestCase):
 
     def setUp(self):
@@ -0,0 +1,263 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+import mock
+
+from neutron.agent.linux import utils
+from neutron.plugins.ml2 import postcommit_queue
+from neutron.tests import base
+
+
+class FakeSlowDriver(object):
+    """Mechanism driver taking some time to complete its postcommit calls"""
+
+    def __init__(self, delay=0.01, failures=0):
+        self.delay = delay
+        self.failures = failures
+        self.calls = []
+        self.running = 0
+        self.max_running = 0
+
+    def create_port_postcommit(self, context):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            eventlet.sleep(self.delay)
+            if self.failures:
+                self.failures -= 1
+                raise Exception('controller unreachable')
+            self.calls.append(('create', context.current['id']))
+        finally:
+            self.running -= 1
+
+    def update_port_postcommit(self, context):
+        eventlet.sleep(self.delay)
+        self.calls.append(('update', context.current['id']))
+
+    def delete_port_postcommit(self, context):
+        eventlet.sleep(self.delay)
+        self.calls.append(('delete', context.current['id']))
+
+    def create_network_postcommit(self, context):
+        eventlet.sleep(self.delay * 5)
+        self.calls.append(('create', context.current['id']))
+
+
+def _get_context(resource_id, network_id=None):
+    current = {'id': resource_id}
+    if network_id:
+        current['network_id'] = network_id
+    return mock.Mock(current=current)
+
+
+class TestPostcommitQueue(base.BaseTestCase):
+    def setUp(self):
+        super(TestPostcommitQueue, self).setUp()
+        self.queue = postcommit_queue.PostcommitQueue()
+
+    def test_calls_of_a_resource_processed_in_order(self):
+        self.queue.add('port1', 'create')
+        self.queue.add('port1', 'update')
+        self.assertEqual(2, self.queue.depth)
+
+        self.assertEqual(('port1', 'create'), self.queue.get())
+        self.queue.done('port1')
+        self.assertEqual(('port1', 'update'), self.queue.get())
+        self.assertEqual(0, self.queue.depth)
+
+    def test_resource_processed_by_one_worker_at_a_time(self):
+        self.queue.add('port1', 'create')
+        self.queue.add('port2', 'create')
+        self.assertEqual(('port1', 'create'), self.queue.get())
+        self.queue.add('port1', 'update')
+
+        # port1 is in progress, only port2 can be handed out
+        self.assertEqual(('port2', 'create'), self.queue.get())
+        self.assertTrue(self.queue._ready.empty())
+        self.queue.done('port1')
+        self.assertEqual(('port1', 'update'), self.queue.get())
+
+
+class TestGetQueueKey(base.BaseTestCase):
+    def test_network(self):
+        self.assertEqual('net1',
+                         postcommit_queue.get_queue_key(_get_context('net1')))
+
+    def test_port(self):
+        self.assertEqual('net1', postcommit_queue.get_queue_key(
+            _get_context('port1', network_id='net1')))
+
+
+class TestAsyncPostcommitDispatcher(base.BaseTestCase):
+    def setUp(self):
+        super(TestAsyncPostcommitDispatcher, self).setUp()
+        mock.patch.object(postcommit_queue, 'RETRY_INTERVAL', 0).start()
+        self.driver = FakeSlowDriver()
+
+    def _get_dispatcher(self, workers=4, retries=3, resync_interval=0):
+        return postcommit_queue.AsyncPostcommitDispatcher(
+            mock.Mock(obj=self.driver), workers, retries, resync_interval)
+
+    def _wait(self, dispatcher):
+        utils.wait_until_true(
+            lambda: (dispatcher.get_stats()['completed'] ==
+                     dispatcher.get_stats()['dispatched']),
+            timeout=5, sleep=0.01)
+
+    def test_dispatch_does_not_wait_for_driver(self):
+        dispatcher = self._get_dispatcher()
+        dispatcher.dispatch('create_port_postcommit', _get_context('port1'))
+
+        self.assertEqual([], self.driver.calls)
+        self.assertEqual(1, dispatcher.get_stats()['backlog'])
+        self._wait(dispatcher)
+        self.assertEqual([('create', 'port1')], self.driver.calls)
+        self.assertEqual(0, dispatcher.get_stats()['backlog'])
+
+    def test_calls_of_a_resource_processed_in_order(self):
+        dispatcher = self._get_dispatcher()
+        dispatcher.dispatch('create_port_postcommit', _get_context('port1'))
+        dispatcher.dispatch('update_port_postcommit', _get_context('port1'))
+        self._wait(dispatcher)
+
+        self.assertEqual([('create', 'port1'), ('update', 'port1')],
+                         self.driver.calls)
+
+    def test_calls_of_a_network_ports_processed_in_order(self):
+        dispatcher = self._get_dispatcher()
+        dispatcher.dispatch('create_network_postcommit', _get_context('net1'))
+        dispatcher.dispatch('create_port_postcommit',
+                            _get_context('port1', network_id='net1'))
+        self._wait(dispatcher)
+
+        self.assertEqual([('create', 'net1'), ('create', 'port1')],
+                         self.driver.calls)
+
+    def test_calls_processed_in_parallel(self):
+        dispatcher = self._get_dispatcher(workers=3)
+        for i in range(6):
+            dispatcher.dispatch('create_port_postcommit',
+                                _get_context('port%s' % i))
+        self._wait(dispatcher)
+
+        self.assertEqual(6, len(self.driver.calls))
+        self.assertEqual(3, self.driver.max_running)
+
+    def test_failed_call_retried(self):
+        self.driver.failures = 2
+        dispatcher = self._get_dispatcher()
+        dispatcher.dispatch('create_port_postcommit', _get_context('port1'))
+        self._wait(dispatcher)
+
+        self.assertEqual([('create', 'port1')], self.driver.calls)
+        stats = dispatcher.get_stats()
+        self.assertEqual(2, stats['retried'])
+        self.assertEqual(0, stats['failed'])
+
+    def test_failed_call_given_up_after_retries(self):
+        self.driver.failures = 3
+        dispatcher = self._get_dispatcher(retries=2)
+        dispatcher.dispatch('create_port_postcommit', _get_context('port1'))
+        dispatcher.dispatch('update_port_postcommit', _get_context('port1'))
+        self._wait(dispatcher)
+
+        self.assertEqual([('update', 'port1')], self.driver.calls)
+        stats = dispatcher.get_stats()
+        self.assertEqual(2, stats['retried'])
+        self.assertEqual(1, stats['failed'])
+        self.assertEqual(1, stats['failed_pending'])
+        [(method_name, context)] = dispatcher._failed
+        self.assertEqual('create_port_postcommit', method_name)
+        self.assertEqual('port1', context.current['id'])
+
+    def test_retry_failed_calls(self):
+        self.driver.failures = 1
+        dispatcher = self._get_dispatcher(retries=0)
+        dispatcher.dispatch('create_port_postcommit', _get_context('port1'))
+        self._wait(dispatcher)
+        self.assertEqual([], self.driver.calls)
+
+        self.assertEqual(1, dispatcher.retry_failed_calls())
+        self._wait(dispatcher)
+        self.assertEqual([('create', 'port1')], self.driver.calls)
+        self.assertEqual(0, dispatcher.get_stats()['failed_pending'])
+
+    def test_failed_calls_capped(self):
+        mock.patch.object(postcommit_queue, 'MAX_FAILED_CALLS', 2).start()
+        self.driver.failures = 3
+        dispatcher = self._get_dispatcher(retries=0)
+        for i in range(3):
+            dispatcher.dispatch('create_port_postcommit',
+                                _get_context('port%s' % i))
+            self._wait(dispatcher)
+
+        self.assertEqual(['port1', 'port2'],
+                         [context.current['id']
+                          for method_name, context in dispatcher._failed])
+        self.assertEqual(1, dispatcher.get_stats()['dropped'])
+
+    def test_failed_calls_forgotten_on_delete(self):
+        self.driver.failures = 1
+        dispatcher = self._get_dispatcher(retries=0)
+        dispatcher.dispatch('create_port_postcommit', _get_context('port1'))
+        dispatcher.dispatch('create_port_postcommit', _get_context('port2'))
+        dispatcher.dispatch('delete_port_postcommit', _get_context('port1'))
+        self._wait(dispatcher)
+
+        self.assertEqual(0, dispatcher.get_stats()['failed_pending'])
+        self.assertEqual(0, dispatcher.retry_failed_calls())
+
+    def test_resync_loop_started(self):
+        with mock.patch.object(postcommit_queue.loopingcall,
+                               'FixedIntervalLoopingCall') as loop:
+            dispatcher = self._get_dispatcher(resync_interval=60)
+            dispatcher.dispatch('create_port_postcommit',
+                                _get_context('port1'))
+            dispatcher.dispatch('create_port_postcommit',
+                                _get_context('port2'))
+        loop.assert_called_once_with(dispatcher._resync)
+        loop.return_value.start.assert_called_once_with(interval=60,
+                                                        initial_delay=60)
+
+    def test_resync(self):
+        self.driver.failures = 1
+        dispatcher = self._get_dispatcher(retries=0)
+        dispatcher.dispatch('create_port_postcommit', _get_context('port1'))
+        self._wait(dispatcher)
+
+        with mock.patch.object(postcommit_queue.LOG, 'info') as log:
+            dispatcher._resync()
+            self._wait(dispatcher)
+            dispatcher._resync()
+        self.assertEqual([('create', 'port1')], self.driver.calls)
+        self.assertEqual(2, log.call_count)
+        self.assertEqual(1, log.call_args_list[0][0][1]['retried_failed'])
+        self.assertEqual(2, log.call_args_list[1][0][1]['completed'])
+        # Nothing happened since the last statistics were logged
+        dispatcher._resync()
+        self.assertEqual(2, log.call_count)
+
+    def test_get_stats(self):
+        dispatcher = self._get_dispatcher()
+        self.assertIsNone(dispatcher.get_stats()['latency_avg'])
+        dispatcher.dispatch('create_port_postcommit', _get_context('port1'))
+        self._wait(dispatcher)
+
+        stats = dispatcher.get_stats()
+        self.assertEqual(1, stats['dispatched'])
+        self.assertEqual(1, stats['completed'])
+        self.assertGreaterEqual(stats['latency_avg'], self.driver.delay)
+        self.assertEqual(stats['latency_avg'], stats['latency_max'])
@@ -189,6 +189,45 @@ class RpcCallbacksTestCase(base.BaseTestCase):
                          self.callbacks.update_device_down(
                              'fake_context', device='fake_device'))
 
+    def test_update_device_list(self):
+        with contextlib.nested(
+            mock.patch.object(self.callbacks, 'update_device_up'),
+            mock.patch.object(self.callbacks, 'update_device_down',
+                              return_value={'device': 'dev_down',
+                                            'exists': True})
+        ) as (update_up, update_down):
+            res = self.callbacks.update_device_list(
+                'fake_context', devices_up=['dev_up'],
+                devices_down=['dev_down'], agent_id='fake_agent_id',
+                host='fake_host')
+        update_up.assert_called_once_with(
+            'fake_context', device='dev_up', agent_id='fake_agent_id',
+            host='fake_host', devices_down=['dev_down'])
+        update_down.assert_called_once_with(
+            'fake_context', device='dev_down', agent_id='fake_agent_id',
+            host='fake_host')
+        self.assertEqual({'devices_up': ['dev_up'],
+                          'failed_devices_up': [],
+                          'devices_down': [{'device': 'dev_down',
+                                            'exists': True}],
+                          'failed_devices_down': []}, res)
+
+    def test_update_device_list_reports_failed_devices(self):
+        with contextlib.nested(
+            mock.patch.object(self.callbacks, 'update_device_up',
+                              side_effect=Exception),
+            mock.patch.object(self.callbacks, 'update_device_down',
+                              side_effect=Exception)
+        ):
+            res = self.callbacks.update_device_list(
+                'fake_context', devices_up=['dev_up'],
+                devices_down=['dev_down'], agent_id='fake_agent_id',
+                host='fake_host')
+        self.assertEqual({'devices_up': [],
+                          'failed_devices_up': ['dev_up'],
+                          'devices_down': [],
+                          'failed_devices_down': ['dev_down']}, res)
+
 
 class RpcApiTestCase(base.BaseTestCase):
 
@@ -315,3 +354,13 @@ class RpcApiTestCase(base.BaseTestCase):
                            device='fake_device',
                            agent_id='fake_agent_id',
                            host='fake_host')
+
+    def test_update_device_list(self):
+        rpcapi = agent_rpc.PluginApi(topics.PLUGIN)
+        self._test_rpc_api(rpcapi, None,
+                           'update_device_list', rpc_method='call',
+                           devices_up=['fake_device1', 'fake_device2'],
+                           devices_down=['fake_device3', 'fake_device4'],
+                           agent_id='fake_agent_id',
+                           host='fake_host',
+                           version='1.5')
@@ -413,17 +413,35 @@ class TestOvsNeutronAgent(base.BaseTestCase):
             self.assertTrue(treat_vif_port.called)
 
     def test_treat_devices_removed_returns_true_for_missing_device(self):
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
+        with mock.patch.object(self.agent.plugin_rpc, 'update_device_list',
                                side_effect=Exception()):
-            self.assertTrue(self.agent.treat_devices_removed([{}]))
+            self.assertTrue(self.agent.treat_devices_removed(['dev1']))
+
+    def test_treat_devices_removed_returns_true_for_failed_device(self):
+        dev_set = {'devices_up': [],
+                   'failed_devices_up': [],
+                   'devices_down': [{'device': 'dev1', 'exists': True}],
+                   'failed_devices_down': ['dev2']}
+        with mock.patch.object(self.agent.plugin_rpc, 'update_device_list',
+                               return_value=dev_set):
+            with mock.patch.object(self.agent, 'port_unbound') as port_unbound:
+                self.assertTrue(
+                    self.agent.treat_devices_removed(['dev1', 'dev2']))
+        port_unbound.assert_called_once_with('dev1')
 
     def _mock_treat_devices_removed(self, port_exists):
-        details = dict(exists=port_exists)
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
-                               return_value=details):
+        details = dict(device='dev1', exists=port_exists)
+        dev_set = {'devices_up': [],
+                   'failed_devices_up': [],
+                   'devices_down': [details],
+                   'failed_devices_down': []}
+        with mock.patch.object(self.agent.plugin_rpc, 'update_device_list',
+                               return_value=dev_set) as update_dev_list:
             with mock.patch.object(self.agent, 'port_unbound') as port_unbound:
-                self.assertFalse(self.agent.treat_devices_removed([{}]))
+                self.assertFalse(self.agent.treat_devices_removed(['dev1']))
         self.assertTrue(port_unbound.called)
+        update_dev_list.assert_called_once_with(
+            self.agent.context, [], ['dev1'], self.agent.agent_id, mock.ANY)
 
     def test_treat_devices_removed_unbinds_port(self):
         self._mock_treat_devices_removed(True)
@@ -432,7 +450,52 @@ class TestOvsNeutronAgent(base.BaseTestCase):
         self._mock_treat_devices_removed(False)
 
     def test_bind_port_with_missing_network(self):
-        self.agent._bind_devices([{'network_id': 'non-existent'}])
+        with contextlib.nested(
+            mock.patch.object(self.agent.int_br, 'get_port_tag_dict',
+                              return_value={}),
+            mock.patch.object(self.agent.plugin_rpc, 'update_device_list')
+        ) as (get_port_tag_dict, update_dev_list):
+            self.agent._bind_devices([{'network_id': 'non-existent'}])
+        self.assertFalse(update_dev_list.called)
+
+    def _test_bind_devices(self, dev_set):
+        port = mock.Mock(port_name='tap1', ofport=1)
+        self.agent.local_vlan_map['net1'] = mock.Mock(vlan=1)
+        port_details = [{'network_id': 'net1', 'vif_port': port,
+                         'device': 'dev_up', 'admin_state_up': True},
+                        {'network_id': 'net1', 'vif_port': port,
+                         'device': 'dev_down', 'admin_state_up': False}]
+        with contextlib.nested(
+            mock.patch.object(self.agent.int_br, 'get_port_tag_dict',
+                              return_value={'tap1': 1}),
+            mock.patch.object(self.agent.int_br, 'set_db_attribute'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_device_list',
+                              return_value=dev_set)
+        ) as (get_port_tag_dict, set_db_attribute, update_dev_list):
+            self.agent._bind_devices(port_details)
+        # Tags of all the ports are read at once and already bound ports
+        # are left untouched
+        get_port_tag_dict.assert_called_once_with()
+        self.assertFalse(set_db_attribute.called)
+        update_dev_list.assert_called_once_with(
+            self.agent.context, ['dev_up'], ['dev_down'],
+            self.agent.agent_id, mock.ANY)
+
+    def test_bind_devices_reports_status_in_one_call(self):
+        self._test_bind_devices({'devices_up': ['dev_up'],
+                                 'failed_devices_up': [],
+                                 'devices_down': [{'device': 'dev_down',
+                                                   'exists': True}],
+                                 'failed_devices_down': []})
+
+    def test_bind_devices_raises_on_failed_devices(self):
+        self.assertRaises(ovs_neutron_agent.DeviceListRetrievalError,
+                          self._test_bind_devices,
+                          {'devices_up': [],
+                           'failed_devices_up': ['dev_up'],
+                           'devices_down': [{'device': 'dev_down',
+                                             'exists': True}],
+                           'failed_devices_down': []})
 
     def _test_process_network_ports(self, port_info):
         with contextlib.nested(
@@ -1702,8 +1765,12 @@ class TestOvsDvrNeutronAgent(base.BaseTestCase):
 
         with contextlib.nested(
             mock.patch.object(self.agent, 'reclaim_local_vlan'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
-                              return_value=None),
+            mock.patch.object(self.agent.plugin_rpc, 'update_device_list',
+                              return_value={
+                                  'devices_up': [],
+                                  'devices_down': [],
+                                  'failed_devices_up': [],
+                                  'failed_devices_down': []}),
             mock.patch.object(self.agent.dvr_agent.int_br, 'delete_flows'),
             mock.patch.object(self.agent.dvr_agent.tun_br,
                               'delete_flows')) as (reclaim_vlan_fn,
@@ -1788,8 +1855,12 @@ class TestOvsDvrNeutronAgent(base.BaseTestCase):
 
         with contextlib.nested(
             mock.patch.object(self.agent, 'reclaim_local_vlan'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
-                              return_value=None),
+            mock.patch.object(self.agent.plugin_rpc, 'update_device_list',
+                              return_value={
+                                  'devices_up': [],
+                                  'devices_down': [],
+                                  'failed_devices_up': [],
+                                  'failed_devices_down': []}),
             mock.patch.object(self.agent.dvr_agent.int_br,
                               'delete_flows')) as (reclaim_vlan_fn,
                                                    update_dev_down_fn,
@@ -1858,8 +1929,12 @@ class TestOvsDvrNeutronAgent(base.BaseTestCase):
 
         with contextlib.nested(
             mock.patch.object(self.agent, 'reclaim_local_vlan'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
-                              return_value=None),
+            mock.patch.object(self.agent.plugin_rpc, 'update_device_list',
+                              return_value={
+                                  'devices_up': [],
+                                  'devices_down': [],
+                                  'failed_devices_up': [],
+                                  'failed_devices_down': []}),
             mock.patch.object(self.agent.dvr_agent.int_br,
                               'delete_flows')) as (reclaim_vlan_fn,
                                                    update_dev_down_fn,
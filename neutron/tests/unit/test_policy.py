@@ -239,6 +239,7 @@ class NeutronPolicyTestCase(base.BaseTestCase):
                                "rule:context_is_advsvc",
             "update_port": "rule:admin_or_owner or rule:context_is_advsvc",
             "get_port": "rule:admin_or_owner or rule:context_is_advsvc",
+            "get_port:binding:host_id": "rule:admin_only",
             "delete_port": "rule:admin_or_owner or rule:context_is_advsvc",
             "create_fake_resource": "rule:admin_or_owner",
             "create_fake_resource:attr": "rule:admin_or_owner",
@@ -650,6 +651,54 @@ class NeutronPolicyTestCase(base.BaseTestCase):
                           'create_fake_resource:fake_resources',
                           'create_fake_resource:attr:sub_attr_1'], rules)
 
+    def test_build_match_rule_read_cached(self):
+        rule = policy._build_match_rule('get_port', {}, None)
+        self.assertIs(rule, policy._build_match_rule('get_port', {}, None))
+        self.assertEqual(1, policy.get_stats()['rule_cache_hits'])
+        # The cache is dropped when the rules are replaced
+        self.fakepolicyinit()
+        self.assertIsNot(rule,
+                         policy._build_match_rule('get_port', {}, None))
+
+    def test_depends_on_credentials_only(self):
+        for rule, expected in (('rule:admin_only', True),
+                               ('role:user and not role:advsvc', True),
+                               ('rule:missing', True),
+                               ('@', True),
+                               ('rule:admin_or_owner', False),
+                               ('rule:shared', False),
+                               ('role:user or field:networks:shared=True',
+                                False)):
+            self.assertEqual(expected, policy._depends_on_credentials_only(
+                common_policy.parse_rule(rule)), rule)
+
+    def test_check_memoizes_credentials_only_rules(self):
+        action = 'get_port:binding:host_id'
+        with mock.patch.object(policy._ENFORCER, 'enforce',
+                               wraps=policy._ENFORCER.enforce) as enforce:
+            self.assertFalse(policy.check(self.context, action,
+                                          {'tenant_id': 'fake'}))
+            self.assertFalse(policy.check(self.context, action,
+                                          {'tenant_id': 'other'}))
+        self.assertEqual(1, enforce.call_count)
+        stats = policy.get_stats()
+        self.assertEqual(2, stats['checks'])
+        self.assertEqual(1, stats['memoized'])
+        self.assertEqual(1, stats['credentials_cache_hits'])
+
+    def test_check_memoized_result_dropped_on_roles_change(self):
+        action = 'get_port:binding:host_id'
+        self.assertFalse(policy.check(self.context, action, {}))
+        self.context.roles.append('admin')
+        self.assertTrue(policy.check(self.context, action, {}))
+
+    def test_check_does_not_memoize_target_rules(self):
+        self.assertTrue(policy.check(self.context, 'get_port',
+                                     {'tenant_id': 'fake'}))
+        self.assertFalse(policy.check(self.context, 'get_port',
+                                      {'tenant_id': 'other'}))
+        self.assertEqual(0, policy.get_stats().get('memoized', 0))
+
     @mock.patch.object(policy.LOG, 'isEnabledFor', return_value=True)
     @mock.patch.object(policy.LOG, 'debug')
     def test_log_rule_list(self, mock_debug, mock_is_e):